@@ -1,11 +1,30 @@
 # PATH: /Archen/Archen/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
 
 def full_name_context(request):
-    if request.user.is_authenticated:
-        full_name = getattr(request.user, 'full_name', '') or request.user.username
-        return {
-            'full_name': full_name,
-            'role': getattr(request.user, 'role', ''),
-            'is_superuser': request.user.is_superuser
-        }
-    return {}
+    """Expose the header user info lazily.
+
+    English: values are only resolved (session + user lookup) when a template
+    actually renders them, so fragments that never show the header stay
+    query-free.
+    """
+    def _full_name():
+        user = request.user
+        if not user.is_authenticated:
+            return ''
+        return getattr(user, 'full_name', '') or user.username
+
+    def _role():
+        user = request.user
+        return getattr(user, 'role', '') if user.is_authenticated else ''
+
+    def _is_superuser():
+        user = request.user
+        return bool(user.is_authenticated and user.is_superuser)
+
+    return {
+        'full_name': SimpleLazyObject(_full_name),
+        'role': SimpleLazyObject(_role),
+        'is_superuser': SimpleLazyObject(_is_superuser),
+    }
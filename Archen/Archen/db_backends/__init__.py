@@ -0,0 +1 @@
+# Custom database backends for the Archen project.
@@ -0,0 +1,5 @@
+"""PostgreSQL backend that keeps psycopg2 connections in an in-process pool.
+
+Enable with ``ENGINE = 'Archen.db_backends.postgresql_pool'`` and tune via
+the ``POOL`` key of the database settings (see ``pool.PoolConfig``).
+"""
@@ -0,0 +1,50 @@
+"""Django PostgreSQL (psycopg2) backend with in-process connection pooling.
+
+``connection.close()`` hands the socket back to the pool instead of closing
+it, so requests that would otherwise reconnect (``CONN_MAX_AGE = 0``, a
+health check failure or an expired persistent connection) reuse a warm
+connection.  Broken connections are detected on checkin (transaction
+status) and on checkout: ``SELECT 1`` after ``ping_after`` idle seconds, or
+sooner when the server wrote to the idle socket (a restart terminating its
+backends) or another connection of the pool was found dead.
+"""
+
+from __future__ import annotations
+
+from django.db.backends.postgresql import base as pg_base
+
+from .pool import PoolConfig, get_pool
+
+
+class DatabaseWrapper(pg_base.DatabaseWrapper):
+    def _pool(self):
+        return get_pool(self.alias, PoolConfig.from_settings(self.settings_dict.get('POOL')))
+
+    def get_new_connection(self, conn_params):
+        parent = super().get_new_connection
+        opened = []
+
+        def _connect():
+            opened.append(True)
+            return parent(conn_params)
+
+        connection = self._pool().acquire(_connect)
+        if not opened:
+            # Reused socket: mirror the isolation setup the parent performs
+            # on fresh connections (options were validated on first connect).
+            isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+            if isolation_level is None:
+                self.isolation_level = pg_base.IsolationLevel.READ_COMMITTED
+            else:
+                self.isolation_level = pg_base.IsolationLevel(isolation_level)
+                connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            self._pool().release(self.connection)
+
+    def pool_stats(self) -> dict:
+        return self._pool().snapshot()
@@ -0,0 +1,238 @@
+"""Small thread-safe connection pool used by the pooled PostgreSQL backend.
+
+Each process (gunicorn worker) owns its own pools; a pool created before a
+fork is discarded in the child so sockets are never shared between workers.
+
+A PostgreSQL restart terminates every backend, and the server's goodbye (or
+EOF) makes the idle socket readable.  An idle connection should have nothing
+to read, so a readable one is pinged before reuse whatever its idle time.
+The first dead connection found also marks every connection returned before
+it as suspect, so the rest of that server generation is pinged once too.
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass
+class PoolConfig:
+    """Pool limits read from ``DATABASES[alias]['POOL']``.
+
+    - max_size: maximum connections (idle + in use) per process.
+    - max_idle: idle connections kept for reuse; extras are closed.
+    - idle_timeout: seconds an idle connection may wait before being closed.
+    - ping_after: idle seconds after which a connection is checked with
+      ``SELECT 1`` before reuse (detects server restarts).
+    - wait_timeout: seconds to wait for a free slot when the pool is full.
+    """
+
+    max_size: int = 10
+    max_idle: int = 5
+    idle_timeout: float = 300.0
+    ping_after: float = 30.0
+    wait_timeout: float = 10.0
+
+    @classmethod
+    def from_settings(cls, raw: dict | None) -> "PoolConfig":
+        raw = raw or {}
+        cfg = cls()
+        for name in ('max_size', 'max_idle'):
+            if raw.get(name) is not None:
+                setattr(cfg, name, max(1, int(raw[name])))
+        for name in ('idle_timeout', 'ping_after', 'wait_timeout'):
+            if raw.get(name) is not None:
+                setattr(cfg, name, max(0.0, float(raw[name])))
+        cfg.max_idle = min(cfg.max_idle, cfg.max_size)
+        return cfg
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection slot frees up within ``wait_timeout``."""
+
+
+class ConnectionPool:
+    """Keep idle psycopg2 connections for reuse by later requests."""
+
+    def __init__(self, config: PoolConfig):
+        self.config = config
+        self.pid = os.getpid()
+        self._idle: deque = deque()  # (connection, returned_at)
+        self._in_use = 0
+        # English: monotonic time of the last dead connection; older idle ones are suspect
+        self._failed_at = float('-inf')
+        self._cond = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'returned': 0,
+            'discarded': 0,
+            'expired': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'exhausted': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    def acquire(self, connect):
+        """Return an idle connection or open a new one with ``connect()``."""
+        deadline = time.monotonic() + self.config.wait_timeout
+        with self._cond:
+            while True:
+                self._expire_idle_locked()
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if self._usable(conn, returned_at):
+                        self._in_use += 1
+                        self.stats['reused'] += 1
+                        return conn
+                    self._discard(conn)
+                if self._in_use < self.config.max_size:
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['exhausted'] += 1
+                    raise PoolExhausted(
+                        f"connection pool exhausted ({self.config.max_size} in use)"
+                    )
+                self.stats['waits'] += 1
+                self._cond.wait(remaining)
+        # Open the new connection outside the lock; release the slot on failure.
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats['created'] += 1
+        return conn
+
+    def release(self, conn) -> None:
+        keep = self._reset(conn)
+        with self._cond:
+            if not keep:
+                self._failed_at = time.monotonic()
+            self._in_use = max(0, self._in_use - 1)
+            if keep and len(self._idle) < self.config.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                self.stats['returned'] += 1
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def discard(self, conn) -> None:
+        """Close a broken connection and free its slot."""
+        with self._cond:
+            self._failed_at = time.monotonic()
+            self._in_use = max(0, self._in_use - 1)
+            self._discard(conn)
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                **self.stats,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.config.max_size,
+                'max_idle': self.config.max_idle,
+                'pid': self.pid,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _expire_idle_locked(self) -> None:
+        if not self.config.idle_timeout:
+            return
+        now = time.monotonic()
+        # Oldest connections sit at the left end of the deque.
+        while self._idle and now - self._idle[0][1] > self.config.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self.stats['expired'] += 1
+            self._discard(conn)
+
+    def _usable(self, conn, returned_at: float) -> bool:
+        if getattr(conn, 'closed', 1):
+            return False
+        now = time.monotonic()
+        if (now - returned_at < self.config.ping_after and returned_at > self._failed_at
+                and not self._peer_spoke(conn)):
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            return True
+        except Exception:
+            self.stats['ping_failures'] += 1
+            self._failed_at = now
+            return False
+
+    @staticmethod
+    def _peer_spoke(conn) -> bool:
+        """True when the server sent data or closed the socket while the connection sat idle."""
+        try:
+            readable, _, _ = select.select([conn.fileno()], [], [], 0)
+        except Exception:
+            return False
+        return bool(readable)
+
+    @staticmethod
+    def _reset(conn) -> bool:
+        """Return the connection to a clean, idle state; False if broken."""
+        if getattr(conn, 'closed', 1):
+            return False
+        try:
+            import psycopg2.extensions as ext
+            if conn.get_transaction_status() != ext.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return conn.get_transaction_status() == ext.TRANSACTION_STATUS_IDLE
+        except Exception:
+            return False
+
+    def _discard(self, conn) -> None:
+        self.stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, config: PoolConfig) -> ConnectionPool:
+    """Return the pool for ``alias`` in the current process, creating it lazily."""
+    pid = os.getpid()
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != pid:
+            # Inherited from the parent process: drop without closing sockets
+            # that still belong to the parent.
+            pool = ConnectionPool(config)
+            _pools[alias] = pool
+        return pool
+
+
+def pool_stats() -> dict[str, dict]:
+    """Stats for every pool created in this process, keyed by DB alias."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.snapshot() for alias, pool in pools.items() if pool.pid == os.getpid()}
@@ -138,6 +138,26 @@ else:
             # 'OPTIONS': json.loads(os.environ.get('DB_OPTIONS', '{}')) if needed
         }
     }
+    # English comment: Production connection profile. DB_POOL=1 swaps in the
+    # in-process psycopg2 pool (Archen/db_backends/postgresql_pool); otherwise
+    # persistent connections are kept for DB_CONN_MAX_AGE seconds. Health
+    # checks drop connections broken by a database restart before reuse.
+    _db_pool = str(os.environ.get('DB_POOL', '0')).lower() in {'1', 'true', 'yes'}
+    if _db_pool and _db_engine == 'django.db.backends.postgresql':
+        DATABASES['default']['ENGINE'] = 'Archen.db_backends.postgresql_pool'
+        DATABASES['default']['POOL'] = {
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'max_idle': int(os.environ.get('DB_POOL_MAX_IDLE', '5')),
+            'idle_timeout': float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300')),
+            'ping_after': float(os.environ.get('DB_POOL_PING_AFTER', '30')),
+            'wait_timeout': float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '10')),
+        }
+        # Connections go back to the pool at the end of each request.
+        _default_conn_max_age = '0'
+    else:
+        _default_conn_max_age = '0' if DEBUG else '60'
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', _default_conn_max_age))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
 LANGUAGE_CODE = 'fa'
 TIME_ZONE = 'Asia/Tehran'
@@ -162,6 +182,45 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# English comment: Cache backend selected by CACHE_BACKEND (locmem | file | db).
+# locmem is per-process and only suits development; gunicorn workers need a
+# shared backend (file or db) so cached data and invalidations are coherent.
+# The db backend requires `python manage.py createcachetable`.
+_cache_backend = (os.environ.get('CACHE_BACKEND') or ('locmem' if DEBUG else 'file')).strip().lower()
+_cache_timeout = int(os.environ.get('CACHE_TIMEOUT', '300'))
+if _cache_backend == 'file':
+    _cache_default = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'tmp' / 'django_cache')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000'))},
+    }
+elif _cache_backend == 'db':
+    _cache_default = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'archen_cache'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000'))},
+    }
+else:
+    _cache_default = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'archen-default',
+    }
+CACHES = {
+    'default': {
+        **_cache_default,
+        'TIMEOUT': _cache_timeout,
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'archen'),
+    }
+}
+
+# English comment: Read sessions through the cache once it is shared between
+# workers (file/db); a per-process locmem cache could serve stale sessions.
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db'
+    if _cache_backend in {'file', 'db'}
+    else 'django.contrib.sessions.backends.db',
+)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 14  # 14 days
 
@@ -226,6 +285,12 @@ if not DEBUG:
     except ValueError:
         # Fallback: append if SecurityMiddleware not found (should not happen)
         MIDDLEWARE.append('whitenoise.middleware.WhiteNoiseMiddleware')
-    # English: Use non-manifest storage to avoid hashed path mismatches on shared hosts
-    # and to keep URLs predictable (/static/...). Enable gzip/brotli via WhiteNoise.
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+    # English: Hashed file names + gzip/brotli precompression (Archen/storage.py).
+    # WhiteNoise serves hashed names with far-future immutable Cache-Control;
+    # templates must use {% static %} so they resolve to the hashed URLs.
+    STATICFILES_STORAGE = 'Archen.storage.ArchenStaticFilesStorage'
+    # collectstatic regenerates the service worker with hashed precache URLs
+    # and a manifest-derived CACHE_NAME; serve it once it exists.
+    _generated_sw = STATIC_ROOT / 'sw' / 'serviceworker.js'
+    if _generated_sw.exists():
+        PWA_SERVICE_WORKER_PATH = _generated_sw
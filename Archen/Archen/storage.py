@@ -0,0 +1,121 @@
+# PATH: /Archen/Archen/storage.py
+"""Static files storage for production.
+
+Files are stored under content-hashed names (``app.3f2a1c9b.css``) and
+precompressed by WhiteNoise (gzip, plus brotli when the ``Brotli`` package
+is installed).  WhiteNoise serves hashed names with
+``Cache-Control: max-age=315360000, public, immutable``.
+
+After post-processing, the service worker is regenerated from
+``static/serviceworker.js``: every ``/static/...`` entry of ``PRECACHE_URLS``
+is rewritten to its hashed URL and ``CACHE_NAME`` gets a version derived from
+the manifest, so a deploy that changes any asset invalidates client caches
+without bumping the version by hand.
+
+The manifest is strict: ``{% static %}`` of a path missing from it raises
+instead of falling back to an unhashed URL that would be served without the
+immutable header (``Archen/tests.py`` checks every template path).  Files that
+collected CSS references but nobody ships are logged and left unhashed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+SERVICE_WORKER_SOURCE = 'serviceworker.js'
+# Generated worker (served by django-pwa, see PWA_SERVICE_WORKER_PATH).
+SERVICE_WORKER_OUTPUT = 'sw/serviceworker.js'
+
+_CACHE_NAME_RE = re.compile(r"const CACHE_NAME = '([^']*)';")
+_PRECACHE_BLOCK_RE = re.compile(r"(const PRECACHE_URLS = \[)(.*?)(\];)", re.S)
+_STATIC_ENTRY_RE = re.compile(r"'(/static/[^']+)'")
+
+logger = logging.getLogger(__name__)
+
+
+def static_prefix() -> str:
+    return '/' + settings.STATIC_URL.strip('/') + '/'
+
+
+def build_service_worker(source: str, hashed_names: dict[str, str]) -> tuple[str, str, list[str]]:
+    """Return ``(worker_js, cache_name, precache_urls)`` for the given manifest.
+
+    ``hashed_names`` maps original relative paths to hashed relative paths,
+    as stored in ``staticfiles.json``.
+    """
+    prefix = static_prefix()
+    digest = hashlib.sha256()
+    for name in sorted(hashed_names):
+        digest.update(f"{name}={hashed_names[name]}\n".encode('utf-8'))
+    digest.update(source.encode('utf-8'))
+    version = digest.hexdigest()[:12]
+
+    match = _CACHE_NAME_RE.search(source)
+    base_name = (match.group(1) if match else 'archen-static').rsplit('-v', 1)[0]
+    cache_name = f"{base_name}-{version}"
+    worker = _CACHE_NAME_RE.sub(f"const CACHE_NAME = '{cache_name}';", source, count=1)
+
+    precache_urls: list[str] = []
+
+    def _rewrite_entry(entry_match):
+        url = entry_match.group(1)
+        relative = url[len(prefix):] if url.startswith(prefix) else url.lstrip('/')
+        hashed = hashed_names.get(relative)
+        resolved = prefix + hashed if hashed else url
+        precache_urls.append(resolved)
+        return f"'{resolved}'"
+
+    def _rewrite_block(block_match):
+        body = _STATIC_ENTRY_RE.sub(_rewrite_entry, block_match.group(2))
+        return block_match.group(1) + body + block_match.group(3)
+
+    worker = _PRECACHE_BLOCK_RE.sub(_rewrite_block, worker, count=1)
+    header = f"// Generated by collectstatic from {SERVICE_WORKER_SOURCE}; do not edit.\n"
+    return header + worker, cache_name, precache_urls
+
+
+class ArchenStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Hashed + compressed static storage that also emits the service worker."""
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            # English: third-party CSS (e.g. django_jalali's jQuery UI theme)
+            # references images it does not ship; keep such URLs unchanged
+            # instead of failing collectstatic.
+            logger.warning("Static file %r is referenced but missing; its URL is left unhashed.", name)
+            return name
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        try:
+            self._write_service_worker()
+        except Exception as exc:
+            yield SERVICE_WORKER_OUTPUT, None, exc
+
+    def _write_service_worker(self) -> None:
+        if not self.exists(SERVICE_WORKER_SOURCE):
+            return
+        with self.open(SERVICE_WORKER_SOURCE) as fh:
+            source = fh.read().decode('utf-8')
+        worker, cache_name, precache_urls = build_service_worker(source, dict(self.hashed_files))
+        if self.exists(SERVICE_WORKER_OUTPUT):
+            self.delete(SERVICE_WORKER_OUTPUT)
+        self._save(SERVICE_WORKER_OUTPUT, ContentFile(worker.encode('utf-8')))
+        meta = json.dumps({'cache_name': cache_name, 'precache': precache_urls}, indent=2)
+        meta_name = SERVICE_WORKER_OUTPUT.rsplit('.', 1)[0] + '.json'
+        if self.exists(meta_name):
+            self.delete(meta_name)
+        self._save(meta_name, ContentFile(meta.encode('utf-8')))
@@ -0,0 +1,348 @@
+import json
+import os
+import re
+import socket
+import tempfile
+import unittest
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from . import storage
+from .db_backends.postgresql_pool import pool as db_pool
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection inside the pool."""
+
+    def __init__(self, status=0):
+        self.closed = 0
+        self.status = status
+        self.pings = 0
+        self.ping_fails = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = 0
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.pings += 1
+                if conn.ping_fails:
+                    raise OSError('server closed the connection')
+
+        return Cursor()
+
+
+class SocketConnection(FakeConnection):
+    """A fake connection with a real socket, so the pool can watch it for the server's goodbye."""
+
+    def __init__(self):
+        super().__init__()
+        self.sock, self.server = socket.socketpair()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        super().close()
+        self.sock.close()
+        self.server.close()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **config):
+        return db_pool.ConnectionPool(db_pool.PoolConfig(**config))
+
+    def test_released_connections_are_reused(self):
+        pool = self.make_pool()
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection), first)
+        self.assertEqual((pool.stats['created'], pool.stats['reused']), (1, 1))
+
+    def test_open_transactions_are_rolled_back_on_release(self):
+        pool = self.make_pool()
+        conn = pool.acquire(lambda: FakeConnection(status=2))
+        pool.release(conn)
+        self.assertEqual(conn.status, 0)
+        self.assertEqual(pool.snapshot()['idle'], 1)
+
+    def test_full_pool_raises_after_the_wait_timeout(self):
+        pool = self.make_pool(max_size=1, wait_timeout=0.01)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(db_pool.PoolExhausted):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats['exhausted'], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = self.make_pool(max_size=1, wait_timeout=0.01)
+
+        def refuse():
+            raise OSError('connection refused')
+
+        with self.assertRaises(OSError):
+            pool.acquire(refuse)
+        self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+    def test_extra_idle_connections_are_closed(self):
+        pool = self.make_pool(max_size=3, max_idle=1)
+        conns = [pool.acquire(FakeConnection) for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertEqual(pool.snapshot()['idle'], 1)
+        self.assertEqual([c.closed for c in conns], [0, 1, 1])
+
+    def test_idle_connections_expire(self):
+        pool = self.make_pool(idle_timeout=10)
+        with mock.patch.object(db_pool.time, 'monotonic', return_value=100.0):
+            conn = pool.acquire(FakeConnection)
+            pool.release(conn)
+        with mock.patch.object(db_pool.time, 'monotonic', return_value=111.0):
+            self.assertIsNot(pool.acquire(FakeConnection), conn)
+        self.assertEqual(pool.stats['expired'], 1)
+        self.assertEqual(conn.closed, 1)
+
+    def test_stale_connections_are_pinged_before_reuse(self):
+        pool = self.make_pool(ping_after=5, idle_timeout=0)
+        with mock.patch.object(db_pool.time, 'monotonic', return_value=100.0):
+            conn = pool.acquire(FakeConnection)
+            pool.release(conn)
+        conn.ping_fails = True
+        with mock.patch.object(db_pool.time, 'monotonic', return_value=106.0):
+            fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, conn)
+        self.assertEqual((conn.pings, pool.stats['ping_failures']), (1, 1))
+
+    def test_connections_the_server_closed_are_pinged_at_once(self):
+        pool = self.make_pool(max_size=3)
+        conns = [pool.acquire(SocketConnection) for _ in range(2)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertIs(pool.acquire(SocketConnection), conns[1])
+        self.assertEqual(conns[1].pings, 0)
+        pool.release(conns[1])
+
+        # English: a restart terminates the backend, which writes and closes its end
+        for conn in conns:
+            conn.server.close()
+            conn.ping_fails = True
+        fresh = pool.acquire(SocketConnection)
+        self.assertNotIn(fresh, conns)
+        self.assertEqual([c.pings for c in conns], [1, 1])
+        self.assertEqual(pool.stats['ping_failures'], 2)
+
+    def test_a_dead_connection_makes_the_older_ones_suspect(self):
+        pool = self.make_pool(max_size=3)
+        old, dead = pool.acquire(FakeConnection), pool.acquire(FakeConnection)
+        pool.release(old)
+        dead.closed = 1
+        pool.release(dead)
+        later = pool.acquire(FakeConnection)
+        self.assertIs(later, old)
+        self.assertEqual(old.pings, 1)
+        pool.release(later)
+        self.assertIs(pool.acquire(FakeConnection), old)
+        self.assertEqual(old.pings, 1)
+
+    def test_pools_are_not_shared_across_forks(self):
+        config = db_pool.PoolConfig()
+        with mock.patch.dict(db_pool._pools, clear=True):
+            parent = db_pool.get_pool('test', config)
+            self.assertIs(db_pool.get_pool('test', config), parent)
+            with mock.patch.object(db_pool.os, 'getpid', return_value=parent.pid + 1):
+                self.assertIsNot(db_pool.get_pool('test', config), parent)
+
+    def test_config_is_clamped(self):
+        config = db_pool.PoolConfig.from_settings({'max_size': 0, 'max_idle': 9, 'idle_timeout': -1})
+        self.assertEqual((config.max_size, config.max_idle, config.idle_timeout), (1, 1, 0.0))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs a PostgreSQL server')
+class PooledBackendTests(TransactionTestCase):
+    def test_closing_returns_the_socket_to_the_pool(self):
+        from .db_backends.postgresql_pool.base import DatabaseWrapper
+
+        settings_dict = {**connection.settings_dict, 'ENGINE': 'Archen.db_backends.postgresql_pool', 'POOL': {}}
+        with mock.patch.dict(db_pool._pools, clear=True):
+            wrapper = DatabaseWrapper(settings_dict, alias='pool_test')
+            pids = []
+            for _ in range(2):
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT pg_backend_pid()')
+                    pids.append(cursor.fetchone()[0])
+                wrapper.close()
+            stats = wrapper.pool_stats()
+            db_pool._pools['pool_test'].close_all()
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 0))
+
+    def test_sockets_of_a_restarted_server_are_replaced_before_use(self):
+        from .db_backends.postgresql_pool.base import DatabaseWrapper
+
+        settings_dict = {**connection.settings_dict, 'ENGINE': 'Archen.db_backends.postgresql_pool', 'POOL': {}}
+        with mock.patch.dict(db_pool._pools, clear=True):
+            wrappers = [DatabaseWrapper(settings_dict, alias='pool_test') for _ in range(2)]
+            old = []
+            for wrapper in wrappers:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT pg_backend_pid()')
+                    old.append(cursor.fetchone()[0])
+            for wrapper in wrappers:
+                wrapper.close()
+            # English: what a restart does to every backend, seen from the pool
+            with connection.cursor() as cursor:
+                for pid in old:
+                    cursor.execute('SELECT pg_terminate_backend(%s, 5000)', [pid])
+            new = []
+            for wrapper in wrappers:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT pg_backend_pid()')
+                    new.append(cursor.fetchone()[0])
+                wrapper.close()
+            stats = wrappers[0].pool_stats()
+            db_pool._pools['pool_test'].close_all()
+        self.assertFalse(set(old) & set(new))
+        self.assertEqual(stats['ping_failures'], 2)
+
+
+WORKER_SOURCE = """const CACHE_NAME = 'archen-static-v16';
+const PRECACHE_URLS = [
+  '/offline/',
+  '/static/css/app.css',
+  '/static/js/missing.js',
+];
+"""
+
+
+class ServiceWorkerBuildTests(SimpleTestCase):
+    def test_static_entries_point_at_hashed_names(self):
+        worker, cache_name, urls = storage.build_service_worker(WORKER_SOURCE, {'css/app.css': 'css/app.0123abcd.css'})
+        self.assertEqual(urls, ['/static/css/app.0123abcd.css', '/static/js/missing.js'])
+        self.assertIn("'/offline/'", worker)
+        self.assertRegex(cache_name, r'^archen-static-[0-9a-f]{12}$')
+        self.assertIn(f"const CACHE_NAME = '{cache_name}';", worker)
+
+    def test_cache_name_changes_with_the_manifest(self):
+        _, first, _ = storage.build_service_worker(WORKER_SOURCE, {'css/app.css': 'css/app.0123abcd.css'})
+        _, same, _ = storage.build_service_worker(WORKER_SOURCE, {'css/app.css': 'css/app.0123abcd.css'})
+        _, changed, _ = storage.build_service_worker(WORKER_SOURCE, {'css/app.css': 'css/app.4567ef01.css'})
+        self.assertEqual(first, same)
+        self.assertNotEqual(first, changed)
+
+
+class CollectStaticTests(SimpleTestCase):
+    def test_collectstatic_hashes_compresses_and_emits_the_worker(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as out:
+            os.makedirs(os.path.join(src, 'css'))
+            Path(src, 'css', 'app.css').write_text('body { color: #123456; }\n' * 50)
+            Path(src, 'serviceworker.js').write_text(WORKER_SOURCE)
+            with override_settings(
+                STATICFILES_DIRS=[src], STATIC_ROOT=out,
+                STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+                STATICFILES_STORAGE='Archen.storage.ArchenStaticFilesStorage',
+            ):
+                call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+            manifest = json.loads(Path(out, 'staticfiles.json').read_text())['paths']
+            hashed = manifest['css/app.css']
+            self.assertRegex(hashed, r'^css/app\.[0-9a-f]{12}\.css$')
+            self.assertTrue(Path(out, hashed + '.gz').exists())
+            meta = json.loads(Path(out, 'sw', 'serviceworker.json').read_text())
+            self.assertIn(f'{settings.STATIC_URL}{hashed}', meta['precache'])
+            worker = Path(out, storage.SERVICE_WORKER_OUTPUT).read_text()
+            self.assertIn(meta['cache_name'], worker)
+            self.assertTrue(worker.startswith('// Generated by collectstatic'))
+
+    def test_missing_references_are_logged_and_template_misses_raise(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as out:
+            os.makedirs(os.path.join(src, 'css'))
+            Path(src, 'css', 'theme.css').write_text("a { background: url('../img/gone.png'); }\n")
+            with override_settings(
+                STATICFILES_DIRS=[src], STATIC_ROOT=out,
+                STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+                STATICFILES_STORAGE='Archen.storage.ArchenStaticFilesStorage',
+            ):
+                with self.assertLogs('Archen.storage', 'WARNING') as logs:
+                    call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+                self.assertIn('img/gone.png', logs.output[0])
+                with self.assertRaises(ValueError):
+                    Template("{% load static %}{% static 'css/missing.css' %}").render(Context())
+
+
+# English: ``{% static 'x' %}`` with a literal path; filtered paths are listed below.
+_STATIC_TAG_RE = re.compile(r"""\{%\s*static\s+(['"])([^'"]+)\1\s*%\}""")
+# English: production_line builds ``{% static 'icons/'|add:stage.icon %}`` from these.
+_STAGE_ICON_RE = re.compile(r"""'icon':\s*'([^']+)'""")
+
+
+def template_static_paths() -> set[str]:
+    base = Path(settings.BASE_DIR)
+    paths = set()
+    for template in base.glob('**/templates/**/*.html'):
+        paths.update(match.group(2) for match in _STATIC_TAG_RE.finditer(template.read_text(encoding='utf-8')))
+    source = (base / 'production_line' / 'views.py').read_text(encoding='utf-8')
+    paths.update('icons/' + name for name in _STAGE_ICON_RE.findall(source))
+    return paths
+
+
+class StaticManifestTests(SimpleTestCase):
+    """collectstatic of the real static files, as a deploy runs it."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        out = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(out.cleanup)
+        static = override_settings(STATIC_ROOT=out.name, STATICFILES_STORAGE='Archen.storage.ArchenStaticFilesStorage')
+        static.enable()
+        cls.addClassCleanup(static.disable)
+        # English: compression is covered by CollectStaticTests and triples the run time here
+        with mock.patch.object(storage.ArchenStaticFilesStorage, 'compress_files', return_value=()), \
+                mock.patch.object(storage.logger, 'warning'):
+            call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+        cls.manifest = json.loads(Path(out.name, 'staticfiles.json').read_text())['paths']
+
+    def test_every_template_static_path_is_in_the_manifest(self):
+        paths = template_static_paths()
+        self.assertGreater(len(paths), 30)
+        self.assertEqual(sorted(path for path in paths if path not in self.manifest), [])
+
+    def test_whitenoise_sends_immutable_for_hashed_files_only(self):
+        from whitenoise.middleware import WhiteNoiseMiddleware
+
+        middleware = WhiteNoiseMiddleware(lambda request: HttpResponse(status=404))
+        factory = RequestFactory()
+        hashed = self.manifest['css/app.min.css']
+        self.assertNotEqual(hashed, 'css/app.min.css')
+        response = middleware(factory.get(settings.STATIC_URL + hashed))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            Template("{% load static %}{% static 'css/app.min.css' %}").render(Context()),
+            settings.STATIC_URL + hashed,
+        )
+
+        response = middleware(factory.get(settings.STATIC_URL + 'css/app.min.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
@@ -6,3 +6,16 @@ class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
     verbose_name = 'انبار'
+
+    def ready(self):
+        # English: keep the shaped-Persian vocabulary used by PDF exports in
+        # step with catalog names, so exports never reshape them at runtime.
+        from inventory.models import Material, Part, Product, ProductModel
+        from utils.persian_text import precompute_on_save
+
+        precompute_on_save(Product, ProductModel, Part, Material)
+
+        # English: catalog edits invalidate the cached selector snapshot.
+        from inventory import catalog
+
+        catalog.connect_signals()
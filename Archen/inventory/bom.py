@@ -0,0 +1,336 @@
+"""Set-based saving of product BOMs (parts and materials).
+
+Every BOM writer goes through :func:`save_bom`: the product add/edit form,
+the XLSX/CSV import (:func:`parse_upload` -> :func:`resolve_rows`) and
+copying the BOM of another product (:func:`copy_bom`).  A save costs a fixed
+number of queries whatever the BOM size:
+
+- the referenced parts and materials are fetched with one ``in_bulk`` each
+  (unknown ids are skipped, as the per-row form handling did);
+- the current BOM rows are read once and compared in memory (:func:`diff`);
+- inserts, quantity changes and removals are written with one
+  ``bulk_create``, one ``bulk_update`` and one ``delete()`` per table.
+
+Rows whose quantity did not change are not written.  The save runs in one
+transaction with the product row locked, and ``Product.bom_version`` is
+bumped once when any row changed.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import transaction
+
+from inventory.models import Material, Part, Product, ProductComponent, ProductMaterial
+from utils.normalize import collapse_whitespace, to_ascii_digits, to_ascii_digits_many
+
+BOM_IMPORT_LIMIT = 2000
+BULK_BATCH_SIZE = 500
+
+# Header aliases accepted in uploaded files (lower-cased, whitespace collapsed).
+COLUMN_ALIASES = {
+    'kind': {'kind', 'type', 'نوع'},
+    'name': {'name', 'item', 'نام', 'نام قطعه', 'نام ماده', 'قطعه/ماده'},
+    'qty': {'qty', 'quantity', 'تعداد', 'مقدار'},
+}
+PART_KINDS = {'part', 'قطعه'}
+MATERIAL_KINDS = {'material', 'ماده', 'ماده اولیه'}
+
+
+class BomError(Exception):
+    """Raised for an unusable upload or copy request; the message is user-facing."""
+
+
+@dataclass
+class BomRow:
+    """One uploaded BOM line; ``row`` is the 1-based source line for error reports."""
+
+    row: int
+    kind: str = ''
+    name: str = ''
+    qty: str = ''
+
+
+@dataclass
+class BomDiff:
+    """Writes that turn the stored BOM into the wanted one.
+
+    ``create`` maps item ids to quantities, ``update`` maps BOM row pks to new
+    quantities and ``delete`` lists BOM row pks.
+    """
+
+    create: dict = field(default_factory=dict)
+    update: dict = field(default_factory=dict)
+    delete: list = field(default_factory=list)
+
+
+@dataclass
+class BomChange:
+    """Outcome of :func:`save_bom` (row counts over both tables)."""
+
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: int = 0
+    version: int | None = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.created or self.updated or self.deleted)
+
+    def message(self) -> str:
+        if not self.changed:
+            return "فهرست اجزای محصول تغییری نکرد."
+        return (
+            f"فهرست اجزای محصول به‌روزرسانی شد: {self.created} ردیف جدید، "
+            f"{self.updated} تغییر مقدار، {self.deleted} حذف."
+        )
+
+
+# ---------------------------------------------------------------------------
+# Quantities
+# ---------------------------------------------------------------------------
+
+def part_qty(value) -> int | None:
+    """Positive whole part quantity, or ``None`` when invalid."""
+    try:
+        qty = int(to_ascii_digits(str(value)).strip()) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError):
+        return None
+    return qty if qty >= 1 else None
+
+
+def material_qty(value) -> Decimal | None:
+    """Positive material quantity rounded to the column's places, or ``None``."""
+    places = ProductMaterial._meta.get_field('qty').decimal_places
+    try:
+        qty = Decimal(to_ascii_digits(str(value)).strip())
+        qty = qty.quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return qty if qty > 0 else None
+
+
+def components_from_payload(items) -> dict[int, int]:
+    """``part id -> qty`` from the form's ``components_data`` list; invalid entries are skipped."""
+    out: dict[int, int] = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            pid = int(item.get('part_id'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        qty = part_qty(item.get('qty'))
+        if qty is not None:
+            out[pid] = qty
+    return out
+
+
+def materials_from_payload(items) -> dict[int, Decimal]:
+    """``material id -> qty`` from the form's ``materials_data`` list; invalid entries are skipped."""
+    out: dict[int, Decimal] = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            mid = int(item.get('material_id'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        qty = material_qty(item.get('qty'))
+        if qty is not None:
+            out[mid] = qty
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Saving
+# ---------------------------------------------------------------------------
+
+def diff(existing: dict, wanted: dict) -> BomDiff:
+    """Compare ``existing`` (item id -> ``(row pk, qty)``) with ``wanted`` (item id -> qty)."""
+    plan = BomDiff()
+    for item_id, qty in wanted.items():
+        if item_id not in existing:
+            plan.create[item_id] = qty
+    for item_id, (row_pk, qty) in existing.items():
+        if item_id not in wanted:
+            plan.delete.append(row_pk)
+        elif wanted[item_id] != qty:
+            plan.update[row_pk] = wanted[item_id]
+    plan.delete.sort()
+    return plan
+
+
+def _apply(change: BomChange, model, item_field: str, item_model, product, wanted: dict) -> None:
+    known = item_model.objects.only('pk').in_bulk(list(wanted)) if wanted else {}
+    change.skipped += len(wanted) - len(known)
+    wanted = {item_id: qty for item_id, qty in wanted.items() if item_id in known}
+
+    item_attr = f'{item_field}_id'
+    existing = {
+        item_id: (row_pk, qty)
+        for row_pk, item_id, qty in model.objects.filter(product=product).values_list('pk', item_attr, 'qty')
+    }
+    plan = diff(existing, wanted)
+    if plan.create:
+        model.objects.bulk_create(
+            [model(product=product, qty=qty, **{item_attr: item_id}) for item_id, qty in sorted(plan.create.items())],
+            batch_size=BULK_BATCH_SIZE,
+        )
+    if plan.update:
+        model.objects.bulk_update(
+            [model(pk=row_pk, qty=qty) for row_pk, qty in sorted(plan.update.items())],
+            ['qty'],
+            batch_size=BULK_BATCH_SIZE,
+        )
+    if plan.delete:
+        model.objects.filter(product=product, pk__in=plan.delete).delete()
+    change.created += len(plan.create)
+    change.updated += len(plan.update)
+    change.deleted += len(plan.delete)
+
+
+def save_bom(product, parts: dict | None = None, materials: dict | None = None) -> BomChange:
+    """Make the BOM of ``product`` equal ``parts`` / ``materials`` (item id -> qty).
+
+    ``None`` leaves that half of the BOM as it is.  Quantities must already
+    be valid (see :func:`part_qty` / :func:`material_qty`); ids of parts or
+    materials that do not exist are skipped and counted in ``skipped``.
+    """
+    change = BomChange()
+    with transaction.atomic():
+        # English: lock the product so concurrent saves of one BOM apply in turn
+        version = Product.objects.select_for_update().values_list('bom_version', flat=True).get(pk=product.pk)
+        if parts is not None:
+            _apply(change, ProductComponent, 'part', Part, product, parts)
+        if materials is not None:
+            _apply(change, ProductMaterial, 'material', Material, product, materials)
+        if change.changed:
+            version += 1
+            Product.objects.filter(pk=product.pk).update(bom_version=version)
+    product.bom_version = change.version = version
+    return change
+
+
+def copy_bom(source, target) -> BomChange:
+    """Replace the BOM of ``target`` with a copy of the BOM of ``source``.
+
+    Parts of another product model are not copied (they are counted in
+    ``skipped``); materials are shared by all models.
+    """
+    if source.pk == target.pk:
+        raise BomError("محصول مبدأ و مقصد یکسان است.")
+    rows = ProductComponent.objects.filter(product=source).values_list('part_id', 'qty', 'part__product_model_id')
+    parts = {}
+    skipped = 0
+    for part_id, qty, model_id in rows:
+        if model_id == target.product_model_id:
+            parts[part_id] = qty
+        else:
+            skipped += 1
+    materials = dict(ProductMaterial.objects.filter(product=source).values_list('material_id', 'qty'))
+    change = save_bom(target, parts, materials)
+    change.skipped += skipped
+    return change
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def _canonical_header(value) -> str | None:
+    key = collapse_whitespace(str(value or '')).lower()
+    for name, aliases in COLUMN_ALIASES.items():
+        if key in aliases:
+            return name
+    return None
+
+
+def _rows_from_table(table) -> list[BomRow]:
+    iterator = iter(table)
+    header = next(iterator, None)
+    if not header:
+        raise BomError("فایل خالی است.")
+    columns = [_canonical_header(h) for h in header]
+    missing = [name for name in ('kind', 'name', 'qty') if name not in columns]
+    if missing:
+        raise BomError("ستون‌های «نوع»، «نام» و «مقدار» در فایل یافت نشد.")
+    rows: list[BomRow] = []
+    for line_no, values in enumerate(iterator, start=2):
+        data = {}
+        for name, value in zip(columns, values):
+            if name and value not in (None, ''):
+                # English: XLSX stores whole quantities as floats
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                data[name] = collapse_whitespace(str(value))
+        if not data:
+            continue
+        rows.append(BomRow(row=line_no, **data))
+        if len(rows) > BOM_IMPORT_LIMIT:
+            raise BomError(f"حداکثر {BOM_IMPORT_LIMIT} ردیف در هر فایل قابل ثبت است.")
+    return rows
+
+
+def parse_upload(upload) -> list[BomRow]:
+    """Read a CSV or XLSX upload with the columns kind (قطعه/ماده), name and qty."""
+    name = (getattr(upload, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        try:
+            wb = load_workbook(upload, read_only=True, data_only=True)
+        except Exception:
+            raise BomError("فایل XLSX قابل خواندن نیست.")
+        try:
+            return _rows_from_table(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    if name.endswith('.csv'):
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BomError("فایل CSV باید با کدگذاری UTF-8 ذخیره شده باشد.")
+        return _rows_from_table(csv.reader(io.StringIO(text)))
+    raise BomError("فقط فایل‌های CSV یا XLSX پشتیبانی می‌شوند.")
+
+
+def resolve_rows(product, rows: list[BomRow]) -> tuple[dict, dict, list[str]]:
+    """Resolve uploaded rows to ``(parts, materials, errors)`` for :func:`save_bom`.
+
+    Parts are looked up by name within the product's model and materials by
+    name, one query each.  Every problem is reported with its row; callers
+    save only when ``errors`` is empty.
+    """
+    part_names = {r.name for r in rows if r.kind.lower() in PART_KINDS}
+    material_names = {r.name for r in rows if r.kind.lower() in MATERIAL_KINDS}
+    part_ids = dict(
+        Part.objects.filter(product_model_id=product.product_model_id, name__in=part_names).values_list('name', 'pk')
+    ) if part_names else {}
+    material_ids = {
+        name: material.pk
+        for name, material in (Material.objects.only('pk', 'name').in_bulk(list(material_names), field_name='name') if material_names else {}).items()
+    }
+
+    parts: dict[int, int] = {}
+    materials: dict[int, Decimal] = {}
+    errors: list[str] = []
+    for r, qty_text in zip(rows, to_ascii_digits_many(r.qty for r in rows)):
+        kind = r.kind.lower()
+        if kind in PART_KINDS:
+            item_id, qty, target, label = part_ids.get(r.name), part_qty(qty_text), parts, "قطعه"
+        elif kind in MATERIAL_KINDS:
+            item_id, qty, target, label = material_ids.get(r.name), material_qty(qty_text), materials, "ماده اولیه"
+        else:
+            errors.append(f"ردیف {r.row}: نوع «{r.kind}» نامعتبر است (قطعه یا ماده).")
+            continue
+        if item_id is None:
+            errors.append(f"ردیف {r.row}: {label} «{r.name}» یافت نشد.")
+        elif qty is None:
+            errors.append(f"ردیف {r.row}: مقدار «{r.qty}» نامعتبر است.")
+        elif item_id in target:
+            errors.append(f"ردیف {r.row}: {label} «{r.name}» تکراری است.")
+        else:
+            target[item_id] = qty
+    return parts, materials, errors
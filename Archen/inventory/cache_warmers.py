@@ -0,0 +1,15 @@
+"""Cache warmers for the inventory app (run by ``manage.py warm_caches``)."""
+
+from utils.cache import register_warmer
+
+
+@register_warmer('inventory.persian_vocabulary')
+def warm_persian_vocabulary():
+    """Shape every catalog name once and store it in the on-disk vocabulary."""
+    from inventory.models import Material, Part, Product, ProductModel
+    from utils.persian_text import precompute
+
+    names: list[str] = []
+    for model in (Product, ProductModel, Part, Material):
+        names.extend(model.objects.values_list('name', flat=True).iterator())
+    return precompute(names)
@@ -0,0 +1,178 @@
+"""Catalog snapshot (product models, products and parts) for cascading selectors.
+
+The order form, job form and daily work entry pick a model and then one of
+its products or parts.  Instead of one request per selector change, the
+browser loads :func:`snapshot` once from ``inventory:catalog_snapshot``, keeps
+it in ``localStorage`` (``static/js/catalog.js``) and filters it locally; the
+request is revalidated with ``If-None-Match`` and costs a ``304`` while the
+catalog is unchanged.
+
+The snapshot is cached in the ``catalog`` namespace of :mod:`utils.cache`,
+which is bumped when a save or delete of a ``ProductModel``, ``Product`` or
+``Part`` commits.  Saves limited to stock columns (``update_fields`` without a catalog
+field) leave it alone.  The ETag is a hash of the document itself, so a
+rebuild with the same content keeps the clients' copies valid.
+
+Forms read their choices from the same snapshot: :func:`model_choices` for
+the model selects and :class:`CatalogChoiceField` for product/part selects,
+so building or rendering a form costs a cache read instead of queries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+from django import forms
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+
+from utils.cache import bump_namespace, cached
+
+CACHE_NAMESPACE = 'catalog'
+
+# Fields whose change alters the snapshot, per model label.
+_CATALOG_FIELDS = {
+    'inventory.productmodel': {'name'},
+    'inventory.product': {'name', 'product_model'},
+    'inventory.part': {'name', 'product_model'},
+}
+
+
+def _build() -> dict:
+    from inventory.models import Part, Product, ProductModel
+
+    models = list(ProductModel.objects.order_by('name').values_list('name', flat=True))
+    products = [
+        [pk, name, model or '']
+        for pk, name, model in Product.objects.order_by('product_model__name', 'name')
+        .values_list('id', 'name', 'product_model__name')
+    ]
+    parts = [
+        [pk, name, model or '']
+        for pk, name, model in Part.objects.order_by('product_model__name', 'name')
+        .values_list('id', 'name', 'product_model__name')
+    ]
+    body = json.dumps(
+        {'models': models, 'products': products, 'parts': parts}, ensure_ascii=False, separators=(',', ':'),
+    ).encode('utf-8')
+    return {
+        'etag': '"catalog-%s"' % hashlib.md5(body).hexdigest()[:16],
+        'body': body,
+        'models': models,
+        'products': products,
+        'parts': parts,
+    }
+
+
+def snapshot() -> dict:
+    """Cached catalog: ``etag``, JSON ``body`` and the ``models``/``products``/``parts`` lists.
+
+    ``products`` and ``parts`` rows are ``[id, name, model name]`` ordered by
+    model then name.
+    """
+    return cached(CACHE_NAMESPACE, ['snapshot'], _build)
+
+
+def products_for_models(names) -> list[dict]:
+    wanted = set(names)
+    return [{'id': pk, 'name': name, 'model': model} for pk, name, model in snapshot()['products'] if model in wanted]
+
+
+def parts_for_model(name: str) -> list[dict]:
+    return [{'id': pk, 'name': part} for pk, part, model in snapshot()['parts'] if model == name]
+
+
+def parts_by_model() -> dict[str, list[dict]]:
+    """``{model name: [{id, name}, ...]}`` for every model (the BOM part picker)."""
+    snap = snapshot()
+    out = {name: [] for name in snap['models']}
+    for pk, name, model in snap['parts']:
+        if model in out:
+            out[model].append({'id': pk, 'name': name})
+    return out
+
+
+def model_choices() -> list[tuple[str, str]]:
+    """``(name, name)`` for every product model, ordered by name."""
+    return [(name, name) for name in snapshot()['models']]
+
+
+class CatalogChoiceIterator(ModelChoiceIterator):
+    """Options from ``field.catalog_choices``; rendering never runs a query."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for pk, label in self.field.catalog_choices:
+            yield (ModelChoiceIteratorValue(pk, None), label)
+
+    def __len__(self):
+        return len(self.field.catalog_choices) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.catalog_choices)
+
+
+class CatalogChoiceField(forms.ModelChoiceField):
+    """``ModelChoiceField`` whose options come from the catalog snapshot.
+
+    Call :func:`limit_field` to pick the rows.  The queryset is only used to
+    validate and load a submitted value (one query on POST).
+    """
+    iterator = CatalogChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.catalog_choices = []
+
+
+def limit_field(field: CatalogChoiceField, kind: str, model_name: str | None = None, *,
+                posted_id=None, all_models: bool = False) -> int:
+    """Offer the ``kind`` rows ('products' or 'parts') of ``model_name`` in ``field``.
+
+    ``posted_id`` (the submitted or initial value) stays selectable even if
+    it belongs to another model.  ``all_models`` lists every row.  Returns
+    the number of rows of the model itself.
+    """
+    owner = field.queryset.model
+    try:
+        posted_id = int(posted_id) if posted_id not in (None, '') else None
+    except (TypeError, ValueError):
+        posted_id = None
+    rows = snapshot()[kind]
+    matching = [r for r in rows if all_models or (model_name and r[2] == model_name)]
+    shown = matching
+    if posted_id is not None and not any(r[0] == posted_id for r in matching):
+        extra = [r for r in rows if r[0] == posted_id]
+        shown = sorted(matching + extra, key=lambda r: r[1]) if extra else matching
+    field.catalog_choices = [(pk, f"{model} - {name}") for pk, name, model in shown]
+
+    if all_models:
+        field.queryset = owner.objects.all()
+    elif model_name or posted_id is not None:
+        cond = Q(product_model__name=model_name) if model_name else Q(pk__in=[])
+        if posted_id is not None:
+            cond |= Q(pk=posted_id)
+        field.queryset = owner.objects.filter(cond)
+    else:
+        field.queryset = owner.objects.none()
+    return len(matching)
+
+
+def _bump(sender, instance=None, update_fields=None, **kwargs):
+    if update_fields is not None and not (set(update_fields) & _CATALOG_FIELDS[sender._meta.label_lower]):
+        return
+    # English: after commit, so no worker caches the old rows under the new version.
+    transaction.on_commit(lambda: bump_namespace(CACHE_NAMESPACE))
+
+
+def connect_signals() -> None:
+    from inventory.models import Part, Product, ProductModel
+
+    for model in (ProductModel, Product, Part):
+        uid = f"inventory.catalog:{model._meta.label_lower}"
+        post_save.connect(_bump, sender=model, weak=False, dispatch_uid=uid + ':save')
+        post_delete.connect(_bump, sender=model, weak=False, dispatch_uid=uid + ':delete')
@@ -0,0 +1,228 @@
+"""Maintained low-stock flags for parts, materials and product stocks.
+
+A row is *low* when any of its stock columns is at or below its threshold
+(NULL counts as zero), the rule the inventory lists and the dashboard use.
+Instead of annotating and comparing every row on each request, ``Part``,
+``Material`` and ``ProductStock`` carry the result:
+
+- ``is_low_stock``: the flag, with a partial index on the low rows;
+- ``low_stock_changed_at``: when the flag last flipped (the alerts cursor).
+
+The flag is written by the statement that changes the stock:
+
+- ``save()`` of the three models adds the columns to ``update_fields`` when
+  a stock or threshold column is saved (:func:`stamp`);
+- ``QuerySet.update()`` callers wrap their changes with :func:`with_flag`,
+  which computes the new flag from the new values in SQL.
+
+The defaults (empty stock, zero threshold) are low, so rows created with
+``bulk_create`` and default values are flagged correctly.  After a raw
+write, run ``manage.py verify_low_stock --repair``.
+"""
+
+from __future__ import annotations
+
+from django.db.models import BooleanField, Case, F, Max, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact, LessThanOrEqual
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+FLAG_FIELDS = ('is_low_stock', 'low_stock_changed_at')
+
+# Stock columns compared with ``threshold``, per model label.
+STOCK_FIELDS = {
+    'inventory.part': ('stock_cut', 'stock_cnc_tools'),
+    'inventory.material': ('quantity',),
+    'production_line.productstock': (
+        'stock_workpage', 'stock_undercoating', 'stock_painting', 'stock_sewing',
+        'stock_upholstery', 'stock_assembly', 'stock_packaging',
+    ),
+}
+
+ALERT_KINDS = {
+    'inventory.part': 'part',
+    'inventory.material': 'material',
+    'production_line.productstock': 'product',
+}
+
+
+def stock_fields(model) -> tuple:
+    return STOCK_FIELDS[model._meta.label_lower]
+
+
+def is_low(instance) -> bool:
+    """Flag value for the in-memory stock of ``instance``."""
+    threshold = instance.threshold or 0
+    return any((getattr(instance, name) or 0) <= threshold for name in stock_fields(type(instance)))
+
+
+def stamp(instance, update_fields=None):
+    """Set the flag on ``instance`` before a save; returns the ``update_fields`` to use.
+
+    The flag columns are added when ``update_fields`` names a stock column or
+    the threshold, so a partial save keeps them in the same statement.
+    """
+    low = is_low(instance)
+    if low != instance.is_low_stock:
+        instance.is_low_stock = low
+        instance.low_stock_changed_at = timezone.now()
+    if update_fields is None:
+        return None
+    update_fields = set(update_fields)
+    if update_fields & (set(stock_fields(type(instance))) | {'threshold'}):
+        update_fields.update(FLAG_FIELDS)
+    return update_fields
+
+
+def _low_expression(model, changes: dict):
+    def value(name):
+        field = model._meta.get_field(name)
+        return Coalesce(changes.get(name, F(name)), Value(field.to_python(0)), output_field=field)
+
+    threshold = value('threshold')
+    return Case(
+        *[When(LessThanOrEqual(value(name), threshold), then=Value(True)) for name in stock_fields(model)],
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def with_flag(model, changes: dict) -> dict:
+    """``changes`` for ``QuerySet.update()`` plus the flag columns, computed from the new values.
+
+    ``changes`` maps column names to values or expressions of the old row
+    (``F('stock_cut') - 2``); the same statement re-evaluates the threshold
+    rule on the new values and stamps ``low_stock_changed_at`` on a flip.
+    """
+    low = _low_expression(model, changes)
+    return {
+        **changes,
+        'is_low_stock': low,
+        'low_stock_changed_at': Case(
+            When(Exact(F('is_low_stock'), low), then=F('low_stock_changed_at')),
+            default=Value(timezone.now()),
+        ),
+    }
+
+
+def set_clause_sql(model, alias: str, new_values: dict, quote_name) -> str:
+    """``SET`` items for the flag columns in hand-written SQL (see ``with_flag``).
+
+    ``new_values`` maps stock column names to SQL for their new value; other
+    columns are read from ``alias``.
+    """
+    def value(name):
+        column = model._meta.get_field(name).column
+        return f"COALESCE({new_values.get(name, f'{alias}.{quote_name(column)}')}, 0)"
+
+    threshold = value('threshold')
+    low = "(" + " OR ".join(f"{value(name)} <= {threshold}" for name in stock_fields(model)) + ")"
+    flag, changed = quote_name('is_low_stock'), quote_name('low_stock_changed_at')
+    return (
+        f"{flag} = {low}, "
+        f"{changed} = CASE WHEN {alias}.{flag} = {low} THEN {alias}.{changed} ELSE CURRENT_TIMESTAMP END"
+    )
+
+
+def refresh(model, queryset=None) -> int:
+    """Recompute the flag of ``queryset`` (default: every row) in one statement."""
+    queryset = model.objects.all() if queryset is None else queryset
+    return queryset.update(**with_flag(model, {}))
+
+
+def drift(model):
+    """Queryset of rows whose stored flag disagrees with their stock."""
+    return model.objects.exclude(is_low_stock=_low_expression(model, {}))
+
+
+def models() -> list:
+    from inventory.models import Material, Part
+    from production_line.models import ProductStock
+
+    return [Part, Material, ProductStock]
+
+
+
+def _parse_cursor(value):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"invalid cursor {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _items(model):
+    """``(queryset, serializer)`` for the alert items of ``model``."""
+    kind = ALERT_KINDS[model._meta.label_lower]
+    qs = model.objects.all()
+    if kind == 'part':
+        qs = qs.select_related('product_model')
+    elif kind == 'product':
+        qs = qs.select_related('product__product_model')
+
+    def item(row):
+        return {
+            'kind': kind,
+            'id': row.product_id if kind == 'product' else row.pk,
+            'name': str(row.product if kind == 'product' else row),
+            'stock': {name: getattr(row, name) or 0 for name in stock_fields(model)},
+            'threshold': row.threshold or 0,
+            'unit': getattr(row, 'unit', '') or '',
+            'low': row.is_low_stock,
+            'changed_at': row.low_stock_changed_at,
+        }
+
+    return qs, item
+
+
+def alerts(since=None, limit: int = 200) -> dict:
+    """Current low-stock items and the flag flips after the ``since`` cursor.
+
+    Returns ``{'counts', 'low', 'changes', 'cursor'}``: ``counts`` per kind
+    (``part``/``material``/``product``), at most ``limit`` items of each kind
+    in ``low`` and ``changes``, and ``cursor``, the newest flip returned as an
+    ISO string with microseconds, to pass back as ``since``.  When a kind has
+    more than ``limit`` flips, the flips of every kind from its first left-out
+    one on wait for the next poll.  Without ``since`` only the cursor is
+    initialised.  An item that flipped several times between two polls
+    appears once, in its current state.  Raises ``ValueError`` for a
+    malformed cursor.
+    """
+    since = _parse_cursor(since)
+    out = {'counts': {}, 'low': [], 'changes': [], 'cursor': since}
+    cut = None
+    for model in models():
+        qs, item = _items(model)
+        out['counts'][ALERT_KINDS[model._meta.label_lower]] = model.objects.filter(is_low_stock=True).count()
+        out['low'].extend(item(row) for row in qs.filter(is_low_stock=True).order_by('pk')[:limit])
+        if since is None:
+            newest = model.objects.aggregate(newest=Max('low_stock_changed_at'))['newest']
+            if newest and (out['cursor'] is None or newest > out['cursor']):
+                out['cursor'] = newest
+            continue
+        changed = [item(row) for row in qs.filter(low_stock_changed_at__gt=since).order_by('low_stock_changed_at', 'pk')[:limit + 1]]
+        if len(changed) > limit:
+            left_out = changed.pop()['changed_at']
+            cut = left_out if cut is None else min(cut, left_out)
+        out['changes'].extend(changed)
+    if cut is not None:
+        # English: the cursor must stay below the first flip left out, or the
+        # next poll would skip it.  Flips sharing that timestamp go with it,
+        # unless more than ``limit`` of them share it: a timestamp cursor
+        # cannot split them, so those are returned and the rest skipped.
+        kept = [row for row in out['changes'] if row['changed_at'] < cut]
+        out['changes'] = kept or [row for row in out['changes'] if row['changed_at'] == cut]
+    out['changes'].sort(key=lambda row: row['changed_at'])
+    if out['changes']:
+        out['cursor'] = out['changes'][-1]['changed_at']
+    if out['cursor'] is None:
+        # English: nothing has flipped yet; later flips are stamped after now
+        out['cursor'] = timezone.now()
+    # English: JSON encoders cut datetimes to milliseconds, which would resend
+    # the flips of the cursor's last millisecond on every poll.
+    out['cursor'] = out['cursor'].isoformat()
+    return out
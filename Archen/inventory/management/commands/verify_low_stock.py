@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import low_stock
+
+
+class Command(BaseCommand):
+    help = "Compare the maintained low-stock flags with the stock columns and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help="Drifting rows to print (0 = all).")
+        parser.add_argument('--repair', action='store_true',
+                            help="Recompute the drifting flags from the stock columns.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            drift = {model: list(low_stock.drift(model).values_list('pk', 'is_low_stock')) for model in low_stock.models()}
+            total = sum(len(rows) for rows in drift.values())
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Checked the low-stock flags in {elapsed:.2f}s: {total} drifting row(s).")
+
+            limit = options['limit']
+            shown = 0
+            for model, rows in drift.items():
+                for pk, stored in rows:
+                    if limit and shown >= limit:
+                        break
+                    self.stdout.write(f"  {model._meta.model_name}#{pk}: is_low_stock={stored!r} -> {not stored!r}")
+                    shown += 1
+            if limit and total > limit:
+                self.stdout.write(f"  ... {total - limit} more")
+
+            if total and options['repair']:
+                for model, rows in drift.items():
+                    if rows:
+                        low_stock.refresh(model, model.objects.filter(pk__in=[pk for pk, _stored in rows]))
+                self.stdout.write(self.style.WARNING(f"Repaired {total} row(s)."))
+            elif total:
+                raise CommandError("Low-stock flags and stock columns disagree; rerun with --repair.")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:40
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+STEP = Decimal('0.001')
+
+
+def round_material_figures(apps, schema_editor):
+    """Round the float quantity/threshold to the new scale before the type change."""
+    Material = apps.get_model('inventory', 'Material')
+    for pk, quantity, threshold in Material.objects.values_list('pk', 'quantity', 'threshold').iterator():
+        changes = {}
+        for name, value in (('quantity', quantity), ('threshold', threshold)):
+            if value is None:
+                continue
+            rounded = float(Decimal(repr(value)).quantize(STEP, rounding=ROUND_HALF_UP))
+            if rounded != value:
+                changes[name] = rounded
+        if changes:
+            Material.objects.filter(pk=pk).update(**changes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_material_figures, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='material',
+            name='quantity',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=16, null=True, verbose_name='مقدار'),
+        ),
+        migrations.AlterField(
+            model_name='material',
+            name='threshold',
+            field=models.DecimalField(decimal_places=3, default=0, help_text='در صورت کمتر شدن مقدار از این حد، وضعیت هشدار می‌شود.', max_digits=16, verbose_name='حد آستانه موجودی'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:44
+
+from django.db import migrations, models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+
+def _clear_flags(model, fields):
+    """Rows are added as low (the field default); clear the flag where every bucket is above the threshold."""
+    above = Q()
+    for name in fields:
+        above &= Q(**{f'{name}__gt': F('thr')})
+    model.objects.annotate(thr=Coalesce('threshold', Value(0))).filter(above).update(is_low_stock=False)
+
+
+def backfill_flags(apps, schema_editor):
+    _clear_flags(apps.get_model('inventory', 'Part'), ('stock_cut', 'stock_cnc_tools'))
+    _clear_flags(apps.get_model('inventory', 'Material'), ('quantity',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_material_decimal_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='is_low_stock',
+            field=models.BooleanField(default=True, editable=False, verbose_name='کمبود موجودی'),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='low_stock_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='is_low_stock',
+            field=models.BooleanField(default=True, editable=False, verbose_name='کمبود موجودی'),
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='low_stock_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['id'], name='material_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['low_stock_changed_at'], name='material_low_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='part',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['id'], name='part_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='part',
+            index=models.Index(fields=['low_stock_changed_at'], name='part_low_changed_idx'),
+        ),
+        migrations.RunPython(backfill_flags, migrations.RunPython.noop),
+    ]
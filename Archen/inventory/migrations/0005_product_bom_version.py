@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_low_stock_flag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='bom_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='نسخه BOM'),
+        ),
+    ]
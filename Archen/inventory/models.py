@@ -21,6 +21,8 @@ from django.db import models
 from django.db.models import Q, CheckConstraint
 from django.utils.translation import gettext_lazy as _
 
+from . import low_stock
+
 
 # ---------------------------
 # Core catalog / master data
@@ -73,6 +75,8 @@ class Product(models.Model):
         blank=True,
         verbose_name=_("توضیحات"),
     )
+    # Bumped once by every BOM save that changes a row (see inventory.bom)
+    bom_version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("نسخه BOM"))
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("ایجاد"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("به‌روزرسانی"))
@@ -108,7 +112,8 @@ class Product(models.Model):
 
 class Material(models.Model):
     """
-    Raw input stored in warehouse. `quantity` and `threshold` are warehouse-level figures.
+    Raw input stored in warehouse. `quantity` and `threshold` are warehouse-level figures,
+    kept as Decimal with the same scale as the BOM (`ProductMaterial.qty`) and the stock ledger.
     """
     name = models.CharField(
         max_length=100,
@@ -116,7 +121,9 @@ class Material(models.Model):
         verbose_name=_("نام ماده اولیه"),
     )
 
-    quantity = models.FloatField(
+    quantity = models.DecimalField(
+        max_digits=16,
+        decimal_places=3,
         blank=True,
         null=True,
         verbose_name=_("مقدار"),
@@ -126,7 +133,9 @@ class Material(models.Model):
         blank=True,
         verbose_name=_("واحد"),
     )
-    threshold = models.FloatField(
+    threshold = models.DecimalField(
+        max_digits=16,
+        decimal_places=3,
         default=0,
         verbose_name=_("حد آستانه موجودی"),
         help_text=_("در صورت کمتر شدن مقدار از این حد، وضعیت هشدار می‌شود."),
@@ -154,6 +163,10 @@ class Material(models.Model):
         verbose_name=_("ایستگاه"),
     )
 
+    # English: maintained by ``inventory.low_stock``; see that module
+    is_low_stock = models.BooleanField(default=True, editable=False, verbose_name=_("کمبود موجودی"))
+    low_stock_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("ایجاد"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("به‌روزرسانی"))
 
@@ -164,6 +177,8 @@ class Material(models.Model):
         indexes = [
             models.Index(fields=["name"]),
             models.Index(fields=["stage"]),
+            models.Index(fields=["id"], condition=Q(is_low_stock=True), name="material_low_stock_idx"),
+            models.Index(fields=["low_stock_changed_at"], name="material_low_changed_idx"),
         ]
         constraints = [
             CheckConstraint(check=Q(threshold__gte=0), name="material_threshold_gte_0"),
@@ -177,6 +192,10 @@ class Material(models.Model):
             ),
         ]
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = low_stock.stamp(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def is_below_threshold(self) -> bool:
         """Return True if the current quantity is below the threshold (treat None as zero)."""
         qty = self.quantity or 0
@@ -230,6 +249,10 @@ class Part(models.Model):
         verbose_name=_("ایستگاه"),
     )
 
+    # English: maintained by ``inventory.low_stock``; see that module
+    is_low_stock = models.BooleanField(default=True, editable=False, verbose_name=_("کمبود موجودی"))
+    low_stock_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("ایجاد"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("به‌روزرسانی"))
 
@@ -242,6 +265,8 @@ class Part(models.Model):
             models.Index(fields=["name"]),
             models.Index(fields=["stage"]),
             models.Index(fields=["product_model"]),
+            models.Index(fields=["id"], condition=Q(is_low_stock=True), name="part_low_stock_idx"),
+            models.Index(fields=["low_stock_changed_at"], name="part_low_changed_idx"),
         ]
         constraints = [
             CheckConstraint(check=Q(stock_cut__gte=0), name="part_stock_cut_gte_0"),
@@ -249,6 +274,10 @@ class Part(models.Model):
             CheckConstraint(check=Q(threshold__gte=0), name="part_threshold_gte_0"),
         ]
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = low_stock.stamp(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def is_below_threshold(self) -> bool:
         """Return True if either stock bucket is below its threshold."""
         thr = self.threshold or 0
@@ -0,0 +1,173 @@
+"""SQL-side filtering, sorting and keyset paging for the inventory lists.
+
+The parts, products and materials lists render one page of rows and load
+the next page as an HTML fragment when the table is scrolled to its end
+(``?fragment=1``, see ``static/js/keyset_list.js``).  Filters and the header
+sort (``sort_col``/``sort_dir``, as in ``reports.queries``) are applied in
+SQL.  A page continues after the last row of the previous one (the
+``after`` cursor) instead of using ``OFFSET``, so each page is one range
+scan whatever the catalog size.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+from inventory.models import Material, Part, Product
+
+PAGE_SIZE = 100
+
+# Header column -> sort keys (the primary key is always the last key).
+PART_SORT_FIELDS = {
+    1: (F('name'),),
+    2: (F('product_model__name'), F('name')),
+}
+PRODUCT_SORT_FIELDS = {
+    1: (F('name'),),
+    2: (F('product_model__name'), F('name')),
+}
+MATERIAL_SORT_FIELDS = {
+    1: (F('name'),),
+    2: (Coalesce('quantity', Value(0), output_field=Material._meta.get_field('quantity')),),
+    3: (F('unit'),),
+    4: (F('supplier'),),
+    5: (Coalesce('price', Value(0), output_field=Material._meta.get_field('price')),),
+}
+
+PRODUCT_STOCK_COLUMNS = {
+    'assembly': 'stock__stock_assembly',
+    'paneling': 'stock__stock_workpage',
+    'undercoat_color': 'stock__stock_undercoating',
+    'color': 'stock__stock_painting',
+    'sewing': 'stock__stock_sewing',
+    'upholstery': 'stock__stock_upholstery',
+    'packing': 'stock__stock_packaging',
+    'thr': 'stock__threshold',
+}
+
+# A product without a stock row has zero stock, so it counts as short.
+PRODUCT_LOW_Q = Q(stock__isnull=True) | Q(stock__is_low_stock=True)
+
+
+@dataclass
+class Page:
+    rows: list
+    next_cursor: str = ''
+    sort_col: int = 1
+    sort_dir: str = 'asc'
+
+
+def _search(params) -> str:
+    return (params.get('search') or '').strip()
+
+
+def filter_parts(params):
+    """Parts for the list toolbar filters (``model``, ``search``)."""
+    qs = Part.objects.select_related('product_model')
+    model = (params.get('model') or '').strip()
+    if model:
+        qs = qs.filter(product_model__name=model)
+    if _search(params):
+        qs = qs.filter(name__icontains=_search(params))
+    return qs
+
+
+def filter_products(params):
+    """Products with their per-section stock (``model``, ``search``).
+
+    Missing ``ProductStock`` rows read as zero, as the template expects.
+    """
+    qs = Product.objects.select_related('product_model').annotate(
+        **{alias: Coalesce(path, Value(0)) for alias, path in PRODUCT_STOCK_COLUMNS.items()}
+    )
+    model = (params.get('model') or '').strip()
+    if model:
+        qs = qs.filter(product_model__name=model)
+    if _search(params):
+        qs = qs.filter(name__icontains=_search(params))
+    return qs
+
+
+def filter_materials(params):
+    """Materials for the list toolbar filters (``material`` exact name, ``search``)."""
+    qs = Material.objects.all()
+    material = (params.get('material') or '').strip()
+    if material:
+        qs = qs.filter(name=material)
+    if _search(params):
+        qs = qs.filter(name__icontains=_search(params))
+    return qs
+
+
+def summary(qs, low_q: Q) -> dict:
+    """``{'total', 'low'}`` for the filtered list in one conditional aggregate."""
+    return qs.order_by().aggregate(total=Count('pk'), low=Count('pk', filter=low_q))
+
+
+def _encode(values) -> str:
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode(cursor: str | None, size: int) -> list | None:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) and len(values) == size else None
+
+
+def _after(aliases, values, desc: bool) -> Q:
+    """Rows strictly after ``values`` in the ``aliases`` order."""
+    op = 'lt' if desc else 'gt'
+    cond = Q()
+    equal = Q()
+    for alias, value in zip(aliases, values):
+        cond |= equal & Q(**{f'{alias}__{op}': value})
+        equal &= Q(**{alias: value})
+    return cond
+
+
+def keyset_page(qs, sort_map, params, per_page: int = PAGE_SIZE, default_col: int = 1) -> Page:
+    """One page of ``qs`` in the ``sort_col``/``sort_dir`` order, after the ``after`` cursor.
+
+    Query budget: one SELECT of ``per_page + 1`` rows.
+    """
+    try:
+        col = int(params.get('sort_col', ''))
+    except (TypeError, ValueError):
+        col = default_col
+    if col not in sort_map:
+        col = default_col
+    desc = (params.get('sort_dir') or 'asc').lower() == 'desc'
+
+    keys = {f'sort_key_{i}': expr for i, expr in enumerate(sort_map[col])}
+    aliases = [*keys, 'pk']
+    qs = qs.annotate(**keys).order_by(*[f'-{a}' if desc else a for a in aliases])
+    after = _decode(params.get('after'), len(aliases))
+    if after is not None:
+        qs = qs.filter(_after(aliases, after, desc))
+
+    rows = list(qs[:per_page + 1])
+    next_cursor = ''
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = _encode([getattr(last, a) for a in keys] + [last.pk])
+    return Page(rows=rows, next_cursor=next_cursor, sort_col=col, sort_dir='desc' if desc else 'asc')
+
+
+def fragment_response(template: str, page: Page, **context) -> JsonResponse:
+    """JSON envelope for a page of table rows rendered by ``template``."""
+    html = render_to_string(template, {'rows': page.rows, **context})
+    return JsonResponse({'ok': True, 'html': html, 'next': page.next_cursor, 'has_next': bool(page.next_cursor)})
@@ -0,0 +1,298 @@
+"""Point-in-time stock ("as of" a Jalali date) from the production log history.
+
+Every ``ProductionLog`` moves stock by fixed rules (``apply_inventory``):
+
+- part logs: cutting adds ``produced_qty - scrap_qty`` to ``stock_cut``;
+  CNC/Tools moves ``produced_qty`` from ``stock_cut`` to ``stock_cnc_tools``
+  and also takes ``scrap_qty`` from ``stock_cut``;
+- product logs (one unit per log): +1 to the log's section unless it is
+  scrap, -1 from the job's previous section (the previous log of the same
+  job, found with ``LAG() OVER (PARTITION BY job ...)``) except on entering
+  assembly, and an assembly entry consumes the BOM parts
+  (``stock_cnc_tools``) and raw materials.
+
+The stock at the end of a date is the current stock minus the movements of
+the logs dated after it.  Those movements are expanded in one SQL statement
+(joined with the BOM tables) and summed per item and bucket with ``GROUP
+BY``; :func:`item_history` accumulates them with a cumulative ``SUM() OVER``
+to give the balance after each log.  Nothing is replayed in Python, and a
+recent date only reads the recent logs and their jobs (the ``jdate`` and
+``job, jdate`` indexes).
+
+Like ``rollback_inventory``, the rules read a job's current label, so a
+deposit job that was later scrapped counts as a normal one.  Assembly
+consumption uses the BOM as it is now, and stock edits made outside
+production logs (inline edits, job labels) are not dated, so they count as
+if they happened before the requested date.
+"""
+
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+import jdatetime
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from inventory.models import Material, Part, Product, ProductComponent, ProductMaterial
+from jobs.models import ProductionJob
+from production_line import ledger
+from production_line.models import ProductionLog, ProductStock, SectionChoices, StockMovement
+from utils.normalize import to_ascii_digits
+
+HISTORY_LIMIT = 500
+
+ITEM_PART = StockMovement.ITEM_PART
+ITEM_PRODUCT = StockMovement.ITEM_PRODUCT
+ITEM_MATERIAL = StockMovement.ITEM_MATERIAL
+
+
+class StockAsOfError(Exception):
+    """Raised for a date range the history cannot answer."""
+
+
+@dataclass
+class AsOfReport:
+    jdate: jdatetime.date
+    at: datetime.datetime
+    parts: list[dict] = field(default_factory=list)
+    products: list[dict] = field(default_factory=list)
+    materials: list[dict] = field(default_factory=list)
+
+
+def parse_jalali_date(value: str | None) -> jdatetime.date | None:
+    """Parse 'YYYY/MM/DD' or 'YYYY-MM-DD' (Persian/Arabic digits allowed)."""
+    text = to_ascii_digits((value or '').strip()).replace('-', '/')
+    if not text:
+        return None
+    try:
+        year, month, day = (int(x) for x in text.split('/'))
+        return jdatetime.date(year, month, day)
+    except Exception:
+        return None
+
+
+def end_of_jalali_day(jdate: jdatetime.date) -> datetime.datetime:
+    """Last instant of ``jdate`` in the project time zone."""
+    next_day = (jdate + datetime.timedelta(days=1)).togregorian()
+    start = datetime.datetime.combine(next_day, datetime.time.min)
+    return timezone.make_aware(start) - datetime.timedelta(microseconds=1)
+
+
+def _db_date(jdate: jdatetime.date):
+    return connection.ops.adapt_datefield_value(jdate.togregorian())
+
+
+def _to_jdate(value) -> jdatetime.date:
+    # English: SQLite hands computed date columns back as ISO text
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    return jdatetime.date.fromgregorian(date=value)
+
+
+def _movements_sql(*, per_log: bool = False, item_type: str | None = None) -> str:
+    """``WITH`` clause defining ``moves(item_type, item_id, bucket, log_id, jdate, section, qty)``.
+
+    Parameters: ``after`` (only logs dated after it move stock) and, with
+    ``item_type``, ``item_id`` to read only the logs that can move that item.
+    Every log of a job with later logs feeds the ``LAG``, so the previous
+    section of its first later log is known.  Unless ``per_log`` is set,
+    part logs are summed per (part, section) and product logs counted per
+    (product, section, previous section, flags) before the BOM join.
+    """
+    qn = connection.ops.quote_name
+    log = qn(ProductionLog._meta.db_table)
+    job = qn(ProductionJob._meta.db_table)
+    components = qn(ProductComponent._meta.db_table)
+    materials = qn(ProductMaterial._meta.db_table)
+    assembly = SectionChoices.ASSEMBLY.value
+    cutting = SectionChoices.CUTTING.value
+    cnc = SectionChoices.CNC_TOOLS.value
+
+    part_scope = product_scope = ''
+    if item_type == ITEM_PART:
+        part_scope = 'AND l.part_id = %(item_id)s'
+        product_scope = f'AND product_id IN (SELECT product_id FROM {components} WHERE part_id = %(item_id)s)'
+    elif item_type == ITEM_PRODUCT:
+        part_scope = 'AND l.part_id IS NULL'
+        product_scope = 'AND product_id = %(item_id)s'
+    elif item_type == ITEM_MATERIAL:
+        part_scope = 'AND l.part_id IS NULL'
+        product_scope = f'AND product_id IN (SELECT product_id FROM {materials} WHERE material_id = %(item_id)s)'
+    if per_log:
+        grain, grain_group = 'log_id, jdate,', 'log_id, jdate,'
+    else:
+        grain, grain_group = 'MIN(log_id) AS log_id, MIN(jdate) AS jdate,', ''
+
+    return f"""
+        WITH part_logs AS (
+            SELECT {grain} section, part_id, SUM(produced_qty) AS produced_qty, SUM(scrap_qty) AS scrap_qty
+            FROM (SELECT l.id AS log_id, l.jdate, l.section, l.part_id, l.produced_qty, l.scrap_qty FROM {log} l
+                  WHERE l.jdate > %(after)s AND l.product_id IS NULL AND l.part_id IS NOT NULL
+                    AND l.section IN ('{cutting}', '{cnc}') {part_scope}) logs
+            GROUP BY {grain_group} section, part_id
+        ),
+        flow AS (
+            SELECT l.id AS log_id, l.jdate, l.section, l.product_id, l.is_scrap, l.is_external,
+                   j.job_label = 'deposit' AS is_deposit,
+                   LAG(l.section) OVER (PARTITION BY l.job_id ORDER BY l.jdate, l.logged_at, l.id) AS prev_section
+            FROM {log} l JOIN {job} j ON j.id = l.job_id
+            WHERE l.product_id IS NOT NULL AND l.job_id IN (
+                SELECT job_id FROM {log}
+                WHERE jdate > %(after)s AND job_id IS NOT NULL AND product_id IS NOT NULL {product_scope}
+            )
+        ),
+        steps AS (
+            SELECT {grain} section, product_id, prev_section, is_scrap, is_external, is_deposit, COUNT(*) AS n
+            FROM flow WHERE jdate > %(after)s
+            GROUP BY {grain_group} section, product_id, prev_section, is_scrap, is_external, is_deposit
+        ),
+        moves AS (
+            SELECT '{ITEM_PART}' AS item_type, part_id AS item_id, 'stock_cut' AS bucket, log_id, jdate, section,
+                   CASE WHEN section = '{cutting}' THEN produced_qty - scrap_qty
+                        ELSE -(produced_qty + scrap_qty) END AS qty
+            FROM part_logs
+            UNION ALL
+            SELECT '{ITEM_PART}', part_id, 'stock_cnc_tools', log_id, jdate, section, produced_qty
+            FROM part_logs WHERE section = '{cnc}'
+            UNION ALL
+            SELECT '{ITEM_PRODUCT}', product_id, 'stock_' || section, log_id, jdate, section, n
+            FROM steps WHERE is_external OR NOT is_scrap
+            UNION ALL
+            SELECT '{ITEM_PRODUCT}', product_id, 'stock_' || prev_section, log_id, jdate, section, -n
+            FROM steps
+            WHERE prev_section IS NOT NULL AND NOT is_external AND (is_deposit OR section <> '{assembly}')
+            UNION ALL
+            SELECT '{ITEM_PART}', c.part_id, 'stock_cnc_tools', s.log_id, s.jdate, s.section, -c.qty * s.n
+            FROM steps s JOIN {components} c ON c.product_id = s.product_id
+            WHERE s.section = '{assembly}' AND NOT s.is_external AND NOT s.is_deposit
+            UNION ALL
+            SELECT '{ITEM_MATERIAL}', m.material_id, 'quantity', s.log_id, s.jdate, s.section, -m.qty * s.n
+            FROM steps s JOIN {materials} m ON m.product_id = s.product_id
+            WHERE s.section = '{assembly}' AND NOT s.is_external AND NOT s.is_deposit
+        )
+    """
+
+
+def movements_after(jdate: jdatetime.date) -> dict[tuple, Decimal]:
+    """Net movement per ``(item_type, item_id, bucket)`` of the logs dated after ``jdate``."""
+    sql = _movements_sql() + """
+        SELECT item_type, item_id, bucket, SUM(qty) FROM moves
+        GROUP BY item_type, item_id, bucket
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'after': _db_date(jdate)})
+        # English: SQLite sums NUMERIC columns in floating point; snap back to the ledger scale
+        return {(t, i, b): ledger.to_qty(total) for t, i, b, total in cursor.fetchall()}
+
+
+def stock_as_of(jdate: jdatetime.date, *, hide_zero: bool = False) -> AsOfReport:
+    """Stock of every part, product section and material at the end of ``jdate``.
+
+    Seven queries: the three stock tables, one aggregate over the later logs
+    and the three item lists.  Items deleted since then are not listed.
+    """
+    current = ledger.current_columns()
+    later = movements_after(jdate)
+    report = AsOfReport(jdate=jdate, at=end_of_jalali_day(jdate))
+
+    def value(item_type, item_id, bucket):
+        key = (item_type, item_id, bucket)
+        return current.get(key, Decimal('0')) - later.get(key, Decimal('0'))
+
+    for pk, name, model_name in Part.objects.order_by('name').values_list('id', 'name', 'product_model__name'):
+        row = {'id': pk, 'name': name, 'model': model_name or ''}
+        row.update({b: int(value(ITEM_PART, pk, b)) for b in ledger.PART_BUCKETS})
+        report.parts.append(row)
+    for pk, name in Product.objects.order_by('name').values_list('id', 'name'):
+        row = {'id': pk, 'name': name}
+        row.update({b: int(value(ITEM_PRODUCT, pk, b)) for b in ledger.PRODUCT_BUCKETS})
+        report.products.append(row)
+    for pk, name, unit in Material.objects.order_by('name').values_list('id', 'name', 'unit'):
+        report.materials.append({
+            'id': pk, 'name': name, 'unit': unit or '',
+            'quantity': value(ITEM_MATERIAL, pk, 'quantity'),
+        })
+
+    if hide_zero:
+        report.parts = [r for r in report.parts if any(r[b] for b in ledger.PART_BUCKETS)]
+        report.products = [r for r in report.products if any(r[b] for b in ledger.PRODUCT_BUCKETS)]
+        report.materials = [r for r in report.materials if r['quantity']]
+    return report
+
+
+def product_bucket_labels() -> list[tuple[str, str]]:
+    """``(bucket, verbose name)`` for the product section columns."""
+    return [(b, str(ProductStock._meta.get_field(b).verbose_name)) for b in ledger.PRODUCT_BUCKETS]
+
+
+def _current_value(item_type: str, item_id: int, bucket: str) -> Decimal:
+    if item_type == ITEM_PART:
+        qs = Part.objects.filter(pk=item_id)
+    elif item_type == ITEM_PRODUCT:
+        qs = ProductStock.objects.filter(product_id=item_id)
+    else:
+        qs = Material.objects.filter(pk=item_id)
+    return ledger.to_qty(qs.values_list(bucket, flat=True).first())
+
+
+def item_history(item_type: str, item_id: int, bucket: str, *, jdate_from: jdatetime.date | None = None,
+                 jdate_to: jdatetime.date | None = None, limit: int = HISTORY_LIMIT) -> list[dict]:
+    """Logs that moved one bucket in the date range, with the balance after each.
+
+    The balance is the current stock minus a cumulative ``SUM() OVER`` of
+    the later logs' movements, newest first, so only the logs from
+    ``jdate_from`` on are read.
+    """
+    if jdate_from is not None and jdate_to is not None and jdate_from > jdate_to:
+        raise StockAsOfError("تاریخ شروع بعد از تاریخ پایان است.")
+    first = jdate_from or jdatetime.date.fromgregorian(date=datetime.date(1900, 1, 1))
+    after = _db_date(first - datetime.timedelta(days=1))
+
+    qn = connection.ops.quote_name
+    sql = _movements_sql(per_log=True, item_type=item_type) + f"""
+        , per_log AS (
+            SELECT log_id, jdate, section, SUM(qty) AS qty FROM moves
+            WHERE item_type = %(item_type)s AND item_id = %(item_id)s AND bucket = %(bucket)s
+            GROUP BY log_id, jdate, section
+        ),
+        running AS (
+            SELECT log_id, jdate, section, qty,
+                   COALESCE(SUM(qty) OVER (ORDER BY jdate DESC, log_id DESC
+                                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS later
+            FROM per_log
+        )
+        SELECT r.log_id, r.jdate, r.section, r.qty, r.later, l.is_scrap, j.job_number, u.username
+        FROM running r
+        JOIN {qn(ProductionLog._meta.db_table)} l ON l.id = r.log_id
+        LEFT JOIN {qn(ProductionJob._meta.db_table)} j ON j.id = l.job_id
+        LEFT JOIN {qn(get_user_model()._meta.db_table)} u ON u.id = l.user_id
+        {'WHERE r.jdate <= %(upto)s' if jdate_to is not None else ''}
+        ORDER BY r.jdate, r.log_id
+    """
+    params = {'after': after, 'item_type': item_type, 'item_id': item_id, 'bucket': bucket}
+    if jdate_to is not None:
+        params['upto'] = _db_date(jdate_to)
+
+    current = _current_value(item_type, item_id, bucket)
+    sections = dict(SectionChoices.choices)
+    out = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for log_id, jdate, section, qty, later, is_scrap, job_number, username in cursor.fetchall():
+            reason = str(sections.get(section, section))
+            if is_scrap:
+                reason += ' (ضایعات)'
+            out.append({
+                'log_id': log_id,
+                'jdate': _to_jdate(jdate),
+                'qty': ledger.to_qty(qty),
+                'balance': current - ledger.to_qty(later),
+                'reason': reason,
+                'job__job_number': job_number,
+                'user__username': username,
+            })
+    return out[-limit:] if limit else out
@@ -0,0 +1,551 @@
+import datetime
+import json
+import random
+from decimal import Decimal
+from io import StringIO
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from jobs.forms import BulkJobForm, CreateJobForm
+from jobs.models import ProductionJob
+from production_line import ledger, reservation
+from production_line.models import ProductionLog, ProductStock, StockMovement, today_jdate
+
+from . import bom, catalog, low_stock, queries, stock_asof
+from .models import Material, Part, Product, ProductComponent, ProductMaterial, ProductModel
+
+
+def make_user(username, role):
+    return get_user_model().objects.create_user(username=username, password='x', role=role, full_name=username)
+
+
+class CatalogFixtureMixin:
+    def setUp(self):
+        cache.clear()
+        self.m1 = ProductModel.objects.create(name='M1')
+        self.m2 = ProductModel.objects.create(name='M2')
+        self.chair = Product.objects.create(name='Chair', product_model=self.m1)
+        self.sofa = Product.objects.create(name='Sofa', product_model=self.m2)
+        self.leg = Part.objects.create(name='Leg', product_model=self.m1)
+        self.arm = Part.objects.create(name='Arm', product_model=self.m2)
+
+
+class CatalogSnapshotTests(CatalogFixtureMixin, TestCase):
+    def test_snapshot_is_built_once(self):
+        snap = catalog.snapshot()
+        self.assertEqual(snap['models'], ['M1', 'M2'])
+        self.assertEqual(snap['products'], [[self.chair.pk, 'Chair', 'M1'], [self.sofa.pk, 'Sofa', 'M2']])
+        self.assertEqual(json.loads(snap['body'])['parts'], [[self.leg.pk, 'Leg', 'M1'], [self.arm.pk, 'Arm', 'M2']])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.snapshot()['etag'], snap['etag'])
+            self.assertEqual(catalog.parts_for_model('M2'), [{'id': self.arm.pk, 'name': 'Arm'}])
+            self.assertEqual(catalog.products_for_models(['M1']), [{'id': self.chair.pk, 'name': 'Chair', 'model': 'M1'}])
+            self.assertEqual(catalog.parts_by_model()['M1'], [{'id': self.leg.pk, 'name': 'Leg'}])
+
+    def test_catalog_edits_rebuild_but_stock_saves_do_not(self):
+        etag = catalog.snapshot()['etag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leg.stock_cut = 7
+            self.leg.save(update_fields=['stock_cut'])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.snapshot()['etag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leg.name = 'Long leg'
+            self.leg.save()
+        self.assertNotEqual(catalog.snapshot()['etag'], etag)
+        self.assertIn('Long leg', catalog.snapshot()['body'].decode('utf-8'))
+
+    def test_identical_rebuild_keeps_the_etag(self):
+        etag = catalog.snapshot()['etag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.m1.save()
+        self.assertEqual(catalog.snapshot()['etag'], etag)
+
+    def test_endpoint_answers_not_modified_for_the_current_etag(self):
+        self.client.force_login(make_user('worker', 'cnc_master'))
+        url = reverse('inventory:catalog_snapshot')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['models'], ['M1', 'M2'])
+        self.assertEqual(response['ETag'], catalog.snapshot()['etag'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"catalog-old"').status_code, 200)
+
+
+class PartForm(forms.Form):
+    part = catalog.CatalogChoiceField(queryset=Part.objects.none(), empty_label='-')
+
+    def __init__(self, *args, model_name=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        posted = self.data.get('part') if self.is_bound else None
+        self.count = catalog.limit_field(self.fields['part'], 'parts', model_name, posted_id=posted)
+
+
+class CatalogChoiceFieldTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        catalog.snapshot()
+
+    def test_building_and_rendering_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            form = PartForm(model_name='M1')
+            html = str(form['part'])
+            str(CreateJobForm(initial={'model': 'M2'}))
+            str(BulkJobForm())
+        self.assertEqual(form.count, 1)
+        self.assertIn('M1 - Leg', html)
+        self.assertNotIn('Arm', html)
+        self.assertEqual(catalog.model_choices(), [('M1', 'M1'), ('M2', 'M2')])
+
+    def test_posted_value_of_another_model_stays_selectable(self):
+        form = PartForm({'part': str(self.arm.pk)}, model_name='M1')
+        self.assertEqual(form.count, 1)
+        self.assertEqual([label for _, label in form.fields['part'].catalog_choices], ['M2 - Arm', 'M1 - Leg'])
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['part'], self.arm)
+
+    def test_values_outside_the_limited_rows_are_rejected(self):
+        self.assertFalse(PartForm({'part': '999999'}, model_name='M1').is_valid())
+        form = PartForm({'part': 'x'})
+        self.assertEqual(form.fields['part'].catalog_choices, [])
+        self.assertFalse(form.is_valid())
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        model = ProductModel.objects.create(name='M1')
+        self.leg = Part.objects.create(name='Leg', product_model=model, stock_cut=10, stock_cnc_tools=10, threshold=5)
+        self.wood = Material.objects.create(name='Wood', unit='kg', quantity=Decimal('2.000'), threshold=Decimal('1.000'))
+        self.chair = Product.objects.create(name='Chair', product_model=model)
+
+    def flag(self, obj):
+        return type(obj).objects.values_list('is_low_stock', 'low_stock_changed_at').get(pk=obj.pk)
+
+    def test_saves_flip_the_flag_both_ways(self):
+        # English: new rows default to low, so stocking one above its threshold is a flip
+        self.assertFalse(self.flag(self.leg)[0])
+        self.leg.stock_cut = 5
+        self.leg.save(update_fields=['stock_cut'])
+        low, went_low = self.flag(self.leg)
+        self.assertTrue(low)
+        self.assertIsNotNone(went_low)
+
+        self.leg.stock_cnc_tools = 3
+        self.leg.save(update_fields=['stock_cnc_tools'])
+        self.assertEqual(self.flag(self.leg), (True, went_low))
+
+        self.leg.stock_cut = self.leg.stock_cnc_tools = 6
+        self.leg.save()
+        low, went_ok = self.flag(self.leg)
+        self.assertFalse(low)
+        self.assertGreater(went_ok, went_low)
+
+        self.leg.threshold = 6
+        self.leg.save(update_fields=['threshold'])
+        self.assertTrue(self.flag(self.leg)[0])
+
+    def test_sql_updates_flip_the_flag_both_ways(self):
+        self.assertEqual(reservation.take(Material, 'quantity', {self.wood.pk: Decimal('0.999')}), [])
+        self.assertFalse(self.flag(self.wood)[0])
+        self.assertEqual(reservation.take(Material, 'quantity', {self.wood.pk: Decimal('0.001')}), [])
+        low, went_low = self.flag(self.wood)
+        self.assertTrue(low)
+        self.assertIsNotNone(went_low)
+        reservation.restore(Material, 'quantity', {self.wood.pk: Decimal('0.001')})
+        self.assertFalse(self.flag(self.wood)[0])
+
+        Part.objects.filter(pk=self.leg.pk).update(**low_stock.with_flag(Part, {'stock_cut': 0}))
+        self.assertTrue(self.flag(self.leg)[0])
+
+    def test_null_quantities_and_new_product_stocks_are_low(self):
+        Material.objects.filter(pk=self.wood.pk).update(**low_stock.with_flag(Material, {'quantity': None}))
+        self.assertTrue(self.flag(self.wood)[0])
+        ProductStock.objects.bulk_create([ProductStock(product=self.chair)])
+        self.assertTrue(ProductStock.objects.get(product=self.chair).is_low_stock)
+
+    def test_verify_command_repairs_raw_writes(self):
+        Part.objects.filter(pk=self.leg.pk).update(stock_cut=0)
+        self.assertEqual(list(low_stock.drift(Part)), [self.leg])
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verify_low_stock', stdout=out)
+        self.assertIn(f'part#{self.leg.pk}: is_low_stock=False -> True', out.getvalue())
+        call_command('verify_low_stock', '--repair', stdout=StringIO())
+        self.assertTrue(self.flag(self.leg)[0])
+
+    def test_alerts_report_flips_after_the_cursor(self):
+        self.client.force_login(make_user('boss', 'manager'))
+        url = reverse('inventory:low_stock_alerts')
+        first = self.client.get(url).json()
+        self.assertEqual(first['counts'], {'part': 0, 'material': 0, 'product': 0})
+        self.assertEqual(first['changes'], [])
+
+        self.leg.stock_cut = 1
+        self.leg.save()
+        second = self.client.get(url, {'since': first['cursor']}).json()
+        self.assertEqual([(c['kind'], c['id'], c['low']) for c in second['changes']], [('part', self.leg.pk, True)])
+        self.assertEqual([item['name'] for item in second['low']], [str(self.leg)])
+
+        self.leg.stock_cut = 10
+        self.leg.save()
+        third = self.client.get(url, {'since': second['cursor']}).json()
+        self.assertEqual([(c['id'], c['low']) for c in third['changes']], [(self.leg.pk, False)])
+        self.assertEqual(self.client.get(url, {'since': third['cursor']}).json()['changes'], [])
+
+    def test_alerts_page_a_kind_over_the_limit(self):
+        self.client.force_login(make_user('boss', 'manager'))
+        url = reverse('inventory:low_stock_alerts')
+        cursor = self.client.get(url).json()['cursor']
+        model = self.leg.product_model
+        flipped = [('part', self.leg.pk)]
+        self.leg.stock_cut = 1
+        self.leg.save()
+        for i in range(4):
+            part = Part.objects.create(name=f'Arm {i}', product_model=model, stock_cut=10, stock_cnc_tools=10, threshold=5)
+            part.stock_cut = 1
+            part.save()
+            flipped.append(('part', part.pk))
+        # English: the material flips after every part, so a cursor taken
+        # from it would skip the parts cut off by the limit
+        self.wood.quantity = Decimal('0.500')
+        self.wood.save()
+        flipped.append(('material', self.wood.pk))
+
+        seen = []
+        for _ in range(len(flipped)):
+            page = self.client.get(url, {'since': cursor, 'limit': 2}).json()
+            if not page['changes']:
+                break
+            self.assertLessEqual(sum(c['kind'] == 'part' for c in page['changes']), 2)
+            seen.extend((c['kind'], c['id']) for c in page['changes'])
+            cursor = page['cursor']
+        self.assertEqual(seen, flipped)
+        self.assertEqual(self.client.get(url, {'since': cursor, 'limit': 2}).json()['changes'], [])
+
+    def test_alerts_reject_bad_cursors_and_other_roles(self):
+        url = reverse('inventory:low_stock_alerts')
+        self.client.force_login(make_user('boss', 'manager'))
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+        self.client.force_login(make_user('worker', 'cnc_master'))
+        self.assertNotEqual(self.client.get(url).status_code, 200)
+
+
+class KeysetPagingTests(TestCase):
+    def setUp(self):
+        rng = random.Random(49)
+        self.models = models = [ProductModel.objects.create(name=f'M{i:02d}') for i in range(15)]
+        # English: few distinct names and quantities, so most sort keys tie and the pk decides
+        combos = [(name, model) for name in ('Arm', 'Leg', 'Seat', 'Back') for model in models]
+        rng.shuffle(combos)
+        Part.objects.bulk_create([
+            Part(name=name, product_model=model, stock_cut=rng.randint(0, 9), stock_cnc_tools=9, threshold=4)
+            for name, model in combos[:57]
+        ])
+        low_stock.refresh(Part)
+        quantities = [None, Decimal('0.500'), Decimal('1.250'), Decimal('2.000')]
+        Material.objects.bulk_create([
+            Material(name=f'Mat {i:02d}', unit='kg', quantity=rng.choice(quantities)) for i in range(45)
+        ])
+
+    def walk(self, qs, sort_map, per_page=10, **params):
+        seen, after = [], ''
+        while True:
+            with self.assertNumQueries(1):
+                page = queries.keyset_page(qs, sort_map, {**params, 'after': after}, per_page=per_page)
+            self.assertLessEqual(len(page.rows), per_page)
+            seen.extend(row.pk for row in page.rows)
+            if not page.next_cursor:
+                return seen
+            after = page.next_cursor
+
+    def expected(self, qs, keys, desc):
+        rows = sorted(qs, key=lambda row: (*keys(row), row.pk), reverse=desc)
+        return [row.pk for row in rows]
+
+    def test_cursor_walk_matches_the_full_ordering(self):
+        parts = queries.filter_parts({})
+        materials = queries.filter_materials({})
+        cases = [
+            (parts, queries.PART_SORT_FIELDS, 1, lambda r: (r.name,)),
+            (parts, queries.PART_SORT_FIELDS, 2, lambda r: (r.product_model.name, r.name)),
+            (materials, queries.MATERIAL_SORT_FIELDS, 2, lambda r: (r.quantity or 0,)),
+        ]
+        for qs, sort_map, col, keys in cases:
+            for direction in ('asc', 'desc'):
+                with self.subTest(model=qs.model.__name__, col=col, direction=direction):
+                    walked = self.walk(qs, sort_map, sort_col=str(col), sort_dir=direction)
+                    self.assertEqual(walked, self.expected(qs, keys, direction == 'desc'))
+
+    def test_filters_and_summary(self):
+        qs = queries.filter_parts({'model': 'M02', 'search': 'a'})
+        self.assertEqual(set(qs), set(Part.objects.filter(product_model__name='M02', name__in=['Arm', 'Seat', 'Back'])))
+        self.assertEqual(queries.summary(queries.filter_parts({}), Q(is_low_stock=True)), {
+            'total': 57, 'low': Part.objects.filter(stock_cut__lte=4).count(),
+        })
+
+    def test_bad_cursors_restart_from_the_first_page(self):
+        first = queries.keyset_page(Part.objects.all(), queries.PART_SORT_FIELDS, {}, per_page=5)
+        for after in ('not-base64!', queries._encode([1, 2, 3]), queries._encode({'a': 1})):
+            page = queries.keyset_page(Part.objects.all(), queries.PART_SORT_FIELDS, {'after': after}, per_page=5)
+            self.assertEqual(page.rows, first.rows)
+
+    def test_list_view_serves_fragments(self):
+        self.client.force_login(make_user('boss', 'manager'))
+        url = reverse('inventory:parts_list')
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['parts']), 57)
+        self.assertEqual(response.context['next_cursor'], '')
+        self.assertEqual(response.context['parts_count'], 57)
+
+        Part.objects.bulk_create([Part(name=f'Extra {i:03d}', product_model=self.models[0]) for i in range(queries.PAGE_SIZE)])
+        first = self.client.get(url, {'fragment': '1'}).json()
+        self.assertTrue(first['has_next'])
+        rest = self.client.get(url, {'fragment': '1', 'after': first['next']}).json()
+        self.assertFalse(rest['has_next'])
+        self.assertEqual(rest['html'].count('<tr'), Part.objects.count() - queries.PAGE_SIZE)
+
+
+class BomDiffTests(SimpleTestCase):
+    def test_applying_the_diff_gives_the_wanted_bom(self):
+        rng = random.Random(50)
+        for _ in range(500):
+            items = rng.sample(range(1, 40), rng.randint(0, 30))
+            existing = {item: (1000 + item, rng.randint(1, 3)) for item in items[:rng.randint(0, len(items))]}
+            wanted = {item: rng.randint(1, 3) for item in rng.sample(items, rng.randint(0, len(items)))}
+            plan = bom.diff(existing, wanted)
+
+            rows = {pk: (item, qty) for item, (pk, qty) in existing.items()}
+            for pk in plan.delete:
+                del rows[pk]
+            for pk, qty in plan.update.items():
+                rows[pk] = (rows[pk][0], qty)
+            result = {item: qty for item, qty in rows.values()}
+            self.assertFalse(set(plan.create) & set(result))
+            result.update(plan.create)
+            self.assertEqual(result, wanted)
+            # English: rows keeping their quantity are not rewritten
+            for pk in plan.update:
+                item = pk - 1000
+                self.assertNotEqual(existing[item][1], wanted[item])
+            self.assertEqual(plan.delete, sorted(plan.delete))
+
+    def test_quantities_are_validated(self):
+        self.assertEqual(bom.part_qty('۳'), 3)
+        self.assertIsNone(bom.part_qty('0'))
+        self.assertEqual(bom.material_qty('۰.۱۲۵'), Decimal('0.125'))
+        self.assertEqual(bom.material_qty('0.0005'), Decimal('0.001'))
+        self.assertIsNone(bom.material_qty('-1'))
+        self.assertEqual(bom.components_from_payload([{'part_id': '4', 'qty': '2'}, {'part_id': 'x'}, 'bad']), {4: 2})
+
+
+class SaveBomTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=self.model)
+        self.parts = Part.objects.bulk_create([Part(name=f'P{i:03d}', product_model=self.model) for i in range(200)])
+        self.materials = Material.objects.bulk_create([Material(name=f'Mat{i:03d}', unit='kg') for i in range(50)])
+
+    def stored(self, product=None):
+        product = product or self.product
+        return (
+            dict(ProductComponent.objects.filter(product=product).values_list('part_id', 'qty')),
+            dict(ProductMaterial.objects.filter(product=product).values_list('material_id', 'qty')),
+        )
+
+    def test_random_saves_leave_exactly_the_wanted_bom(self):
+        rng = random.Random(50)
+        version = self.product.bom_version
+        for _ in range(15):
+            parts = {p.pk: rng.randint(1, 3) for p in rng.sample(self.parts, rng.randint(0, 40))}
+            materials = {m.pk: Decimal(rng.randint(1, 3)).scaleb(-1) for m in rng.sample(self.materials, rng.randint(0, 10))}
+            plans = [
+                bom.diff({item: (item, qty) for item, qty in before.items()}, wanted)
+                for before, wanted in zip(self.stored(), (parts, materials))
+            ]
+            change = bom.save_bom(self.product, parts, materials)
+            self.assertEqual(self.stored(), (parts, materials))
+            self.assertEqual(
+                (change.created, change.updated, change.deleted),
+                tuple(sum(len(getattr(plan, name)) for plan in plans) for name in ('create', 'update', 'delete')),
+            )
+            version += change.changed
+            self.assertEqual(Product.objects.get(pk=self.product.pk).bom_version, version)
+
+    def test_unchanged_save_writes_nothing(self):
+        parts = {p.pk: 2 for p in self.parts[:10]}
+        bom.save_bom(self.product, parts, {self.materials[0].pk: Decimal('0.250')})
+        version = self.product.bom_version
+        with self.assertNumQueries(7):
+            change = bom.save_bom(self.product, parts, {self.materials[0].pk: Decimal('0.250')})
+        self.assertFalse(change.changed)
+        self.assertEqual(change.version, version)
+        self.assertEqual(change.message(), "فهرست اجزای محصول تغییری نکرد.")
+
+    def test_query_count_does_not_grow_with_the_bom(self):
+        counts = []
+        for size in (3, 150):
+            product = Product.objects.create(name=f'Sofa {size}', product_model=self.model)
+            bom.save_bom(product, {p.pk: 1 for p in self.parts[:size]}, {})
+            # English: drop the first part, change the others, add one and name an unknown id
+            wanted = {p.pk: 2 for p in self.parts[1:size]}
+            wanted.update({self.parts[size].pk: 1, 999999: 1})
+            with CaptureQueriesContext(connection) as captured:
+                change = bom.save_bom(product, wanted, {m.pk: Decimal('1') for m in self.materials[:size // 4 + 1]})
+            counts.append(len(captured))
+            self.assertEqual(change.deleted, 1)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_ids_are_skipped(self):
+        change = bom.save_bom(self.product, {self.parts[0].pk: 1, 999999: 4}, None)
+        self.assertEqual((change.created, change.skipped), (1, 1))
+        self.assertEqual(self.stored()[0], {self.parts[0].pk: 1})
+
+    def test_copy_skips_parts_of_another_model(self):
+        other_model = ProductModel.objects.create(name='M2')
+        foreign = Part.objects.create(name='Foreign', product_model=other_model)
+        bom.save_bom(self.product, {self.parts[0].pk: 4, foreign.pk: 1}, {self.materials[0].pk: Decimal('0.500')})
+        target = Product.objects.create(name='Stool', product_model=self.model)
+        change = bom.copy_bom(self.product, target)
+        self.assertEqual(self.stored(target), ({self.parts[0].pk: 4}, {self.materials[0].pk: Decimal('0.500')}))
+        self.assertEqual(change.skipped, 1)
+        with self.assertRaises(bom.BomError):
+            bom.copy_bom(target, target)
+
+    def test_import_is_all_or_nothing(self):
+        self.client.force_login(make_user('boss', 'manager'))
+        url = reverse('inventory:products_bom_import', args=[self.product.pk])
+        good = 'نوع,نام,مقدار\nقطعه,P001,۲\nماده,Mat003,0.125\n'
+        self.client.post(url, {'bom_file': SimpleUploadedFile('bom.csv', good.encode('utf-8-sig'))}, follow=True)
+        self.assertEqual(self.stored(), ({self.parts[1].pk: 2}, {self.materials[3].pk: Decimal('0.125')}))
+
+        bad = 'kind,name,qty\npart,P002,1\npart,Nope,1\nmaterial,Mat003,x\n'
+        response = self.client.post(url, {'bom_file': SimpleUploadedFile('bom.csv', bad.encode('utf-8'))}, follow=True)
+        errors = [str(m) for m in response.context['messages']]
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(errors[0].startswith('ردیف 3'))
+        self.assertEqual(self.stored(), ({self.parts[1].pk: 2}, {self.materials[3].pk: Decimal('0.125')}))
+
+
+class StockAsOfTests(TestCase):
+    """``stock_as_of`` must give back the stock recorded at the end of each day."""
+
+    flow = ('assembly', 'workpage', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging')
+
+    def setUp(self):
+        cache.clear()
+        self.rng = random.Random(38)
+        self.user = make_user('boss', 'manager')
+        model = ProductModel.objects.create(name='M1')
+        self.parts = [
+            Part.objects.create(name=name, product_model=model, stock_cut=20, stock_cnc_tools=60)
+            for name in ('Leg', 'Seat', 'Arm')
+        ]
+        self.materials = [
+            Material.objects.create(name=name, unit='kg', quantity=Decimal('40.000')) for name in ('Wood', 'Foam')
+        ]
+        self.products = [Product.objects.create(name=name, product_model=model) for name in ('Chair', 'Sofa')]
+        for product in self.products:
+            for part in self.rng.sample(self.parts, 2):
+                ProductComponent.objects.create(product=product, part=part, qty=self.rng.randint(1, 3))
+            for material in self.materials:
+                ProductMaterial.objects.create(product=product, material=material,
+                                               qty=Decimal('0.125') * self.rng.randint(1, 4))
+        self.jobs = {}
+
+    def log(self, jdate, **fields):
+        return ProductionLog.objects.create(user=self.user, role='manager', model='M1', jdate=jdate, **fields)
+
+    def generate_day(self, jdate, new_jobs):
+        rng = self.rng
+        for part in self.parts:
+            if rng.random() < 0.7:
+                self.log(jdate, part=Part.objects.get(pk=part.pk), section='cutting',
+                         produced_qty=rng.randint(1, 5), scrap_qty=rng.randint(0, 1))
+            fresh = Part.objects.get(pk=part.pk)
+            if fresh.stock_cut and rng.random() < 0.7:
+                produced = rng.randint(0, fresh.stock_cut)
+                scrap = rng.randint(0, fresh.stock_cut - produced)
+                self.log(jdate, part=fresh, section='cnc_tools', produced_qty=produced, scrap_qty=scrap)
+        for _ in range(new_jobs):
+            number = f'J{len(self.jobs) + 1:03d}'
+            sections = ['assembly'] + sorted(rng.sample(self.flow[1:], rng.randint(1, 4)), key=self.flow.index)
+            job = ProductionJob.objects.create(
+                job_number=number, product=rng.choice(self.products), allowed_sections=sections,
+                job_label='deposit' if rng.random() < 0.2 else 'in_progress',
+                deposit_account='Store',
+            )
+            self.jobs[job.pk] = sections
+        for pk, sections in list(self.jobs.items()):
+            if not sections or rng.random() < 0.3:
+                continue
+            job = ProductionJob.objects.get(pk=pk)
+            self.log(jdate, job=job, product=job.product, section=sections.pop(0),
+                     is_scrap=rng.random() < 0.1, is_external=rng.random() < 0.15)
+            if ProductionJob.objects.get(pk=pk).finished_at is not None:
+                sections.clear()
+
+    def report_columns(self, report):
+        out = {}
+        for row in report.parts:
+            out.update({(StockMovement.ITEM_PART, row['id'], b): row[b] for b in ledger.PART_BUCKETS})
+        for row in report.products:
+            out.update({(StockMovement.ITEM_PRODUCT, row['id'], b): row[b] for b in ledger.PRODUCT_BUCKETS})
+        for row in report.materials:
+            out[(StockMovement.ITEM_MATERIAL, row['id'], 'quantity')] = row['quantity']
+        return {key: value for key, value in out.items() if value}
+
+    def recorded(self):
+        return {key: value for key, value in ledger.current_columns().items() if value}
+
+    def test_past_dates_give_the_recorded_stock(self):
+        today = today_jdate()
+        days = [today - datetime.timedelta(days=k) for k in (9, 6, 5, 2, 0)]
+        recorded = {days[0] - datetime.timedelta(days=1): self.recorded()}
+        for jdate in days:
+            self.generate_day(jdate, new_jobs=3)
+            recorded[jdate] = self.recorded()
+        logs = ProductionLog.objects.exclude(job=None)
+        self.assertTrue(logs.filter(is_scrap=True).exists() and logs.filter(is_external=True).exists())
+        self.assertTrue(logs.filter(job__job_label='deposit').exclude(section='assembly').exists())
+
+        for jdate, expected in recorded.items():
+            with self.assertNumQueries(7):
+                report = stock_asof.stock_as_of(jdate)
+            self.assertEqual(self.report_columns(report), expected, jdate)
+        self.assertEqual(self.report_columns(stock_asof.stock_as_of(today)), self.recorded())
+
+    def test_item_history_balances_match_the_recorded_stock(self):
+        today = today_jdate()
+        days = [today - datetime.timedelta(days=k) for k in (4, 3, 1)]
+        recorded = {}
+        for jdate in days:
+            self.generate_day(jdate, new_jobs=3)
+            recorded[jdate] = ledger.current_columns()
+        keys = [(StockMovement.ITEM_PART, p.pk, b) for p in self.parts for b in ledger.PART_BUCKETS]
+        keys += [(StockMovement.ITEM_PRODUCT, p.pk, b) for p in self.products for b in ledger.PRODUCT_BUCKETS]
+        keys += [(StockMovement.ITEM_MATERIAL, m.pk, 'quantity') for m in self.materials]
+        checked = 0
+        for key in keys:
+            history = stock_asof.item_history(*key)
+            for jdate in days:
+                rows = [row for row in history if row['jdate'] <= jdate]
+                if rows:
+                    self.assertEqual(rows[-1]['balance'], recorded[jdate].get(key, 0), (key, jdate))
+                    checked += 1
+            ranged = stock_asof.item_history(*key, jdate_from=days[1], jdate_to=days[1])
+            self.assertEqual(ranged, [row for row in history if row['jdate'] == days[1]])
+        self.assertGreater(checked, 10)
@@ -10,6 +10,8 @@ urlpatterns = [
     path('products/export/xlsx/', views.products_export_xlsx, name='products_export_xlsx'),
     path('products/add/', views.products_add, name='products_add'),
     path('products/<int:pk>/edit/', views.products_edit, name='products_edit'),
+    path('products/<int:pk>/bom/import/', views.products_bom_import, name='products_bom_import'),
+    path('products/<int:pk>/bom/copy/', views.products_bom_copy, name='products_bom_copy'),
     path('products/<int:pk>/delete/', views.products_delete, name='products_delete'),
     path('products/bulk-delete/', views.products_bulk_delete, name='products_bulk_delete'),
     # Inline/bulk updates for product stage stocks
@@ -27,6 +29,17 @@ urlpatterns = [
     # Dashboard
     path('', views.inventory_dashboard, name='dashboard'),
 
+    # Stock as of a date and per-bucket history (stock movement ledger)
+    path('stock/as-of/', views.stock_as_of_view, name='stock_as_of'),
+    path('stock/as-of/export/xlsx/', views.stock_as_of_export_xlsx, name='stock_as_of_export_xlsx'),
+    path('stock/history/', views.stock_history_view, name='stock_history'),
+
+    # Catalog snapshot for model -> product/part selectors (ETag revalidated)
+    path('api/catalog/', views.catalog_snapshot, name='catalog_snapshot'),
+
+    # Low-stock items and threshold crossings since a cursor
+    path('api/low-stock/', views.low_stock_alerts, name='low_stock_alerts'),
+
     # Parts
     path('parts/', views.parts_list_view, name='parts_list'),
     path('parts/export/xlsx/', views.parts_export_xlsx, name='parts_export_xlsx'),
@@ -19,7 +19,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseServerError
 from django.views.decorators.http import require_POST
-from django.db.models import F, Q, Value, Count, FloatField
+from django.db.models import Q, Value, Count
 from django.db.models.functions import Coalesce
 
 # Local models/forms
@@ -32,11 +32,12 @@ from .forms import ProductStockEditForm  # if used elsewhere
 # Product and ProductModel are now defined directly in inventory.models, so
 # there is no longer a dependency on the removed products app.  Likewise,
 # ProductForm is defined in inventory.forms.
-from inventory.models import Product, ProductModel, ProductComponent, ProductMaterial
+from inventory.models import Product, ProductModel
 from inventory.forms import ProductForm
 
 import json
-from decimal import Decimal, InvalidOperation
+from inventory import bom, catalog, low_stock, queries
+from production_line import ledger
 from production_line.models import ProductStock
 
 # ----------------------------------
@@ -104,48 +105,28 @@ def parts_list_view(request):
     ``?model=XYZ``) and simple substring search on the part name.  The
     old ``product_type`` free‑text filter is no longer supported now
     that the schema has been normalized around the ``ProductModel``
-    relation.  A count of parts below their stock thresholds is also
-    computed server‑side.
+    relation.  Rows are served one keyset page at a time (see
+    ``inventory.queries``); ``?fragment=1`` returns the rows of the next
+    page for infinite scroll.  The part and shortage counts cover the whole
+    filtered list.
     """
-    qs = Part.objects.all().order_by('name')
+    qs = queries.filter_parts(request.GET)
+    page = queries.keyset_page(qs, queries.PART_SORT_FIELDS, request.GET)
+    if request.GET.get('fragment'):
+        return queries.fragment_response('inventory/_parts_rows.html', page, first_page=not request.GET.get('after'))
 
-    # Filters
-
-    # ``product_type`` parameter is no longer honoured; only the
-    # ``model`` parameter is recognised.
-    current_model = (request.GET.get('model') or '').strip()
-    search_query = (request.GET.get('search') or '').strip()
-
-    if current_model:
-        # Filter by the related product_model name.  The ProductModel FK stores
-        # the canonical model name, so filter via product_model__name.
-        qs = qs.filter(product_model__name=current_model)
-    if search_query:
-        qs = qs.filter(name__icontains=search_query)
-
-    # Model choices for toolbar filter
-    try:
-        model_choices = [(m.name, m.name) for m in ProductModel.objects.all().order_by('name')]
-    except Exception:
-        model_choices = []
-
-    # Below-threshold count (treat null as 0)
-    parts_ann = qs.annotate(
-        thr=Coalesce('threshold', Value(0)),
-        cut=Coalesce('stock_cut', Value(0)),
-        # Use the renamed stock_cnc_tools field to compute the CNC/tools stock
-        cnc=Coalesce('stock_cnc_tools', Value(0)),
-    )
-    # Treat at-or-below threshold as shortage to align with dashboard logic
-    below_threshold_count = parts_ann.filter(Q(cut__lte=F('thr')) | Q(cnc__lte=F('thr'))).count()
+    # Counts in one conditional aggregate (maintained flag, see inventory.low_stock)
+    counts = queries.summary(qs, Q(is_low_stock=True))
 
     ctx = {
-        'parts': qs,
-        'model_choices': model_choices,
-        'current_model': current_model,
-        'search_query': search_query,
-        'parts_count': qs.count(),
-        'below_threshold_count': below_threshold_count,
+        'parts': page.rows,
+        'next_cursor': page.next_cursor,
+        # English: toolbar choices from the cached catalog snapshot, no query per request
+        'model_choices': catalog.model_choices(),
+        'current_model': (request.GET.get('model') or '').strip(),
+        'search_query': (request.GET.get('search') or '').strip(),
+        'parts_count': counts['total'],
+        'below_threshold_count': counts['low'],
     }
     return render(request, 'inventory/parts_list.html', ctx)
 
@@ -185,6 +166,7 @@ def parts_export_xlsx(request):
 
 @login_required
 @user_passes_test(is_manager)
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def parts_create_view(request):
     if request.method == 'POST':
         form = PartForm(request.POST)
@@ -199,6 +181,7 @@ def parts_create_view(request):
 
 @login_required
 @user_passes_test(is_manager)
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def parts_edit_view(request, pk: int):
     obj = get_object_or_404(Part, pk=pk)
     if request.method == 'POST':
@@ -251,6 +234,7 @@ def parts_bulk_delete_view(request):
 @login_required
 @user_passes_test(is_manager)
 @require_POST
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def parts_inline_update(request):
     """Inline update of a single numeric stock field for a Part.
 
@@ -305,6 +289,7 @@ def parts_inline_update(request):
 @login_required
 @user_passes_test(is_manager)
 @require_POST
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def parts_bulk_update(request):
     """Bulk update a numeric stock field for multiple Part rows.
 
@@ -381,37 +366,22 @@ def parts_bulk_update(request):
 @login_required
 @user_passes_test(is_manager)
 def materials_list(request):
-    qs = Material.objects.all().order_by('name')
+    # Filter by material (name exact) and search (icontains), one keyset page at a time
+    qs = queries.filter_materials(request.GET)
+    page = queries.keyset_page(qs, queries.MATERIAL_SORT_FIELDS, request.GET)
+    if request.GET.get('fragment'):
+        return queries.fragment_response('inventory/_materials_rows.html', page, first_page=not request.GET.get('after'))
 
-    # Filter by material (name exact) and search (icontains)
-    current_material = (request.GET.get('material') or '').strip()
-    search_query = (request.GET.get('search') or '').strip()
-
-    if current_material:
-        qs = qs.filter(name=current_material)
-    if search_query:
-        qs = qs.filter(name__icontains=search_query)
-
-    try:
-        material_choices = [(n, n) for n in Material.objects.order_by('name').values_list('name', flat=True).distinct()]
-    except Exception:
-        material_choices = []
-
-    # Compute server-side shortage counter using <= threshold rule
-    # English: Treat NULL as 0 for both quantity and threshold.
-    qs_ann = qs.annotate(
-        # Ensure consistent float output to avoid mixed Integer/Float errors
-        qty=Coalesce(F('quantity'), Value(0.0), output_field=FloatField()),
-        thr=Coalesce(F('threshold'), Value(0.0), output_field=FloatField()),
-    )
-    below_threshold_count = qs_ann.filter(qty__lte=F('thr')).count()
+    # Server-side counters from the maintained flag (<= threshold rule, NULL as 0)
+    counts = queries.summary(qs, Q(is_low_stock=True))
 
     return render(request, 'inventory/materials_list.html', {
-        'materials': qs,
-        'search_query': search_query,
-        'material_choices': material_choices,
-        'current_material': current_material,
-        'below_threshold_count': below_threshold_count,
+        'materials': page.rows,
+        'next_cursor': page.next_cursor,
+        'search_query': (request.GET.get('search') or '').strip(),
+        'current_material': (request.GET.get('material') or '').strip(),
+        'materials_count': counts['total'],
+        'below_threshold_count': counts['low'],
     })
 
 
@@ -454,6 +424,7 @@ def materials_export_xlsx(request):
 
 @login_required
 @user_passes_test(is_manager)
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def materials_add(request):
     if request.method == 'POST':
         form = MaterialForm(request.POST)
@@ -468,6 +439,7 @@ def materials_add(request):
 
 @login_required
 @user_passes_test(is_manager)
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def materials_edit(request, pk: int):
     obj = get_object_or_404(Material, pk=pk)
     if request.method == 'POST':
@@ -523,58 +495,25 @@ def materials_bulk_delete(request):
 @login_required
 @user_passes_test(is_manager)
 def products_list(request):
-    # Start with all products and prefetch their stock relationship.  Annotate each
-    # product with per-section stock values and the stock threshold.  Missing
-    # ProductStock records default to zero via ``Coalesce``.  These annotations
-    # allow the template to access ``p.assembly``, ``p.paneling`` and related
-    # attributes directly without additional database hits.
-    qs = (Product.objects
-          .all()
-          .select_related('stock')
-          .annotate(
-              assembly=Coalesce('stock__stock_assembly', Value(0)),
-              paneling=Coalesce('stock__stock_workpage', Value(0)),
-              undercoat_color=Coalesce('stock__stock_undercoating', Value(0)),
-              color=Coalesce('stock__stock_painting', Value(0)),
-              sewing=Coalesce('stock__stock_sewing', Value(0)),
-              upholstery=Coalesce('stock__stock_upholstery', Value(0)),
-              packing=Coalesce('stock__stock_packaging', Value(0)),
-              thr=Coalesce('stock__threshold', Value(0)),
-          )
-          .order_by('id'))
-    search_query = (request.GET.get('search') or '').strip()
-    model_filter = (request.GET.get('model') or '').strip()
-
-
-    # ``product_type`` field has been removed from the schema, the only
-    # supported filter is on the ``product_model__name`` relation.
-    if model_filter:
-        qs = qs.filter(product_model__name=model_filter)
-    if search_query:
-        qs = qs.filter(name__icontains=search_query)
+    # Products with per-section stock annotations (``p.assembly``, ``p.paneling``
+    # ...; missing ProductStock rows read as zero), filtered by model and
+    # search and served one keyset page at a time (see inventory.queries).
+    qs = queries.filter_products(request.GET)
+    page = queries.keyset_page(qs, queries.PRODUCT_SORT_FIELDS, request.GET)
+    if request.GET.get('fragment'):
+        return queries.fragment_response('inventory/_products_rows.html', page, first_page=not request.GET.get('after'))
 
-    try:
-        model_choices = [(m.name, m.name) for m in ProductModel.objects.all().order_by('id')]
-    except Exception:
-        model_choices = []
-
-    # Compute server-side shortage count for products: any stage at or below threshold
-    below_threshold_count = qs.filter(
-        Q(assembly__lte=F('thr')) |
-        Q(paneling__lte=F('thr')) |
-        Q(undercoat_color__lte=F('thr')) |
-        Q(color__lte=F('thr')) |
-        Q(sewing__lte=F('thr')) |
-        Q(upholstery__lte=F('thr')) |
-        Q(packing__lte=F('thr'))
-    ).count()
+    # Server-side counts: any stage at or below threshold, missing stock rows included
+    counts = queries.summary(qs, queries.PRODUCT_LOW_Q)
 
     return render(request, 'inventory/products_list.html', {
-        'products': qs,
-        'model_choices': model_choices,
-        'current_model': model_filter,
-        'search_query': search_query,
-        'below_threshold_count': below_threshold_count,
+        'products': page.rows,
+        'next_cursor': page.next_cursor,
+        'model_choices': catalog.model_choices(),
+        'current_model': (request.GET.get('model') or '').strip(),
+        'search_query': (request.GET.get('search') or '').strip(),
+        'products_count': counts['total'],
+        'below_threshold_count': counts['low'],
     })
 
 
@@ -632,6 +571,7 @@ def products_export_xlsx(request):
 @login_required
 @user_passes_test(is_manager)
 @require_POST
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def products_inline_update(request):
     """Inline update of a single ProductStock numeric field for a Product.
 
@@ -695,6 +635,7 @@ def products_inline_update(request):
 @login_required
 @user_passes_test(is_manager)
 @require_POST
+@ledger.recorded_view(ledger.REASON_MANUAL)
 def products_bulk_update(request):
     """Bulk update a ProductStock numeric field for multiple products.
 
@@ -779,9 +720,9 @@ def products_add(request):
     In addition to the basic product fields (name, model, description), this
     view accepts two hidden JSON payloads – ``components_data`` and
     ``materials_data`` – that describe the parts and materials required to
-    assemble the product.  Each payload is parsed and persisted via the
-    ProductComponent and ProductMaterial models after the base Product
-    instance has been saved.
+    assemble the product.  Each payload is parsed and persisted with
+    ``inventory.bom.save_bom`` after the base Product instance has been
+    saved.
     """
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
@@ -820,43 +761,10 @@ def products_add(request):
             except Exception:
                 mats_list = []
 
-            # Create ProductComponent rows for each component.  There will be
-            # no existing BOM rows on a newly created product, so we simply
-            # iterate and insert.  Invalid part IDs or quantities are skipped.
-            for comp in comps_list:
-                part_id = comp.get('part_id')
-                qty = comp.get('qty')
-                try:
-                    pid = int(part_id)
-                    q = int(qty)
-                    if q < 1:
-                        continue
-                except (TypeError, ValueError):
-                    continue
-                try:
-                    part_obj = Part.objects.get(pk=pid)
-                except Part.DoesNotExist:
-                    continue
-                ProductComponent.objects.create(product=product, part=part_obj, qty=q)
-
-            # Create ProductMaterial rows for each material.  Quantities are
-            # parsed as Decimals to preserve fractional units.
-            for mat in mats_list:
-                material_id = mat.get('material_id')
-                qty = mat.get('qty')
-                try:
-                    mid = int(material_id)
-                    # Accept numeric strings or numbers; fall back to 0 on error
-                    q = Decimal(str(qty))
-                    if q <= 0:
-                        continue
-                except (TypeError, ValueError, InvalidOperation):
-                    continue
-                try:
-                    material_obj = Material.objects.get(pk=mid)
-                except Material.DoesNotExist:
-                    continue
-                ProductMaterial.objects.create(product=product, material=material_obj, qty=q)
+            # Save the BOM rows in one set-based pass (inventory.bom).  Invalid
+            # part/material ids or quantities are skipped; material quantities
+            # are Decimals to preserve fractional units.
+            bom.save_bom(product, bom.components_from_payload(comps_list), bom.materials_from_payload(mats_list))
 
             messages.success(request, 'محصول با موفقیت ایجاد شد.')
             return redirect('inventory:products_list')
@@ -865,12 +773,7 @@ def products_add(request):
 
     # Build parts_by_model mapping to drive the client‑side component picker.
     try:
-        parts_by_model: Dict[str, List[Dict[str, str]]] = {}
-        for m in ProductModel.objects.all().order_by('name'):
-            parts_by_model[m.name] = [
-                {"id": p.id, "name": p.name}
-                for p in m.parts.all().order_by('name')
-            ]
+        parts_by_model: Dict[str, List[Dict[str, str]]] = catalog.parts_by_model()
     except Exception:
         parts_by_model = {}
 
@@ -942,55 +845,9 @@ def products_edit(request, pk: int):
             except Exception:
                 mats_list = []
 
-            # Build a map of part_id -> qty for easy lookup and deduplication
-            comp_map = {}
-            for comp in comps_list:
-                try:
-                    pid = int(comp.get('part_id'))
-                    q = int(comp.get('qty'))
-                    if q < 1:
-                        continue
-                    comp_map[pid] = q
-                except (TypeError, ValueError):
-                    continue
-            # Delete BOM components not present in the submitted list
-            ProductComponent.objects.filter(product=product).exclude(part_id__in=comp_map.keys()).delete()
-            # Upsert each component
-            for pid, q in comp_map.items():
-                try:
-                    part_obj = Part.objects.get(pk=pid)
-                except Part.DoesNotExist:
-                    continue
-                ProductComponent.objects.update_or_create(
-                    product=product,
-                    part=part_obj,
-                    defaults={'qty': q},
-                )
-
-            # Build a map of material_id -> qty for materials
-            mat_map = {}
-            for mat in mats_list:
-                try:
-                    mid = int(mat.get('material_id'))
-                    q = Decimal(str(mat.get('qty')))
-                    if q <= 0:
-                        continue
-                    mat_map[mid] = q
-                except (TypeError, ValueError, InvalidOperation):
-                    continue
-            # Delete material BOM rows not present
-            ProductMaterial.objects.filter(product=product).exclude(material_id__in=mat_map.keys()).delete()
-            # Upsert each material
-            for mid, q in mat_map.items():
-                try:
-                    material_obj = Material.objects.get(pk=mid)
-                except Material.DoesNotExist:
-                    continue
-                ProductMaterial.objects.update_or_create(
-                    product=product,
-                    material=material_obj,
-                    defaults={'qty': q},
-                )
+            # Diff the submitted BOM against the stored rows and write only the
+            # changes: inserts, quantity updates and removals in bulk (inventory.bom)
+            bom.save_bom(product, bom.components_from_payload(comps_list), bom.materials_from_payload(mats_list))
 
             messages.success(request, 'تغییرات محصول ذخیره شد.')
             return redirect('inventory:products_list')
@@ -999,12 +856,7 @@ def products_edit(request, pk: int):
 
     # Build parts_by_model mapping
     try:
-        parts_by_model: Dict[str, List[Dict[str, str]]] = {}
-        for m in ProductModel.objects.all().order_by('name'):
-            parts_by_model[m.name] = [
-                {"id": p.id, "name": p.name}
-                for p in m.parts.all().order_by('name')
-            ]
+        parts_by_model: Dict[str, List[Dict[str, str]]] = catalog.parts_by_model()
     except Exception:
         parts_by_model = {}
 
@@ -1033,6 +885,12 @@ def products_edit(request, pk: int):
     initial_components_json = json.dumps(initial_components, ensure_ascii=False)
     initial_materials_json = json.dumps(initial_materials, ensure_ascii=False)
 
+    # Products of the same model whose BOM can be copied into this one
+    copy_sources = list(
+        Product.objects.filter(product_model_id=obj.product_model_id).exclude(pk=obj.pk)
+        .order_by('name').values_list('pk', 'name')
+    )
+
     return render(request, 'inventory/products_form.html', {
         'form': form,
         'is_editing': True,
@@ -1041,9 +899,67 @@ def products_edit(request, pk: int):
         'materials_json': materials_json,
         'initial_components_json': initial_components_json,
         'initial_materials_json': initial_materials_json,
+        'copy_sources': copy_sources,
     })
 
 
+@login_required
+@user_passes_test(is_manager)
+@require_POST
+def products_bom_import(request, pk: int):
+    """Replace a product's BOM with the rows of an uploaded XLSX/CSV file.
+
+    Columns: نوع (قطعه/ماده), نام, مقدار.  Parts are matched by name within
+    the product's model.  The import is all-or-nothing: any invalid row is
+    reported and nothing is saved.
+    """
+    product = get_object_or_404(Product, pk=pk)
+    upload = request.FILES.get('bom_file')
+    if not upload:
+        messages.error(request, 'فایلی برای ورود انتخاب نشده است.')
+        return redirect('inventory:products_edit', pk=pk)
+    try:
+        rows = bom.parse_upload(upload)
+    except bom.BomError as exc:
+        messages.error(request, str(exc))
+        return redirect('inventory:products_edit', pk=pk)
+    except ImportError:
+        return HttpResponseServerError("کتابخانه openpyxl نصب نشده است؛ لطفاً با مدیر سیستم تماس بگیرید.")
+
+    parts, materials, errors = bom.resolve_rows(product, rows)
+    if errors:
+        for error in errors[:10]:
+            messages.error(request, error)
+        if len(errors) > 10:
+            messages.error(request, f'و {len(errors) - 10} خطای دیگر.')
+        return redirect('inventory:products_edit', pk=pk)
+    change = bom.save_bom(product, parts, materials)
+    messages.success(request, change.message())
+    return redirect('inventory:products_edit', pk=pk)
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_POST
+def products_bom_copy(request, pk: int):
+    """Replace a product's BOM with a copy of another product's BOM."""
+    product = get_object_or_404(Product, pk=pk)
+    try:
+        source = Product.objects.get(pk=int(request.POST.get('source') or 0))
+    except (Product.DoesNotExist, TypeError, ValueError):
+        messages.error(request, 'محصول مبدأ یافت نشد.')
+        return redirect('inventory:products_edit', pk=pk)
+    try:
+        change = bom.copy_bom(source, product)
+    except bom.BomError as exc:
+        messages.error(request, str(exc))
+        return redirect('inventory:products_edit', pk=pk)
+    messages.success(request, change.message())
+    if change.skipped:
+        messages.warning(request, f'{change.skipped} قطعه از مدل دیگری بود و کپی نشد.')
+    return redirect('inventory:products_edit', pk=pk)
+
+
 @login_required
 @user_passes_test(is_manager)
 def products_delete(request, pk: int):
@@ -1220,3 +1136,160 @@ def model_bulk_delete_view(request):
     else:
         messages.info(request, "هیچ مدلی انتخاب نشده بود.")
     return redirect('inventory:models_list')
+
+
+# ==================================================
+# Stock as of a date (from the production logs)
+# ==================================================
+ASOF_PART_HEADERS = ['نام قطعه', 'مدل', 'موجودی برش', 'موجودی سی‌ان‌سی و ابزار']
+ASOF_MATERIAL_HEADERS = ['نام ماده', 'مقدار', 'واحد']
+
+
+def _asof_params(request):
+    """English: (jdate, hide_zero) from the query string; defaults to today, zero rows hidden."""
+    import jdatetime
+    from inventory.stock_asof import parse_jalali_date
+
+    jdate = parse_jalali_date(request.GET.get('date')) or jdatetime.date.today()
+    hide_zero = request.GET.get('hide_zero', '1') != '0'
+    return jdate, hide_zero
+
+
+@login_required
+@user_passes_test(is_manager)
+def stock_as_of_view(request):
+    """Stock of parts, product sections and materials at the end of a Jalali date."""
+    from inventory.stock_asof import product_bucket_labels, stock_as_of
+
+    jdate, hide_zero = _asof_params(request)
+    report = stock_as_of(jdate, hide_zero=hide_zero)
+    buckets = product_bucket_labels()
+    products = [{'row': r, 'values': [r[b] for b, _ in buckets]} for r in report.products]
+    return render(request, 'inventory/stock_as_of.html', {
+        'report': report,
+        'date_value': jdate.strftime('%Y/%m/%d'),
+        'hide_zero': hide_zero,
+        'product_headers': [label for _, label in buckets],
+        'products': products,
+    })
+
+
+@login_required
+@user_passes_test(is_manager)
+def stock_as_of_export_xlsx(request):
+    """Stream the as-of stock as a three-sheet XLSX (parts, products, materials)."""
+    from inventory.stock_asof import product_bucket_labels, stock_as_of
+    from production_line import ledger as stock_ledger
+    try:
+        from utils.xlsx import build_streaming_workbook_response
+    except Exception:
+        return HttpResponseServerError("کتابخانه openpyxl نصب نشده است؛ لطفاً با مدیر سیستم تماس بگیرید.")
+
+    jdate, hide_zero = _asof_params(request)
+    report = stock_as_of(jdate, hide_zero=hide_zero)
+    buckets = product_bucket_labels()
+    date_text = jdate.strftime('%Y/%m/%d')
+    sheets = [
+        ('قطعات', ASOF_PART_HEADERS,
+         ([r['name'], r['model']] + [r[b] for b in stock_ledger.PART_BUCKETS] for r in report.parts)),
+        ('محصولات', ['نام محصول'] + [label for _, label in buckets],
+         ([r['name']] + [r[b] for b, _ in buckets] for r in report.products)),
+        ('مواد اولیه', ASOF_MATERIAL_HEADERS,
+         ([r['name'], r['quantity'], r['unit']] for r in report.materials)),
+    ]
+    return build_streaming_workbook_response(
+        sheets=sheets,
+        filename=f"stock_as_of_{date_text.replace('/', '-')}.xlsx",
+        report_title=f"موجودی انبار در پایان {date_text}",
+        column_widths=[30, 18, 18, 18, 18, 18, 18, 18],
+    )
+
+
+@login_required
+@user_passes_test(is_manager)
+def stock_history_view(request):
+    """Production logs that moved one stock bucket, with the balance after each."""
+    import datetime
+
+    import jdatetime
+    from inventory.stock_asof import StockAsOfError, item_history, parse_jalali_date, product_bucket_labels
+    from production_line import ledger as stock_ledger
+    from production_line.models import StockMovement
+
+    item_type = request.GET.get('item') or StockMovement.ITEM_PART
+    buckets_by_type = {
+        StockMovement.ITEM_PART: [(b, str(Part._meta.get_field(b).verbose_name)) for b in stock_ledger.PART_BUCKETS],
+        StockMovement.ITEM_PRODUCT: product_bucket_labels(),
+        StockMovement.ITEM_MATERIAL: [('quantity', 'مقدار')],
+    }
+    if item_type not in buckets_by_type:
+        return HttpResponseBadRequest('Invalid item')
+    try:
+        item_id = int(request.GET.get('id') or 0)
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest('Invalid id')
+    buckets = buckets_by_type[item_type]
+    bucket = request.GET.get('bucket') or buckets[0][0]
+    if bucket not in dict(buckets):
+        return HttpResponseBadRequest('Invalid bucket')
+
+    owner = {StockMovement.ITEM_PART: Part, StockMovement.ITEM_PRODUCT: Product, StockMovement.ITEM_MATERIAL: Material}[item_type]
+    item = get_object_or_404(owner, pk=item_id)
+    date_to = parse_jalali_date(request.GET.get('date_to')) or jdatetime.date.today()
+    date_from = parse_jalali_date(request.GET.get('date_from')) or (date_to - datetime.timedelta(days=30))
+
+    rows, error = [], ''
+    try:
+        rows = item_history(item_type, item_id, bucket, jdate_from=date_from, jdate_to=date_to)
+    except StockAsOfError as e:
+        error = str(e)
+    for row in rows:
+        row['jdate'] = row['jdate'].strftime('%Y/%m/%d')
+    return render(request, 'inventory/stock_history.html', {
+        'item': item,
+        'item_type': item_type,
+        'bucket': bucket,
+        'buckets': buckets,
+        'rows': rows,
+        'error': error,
+        'date_from': date_from.strftime('%Y/%m/%d'),
+        'date_to': date_to.strftime('%Y/%m/%d'),
+    })
+
+
+@login_required
+def catalog_snapshot(request):
+    """Models, products and parts as one JSON document for the cascading selectors.
+
+    Answers ``304`` when ``If-None-Match`` carries the current ETag (see
+    ``inventory.catalog``).
+    """
+    snap = catalog.snapshot()
+    if snap['etag'] in (request.headers.get('If-None-Match') or ''):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(snap['body'], content_type='application/json; charset=utf-8')
+    response['ETag'] = snap['etag']
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@user_passes_test(is_manager)
+def low_stock_alerts(request):
+    """Low-stock parts, materials and product stocks as JSON (see ``inventory.low_stock``).
+
+    ``?since=<cursor>`` adds the items whose flag flipped after the cursor
+    returned by the previous call; ``?limit=`` caps the items per kind.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit') or 200), 1000))
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest('Invalid limit')
+    try:
+        data = low_stock.alerts(since=request.GET.get('since'), limit=limit)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -12,4 +12,10 @@ class JobsConfig(AppConfig):
     """
 
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'jobs'
\ No newline at end of file
+    name = 'jobs'
+
+    def ready(self):
+        # English: every log write refreshes the job's progress columns.
+        from jobs import progress
+
+        progress.connect_signals()
@@ -0,0 +1,457 @@
+"""Bulk job creation from a number range or an uploaded CSV/XLSX file.
+
+The flow is parse -> validate -> create:
+
+- :func:`expand_range` / :func:`parse_upload` produce :class:`JobRow` items;
+- :func:`validate_rows` resolves products, sections and labels and checks
+  every job number against existing jobs with set-based queries, collecting
+  a row-level error report instead of stopping at the first problem;
+- :func:`create_jobs` inserts everything with ``bulk_create`` inside one
+  transaction and applies the label stock side effects
+  (``jobs.models.label_side_effects``) as one aggregated ``F()`` update per
+  product instead of one post_save signal per job.
+
+The import is all-or-nothing: callers only reach :func:`create_jobs` when
+validation returned no errors.  Uploaded rows are parsed without the form
+defaults and kept in a signed form field (:func:`dump_pending`) while the
+user confirms shortages, so the confirmation does not need the file again.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+
+from inventory import low_stock
+from inventory.models import Product, ProductMaterial
+from jobs.models import ProductionJob, label_side_effects
+from jobs.planner import SECTION_LABEL_MAP
+from utils.normalize import collapse_whitespace, to_ascii_digits_many
+
+BULK_JOB_LIMIT = 10000
+# Job numbers checked per existence query (stays under SQLite's variable limit).
+EXISTS_CHUNK_SIZE = 5000
+BULK_CREATE_BATCH_SIZE = 500
+PENDING_SALT = 'jobs.bulk.pending'
+# Seconds a shortage confirmation may take before the file must be sent again.
+PENDING_MAX_AGE = 60 * 60
+
+# Header aliases accepted in uploaded files (lower-cased, whitespace collapsed).
+COLUMN_ALIASES = {
+    'job_number': {'job_number', 'job', 'شماره کار'},
+    'product': {'product', 'product_id', 'محصول', 'نام محصول'},
+    'model': {'model', 'مدل'},
+    'allowed_sections': {'allowed_sections', 'sections', 'بخش‌های مجاز', 'بخش های مجاز', 'بخش‌ها'},
+    'job_label': {'job_label', 'label', 'برچسب', 'برچسب کار'},
+    'deposit_account': {'deposit_account', 'طرف حساب'},
+}
+
+_SECTION_SPLIT_RE = re.compile(r'[,،;|\n]+')
+_LABEL_LOOKUP = {
+    **{slug: slug for slug, _ in ProductionJob.LABEL_CHOICES},
+    **{label: slug for slug, label in ProductionJob.LABEL_CHOICES},
+}
+_SECTION_LOOKUP = {
+    **{slug: slug for slug in SECTION_LABEL_MAP},
+    **{str(label): slug for slug, label in SECTION_LABEL_MAP.items()},
+}
+
+
+class BulkJobError(Exception):
+    """Raised for problems with the whole request (bad file, too many rows)."""
+
+
+@dataclass
+class JobRow:
+    """One job to create; ``row`` is the 1-based source line for error reports."""
+
+    row: int
+    job_number: str
+    product: str = ''
+    model: str = ''
+    allowed_sections: str = ''
+    job_label: str = ''
+    deposit_account: str = ''
+
+
+@dataclass
+class RowError:
+    row: int
+    job_number: str
+    message: str
+
+
+@dataclass
+class ValidatedJob:
+    row: int
+    job_number: str
+    product: Product
+    allowed_sections: list[str]
+    job_label: str
+    deposit_account: str | None
+
+
+@dataclass
+class BulkValidation:
+    jobs: list[ValidatedJob] = field(default_factory=list)
+    errors: list[RowError] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.jobs) and not self.errors
+
+
+def initial_status_for_label(job_label: str) -> str:
+    """Initial job status for a label (same rules as the single create form).
+
+    'repaired' jobs are still in progress until the last allowed section is
+    logged, so they start as in_progress like deposit jobs.
+    """
+    if job_label in ('in_progress', 'deposit', 'repaired'):
+        return 'in_progress'
+    if job_label == 'warranty':
+        return 'warranty'
+    # completed/scrapped set explicit closure state
+    return job_label
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def expand_range(prefix: str, start: int, end: int, *, width: int | None = None, **defaults) -> list[JobRow]:
+    """Return rows for ``prefix + start .. prefix + end`` (inclusive).
+
+    ``width`` zero-pads the number (``width=4`` -> ``A0007``).
+    """
+    if end < start:
+        raise BulkJobError("پایان بازه باید بزرگ‌تر یا مساوی شروع باشد.")
+    if end - start + 1 > BULK_JOB_LIMIT:
+        raise BulkJobError(f"حداکثر {BULK_JOB_LIMIT} کار در هر بار قابل ثبت است.")
+    prefix = (prefix or '').strip()
+    rows = []
+    for idx, number in enumerate(range(start, end + 1), start=1):
+        digits = str(number).zfill(width) if width else str(number)
+        rows.append(JobRow(row=idx, job_number=f"{prefix}{digits}", **defaults))
+    return rows
+
+
+def _canonical_header(value) -> str | None:
+    key = collapse_whitespace(str(value or '')).lower()
+    for name, aliases in COLUMN_ALIASES.items():
+        if key in aliases:
+            return name
+    return None
+
+
+def _rows_from_table(table, **defaults) -> list[JobRow]:
+    iterator = iter(table)
+    header = next(iterator, None)
+    if not header:
+        raise BulkJobError("فایل خالی است.")
+    columns = [_canonical_header(h) for h in header]
+    if 'job_number' not in columns:
+        raise BulkJobError("ستون «شماره کار» (job_number) در فایل یافت نشد.")
+    rows: list[JobRow] = []
+    for line_no, values in enumerate(iterator, start=2):
+        data = dict(defaults)
+        for name, value in zip(columns, values):
+            if name and value not in (None, ''):
+                text = str(value).strip()
+                # English: XLSX stores numeric job numbers/ids as floats.
+                if isinstance(value, float) and value.is_integer():
+                    text = str(int(value))
+                data[name] = text
+        if not any(str(v or '').strip() for v in values):
+            continue
+        rows.append(JobRow(row=line_no, job_number=data.pop('job_number', ''), **data))
+        if len(rows) > BULK_JOB_LIMIT:
+            raise BulkJobError(f"حداکثر {BULK_JOB_LIMIT} کار در هر بار قابل ثبت است.")
+    return rows
+
+
+def with_defaults(rows: list[JobRow], **defaults) -> list[JobRow]:
+    """Copies of ``rows`` with empty columns filled from ``defaults``."""
+    filled = []
+    for r in rows:
+        changes = {name: value for name, value in defaults.items() if value and not getattr(r, name)}
+        filled.append(replace(r, **changes) if changes else r)
+    return filled
+
+
+def dump_pending(rows: list[JobRow]) -> str:
+    """Signed, compressed copy of parsed rows for the shortage confirmation step."""
+    data = [
+        [r.row, r.job_number, r.product, r.model, r.allowed_sections, r.job_label, r.deposit_account]
+        for r in rows
+    ]
+    return signing.dumps(data, salt=PENDING_SALT, compress=True)
+
+
+def load_pending(token: str) -> list[JobRow]:
+    """Rows saved by :func:`dump_pending`; raises :class:`BulkJobError` when invalid or expired."""
+    try:
+        data = signing.loads(token, salt=PENDING_SALT, max_age=PENDING_MAX_AGE)
+        return [JobRow(*item) for item in data]
+    except (signing.BadSignature, TypeError, ValueError):
+        raise BulkJobError("اطلاعات فایل منقضی شده است؛ فایل را دوباره بارگذاری کنید.")
+
+
+def parse_upload(upload, **defaults) -> list[JobRow]:
+    """Read a CSV or XLSX upload into rows; ``defaults`` fill missing columns."""
+    name = (getattr(upload, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        try:
+            wb = load_workbook(upload, read_only=True, data_only=True)
+        except Exception:
+            raise BulkJobError("فایل XLSX قابل خواندن نیست.")
+        try:
+            return _rows_from_table(wb.active.iter_rows(values_only=True), **defaults)
+        finally:
+            wb.close()
+    if name.endswith('.csv'):
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BulkJobError("فایل CSV باید با کدگذاری UTF-8 ذخیره شده باشد.")
+        return _rows_from_table(csv.reader(io.StringIO(text)), **defaults)
+    raise BulkJobError("فقط فایل‌های CSV یا XLSX پشتیبانی می‌شوند.")
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+def _existing_job_numbers(numbers: list[str]) -> set[str]:
+    existing: set[str] = set()
+    for i in range(0, len(numbers), EXISTS_CHUNK_SIZE):
+        chunk = numbers[i:i + EXISTS_CHUNK_SIZE]
+        existing.update(ProductionJob.objects.filter(job_number__in=chunk).values_list('job_number', flat=True))
+    return existing
+
+
+def _load_products(rows: list[JobRow]) -> tuple[dict[int, Product], dict[str, list[Product]]]:
+    ids = {int(r.product) for r in rows if r.product.isdigit()}
+    names = {r.product for r in rows if r.product and not r.product.isdigit()}
+    by_id: dict[int, Product] = {}
+    by_name: dict[str, list[Product]] = defaultdict(list)
+    if not ids and not names:
+        return by_id, by_name
+    qs = (
+        Product.objects.filter(Q(pk__in=ids) | Q(name__in=names))
+        .select_related('product_model')
+        .prefetch_related(Prefetch('material_bom_items', queryset=ProductMaterial.objects.select_related('material')))
+    )
+    for product in qs:
+        by_id[product.pk] = product
+        by_name[product.name].append(product)
+    return by_id, by_name
+
+
+def _parse_sections(raw: str) -> list[str] | None:
+    """Return section slugs, or ``None`` when a token is not a known section."""
+    slugs = []
+    for token in _SECTION_SPLIT_RE.split(raw):
+        token = collapse_whitespace(token)
+        if not token:
+            continue
+        slug = _SECTION_LOOKUP.get(token) or _SECTION_LOOKUP.get(token.lower())
+        if not slug:
+            return None
+        slugs.append(slug)
+    return slugs
+
+
+def validate_rows(rows: list[JobRow]) -> BulkValidation:
+    """Resolve and check ``rows``; every problem is reported with its row."""
+    # Lazy import: jobs.views imports this module.
+    from jobs.views import PRODUCT_SECTION_FLOW, _infer_default_allowed_sections, _ordered_allowed_sections
+
+    result = BulkValidation()
+    if not rows:
+        result.errors.append(RowError(0, '', "هیچ ردیفی برای ثبت یافت نشد."))
+        return result
+    if len(rows) > BULK_JOB_LIMIT:
+        result.errors.append(RowError(0, '', f"حداکثر {BULK_JOB_LIMIT} کار در هر بار قابل ثبت است."))
+        return result
+
+    for r, number in zip(rows, to_ascii_digits_many(r.job_number for r in rows)):
+        r.job_number = number.strip()
+    numbers = [r.job_number for r in rows if r.job_number]
+    existing = _existing_job_numbers(numbers)
+    by_id, by_name = _load_products(rows)
+    product_sections = set(PRODUCT_SECTION_FLOW)
+    inferred: dict[int, list[str]] = {}
+    seen: set[str] = set()
+
+    for r in rows:
+        def _error(message: str) -> None:
+            result.errors.append(RowError(r.row, r.job_number, message))
+
+        if not r.job_number:
+            _error("شماره کار خالی است.")
+            continue
+        if len(r.job_number) > ProductionJob._meta.get_field('job_number').max_length:
+            _error("شماره کار بیش از حد طولانی است.")
+            continue
+        if r.job_number in seen:
+            _error("شماره کار در فایل تکراری است.")
+            continue
+        seen.add(r.job_number)
+        if r.job_number in existing:
+            _error("این شماره کار قبلاً ثبت شده است.")
+            continue
+
+        product = None
+        if r.product.isdigit():
+            product = by_id.get(int(r.product))
+        elif r.product:
+            candidates = by_name.get(r.product, [])
+            if r.model:
+                candidates = [p for p in candidates if p.product_model.name == r.model]
+            if len(candidates) > 1:
+                _error("نام محصول در چند مدل وجود دارد؛ ستون مدل را مشخص کنید.")
+                continue
+            product = candidates[0] if candidates else None
+        if product is None:
+            _error("محصول یافت نشد." if r.product else "محصول مشخص نشده است.")
+            continue
+
+        label_text = collapse_whitespace(r.job_label or 'in_progress')
+        label = _LABEL_LOOKUP.get(label_text) or _LABEL_LOOKUP.get(label_text.lower())
+        if not label:
+            _error("برچسب کار نامعتبر است.")
+            continue
+        deposit_account = (r.deposit_account or '').strip()
+        if label == 'deposit' and not deposit_account:
+            _error("وارد کردن طرف حساب برای امانی الزامی است.")
+            continue
+
+        if r.allowed_sections:
+            sections = _parse_sections(r.allowed_sections)
+            if sections is None or not set(sections) <= product_sections:
+                _error("انتخاب بخش نامعتبر است.")
+                continue
+        else:
+            if product.pk not in inferred:
+                inferred[product.pk] = _infer_default_allowed_sections(product)
+            sections = inferred[product.pk]
+        # Same order/shape the create form posts (product sections in flow order).
+        sections = _ordered_allowed_sections(sections)
+        if not sections:
+            _error("حداقل یک بخش باید انتخاب شود.")
+            continue
+
+        result.jobs.append(ValidatedJob(
+            row=r.row,
+            job_number=r.job_number,
+            product=product,
+            allowed_sections=sections,
+            job_label=label,
+            deposit_account=deposit_account if label == 'deposit' else None,
+        ))
+    return result
+
+
+def shortages_for_jobs(jobs: list[ValidatedJob]) -> list[dict]:
+    """Aggregate BOM shortages for the in-progress jobs of a batch."""
+    from jobs import planner
+
+    candidates = [
+        planner.PlanJob(key=job.row, product_id=job.product.pk, allowed_sections=job.allowed_sections)
+        for job in jobs if job.job_label == 'in_progress'
+    ]
+    if not candidates:
+        return []
+    return planner.plan_shortages(candidates, include_open_jobs=False).aggregate
+
+
+# ---------------------------------------------------------------------------
+# Creation
+# ---------------------------------------------------------------------------
+
+def create_jobs(jobs: list[ValidatedJob]) -> list[ProductionJob]:
+    """Insert ``jobs`` and apply their label stock effects atomically.
+
+    As with single creation, the last job of the batch becomes the default
+    job.  A job number inserted by someone else after :func:`validate_rows`
+    rolls the batch back and raises :class:`BulkJobError`.
+    """
+    from utils.cache import bump_namespace
+
+    now = timezone.now()
+    objs: list[ProductionJob] = []
+    job_deltas: list[dict[str, int]] = []
+    deltas: dict[int, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for job in jobs:
+        status = initial_status_for_label(job.job_label)
+        obj = ProductionJob(
+            job_number=job.job_number,
+            product=job.product,
+            status=status,
+            job_label=job.job_label,
+            deposit_account=job.deposit_account,
+            allowed_sections=job.allowed_sections,
+            finished_at=now if status in ('scrapped', 'completed') else None,
+        )
+        stock_deltas, updates = label_side_effects(job.job_label, job.allowed_sections, obj.current_section)
+        for fname, value in updates.items():
+            setattr(obj, fname, value)
+        for fname, delta in stock_deltas.items():
+            deltas[job.product.pk][fname] += delta
+        objs.append(obj)
+        job_deltas.append(stock_deltas)
+    if objs:
+        objs[-1].is_default = True
+
+    product_ids = {job.product.pk for job in jobs}
+    try:
+        with transaction.atomic():
+            created = _insert(objs, job_deltas, deltas, product_ids)
+    except IntegrityError:
+        taken = sorted(_existing_job_numbers([obj.job_number for obj in objs]))
+        if not taken:
+            raise
+        raise BulkJobError(
+            "هم‌زمان کار دیگری با این شماره‌ها ثبت شد و هیچ کاری ثبت نشد: " + '، '.join(taken[:10])
+        )
+    # bulk_create skips post_save, so invalidate dependent caches explicitly.
+    transaction.on_commit(lambda: bump_namespace('metrics'))
+    return created
+
+
+def _insert(objs, job_deltas, deltas, product_ids) -> list[ProductionJob]:
+    """Insert the jobs, their stock effects and ledger rows (inside ``create_jobs``'s transaction)."""
+    from production_line import ledger
+    from production_line.models import ProductStock, StockMovement
+
+    if any(obj.is_default for obj in objs):
+        ProductionJob.objects.filter(is_default=True).update(is_default=False)
+    created = ProductionJob.objects.bulk_create(objs, batch_size=BULK_CREATE_BATCH_SIZE)
+    # English: the post_save signal creates a stock row for every product
+    # job; do the same once per product.
+    have_stock = set(ProductStock.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+    ProductStock.objects.bulk_create(
+        [ProductStock(product_id=pid) for pid in sorted(product_ids - have_stock)],
+        ignore_conflicts=True,
+    )
+    for product_id, fields in deltas.items():
+        changes = {fname: F(fname) + delta for fname, delta in fields.items() if delta}
+        if changes:
+            ProductStock.objects.filter(product_id=product_id).update(**low_stock.with_flag(ProductStock, changes))
+    # English: update() skips the ledger signals; record one movement per job.
+    with ledger.recording(ledger.REASON_BULK_JOBS):
+        for obj, stock_deltas in zip(created, job_deltas):
+            for fname, delta in stock_deltas.items():
+                ledger.record(StockMovement.ITEM_PRODUCT, obj.product_id, fname, delta, job=obj)
+    return created
@@ -1,8 +1,8 @@
 # jobs/forms.py
 from django import forms
-from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
+from inventory import catalog
 from inventory.models import Part, Product
 from production_line.models import ProductionLog, SectionChoices
 from production_line.utils import (
@@ -20,11 +20,11 @@ class WorkEntryForm(forms.ModelForm):
         label=_("مدل"),
         widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_model", "required": "required"}),
     )
-    part = forms.ModelChoiceField(
+    part = catalog.CatalogChoiceField(
         queryset=Part.objects.none(), required=False, label=_("قطعه"),
         empty_label=" ", widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_part"}),
     )
-    product = forms.ModelChoiceField(
+    product = catalog.CatalogChoiceField(
         queryset=Product.objects.none(), required=False, label=_("محصول"),
         empty_label="انتخاب محصول", widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_product"}),
     )
@@ -63,10 +63,9 @@ class WorkEntryForm(forms.ModelForm):
 
         # Load ProductModel choices
         try:
-            from inventory.models import ProductModel
-            models_qs = ProductModel.objects.all().order_by('name')
-            self.fields['model'].choices = [('', 'انتخاب مدل')] + [(m.name, m.name) for m in models_qs]
-            if not models_qs.exists():
+            model_choices = catalog.model_choices()
+            self.fields['model'].choices = [('', 'انتخاب مدل')] + model_choices
+            if not model_choices:
                 self.fields['model'].widget.attrs['disabled'] = 'disabled'
         except Exception:
             self.fields['model'].choices = [('', 'انتخاب مدل')]
@@ -74,52 +73,26 @@ class WorkEntryForm(forms.ModelForm):
 
         selected_model = (self.data.get('model') if self.is_bound else self.initial.get('model')) or None
 
-        def expand_part_queryset(qs):
-            posted_id = (self.data.get('part') if self.is_bound else self.initial.get('part'))
-            if posted_id:
-                try:
-                    return Part.objects.filter(Q(pk=posted_id) | Q(pk__in=qs.values('pk'))).order_by('name')
-                except Exception:
-                    return qs
-            return qs
-
-        def expand_product_queryset(qs):
-            posted_id = (self.data.get('product') if self.is_bound else self.initial.get('product'))
-            if posted_id:
-                try:
-                    return Product.objects.filter(Q(pk=posted_id) | Q(pk__in=qs.values('pk'))).order_by('name')
-                except Exception:
-                    return qs
-            return qs
+        def posted(name):
+            value = self.data.get(name) if self.is_bound else self.initial.get(name)
+            return getattr(value, 'pk', value)
 
         if is_parts_based(section):
-            qs = Part.objects.none()
-            if selected_model:
-                qs = Part.objects.filter(product_model__name=selected_model).order_by('name')
-            self.fields["part"].queryset = expand_part_queryset(qs)
-            try:
-                if qs.count() == 0:
-                    self.fields["part"].widget.attrs['disabled'] = 'disabled'
-                else:
-                    self.fields["part"].widget.attrs.pop('disabled', None)
-            except Exception:
-                pass
+            count = catalog.limit_field(self.fields["part"], 'parts', selected_model, posted_id=posted('part'))
+            if count == 0:
+                self.fields["part"].widget.attrs['disabled'] = 'disabled'
+            else:
+                self.fields["part"].widget.attrs.pop('disabled', None)
             self.fields["product"].widget = forms.HiddenInput()
             self.fields["job_number"].widget = forms.HiddenInput()
             self.fields["is_scrap"].widget = forms.HiddenInput()
             self.fields["is_external"].widget = forms.HiddenInput()
         elif is_products_based(section):
-            qs = Product.objects.none()
-            if selected_model:
-                qs = Product.objects.filter(product_model__name=selected_model).order_by('name')
-            self.fields["product"].queryset = expand_product_queryset(qs)
-            try:
-                if qs.count() == 0:
-                    self.fields["product"].widget.attrs['disabled'] = 'disabled'
-                else:
-                    self.fields["product"].widget.attrs.pop('disabled', None)
-            except Exception:
-                pass
+            count = catalog.limit_field(self.fields["product"], 'products', selected_model, posted_id=posted('product'))
+            if count == 0:
+                self.fields["product"].widget.attrs['disabled'] = 'disabled'
+            else:
+                self.fields["product"].widget.attrs.pop('disabled', None)
             self.fields["part"].widget = forms.HiddenInput()
             self.fields["produced_qty"].widget = forms.HiddenInput()
             self.fields["scrap_qty"].widget = forms.HiddenInput()
@@ -155,7 +128,7 @@ class CreateJobForm(forms.Form):
         choices=[('', 'انتخاب مدل')], label=_("مدل"),
         widget=forms.Select(attrs={"class": SELECT_CLS, "id": "create_job_model", "required": "required"}),
     )
-    product = forms.ModelChoiceField(
+    product = catalog.CatalogChoiceField(
         queryset=Product.objects.none(), required=True, label=_("محصول"),
         widget=forms.Select(attrs={"class": SELECT_CLS, "id": "create_job_product"}),
     )
@@ -187,10 +160,9 @@ class CreateJobForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         try:
-            from inventory.models import ProductModel
-            models_qs = ProductModel.objects.all().order_by('name')
-            self.fields['model'].choices = [('', 'انتخاب مدل')] + [(m.name, m.name) for m in models_qs]
-            if not models_qs.exists():
+            model_choices = catalog.model_choices()
+            self.fields['model'].choices = [('', 'انتخاب مدل')] + model_choices
+            if not model_choices:
                 self.fields['model'].widget.attrs['disabled'] = 'disabled'
         except Exception:
             self.fields['model'].choices = [('', 'انتخاب مدل')]
@@ -198,26 +170,14 @@ class CreateJobForm(forms.Form):
 
         selected_model = (self.data.get('model') if self.is_bound else self.initial.get('model')) or None
 
-        def expand_product_queryset(qs):
-            posted_id = (self.data.get('product') if self.is_bound else self.initial.get('product'))
-            if posted_id:
-                try:
-                    return Product.objects.filter(Q(pk=posted_id) | Q(pk__in=qs.values('pk'))).order_by('name')
-                except Exception:
-                    return qs
-            return qs
-
-        qs = Product.objects.none()
-        if selected_model:
-            qs = Product.objects.filter(product_model__name=selected_model).order_by('name')
-        self.fields['product'].queryset = expand_product_queryset(qs)
-        try:
-            if qs.count() == 0:
-                self.fields['product'].widget.attrs['disabled'] = 'disabled'
-            else:
-                self.fields['product'].widget.attrs.pop('disabled', None)
-        except Exception:
-            pass
+        posted_id = self.data.get('product') if self.is_bound else self.initial.get('product')
+        count = catalog.limit_field(
+            self.fields['product'], 'products', selected_model, posted_id=getattr(posted_id, 'pk', posted_id),
+        )
+        if count == 0:
+            self.fields['product'].widget.attrs['disabled'] = 'disabled'
+        else:
+            self.fields['product'].widget.attrs.pop('disabled', None)
         try:
             self.fields['product'].empty_label = 'انتخاب محصول'
         except Exception:
@@ -281,3 +241,68 @@ class CreateJobForm(forms.Form):
         if cleaned.get('job_label') == 'deposit' and not (cleaned.get('deposit_account') or '').strip():
             self.add_error('deposit_account', _("وارد کردن طرف حساب برای امانی الزامی است."))
         return cleaned
+
+
+class BulkJobForm(forms.Form):
+    """Create many jobs at once from a number range or a CSV/XLSX file.
+
+    Product/sections/label entered here are defaults; columns present in an
+    uploaded file override them per row.  Empty allowed sections are inferred
+    per product from its BOM.
+    """
+    prefix = forms.CharField(
+        required=False, label=_("پیشوند شماره کار"),
+        widget=forms.TextInput(attrs={"class": INPUT_CLS, "placeholder": "مثلاً A-"}),
+    )
+    start = forms.IntegerField(
+        required=False, min_value=0, label=_("از شماره"),
+        widget=forms.NumberInput(attrs={"class": INPUT_CLS}),
+    )
+    end = forms.IntegerField(
+        required=False, min_value=0, label=_("تا شماره"),
+        widget=forms.NumberInput(attrs={"class": INPUT_CLS}),
+    )
+    width = forms.IntegerField(
+        required=False, min_value=0, max_value=12, label=_("تعداد رقم (صفر پیشرو)"),
+        widget=forms.NumberInput(attrs={"class": INPUT_CLS}),
+    )
+    upload = forms.FileField(
+        required=False, label=_("فایل CSV / XLSX"),
+        widget=forms.ClearableFileInput(attrs={"class": INPUT_CLS, "accept": ".csv,.xlsx"}),
+    )
+    product = catalog.CatalogChoiceField(
+        queryset=Product.objects.none(), required=False, label=_("محصول"),
+        empty_label="انتخاب محصول", widget=forms.Select(attrs={"class": SELECT_CLS}),
+    )
+    allowed_sections = forms.MultipleChoiceField(
+        choices=CreateJobForm.PRODUCT_SECTION_CHOICES, label=_("بخش‌های مجاز"),
+        widget=forms.CheckboxSelectMultiple, required=False,
+    )
+    job_label = forms.ChoiceField(
+        choices=CreateJobForm._PJ.LABEL_CHOICES, label=_("برچسب کار"),
+        widget=forms.RadioSelect, initial='in_progress',
+    )
+    deposit_account = forms.CharField(
+        required=False, label=_("طرف حساب"),
+        widget=forms.TextInput(attrs={"class": INPUT_CLS, "placeholder": "نام طرف حساب"}),
+    )
+    # Signed rows of the last upload (jobs.bulk.dump_pending), re-posted when
+    # the user confirms shortages so the file is not needed again.
+    pending_rows = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        catalog.limit_field(self.fields['product'], 'products', all_models=True)
+
+    def clean(self):
+        cleaned = super().clean()
+        has_file = bool(cleaned.get('upload') or cleaned.get('pending_rows'))
+        has_range = cleaned.get('start') is not None or cleaned.get('end') is not None
+        if not has_file and not has_range:
+            raise forms.ValidationError(_("بازه شماره کار یا فایل ورودی را مشخص کنید."))
+        if has_range and not has_file:
+            if cleaned.get('start') is None or cleaned.get('end') is None:
+                raise forms.ValidationError(_("شروع و پایان بازه هر دو لازم است."))
+            if not cleaned.get('product'):
+                self.add_error('product', _("برای ثبت بازه‌ای، محصول الزامی است."))
+        return cleaned
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from jobs import progress
+from jobs.models import ProductionJob
+
+
+class Command(BaseCommand):
+    help = "Compare the job progress columns with the production logs and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help="Drifting jobs to print (0 = all).")
+        parser.add_argument('--repair', action='store_true',
+                            help="Overwrite drifting columns with the values computed from the logs.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            drift = list(progress.drift())
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Checked the job progress columns in {elapsed:.2f}s: {len(drift)} drifting job(s).")
+
+            limit = options['limit']
+            for job_id, stored, expected in drift[:limit or None]:
+                changed = ', '.join(
+                    f"{name}: {stored[name]!r} -> {expected[name]!r}"
+                    for name in progress.PROGRESS_FIELDS if stored[name] != expected[name]
+                )
+                self.stdout.write(f"  job#{job_id}: {changed}")
+            if limit and len(drift) > limit:
+                self.stdout.write(f"  ... {len(drift) - limit} more")
+
+            if drift and options['repair']:
+                for job_id, _stored, expected in drift:
+                    ProductionJob.objects.filter(pk=job_id).update(**expected)
+                self.stdout.write(self.style.WARNING(f"Repaired {len(drift)} job(s)."))
+            elif drift:
+                raise CommandError("Job progress columns and production logs disagree; rerun with --repair.")
+        self.stdout.write(self.style.SUCCESS("Done."))
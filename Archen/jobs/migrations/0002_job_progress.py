@@ -0,0 +1,75 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:31
+
+from django.db import migrations, models
+
+
+def backfill_progress(apps, schema_editor):
+    """Fill the progress columns from the existing logs (streamed in job order)."""
+    ProductionJob = apps.get_model('jobs', 'ProductionJob')
+    ProductionLog = apps.get_model('production_line', 'ProductionLog')
+    fields = ['logged_sections', 'last_logged_section', 'last_logged_at', 'produced_total', 'scrap_total']
+    batch = []
+
+    def flush():
+        ProductionJob.objects.bulk_update(batch, fields)
+        batch.clear()
+
+    current = None
+    rows = (
+        ProductionLog.objects.filter(job__isnull=False)
+        .order_by('job_id', 'logged_at', 'id')
+        .values_list('job_id', 'section', 'logged_at', 'produced_qty', 'scrap_qty')
+        .iterator(chunk_size=2000)
+    )
+    for job_id, section, logged_at, produced, scrap in rows:
+        if current is None or current.pk != job_id:
+            if len(batch) >= 500:
+                flush()
+            current = ProductionJob(pk=job_id, logged_sections=[], produced_total=0, scrap_total=0)
+            batch.append(current)
+        slug = str(section or '').strip().lower()
+        if slug and slug not in current.logged_sections:
+            current.logged_sections.append(slug)
+        current.last_logged_section = slug or None
+        current.last_logged_at = logged_at
+        current.produced_total += produced or 0
+        current.scrap_total += scrap or 0
+    if batch:
+        flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+        ('production_line', '0006_productionlog_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productionjob',
+            name='last_logged_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productionjob',
+            name='last_logged_section',
+            field=models.CharField(blank=True, choices=[('cutting', 'برش'), ('cnc_tools', 'سی\u200cان\u200cسی و ابزار'), ('undercoating', 'رنگ زیرکار'), ('painting', 'رنگ'), ('workpage', 'صفحه\u200cکاری'), ('sewing', 'خیاطی'), ('upholstery', 'رویه\u200cکوبی'), ('assembly', 'مونتاژ'), ('packaging', 'بسته\u200cبندی')], editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='productionjob',
+            name='logged_sections',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productionjob',
+            name='produced_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productionjob',
+            name='scrap_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
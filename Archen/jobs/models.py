@@ -68,9 +68,33 @@ class ProductionJob(models.Model):
     allowed_sections = models.JSONField(default=list, blank=True)
     is_default = models.BooleanField(default=False)
 
+    # Progress summary of the job's logs, maintained by ``jobs.progress``
+    logged_sections = models.JSONField(default=list, blank=True, editable=False)
+    last_logged_section = models.CharField(max_length=20, choices=SectionChoices.choices, blank=True, null=True,
+                                           editable=False)
+    last_logged_at = models.DateTimeField(null=True, blank=True, editable=False)
+    produced_total = models.PositiveIntegerField(default=0, editable=False)
+    scrap_total = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self) -> str:
         return f"Job {self.job_number} ({self.get_status_display()})"
 
+    def save(self, *args, **kwargs):
+        """Save the job without overwriting the progress columns.
+
+        Those columns are written by ``jobs.progress.refresh`` only; a full
+        save of an instance loaded before a log was written would otherwise
+        put the stale values back.
+        """
+        from jobs.progress import PROGRESS_FIELDS
+
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in PROGRESS_FIELDS
+            ]
+        return super().save(*args, **kwargs)
+
     # ------------------------------------------------------------------
     # Process flow helpers
     # ------------------------------------------------------------------
@@ -145,77 +169,93 @@ class ProductionJob(models.Model):
 # ----------------------------------------------------------------------------
 # Signals to apply label side-effects on job creation
 # ----------------------------------------------------------------------------
-@receiver(post_save, sender='jobs.ProductionJob')
-def apply_label_side_effects(sender, instance, created, **kwargs):
-    """Apply stock movements on creation for deposit/scrapped/completed labels.
+LABEL_STOCK_FIELD_MAP = {
+    'assembly': 'stock_assembly',
+    'workpage': 'stock_workpage',
+    'undercoating': 'stock_undercoating',
+    'painting': 'stock_painting',
+    'sewing': 'stock_sewing',
+    'upholstery': 'stock_upholstery',
+    'packaging': 'stock_packaging',
+}
+
+
+def label_side_effects(job_label: str, allowed_sections, current_section: str | None = None) -> tuple[dict[str, int], dict]:
+    """Return ``(stock_deltas, job_updates)`` for a job created with ``job_label``.
 
     - deposit (امانی): closed; add 1 to the single allowed section.
     - scrapped (اسقاط): closed; remove 1 from previous allowed section.
     - completed (تولید شده): closed; add 1 to packaging and -1 from previous.
+
+    ``stock_deltas`` maps ``ProductStock`` field names to increments and
+    ``job_updates`` holds job fields to set.  Shared by the post_save signal
+    and bulk creation (``jobs.bulk``), which aggregates deltas per product.
+    """
+    label = str(job_label or '')
+    allowed = list(allowed_sections or [])
+
+    def _field_for(section_slug: str | None) -> str | None:
+        return LABEL_STOCK_FIELD_MAP.get((section_slug or '').lower())
+
+    deltas: dict[str, int] = {}
+    updates: dict = {}
+    if label == 'deposit':
+        # Closed deposit: add to the single allowed section
+        if len(allowed) == 1:
+            fname = _field_for(allowed[0])
+            if fname:
+                deltas[fname] = 1
+                # label dictates closure but status remains traceable
+                updates = {'status': 'in_progress', 'finished_at': timezone.now()}
+    elif label == 'scrapped':
+        # Remove from previous allowed section (if any)
+        if len(allowed) >= 1:
+            prev = allowed[-1] if len(allowed) == 1 else allowed[-2]
+            fname = _field_for(prev)
+            if fname:
+                deltas[fname] = -1
+                updates = {'status': 'scrapped', 'finished_at': timezone.now()}
+    elif label == 'completed':
+        # Add to packaging and subtract from previous allowed (if present)
+        fname_pack = _field_for('packaging')
+        deltas[fname_pack] = 1
+        prev = allowed[-1] if allowed else current_section
+        prev_fname = _field_for(prev) if prev else None
+        if prev_fname and prev_fname != fname_pack:
+            deltas[prev_fname] = -1
+        updates = {'status': 'completed', 'finished_at': timezone.now()}
+    return deltas, updates
+
+
+@receiver(post_save, sender='jobs.ProductionJob')
+def apply_label_side_effects(sender, instance, created, **kwargs):
+    """Apply stock movements on creation for deposit/scrapped/completed labels.
+
+    See :func:`label_side_effects` for the rules per label.
     """
     try:
         job = instance
         if not created:
             return
-        label = str(getattr(job, 'job_label', '') or '')
-        allowed = list(getattr(job, 'allowed_sections', []) or [])
-        # Only act if a product job and allowed sections is a non-empty list
+        # Only act if a product job
         if not job.product_id:
             return
-        from production_line.models import ProductStock, SectionChoices
+        from production_line.models import ProductStock
         stock, _ = ProductStock.objects.get_or_create(product=job.product)
 
-        def _field_for(section_slug: str) -> str | None:
-            mapping = {
-                'assembly': 'stock_assembly',
-                'workpage': 'stock_workpage',
-                'undercoating': 'stock_undercoating',
-                'painting': 'stock_painting',
-                'sewing': 'stock_sewing',
-                'upholstery': 'stock_upholstery',
-                'packaging': 'stock_packaging',
-            }
-            return mapping.get((section_slug or '').lower())
-
-        if label == 'deposit':
-            # Closed deposit: add to the single allowed section
-            if len(allowed) == 1:
-                fname = _field_for(allowed[0])
-                if fname:
-                    setattr(stock, fname, (getattr(stock, fname, 0) or 0) + 1)
-                    stock.save(update_fields=[fname])
-                    job.status = 'in_progress'  # label dictates closure but status remains traceable
-                    job.finished_at = timezone.now()
-                    job.save(update_fields=['status', 'finished_at'])
-            return
-
-        if label == 'scrapped':
-            # Remove from previous allowed section (if any)
-            if len(allowed) >= 1:
-                prev = allowed[-1] if len(allowed) == 1 else allowed[-2]
-                fname = _field_for(prev)
-                if fname:
-                    setattr(stock, fname, (getattr(stock, fname, 0) or 0) - 1)
-                    stock.save(update_fields=[fname])
-                    job.status = 'scrapped'
-                    job.finished_at = timezone.now()
-                    job.save(update_fields=['status', 'finished_at'])
-            return
-
-        if label == 'completed':
-            # Add to packaging and subtract from previous allowed (if present)
-            fname_pack = _field_for('packaging')
-            if fname_pack:
-                setattr(stock, fname_pack, (getattr(stock, fname_pack, 0) or 0) + 1)
-            prev = allowed[-1] if allowed else job.current_section
-            prev_fname = _field_for(prev) if prev else None
-            if prev_fname and prev_fname != fname_pack:
-                setattr(stock, prev_fname, (getattr(stock, prev_fname, 0) or 0) - 1)
-            stock.save(update_fields=[fn for fn in [fname_pack, prev_fname] if fn])
-            job.status = 'completed'
-            job.finished_at = timezone.now()
-            job.save(update_fields=['status', 'finished_at'])
-            return
+        deltas, updates = label_side_effects(
+            getattr(job, 'job_label', ''), getattr(job, 'allowed_sections', []), job.current_section,
+        )
+        if deltas:
+            from production_line import ledger
+            for fname, delta in deltas.items():
+                setattr(stock, fname, (getattr(stock, fname, 0) or 0) + delta)
+            with ledger.recording(ledger.REASON_JOB_LABEL, job=job):
+                stock.save(update_fields=list(deltas))
+        if updates:
+            for fname, value in updates.items():
+                setattr(job, fname, value)
+            job.save(update_fields=list(updates))
     except Exception:
         # Fail-safe: never break job creation
         pass
@@ -0,0 +1,496 @@
+"""Batch inventory shortage planning for production jobs.
+
+The planner answers "what is missing" for many jobs at once instead of
+exploding each job's BOM separately.  It works in three stages:
+
+1. ``load_snapshot`` reads open jobs, their logged sections, BOM rows and
+   current Part/Material/ProductStock levels in a fixed number of queries.
+2. ``build_requirements`` turns every job into a sparse requirement row
+   (column = part, material or product-stock bucket).
+3. ``allocate`` walks the rows in priority order (``created_at`` then id)
+   and computes per-job and aggregate net shortages.  NumPy is used for
+   large matrices when it is installed; both paths are exact (the NumPy one
+   works on Decimal quantities scaled to integers).
+
+Shortage dictionaries use the same keys and semantics as the create-job
+form: ``name``, ``required``, ``available``, ``missing``, ``type`` and
+``unit`` for materials.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Iterable
+
+from inventory.models import Material, Part, ProductComponent, ProductMaterial
+from production_line.models import ProductionLog, ProductStock, SectionChoices, get_components_for_product
+from production_line.utils import is_mdf_page_name
+from utils.normalize import normalize_names
+
+try:  # Optional acceleration for large plans
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is not a hard dependency
+    np = None
+
+
+# Matrices with fewer non-zero entries than this are allocated in pure Python.
+NUMPY_MIN_ENTRIES = 20000
+
+SECTION_LABEL_MAP = {str(slug): label for slug, label in SectionChoices.choices}
+
+SECTION_STOCK_FIELD_MAP = {
+    str(SectionChoices.ASSEMBLY): 'stock_assembly',
+    str(SectionChoices.WORKPAGE): 'stock_workpage',
+    str(SectionChoices.UNDERCOATING): 'stock_undercoating',
+    str(SectionChoices.PAINTING): 'stock_painting',
+    str(SectionChoices.SEWING): 'stock_sewing',
+    str(SectionChoices.UPHOLSTERY): 'stock_upholstery',
+    str(SectionChoices.PACKAGING): 'stock_packaging',
+}
+
+MDF_PRODUCT_FLOW = [
+    str(SectionChoices.ASSEMBLY),
+    str(SectionChoices.WORKPAGE),
+    str(SectionChoices.UNDERCOATING),
+    str(SectionChoices.PAINTING),
+    str(SectionChoices.PACKAGING),
+]
+
+DEFAULT_PRODUCT_FLOW = [
+    str(SectionChoices.ASSEMBLY),
+    str(SectionChoices.UNDERCOATING),
+    str(SectionChoices.PAINTING),
+    str(SectionChoices.SEWING),
+    str(SectionChoices.UPHOLSTERY),
+    str(SectionChoices.PACKAGING),
+]
+
+
+def base_flow(has_mdf: bool) -> list[str]:
+    """Return the canonical product flow for MDF/page and regular products."""
+    return list(MDF_PRODUCT_FLOW if has_mdf else DEFAULT_PRODUCT_FLOW)
+
+
+def entry_section(flow: list[str], allowed_sections: Iterable[str] | None) -> str | None:
+    """Return the first *selected* section of ``flow`` (or the flow start)."""
+    if not flow:
+        return None
+    allowed_norm = {str(sec).lower() for sec in (allowed_sections or []) if sec}
+    for sec in flow:
+        if sec in allowed_norm:
+            return sec
+    return flow[0]
+
+
+# ---------------------------------------------------------------------------
+# Stage 1: snapshot loading
+# ---------------------------------------------------------------------------
+@dataclass
+class PlanJob:
+    """A job (existing or about to be created) that takes part in a plan."""
+
+    key: object
+    product_id: int
+    allowed_sections: list[str] = field(default_factory=list)
+    job_number: str = ''
+    started: bool = False
+
+
+@dataclass
+class PlanningSnapshot:
+    """Everything the planner needs, loaded up-front."""
+
+    jobs: list[PlanJob] = field(default_factory=list)
+    components: dict[int, list[tuple[int, str, int]]] = field(default_factory=dict)
+    materials: dict[int, list[tuple[int, str, Decimal]]] = field(default_factory=dict)
+    part_stock: dict[int, int] = field(default_factory=dict)
+    material_stock: dict[int, tuple[Decimal, str, str]] = field(default_factory=dict)
+    product_stock: dict[int, dict[str, int]] = field(default_factory=dict)
+    mdf_products: set[int] = field(default_factory=set)
+    # Units of product stock already held by started jobs, keyed by (product_id, stock_field)
+    held_stock: dict[tuple[int, str], int] = field(default_factory=dict)
+
+
+def _open_jobs_queryset():
+    from jobs.models import ProductionJob
+    return (ProductionJob.objects
+            .filter(finished_at__isnull=True, job_label='in_progress', product__isnull=False)
+            .order_by('created_at', 'id'))
+
+
+def legacy_components(product) -> list[tuple[int | None, str, int]] | None:
+    """BOM part rows from a ``components`` list set on ``product``, or ``None``.
+
+    Forms and serializers may attach the BOM being edited as a list of dicts;
+    ``get_components_for_product`` prefers it to the stored rows and so does
+    the planner.  Entries without a part id are looked up by name within the
+    product's model (unknown parts count as out of stock).
+    """
+    dynamic = getattr(product, 'components', None)
+    if not isinstance(dynamic, (list, tuple)) or not dynamic:
+        return None
+    rows = get_components_for_product(product)
+    names = {r['part_name'] for r in rows if not r['part_id']}
+    by_name: dict[str, int] = {}
+    if names:
+        parts = Part.objects.filter(name__in=names)
+        if getattr(product, 'product_model_id', None):
+            parts = parts.filter(product_model_id=product.product_model_id)
+        for pk, name in parts.order_by('pk').values_list('pk', 'name'):
+            by_name.setdefault(name, pk)
+    lines: dict[object, list] = {}
+    for r in rows:
+        part_id = r['part_id'] or by_name.get(r['part_name'])
+        line = lines.setdefault(part_id or r['part_name'], [part_id, r['part_name'], 0])
+        line[2] += r['qty']
+    return [tuple(line) for line in lines.values()]
+
+
+def load_snapshot(candidates: Iterable[PlanJob] = (), *, include_open_jobs: bool = True,
+                  bom_overrides: dict[int, list] | None = None) -> PlanningSnapshot:
+    """Load jobs, BOMs and stock levels for a plan in a fixed number of queries.
+
+    ``candidates`` are appended after the open jobs (lowest priority), which
+    matches how a job being created competes with work already on the floor.
+    ``bom_overrides`` maps product ids to part rows (see
+    :func:`legacy_components`) used instead of their stored BOM.
+    """
+    snap = PlanningSnapshot()
+    jobs: list[PlanJob] = []
+    if include_open_jobs:
+        rows = list(_open_jobs_queryset().values_list('id', 'job_number', 'product_id', 'allowed_sections'))
+        for job_id, job_number, product_id, allowed in rows:
+            jobs.append(PlanJob(
+                key=job_id,
+                product_id=product_id,
+                allowed_sections=list(allowed or []) if isinstance(allowed, (list, tuple)) else [],
+                job_number=job_number or '',
+            ))
+    jobs.extend(candidates)
+    snap.jobs = jobs
+    if not jobs:
+        return snap
+
+    product_ids = {j.product_id for j in jobs if j.product_id}
+
+    # A BOM may list the same part or material on several lines; each is
+    # summed into one requirement so a job never competes with itself.
+    part_lines: dict[tuple[int, int], list] = {}
+    for product_id, part_id, part_name, qty in (
+        ProductComponent.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'part_id', 'part__name', 'qty')
+    ):
+        if part_id and qty:
+            line = part_lines.setdefault((product_id, part_id), [part_name or '', 0])
+            line[1] += int(qty)
+    for (product_id, part_id), (part_name, qty) in part_lines.items():
+        snap.components.setdefault(product_id, []).append((part_id, part_name, qty))
+    snap.components.update(bom_overrides or {})
+
+    material_lines: dict[tuple[int, int], list] = {}
+    material_rows = list(
+        ProductMaterial.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'material_id', 'material__name', 'qty')
+    )
+    snap.mdf_products.update(
+        row[0] for row, name in zip(material_rows, normalize_names(row[2] for row in material_rows))
+        if is_mdf_page_name(name)
+    )
+    for product_id, material_id, material_name, qty in material_rows:
+        try:
+            q = Decimal(qty)
+        except Exception:
+            continue
+        if not material_id or not q or q <= 0:
+            continue
+        line = material_lines.setdefault((product_id, material_id), [material_name or '', Decimal('0')])
+        line[1] += q
+    for (product_id, material_id), (material_name, qty) in material_lines.items():
+        snap.materials.setdefault(product_id, []).append((material_id, material_name, qty))
+
+    part_ids = {pid for rows in snap.components.values() for pid, _, _ in rows if pid}
+    if part_ids:
+        snap.part_stock = {
+            pid: int(stock or 0)
+            for pid, stock in Part.objects.filter(pk__in=part_ids).values_list('id', 'stock_cnc_tools')
+        }
+
+    material_ids = {mid for rows in snap.materials.values() for mid, _, _ in rows}
+    if material_ids:
+        for mid, quantity, unit, name in Material.objects.filter(pk__in=material_ids).values_list('id', 'quantity', 'unit', 'name'):
+            try:
+                available = Decimal(quantity or 0)
+            except Exception:
+                available = Decimal('0')
+            snap.material_stock[mid] = (available, unit or '', name or '')
+
+    stock_fields = list(SECTION_STOCK_FIELD_MAP.values())
+    for row in ProductStock.objects.filter(product_id__in=product_ids).values('product_id', *stock_fields):
+        snap.product_stock[row['product_id']] = {f: int(row.get(f) or 0) for f in stock_fields}
+
+    open_ids = [j.key for j in jobs if isinstance(j.key, int)]
+    if open_ids:
+        logged: dict[int, set[str]] = {}
+        for job_id, section in (
+            ProductionLog.objects.filter(job_id__in=open_ids)
+            .values_list('job_id', 'section').distinct()
+        ):
+            logged.setdefault(job_id, set()).add(str(section or '').lower())
+        for job in jobs:
+            sections = logged.get(job.key) if isinstance(job.key, int) else None
+            if not sections:
+                continue
+            flow = base_flow(job.product_id in snap.mdf_products)
+            start = entry_section(flow, job.allowed_sections)
+            if start in sections:
+                job.started = True
+                # The unit produced by the latest logged section waits in that
+                # section's bucket for the job's next step.
+                last = None
+                for sec in flow:
+                    if sec in sections:
+                        last = sec
+                if last and last != flow[-1]:
+                    stock_field = SECTION_STOCK_FIELD_MAP.get(last)
+                    if stock_field:
+                        key = (job.product_id, stock_field)
+                        snap.held_stock[key] = snap.held_stock.get(key, 0) + 1
+    return snap
+
+
+# ---------------------------------------------------------------------------
+# Stage 2: sparse requirement matrix
+# ---------------------------------------------------------------------------
+@dataclass
+class RequirementMatrix:
+    """Sparse (COO) job × item requirement matrix plus column metadata."""
+
+    jobs: list[PlanJob]
+    rows: list[int] = field(default_factory=list)
+    cols: list[int] = field(default_factory=list)
+    values: list = field(default_factory=list)
+    col_keys: list[tuple] = field(default_factory=list)
+    col_meta: list[dict] = field(default_factory=list)
+    col_available: list = field(default_factory=list)
+    _col_index: dict[tuple, int] = field(default_factory=dict)
+
+    def column(self, key: tuple, meta: dict, available) -> int:
+        idx = self._col_index.get(key)
+        if idx is None:
+            idx = len(self.col_keys)
+            self._col_index[key] = idx
+            self.col_keys.append(key)
+            self.col_meta.append(meta)
+            self.col_available.append(available)
+        return idx
+
+    def add(self, row: int, col: int, value) -> None:
+        self.rows.append(row)
+        self.cols.append(col)
+        self.values.append(value)
+
+
+def build_requirements(snap: PlanningSnapshot, *, net: bool = True) -> RequirementMatrix:
+    """Explode every not-yet-started job into its requirement row.
+
+    Jobs entering at assembly need CNC-stage parts and materials; jobs
+    entering later need one unit from the previous section's product stock.
+    With ``net`` enabled, product stock held by started jobs is not available.
+    """
+    matrix = RequirementMatrix(jobs=snap.jobs)
+    for row_idx, job in enumerate(snap.jobs):
+        if job.started or not job.product_id:
+            continue
+        flow = base_flow(job.product_id in snap.mdf_products)
+        first_section = entry_section(flow, job.allowed_sections)
+        if first_section is None:
+            continue
+
+        if first_section == str(SectionChoices.ASSEMBLY):
+            for part_id, part_name, qty in snap.components.get(job.product_id, []):
+                pname = part_name.strip()
+                if not pname or qty <= 0:
+                    continue
+                col = matrix.column(
+                    ('part', part_id or pname),
+                    {'name': pname, 'type': 'part'},
+                    snap.part_stock.get(part_id, 0),
+                )
+                matrix.add(row_idx, col, qty)
+            for material_id, material_name, qty in snap.materials.get(job.product_id, []):
+                available, unit, stock_name = snap.material_stock.get(material_id, (Decimal('0'), '', ''))
+                col = matrix.column(
+                    ('material', material_id),
+                    {'name': (material_name or stock_name or 'ماده اولیه').strip(), 'type': 'material', 'unit': unit},
+                    available,
+                )
+                matrix.add(row_idx, col, qty)
+            continue
+
+        idx = flow.index(first_section)
+        prev_section = flow[idx - 1] if idx > 0 else None
+        stock_field = SECTION_STOCK_FIELD_MAP.get(prev_section) if prev_section else None
+        if not stock_field:
+            continue
+        available = snap.product_stock.get(job.product_id, {}).get(stock_field, 0)
+        if net:
+            available = max(available - snap.held_stock.get((job.product_id, stock_field), 0), 0)
+        col = matrix.column(
+            ('product', job.product_id, stock_field),
+            {'name': f"موجودی بخش {SECTION_LABEL_MAP.get(prev_section, prev_section)}", 'type': 'product'},
+            available,
+        )
+        matrix.add(row_idx, col, 1)
+    return matrix
+
+
+# ---------------------------------------------------------------------------
+# Stage 3: allocation
+# ---------------------------------------------------------------------------
+@dataclass
+class ShortagePlan:
+    """Result of a planning run."""
+
+    per_job: dict[object, list[dict]] = field(default_factory=dict)
+    aggregate: list[dict] = field(default_factory=list)
+
+    def for_job(self, key) -> list[dict]:
+        return self.per_job.get(key, [])
+
+
+def _shortage_dict(meta: dict, required, available, missing) -> dict:
+    item = {'name': meta['name']}
+    if meta['type'] == 'material':
+        item.update({
+            'required': float(required),
+            'available': float(available),
+            'missing': float(missing),
+            'unit': meta.get('unit', ''),
+        })
+    else:
+        item.update({
+            'required': int(required),
+            'available': int(available),
+            'missing': int(missing),
+        })
+    item['type'] = meta['type']
+    return item
+
+
+def _remaining_before_python(matrix: RequirementMatrix) -> list:
+    """Stock left for each entry once higher-priority rows were served."""
+    consumed: dict[int, object] = {}
+    remaining = []
+    for col, value in zip(matrix.cols, matrix.values):
+        before = consumed.get(col, 0)
+        available = matrix.col_available[col]
+        if before:
+            left = available - before
+            available = left if left > 0 else 0
+        remaining.append(available)
+        consumed[col] = before + value
+    return remaining
+
+
+def _decimal_places(values) -> int:
+    """Fraction digits needed to hold every Decimal of ``values`` as an integer."""
+    places = 0
+    for value in values:
+        if isinstance(value, Decimal):
+            places = max(places, -value.as_tuple().exponent)
+    return places
+
+
+def _remaining_before_numpy(matrix: RequirementMatrix) -> list:
+    """Vectorized equivalent of ``_remaining_before_python``.
+
+    Entries are grouped per column in row (priority) order; an exclusive
+    cumulative sum per group gives the demand served before each entry.
+    Quantities are scaled to integers (material quantities are Decimals), so
+    the sums are exact; results come back as ``Decimal``.
+    """
+    places = _decimal_places([*matrix.values, *matrix.col_available])
+    factor = 10 ** places
+    cols = np.asarray(matrix.cols, dtype=np.int64)
+    rows = np.asarray(matrix.rows, dtype=np.int64)
+    vals = np.asarray([int(v * factor) for v in matrix.values], dtype=np.int64)
+    avail = np.asarray([int(v * factor) for v in matrix.col_available], dtype=np.int64)
+    order = np.lexsort((rows, cols))
+    sorted_cols = cols[order]
+    sorted_vals = vals[order]
+    csum = np.cumsum(sorted_vals)
+    group_start = np.ones(len(sorted_cols), dtype=bool)
+    group_start[1:] = sorted_cols[1:] != sorted_cols[:-1]
+    start_idx = np.maximum.accumulate(np.where(group_start, np.arange(len(sorted_cols)), 0))
+    offset = csum[start_idx] - sorted_vals[start_idx]
+    before = csum - sorted_vals - offset
+    left = np.maximum(avail[sorted_cols] - before, 0)
+    remaining = np.empty_like(left)
+    remaining[order] = left
+    return [Decimal(int(v)).scaleb(-places) for v in remaining.tolist()]
+
+
+def allocate(matrix: RequirementMatrix) -> ShortagePlan:
+    """Allocate stock to jobs in priority order and collect shortages.
+
+    Rows are already in priority order, so entry ``k`` of a column only sees
+    the stock left after all earlier rows took their full requirement.
+    """
+    plan = ShortagePlan()
+    if not matrix.values:
+        return plan
+
+    if np is not None and len(matrix.values) >= NUMPY_MIN_ENTRIES:
+        remaining = _remaining_before_numpy(matrix)
+    else:
+        remaining = _remaining_before_python(matrix)
+
+    total_required: dict[int, object] = {}
+    for row, col, value, left in zip(matrix.rows, matrix.cols, matrix.values, remaining):
+        total_required[col] = total_required.get(col, 0) + value
+        meta = matrix.col_meta[col]
+        if meta['type'] != 'material':
+            left = int(left)
+        elif not isinstance(left, Decimal):
+            left = Decimal(left)
+        missing = value - left
+        if missing > 0:
+            job = matrix.jobs[row]
+            plan.per_job.setdefault(job.key, []).append(_shortage_dict(meta, value, left, missing))
+
+    for col, required in total_required.items():
+        available = matrix.col_available[col]
+        missing = required - available
+        if missing > 0:
+            plan.aggregate.append(_shortage_dict(matrix.col_meta[col], required, available, missing))
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+def plan_shortages(candidates: Iterable[PlanJob] = (), *, include_open_jobs: bool = True) -> ShortagePlan:
+    """Run all three stages and return per-job and aggregate shortages."""
+    snap = load_snapshot(candidates, include_open_jobs=include_open_jobs)
+    return allocate(build_requirements(snap, net=include_open_jobs))
+
+
+def shortages_for_product(product, allowed_sections: Iterable[str] | None, *, net: bool = False) -> list[dict]:
+    """Shortages for creating one in-progress job of ``product``.
+
+    With ``net`` disabled this only compares the BOM against current stock
+    (the create-job form semantics).  With ``net`` enabled the new job is
+    queued behind every open job, so stock already promised is excluded.
+    A ``components`` list on ``product`` replaces its stored part rows
+    (:func:`legacy_components`).
+    """
+    if not product or not getattr(product, 'pk', None):
+        return []
+    candidate = PlanJob(key='candidate', product_id=product.pk, allowed_sections=list(allowed_sections or []))
+    components = legacy_components(product)
+    snap = load_snapshot(
+        [candidate], include_open_jobs=net,
+        bom_overrides={product.pk: components} if components is not None else None,
+    )
+    return allocate(build_requirements(snap, net=net)).for_job('candidate')
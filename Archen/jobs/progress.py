@@ -0,0 +1,195 @@
+"""Denormalized production progress on ``ProductionJob``.
+
+Progress displays (job edit form, public order summary, job details panel and
+the work-entry job pickers) used to query a job's logs for every job they
+showed.  The job row now carries a summary of its logs:
+
+- ``logged_sections``: section slugs with a log, in logging order;
+- ``last_logged_section`` / ``last_logged_at``: the newest log;
+- ``produced_total`` / ``scrap_total``: summed quantities.
+
+:func:`refresh` recomputes the summary from the logs.  It runs from the
+``ProductionLog`` ``post_save``/``post_delete`` signals, so it shares the
+transaction of the log write (``ProductionLog.save`` is atomic and Django
+deletes inside a transaction) and covers the work-entry views,
+``jobs.services.rewind_job_progress`` and ``delete_job_completely``.  The job
+row is locked first so concurrent logs of one job are summed in turn.  Batch
+work entry creates its logs with ``bulk_create`` and calls
+:func:`refresh_many` itself.
+
+``QuerySet.update()`` on logs skips the signals; run
+``manage.py verify_job_progress --repair`` after such changes.
+"""
+
+from __future__ import annotations
+
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+PROGRESS_FIELDS = ('logged_sections', 'last_logged_section', 'last_logged_at', 'produced_total', 'scrap_total')
+
+# English: columns read from each log, in ``logged_at, id`` order.
+LOG_COLUMNS = ('section', 'logged_at', 'produced_qty', 'scrap_qty')
+
+_deferred: contextvars.ContextVar[set | None] = contextvars.ContextVar('job_progress_deferred', default=None)
+
+
+def summarize(rows) -> dict:
+    """Progress values for one job from its ``LOG_COLUMNS`` rows (oldest first)."""
+    sections: list[str] = []
+    produced = scrap = 0
+    last = None
+    for section, logged_at, produced_qty, scrap_qty in rows:
+        slug = str(section or '').strip().lower()
+        if slug and slug not in sections:
+            sections.append(slug)
+        produced += produced_qty or 0
+        scrap += scrap_qty or 0
+        last = (slug or None, logged_at)
+    return {
+        'logged_sections': sections,
+        'last_logged_section': last[0] if last else None,
+        'last_logged_at': last[1] if last else None,
+        'produced_total': produced,
+        'scrap_total': scrap,
+    }
+
+
+def compute(job_id: int) -> dict:
+    """Progress values of a job from its logs (one query)."""
+    from production_line.models import ProductionLog
+
+    rows = ProductionLog.objects.filter(job_id=job_id).order_by('logged_at', 'id').values_list(*LOG_COLUMNS)
+    return summarize(rows)
+
+
+def refresh(job) -> dict:
+    """Recompute and store the progress columns of ``job`` (an instance or id).
+
+    When an instance is passed its attributes are updated too.  Returns the
+    stored values, or ``{}`` when the job no longer exists.
+    """
+    from .models import ProductionJob
+
+    job_id = getattr(job, 'pk', job)
+    if job_id is None:
+        return {}
+    with transaction.atomic():
+        if not list(ProductionJob.objects.select_for_update().filter(pk=job_id).values_list('pk', flat=True)):
+            return {}
+        values = compute(job_id)
+        ProductionJob.objects.filter(pk=job_id).update(**values)
+    if isinstance(job, ProductionJob):
+        for name, value in values.items():
+            setattr(job, name, value)
+    return values
+
+
+def refresh_many(job_ids) -> int:
+    """Recompute the progress columns of several jobs (one log query, one bulk update).
+
+    For writers that skip the signals, such as ``bulk_create`` in batch work
+    entry.  Returns the number of jobs updated.
+    """
+    from production_line.models import ProductionLog
+    from .models import ProductionJob
+
+    ids = sorted({pk for pk in job_ids if pk})
+    if not ids:
+        return 0
+    with transaction.atomic():
+        jobs = list(ProductionJob.objects.select_for_update().filter(pk__in=ids).only('pk'))
+        grouped = defaultdict(list)
+        rows = (
+            ProductionLog.objects.filter(job_id__in=ids)
+            .order_by('job_id', 'logged_at', 'id')
+            .values_list('job_id', *LOG_COLUMNS)
+        )
+        for job_id, *row in rows:
+            grouped[job_id].append(row)
+        for job in jobs:
+            for name, value in summarize(grouped.get(job.pk, ())).items():
+                setattr(job, name, value)
+        ProductionJob.objects.bulk_update(jobs, PROGRESS_FIELDS)
+    return len(jobs)
+
+
+@contextmanager
+def deferred():
+    """Refresh the jobs touched by log writes inside the block once, at its end.
+
+    Yields the set of pending job ids; a caller that refreshes a job itself
+    may discard it.  Nested blocks share the outermost one.
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        yield pending
+        return
+    pending = set()
+    token = _deferred.set(pending)
+    try:
+        yield pending
+    finally:
+        _deferred.reset(token)
+    refresh_many(pending)
+
+
+def _touch(job_id) -> None:
+    pending = _deferred.get()
+    if pending is not None:
+        pending.add(job_id)
+    else:
+        refresh(job_id)
+
+
+def drift(job_ids=None, chunk_size: int = 2000):
+    """Yield ``(job_id, stored, expected)`` for jobs whose columns disagree with their logs.
+
+    Streams the logs once in ``job_id`` order instead of querying per job.
+    """
+    from production_line.models import ProductionLog
+    from .models import ProductionJob
+
+    jobs = ProductionJob.objects.order_by('pk')
+    logs = ProductionLog.objects.filter(job__isnull=False).order_by('job_id', 'logged_at', 'id')
+    if job_ids is not None:
+        jobs = jobs.filter(pk__in=job_ids)
+        logs = logs.filter(job_id__in=job_ids)
+    log_rows = logs.values_list('job_id', *LOG_COLUMNS).iterator(chunk_size=chunk_size)
+    pending = next(log_rows, None)
+
+    for job_id, *stored in jobs.values_list('pk', *PROGRESS_FIELDS).iterator(chunk_size=chunk_size):
+        rows = []
+        # English: skip logs of ids missing from ``jobs`` (both streams are sorted)
+        while pending is not None and pending[0] < job_id:
+            pending = next(log_rows, None)
+        while pending is not None and pending[0] == job_id:
+            rows.append(pending[1:])
+            pending = next(log_rows, None)
+        expected = summarize(rows)
+        current = dict(zip(PROGRESS_FIELDS, stored))
+        current['logged_sections'] = list(current['logged_sections'] or [])
+        if current != expected:
+            yield job_id, current, expected
+
+
+def _on_log_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.job_id:
+        return
+    _touch(instance.job_id)
+
+
+def _on_log_deleted(sender, instance, **kwargs):
+    if instance.job_id:
+        _touch(instance.job_id)
+
+
+def connect_signals() -> None:
+    from production_line.models import ProductionLog
+
+    post_save.connect(_on_log_saved, sender=ProductionLog, weak=False, dispatch_uid='jobs.progress:save')
+    post_delete.connect(_on_log_deleted, sender=ProductionLog, weak=False, dispatch_uid='jobs.progress:delete')
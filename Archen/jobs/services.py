@@ -2,27 +2,199 @@
 
 from __future__ import annotations
 
+from collections import defaultdict
+from decimal import Decimal
 from typing import List, Tuple
 
 from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 
-from production_line.models import ProductionLog
+from inventory import low_stock
+from inventory.models import Material, Part, ProductComponent, ProductMaterial
+from jobs import progress
+from jobs.planner import SECTION_STOCK_FIELD_MAP
+from production_line import ledger
+from production_line.models import ProductionLog, ProductStock, SectionChoices, StockMovement
 
+# Columns of a log needed to reverse its inventory movement.
+_LOG_FIELDS = ('id', 'section', 'part_id', 'product_id', 'user_id', 'is_external', 'is_scrap',
+               'produced_qty', 'scrap_qty')
+_PART_SECTION_FIELDS = {
+    str(SectionChoices.CUTTING): 'stock_cut',
+    str(SectionChoices.CNC_TOOLS): 'stock_cnc_tools',
+}
 
-def _collect_log_history(job) -> List[Tuple[ProductionLog, str | None]]:
-    """Return ordered log rows with their previous section slug."""
-    logs = list(
-        job.productionlog_set.select_related('job', 'product', 'part')
-        .order_by('logged_at', 'id')
-    )
-    contexts: List[Tuple[ProductionLog, str | None]] = []
+
+def _slug(value) -> str | None:
+    return (str(value or '')).strip().lower() or None
+
+
+def _collect_log_history(job) -> List[Tuple[dict, str | None]]:
+    """Return the job's log rows (oldest first, one query) with their previous section slug."""
+    contexts: List[Tuple[dict, str | None]] = []
     prev_section: str | None = None
-    for log in logs:
-        contexts.append((log, prev_section))
-        prev_section = (str(log.section or '').strip().lower()) or None
+    for row in job.productionlog_set.order_by('logged_at', 'id').values(*_LOG_FIELDS):
+        contexts.append((row, prev_section))
+        prev_section = _slug(row['section'])
     return contexts
 
 
+class _Reversal:
+    """Net stock movement that undoes a set of logs of one job.
+
+    Mirrors ``ProductionLog._rollback_inventory`` log by log, but explodes each
+    product BOM once and writes the result as one ``F()`` update per stock row.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.is_deposit = str(getattr(job, 'job_label', '') or '') == 'deposit'
+        # (item_type, item_id, bucket) -> [(log row, delta), ...]
+        self.moves: dict[tuple, list] = defaultdict(list)
+        self._bom: dict[int, tuple[list, list]] = {}
+
+    def _add(self, item_type, item_id, bucket, delta, row) -> None:
+        if item_id and delta:
+            self.moves[(item_type, item_id, bucket)].append((row, delta))
+
+    def _product(self, row, section, delta) -> None:
+        field = SECTION_STOCK_FIELD_MAP.get(section or '')
+        if row['product_id'] and field:
+            self._add(StockMovement.ITEM_PRODUCT, row['product_id'], field, delta, row)
+
+    def load_boms(self, product_ids) -> None:
+        ids = {pid for pid in product_ids if pid}
+        for pid in ids:
+            self._bom[pid] = ([], [])
+        for pid, part_id, qty in (
+            ProductComponent.objects.filter(product_id__in=ids, part__isnull=False)
+            .values_list('product_id', 'part_id', 'qty')
+        ):
+            if int(qty or 0) > 0:
+                self._bom[pid][0].append((part_id, int(qty)))
+        for pid, material_id, qty in (
+            ProductMaterial.objects.filter(product_id__in=ids).values_list('product_id', 'material_id', 'qty')
+        ):
+            qty = Decimal(qty or 0)
+            if material_id and qty > 0:
+                self._bom[pid][1].append((material_id, qty))
+
+    def _restore_inputs(self, row) -> None:
+        parts, materials = self._bom.get(row['product_id'], ((), ()))
+        for part_id, qty in parts:
+            self._add(StockMovement.ITEM_PART, part_id, 'stock_cnc_tools', qty, row)
+        for material_id, qty in materials:
+            self._add(StockMovement.ITEM_MATERIAL, material_id, 'quantity', qty, row)
+
+    def _reverse_decrement_previous(self, row, section, prev_section) -> None:
+        # Assembly logs never decremented previous stock in apply_inventory
+        if not prev_section or section == str(SectionChoices.ASSEMBLY):
+            return
+        part_field = _PART_SECTION_FIELDS.get(prev_section)
+        if part_field:
+            self._add(StockMovement.ITEM_PART, row['part_id'], part_field, 1, row)
+            return
+        self._product(row, prev_section, +1)
+
+    def add_log(self, row, prev_section) -> None:
+        section = _slug(row['section'])
+        produced = int(row['produced_qty'] or 0)
+        scrap = int(row['scrap_qty'] or 0)
+
+        # Part-only logs have isolated stock rules
+        if row['part_id'] and not row['product_id']:
+            if section == str(SectionChoices.CUTTING):
+                self._add(StockMovement.ITEM_PART, row['part_id'], 'stock_cut', scrap - produced, row)
+            elif section == str(SectionChoices.CNC_TOOLS):
+                self._add(StockMovement.ITEM_PART, row['part_id'], 'stock_cnc_tools', -produced, row)
+                self._add(StockMovement.ITEM_PART, row['part_id'], 'stock_cut', produced + scrap, row)
+            return
+
+        first_entry = prev_section is None
+        if row['is_external']:
+            self._product(row, section, -1)
+            return
+        if self.is_deposit:
+            if not first_entry:
+                self._product(row, prev_section, +1)
+            if not row['is_scrap']:
+                self._product(row, section, -1)
+            return
+        if row['is_scrap']:
+            if section == str(SectionChoices.ASSEMBLY):
+                self._restore_inputs(row)
+            elif not first_entry:
+                self._reverse_decrement_previous(row, section, prev_section)
+            return
+
+        # Normal flow
+        if not first_entry:
+            self._reverse_decrement_previous(row, section, prev_section)
+        if section == str(SectionChoices.ASSEMBLY):
+            self._restore_inputs(row)
+        self._product(row, section, -1)
+
+    def apply(self) -> None:
+        """Write the net deltas with ``F()`` updates and the per-log ledger rows."""
+        product_ids = {item_id for item_type, item_id, _ in self.moves if item_type == StockMovement.ITEM_PRODUCT}
+        if product_ids:
+            # English: rollback creates missing stock rows on demand; do it once up front.
+            have = set(ProductStock.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+            ProductStock.objects.bulk_create(
+                [ProductStock(product_id=pid) for pid in sorted(product_ids - have)],
+                ignore_conflicts=True,
+            )
+
+        changes: dict[tuple, dict] = defaultdict(dict)
+        for (item_type, item_id, bucket), entries in self.moves.items():
+            net = sum((delta for _row, delta in entries), 0)
+            if net:
+                # English: material quantities may be NULL; the per-log rollback counted them as zero
+                if item_type == StockMovement.ITEM_MATERIAL:
+                    changes[(item_type, item_id)][bucket] = ledger.rounded(Coalesce(F(bucket), Value(Decimal('0'))) + net)
+                else:
+                    changes[(item_type, item_id)][bucket] = F(bucket) + net
+        targets = {
+            StockMovement.ITEM_PART: (Part, 'pk'),
+            StockMovement.ITEM_PRODUCT: (ProductStock, 'product_id'),
+            StockMovement.ITEM_MATERIAL: (Material, 'pk'),
+        }
+        for (item_type, item_id), fields in sorted(changes.items()):
+            model, id_attr = targets[item_type]
+            model.objects.filter(**{id_attr: item_id}).update(**low_stock.with_flag(model, fields))
+
+        # QuerySet.update() skips the ledger signals; record what rollback_inventory would have
+        with ledger.recording(ledger.REASON_ROLLBACK, job=self.job):
+            for (item_type, item_id, bucket), entries in self.moves.items():
+                for row, delta in entries:
+                    ledger.record(item_type, item_id, bucket, delta, log=row['id'], user=row['user_id'])
+
+
+def _rollback_logs(job, contexts) -> int:
+    """Reverse the inventory of ``contexts`` (``(log row, prev section)``) and delete the logs.
+
+    Four steps in the caller's transaction: the BOMs of the logged products
+    are loaded once, the net reversal is computed in memory, applied with
+    ``F()`` updates, and the logs are deleted with one statement.
+    """
+    if not contexts:
+        return 0
+    reversal = _Reversal(job)
+    reversal.load_boms(
+        row['product_id'] for row, _prev in contexts
+        if _slug(row['section']) == str(SectionChoices.ASSEMBLY)
+    )
+    for row, prev_section in contexts:
+        reversal.add_log(row, prev_section)
+    reversal.apply()
+    with progress.deferred() as touched:
+        ProductionLog.objects.filter(pk__in=[row['id'] for row, _prev in contexts]).delete()
+        touched.discard(job.pk)
+        progress.refresh(job)
+    return len(contexts)
+
+
 def delete_job_completely(job) -> tuple[int, int]:
     """Remove a job together with its logs and revert inventory.
 
@@ -30,12 +202,9 @@ def delete_job_completely(job) -> tuple[int, int]:
     success so that callers can aggregate counters.
     """
     with transaction.atomic():
-        contexts = _collect_log_history(job)
-        for log, prev_section in reversed(contexts):
-            log.rollback_inventory(prev_section)
-            log.delete()
+        removed = _rollback_logs(job, _collect_log_history(job))
         job.delete()
-    return (len(contexts), 1)
+    return (removed, 1)
 
 
 def rewind_job_progress(job, ordered_flow: list[str], target_cursor: int, current_cursor: int) -> tuple[int, str | None]:
@@ -44,11 +213,13 @@ def rewind_job_progress(job, ordered_flow: list[str], target_cursor: int, curren
     ``ordered_flow`` must contain the allowed sections in process order.
     ``current_cursor`` represents the current contiguous completion count (i.e. the
     index of the highlighted/next section).  The function removes logs for the
-    slice ``ordered_flow[target_cursor:current_cursor]`` (if any) while restoring
-    inventory via ``ProductionLog.rollback_inventory``.
+    slice ``ordered_flow[target_cursor:current_cursor]`` (if any) and restores
+    inventory as ``ProductionLog.rollback_inventory`` would, in one batch (see
+    :func:`_rollback_logs`).
 
     Returns a tuple ``(removed_logs, new_current_section_slug)``.  The caller is
-    responsible for persisting the updated ``current_section`` on the job.
+    responsible for persisting the updated ``current_section`` on the job; the
+    progress columns (``jobs.progress``) are already refreshed on ``job``.
     """
 
     if not ordered_flow:
@@ -63,19 +234,17 @@ def rewind_job_progress(job, ordered_flow: list[str], target_cursor: int, curren
         return (0, new_current)
 
     slice_set = set(slice_slugs)
-    removed = 0
-
     with transaction.atomic():
-        contexts = _collect_log_history(job)
-        for log, prev_section in reversed(contexts):
-            slug = str(getattr(log, 'section', '') or '').lower()
+        # English: the newest log of each section in the slice, as the per-log loop picked them
+        selected = []
+        for row, prev_section in reversed(_collect_log_history(job)):
+            slug = _slug(row['section'])
             if slug in slice_set:
-                log.rollback_inventory(prev_section)
-                log.delete()
-                removed += 1
+                selected.append((row, prev_section))
                 slice_set.remove(slug)
                 if not slice_set:
                     break
+        removed = _rollback_logs(job, selected)
 
     new_current = ordered_flow[target_cursor - 1] if target_cursor > 0 else None
     return (removed, new_current)
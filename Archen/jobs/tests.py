@@ -0,0 +1,636 @@
+import random
+import unittest
+from unittest import mock
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.models import Material, Part, Product, ProductComponent, ProductMaterial, ProductModel
+from production_line.models import ProductionLog, ProductStock, StockMovement
+
+from . import bulk, planner, progress, services
+from .models import ProductionJob
+
+
+class AllocationParityTests(SimpleTestCase):
+    """The NumPy allocation must give exactly what the Python loop gives."""
+
+    def random_matrix(self, seed, entries):
+        rng = random.Random(seed)
+        jobs = [planner.PlanJob(key=i, product_id=1) for i in range(entries // 10)]
+        matrix = planner.RequirementMatrix(jobs=jobs)
+        for c in range(40):
+            if c % 2:
+                meta, available = {'name': f'M{c}', 'type': 'material', 'unit': 'kg'}, Decimal(rng.randint(0, 50000)).scaleb(-3)
+            else:
+                meta, available = {'name': f'P{c}', 'type': 'part'}, rng.randint(0, 500)
+            matrix.column(('col', c), meta, available)
+        for row in range(len(jobs)):
+            for col in rng.sample(range(40), 10):
+                if matrix.col_meta[col]['type'] == 'material':
+                    matrix.add(row, col, Decimal(rng.randint(1, 2000)).scaleb(-3))
+                else:
+                    matrix.add(row, col, rng.randint(1, 6))
+        return matrix
+
+    @unittest.skipIf(planner.np is None, 'numpy is not installed')
+    def test_numpy_and_python_remaining_stock_agree(self):
+        for seed in range(3):
+            matrix = self.random_matrix(seed, 30000)
+            self.assertEqual(planner._remaining_before_numpy(matrix), planner._remaining_before_python(matrix))
+
+    @unittest.skipIf(planner.np is None, 'numpy is not installed')
+    def test_allocate_is_the_same_on_both_paths(self):
+        matrix = self.random_matrix(7, 30000)
+        with mock.patch.object(planner, 'NUMPY_MIN_ENTRIES', 10 ** 9):
+            python_plan = planner.allocate(matrix)
+        with mock.patch.object(planner, 'NUMPY_MIN_ENTRIES', 0):
+            numpy_plan = planner.allocate(matrix)
+        self.assertEqual(numpy_plan.per_job, python_plan.per_job)
+        self.assertEqual(numpy_plan.aggregate, python_plan.aggregate)
+
+
+class ShortagePlannerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=self.model)
+        self.leg = Part.objects.create(name='Leg', product_model=self.model, stock_cnc_tools=10)
+        self.wood = Material.objects.create(name='Wood', quantity=Decimal('0.300'), unit='kg')
+        ProductComponent.objects.create(product=self.product, part=self.leg, qty=4)
+        ProductMaterial.objects.create(product=self.product, material=self.wood, qty=Decimal('0.100'))
+
+    def open_job(self, number, **kwargs):
+        return ProductionJob.objects.create(job_number=number, product=self.product, **kwargs)
+
+    def test_open_jobs_are_served_in_creation_order(self):
+        jobs = [self.open_job(f'J{i}') for i in range(4)]
+        plan = planner.plan_shortages()
+
+        self.assertEqual(plan.for_job(jobs[0].pk), [])
+        self.assertEqual(plan.for_job(jobs[1].pk), [])
+        self.assertEqual(plan.for_job(jobs[2].pk), [
+            {'name': 'Leg', 'required': 4, 'available': 2, 'missing': 2, 'type': 'part'},
+        ])
+        self.assertEqual([s['name'] for s in plan.for_job(jobs[3].pk)], ['Leg', 'Wood'])
+        aggregate = {s['name']: s['missing'] for s in plan.aggregate}
+        self.assertEqual(aggregate, {'Leg': 6, 'Wood': 0.1})
+
+    def test_material_quantities_are_summed_exactly(self):
+        # English: 0.1 + 0.1 + 0.1 > 0.3 in binary floating point
+        self.leg.stock_cnc_tools = 100
+        self.leg.save()
+        jobs = [self.open_job(f'J{i}') for i in range(3)]
+        plan = planner.plan_shortages()
+        self.assertEqual(plan.aggregate, [])
+        self.assertTrue(all(plan.for_job(job.pk) == [] for job in jobs))
+
+    def test_gross_shortages_ignore_other_open_jobs(self):
+        for i in range(3):
+            self.open_job(f'J{i}')
+        self.assertEqual(planner.shortages_for_product(self.product, []), [])
+        net = planner.shortages_for_product(self.product, [], net=True)
+        self.assertEqual({s['name']: s['missing'] for s in net}, {'Leg': 4, 'Wood': 0.1})
+
+    def test_mdf_page_materials_mark_their_products(self):
+        board = Material.objects.create(name='صفحه ام\u200cدي\u200cاف', quantity=Decimal('5.000'), unit='sheet')
+        table = Product.objects.create(name='Table', product_model=self.model)
+        ProductMaterial.objects.create(product=table, material=board, qty=Decimal('1.000'))
+        self.open_job('J1')
+        ProductionJob.objects.create(job_number='J2', product=table)
+        self.assertEqual(planner.load_snapshot().mdf_products, {table.pk})
+
+    def test_started_jobs_hold_the_unit_they_produced(self):
+        stock, _ = ProductStock.objects.get_or_create(product=self.product)
+        stock.stock_assembly = 1
+        stock.save()
+        started = self.open_job('J1', allowed_sections=['assembly', 'undercoating'])
+        user = get_user_model().objects.create_user(username='assembler', password='x', role='assembly_master')
+        # English: bulk_create skips the stock side effects of save(); only the log's presence matters here
+        ProductionLog.objects.bulk_create([ProductionLog(
+            user=user, role='assembly_master', model='M1', job=started, product=self.product, section='assembly',
+        )])
+        later = self.open_job('J2', allowed_sections=['undercoating'])
+
+        snap = planner.load_snapshot()
+        self.assertTrue(snap.jobs[0].started)
+        self.assertEqual(snap.held_stock, {(self.product.pk, 'stock_assembly'): 1})
+        plan = planner.allocate(planner.build_requirements(snap))
+        self.assertEqual([s['missing'] for s in plan.for_job(later.pk)], [1])
+        gross = planner.allocate(planner.build_requirements(snap, net=False))
+        self.assertEqual(gross.for_job(later.pk), [])
+
+
+STOCK_FIELDS = list(planner.SECTION_STOCK_FIELD_MAP.values())
+
+
+def _per_product_shortages(product, allowed_sections):
+    """The per-product BOM explosion that ``planner.shortages_for_product`` replaced."""
+    from production_line.models import get_components_for_product, get_materials_for_product
+    from production_line.utils import product_contains_mdf_page
+
+    if not product:
+        return []
+    base_flow = planner.base_flow(product_contains_mdf_page(product))
+    allowed_norm = [str(sec).lower() for sec in (allowed_sections or []) if sec]
+    first_selected = next((sec for sec in base_flow if sec in allowed_norm), None) if allowed_norm else None
+    first_section = (first_selected or base_flow[0]).lower()
+    shortages = []
+
+    if first_section == 'assembly':
+        components = get_components_for_product(product)
+        product_model = getattr(product, 'product_model', None)
+        part_ids = [c.get('part_id') for c in components if c.get('part_id')]
+        parts_map = {p.id: p for p in Part.objects.filter(pk__in=part_ids)} if part_ids else {}
+        for comp in components:
+            pname = (comp.get('part_name') or '').strip()
+            qty = int(comp.get('qty') or 0)
+            if not pname or qty <= 0:
+                continue
+            part_id = comp.get('part_id')
+            if part_id:
+                part_obj = parts_map.get(part_id) or Part.objects.filter(pk=part_id).first()
+            elif product_model:
+                part_obj = Part.objects.filter(name=pname, product_model=product_model).first()
+            else:
+                part_obj = Part.objects.filter(name=pname).first()
+            available = int(getattr(part_obj, 'stock_cnc_tools', 0) or 0)
+            if qty - available > 0:
+                shortages.append({'name': pname, 'required': qty, 'available': available,
+                                  'missing': qty - available, 'type': 'part'})
+
+        materials = get_materials_for_product(product)
+        mats_map = {m.id: m for m in Material.objects.filter(id__in=[m.get('material_id') for m in materials])}
+        for mat in materials:
+            req = Decimal(mat.get('qty') or 0)
+            mat_obj = mats_map.get(mat.get('material_id'))
+            available = Decimal(getattr(mat_obj, 'quantity', 0) or 0) if mat_obj else Decimal('0')
+            if req - available > 0:
+                shortages.append({
+                    'name': (mat.get('material_name') or getattr(mat_obj, 'name', '') or 'ماده اولیه').strip(),
+                    'required': float(req), 'available': float(available), 'missing': float(req - available),
+                    'unit': getattr(mat_obj, 'unit', '') if mat_obj else '', 'type': 'material',
+                })
+        return shortages
+
+    idx = base_flow.index(first_section)
+    prev_section = base_flow[idx - 1] if idx > 0 else None
+    stock_field = planner.SECTION_STOCK_FIELD_MAP.get(prev_section) if prev_section else None
+    if stock_field:
+        stock_obj = ProductStock.objects.filter(product=product).first()
+        available = int(getattr(stock_obj, stock_field, 0) or 0)
+        if 1 - available > 0:
+            shortages.append({'name': f"موجودی بخش {planner.SECTION_LABEL_MAP.get(prev_section, prev_section)}",
+                              'required': 1, 'available': available, 'missing': 1 - available, 'type': 'product'})
+    return shortages
+
+
+class ShortageParityTests(TestCase):
+    """``planner.shortages_for_product`` must report what the per-product explosion did."""
+
+    def setUp(self):
+        cache.clear()
+        rng = random.Random(26)
+        self.products = []
+        materials = [
+            Material.objects.create(name=name, quantity=Decimal(rng.randint(0, 3000)).scaleb(-3), unit='kg')
+            for name in ('Wood', 'Glue', 'Foam', 'صفحه ام\u200cدی\u200cاف')
+        ]
+        for m in range(2):
+            model = ProductModel.objects.create(name=f'M{m}')
+            parts = [Part.objects.create(name=f'P{m}{i}', product_model=model, stock_cnc_tools=rng.randint(0, 8))
+                     for i in range(5)]
+            for p in range(4):
+                product = Product.objects.create(name=f'Chair{m}{p}', product_model=model)
+                for part in rng.sample(parts, rng.randint(0, 4)):
+                    ProductComponent.objects.create(product=product, part=part, qty=rng.randint(1, 6))
+                for material in rng.sample(materials, rng.randint(0, 3)):
+                    ProductMaterial.objects.create(product=product, material=material,
+                                                   qty=Decimal(rng.randint(1, 2000)).scaleb(-3))
+                if rng.random() < 0.7:
+                    ProductStock.objects.create(product=product, **{f: rng.randint(0, 1) for f in STOCK_FIELDS})
+                self.products.append(product)
+        self.section_choices = [[], *([s] for s in planner.SECTION_STOCK_FIELD_MAP), ['painting', 'sewing'], ['bogus']]
+
+    def test_same_shortages_as_the_per_product_explosion(self):
+        kinds = set()
+        for product in self.products:
+            for allowed in self.section_choices:
+                with self.subTest(product=product.name, allowed=allowed):
+                    expected = _per_product_shortages(product, allowed)
+                    self.assertEqual(planner.shortages_for_product(product, allowed), expected)
+                    kinds.update(s['type'] for s in expected)
+        self.assertEqual(kinds, {'part', 'material', 'product'})
+
+    def test_components_attribute_replaces_the_stored_parts(self):
+        product = self.products[0]
+        leg = Part.objects.get(name='P00')
+        product.components = [
+            {'part_name': 'Leg', 'qty': leg.stock_cnc_tools + 2, 'part_id': leg.pk},
+            {'part_name': 'P01', 'qty': 50},
+            {'part_name': 'Ghost', 'qty': 3},
+            {'part_name': '', 'qty': 9},
+        ]
+        shortages = planner.shortages_for_product(product, ['assembly'])
+        self.assertEqual(shortages, _per_product_shortages(product, ['assembly']))
+        self.assertEqual([(s['name'], s['missing']) for s in shortages if s['type'] == 'part'][:3], [
+            ('Leg', 2), ('P01', 50 - Part.objects.get(name='P01').stock_cnc_tools), ('Ghost', 3),
+        ])
+
+
+# (label, allowed sections, deposit account) for every label with stock effects
+LABELLED_JOBS = [
+    ('deposit', ['painting'], 'Store A'),
+    ('scrapped', ['assembly', 'undercoating'], ''),
+    ('completed', ['assembly', 'painting'], ''),
+    ('in_progress', ['assembly', 'undercoating', 'painting'], ''),
+]
+
+
+class BulkParseTests(SimpleTestCase):
+    def test_expand_range_pads_numbers(self):
+        rows = bulk.expand_range('A', 7, 9, width=4, product='1')
+        self.assertEqual([(r.row, r.job_number, r.product) for r in rows],
+                         [(1, 'A0007', '1'), (2, 'A0008', '1'), (3, 'A0009', '1')])
+        with self.assertRaises(bulk.BulkJobError):
+            bulk.expand_range('A', 9, 7)
+        with self.assertRaises(bulk.BulkJobError):
+            bulk.expand_range('A', 1, bulk.BULK_JOB_LIMIT + 1)
+
+    def test_csv_with_persian_headers(self):
+        upload = SimpleUploadedFile('jobs.csv', '\ufeffشماره کار,محصول,برچسب\nJ1,Chair,امانی\n,,\nJ2,,\n'.encode('utf-8'))
+        rows = bulk.parse_upload(upload)
+        self.assertEqual([(r.row, r.job_number, r.product, r.job_label) for r in rows],
+                         [(2, 'J1', 'Chair', 'امانی'), (4, 'J2', '', '')])
+        filled = bulk.with_defaults(rows, product='7', job_label='in_progress')
+        self.assertEqual([(r.product, r.job_label) for r in filled], [('Chair', 'امانی'), ('7', 'in_progress')])
+
+    def test_xlsx_numbers_are_read_as_integers(self):
+        from io import BytesIO
+
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        wb.active.append(['job_number', 'product'])
+        wb.active.append([1001.0, 12.0])
+        buf = BytesIO()
+        wb.save(buf)
+        rows = bulk.parse_upload(SimpleUploadedFile('jobs.xlsx', buf.getvalue()))
+        self.assertEqual([(r.job_number, r.product) for r in rows], [('1001', '12')])
+
+    def test_missing_job_number_column_is_rejected(self):
+        with self.assertRaises(bulk.BulkJobError):
+            bulk.parse_upload(SimpleUploadedFile('jobs.csv', b'product\n1\n'))
+
+    def test_pending_rows_round_trip_and_reject_tampering(self):
+        rows = bulk.expand_range('J', 1, 3, product='Chair', model='M1')
+        self.assertEqual(bulk.load_pending(bulk.dump_pending(rows)), rows)
+        with self.assertRaises(bulk.BulkJobError):
+            bulk.load_pending(bulk.dump_pending(rows) + 'x')
+
+
+class BulkCreateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.model = ProductModel.objects.create(name='M1')
+        self.single = Product.objects.create(name='Chair', product_model=self.model)
+        self.batch = Product.objects.create(name='Sofa', product_model=self.model)
+        for product in (self.single, self.batch):
+            ProductStock.objects.update_or_create(product=product, defaults={f: 5 for f in STOCK_FIELDS})
+
+    def test_row_errors_are_collected(self):
+        ProductionJob.objects.create(job_number='TAKEN', product=self.single)
+        Product.objects.create(name='Chair', product_model=ProductModel.objects.create(name='M2'))
+        rows = [
+            bulk.JobRow(1, 'J1', product=str(self.batch.pk)),
+            bulk.JobRow(2, 'J1', product=str(self.batch.pk)),
+            bulk.JobRow(3, 'TAKEN', product=str(self.batch.pk)),
+            bulk.JobRow(4, 'J4', product='Nope'),
+            bulk.JobRow(5, 'J5', product='Chair'),
+            bulk.JobRow(6, 'J6', product='Chair', model='M1', job_label='deposit'),
+            bulk.JobRow(7, 'J7', product='Sofa', allowed_sections='assembly, cutting'),
+            bulk.JobRow(8, 'J۸', product='Sofa', allowed_sections='مونتاژ،رنگ'),
+        ]
+        result = bulk.validate_rows(rows)
+        self.assertEqual([e.row for e in result.errors], [2, 3, 4, 5, 6, 7])
+        self.assertFalse(result.ok)
+        self.assertEqual([(j.job_number, j.allowed_sections) for j in result.jobs],
+                         [('J1', ['assembly', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging']),
+                          ('J8', ['assembly', 'painting'])])
+
+    def test_same_stock_effects_as_single_creation(self):
+        for i, (label, sections, account) in enumerate(LABELLED_JOBS):
+            ProductionJob.objects.create(
+                job_number=f'S{i}', product=self.single, job_label=label, allowed_sections=sections,
+                deposit_account=account or None, status=bulk.initial_status_for_label(label),
+            )
+        rows = [
+            bulk.JobRow(i + 1, f'B{i}', product=str(self.batch.pk), job_label=label,
+                        allowed_sections=','.join(sections), deposit_account=account)
+            for i, (label, sections, account) in enumerate(LABELLED_JOBS)
+        ]
+        result = bulk.validate_rows(rows)
+        self.assertTrue(result.ok, result.errors)
+        bulk.create_jobs(result.jobs)
+
+        stocks = {s.product_id: s for s in ProductStock.objects.all()}
+        self.assertEqual(
+            {f: getattr(stocks[self.batch.pk], f) for f in STOCK_FIELDS},
+            {f: getattr(stocks[self.single.pk], f) for f in STOCK_FIELDS},
+        )
+        single = ProductionJob.objects.filter(product=self.single).order_by('job_number')
+        created = ProductionJob.objects.filter(product=self.batch).order_by('job_number')
+        self.assertEqual(
+            [(j.status, j.finished_at is not None) for j in created],
+            [(j.status, j.finished_at is not None) for j in single],
+        )
+
+        def job_movements(product):
+            rows = StockMovement.objects.filter(
+                item_type=StockMovement.ITEM_PRODUCT, item_id=product.pk, job__isnull=False,
+            ).values_list('job__job_number', 'bucket', 'qty')
+            return sorted((number[1:], bucket, qty) for number, bucket, qty in rows)
+
+        self.assertEqual(len(job_movements(self.batch)), 4)
+        self.assertEqual(job_movements(self.batch), job_movements(self.single))
+
+    def test_last_job_becomes_the_default(self):
+        old = ProductionJob.objects.create(job_number='OLD', product=self.single, is_default=True)
+        result = bulk.validate_rows(bulk.expand_range('J', 1, 3, product=str(self.batch.pk)))
+        bulk.create_jobs(result.jobs)
+        self.assertEqual(list(ProductionJob.objects.filter(is_default=True).values_list('job_number', flat=True)), ['J3'])
+        old.refresh_from_db()
+        self.assertFalse(old.is_default)
+
+    def test_number_taken_after_validation_creates_nothing(self):
+        result = bulk.validate_rows(bulk.expand_range('J', 1, 3, product=str(self.batch.pk), job_label='completed'))
+        ProductionJob.objects.create(job_number='J2', product=self.single)
+        with self.assertRaisesMessage(bulk.BulkJobError, 'J2'):
+            bulk.create_jobs(result.jobs)
+        self.assertFalse(ProductionJob.objects.filter(product=self.batch).exists())
+        self.assertEqual(ProductStock.objects.get(product=self.batch).stock_packaging, 5)
+
+
+class JobProgressTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=model)
+        self.leg = Part.objects.create(name='Leg', product_model=model)
+        self.job = ProductionJob.objects.create(job_number='J1', product=self.product)
+        self.user = get_user_model().objects.create_user(username='u', password='x', role='manager', full_name='u')
+
+    def log(self, section, produced=0, scrap=0, job=None):
+        log = ProductionLog(user=self.user, role='manager', model='M1', part=self.leg, job=job or self.job,
+                            section=section, produced_qty=produced, scrap_qty=scrap)
+        log.save()
+        return log
+
+    def columns(self, job=None):
+        return ProductionJob.objects.values(*progress.PROGRESS_FIELDS).get(pk=(job or self.job).pk)
+
+    def test_log_writes_keep_the_columns_current(self):
+        self.log('cutting', produced=5, scrap=1)
+        cnc = self.log('cnc_tools', produced=3, scrap=1)
+        columns = self.columns()
+        self.assertEqual(columns['logged_sections'], ['cutting', 'cnc_tools'])
+        self.assertEqual(columns['last_logged_section'], 'cnc_tools')
+        self.assertEqual(columns['last_logged_at'], cnc.logged_at)
+        self.assertEqual((columns['produced_total'], columns['scrap_total']), (8, 2))
+
+        cnc.delete()
+        self.assertEqual(self.columns(), progress.compute(self.job.pk))
+        self.assertEqual(self.columns()['logged_sections'], ['cutting'])
+
+    def test_deferred_block_refreshes_each_job_once(self):
+        other = ProductionJob.objects.create(job_number='J2', product=self.product)
+        with mock.patch.object(progress, 'refresh', wraps=progress.refresh) as refresh, \
+                mock.patch.object(progress, 'refresh_many', wraps=progress.refresh_many) as refresh_many:
+            with progress.deferred():
+                self.log('cutting', produced=2)
+                self.log('cnc_tools', produced=1)
+                self.log('cutting', produced=4, job=other)
+                self.assertEqual(self.columns()['logged_sections'], [])
+        refresh.assert_not_called()
+        refresh_many.assert_called_once()
+        self.assertEqual(self.columns()['produced_total'], 3)
+        self.assertEqual(self.columns(other)['logged_sections'], ['cutting'])
+
+    def test_verify_command_reports_and_repairs_drift(self):
+        self.log('cutting', produced=5)
+        ProductionLog.objects.update(produced_qty=7)
+        self.assertEqual([job_id for job_id, _, _ in progress.drift()], [self.job.pk])
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verify_job_progress', stdout=out)
+        self.assertIn('produced_total: 5 -> 7', out.getvalue())
+
+        call_command('verify_job_progress', '--repair', stdout=StringIO())
+        self.assertEqual(self.columns()['produced_total'], 7)
+        self.assertEqual(list(progress.drift()), [])
+
+    def test_label_saves_leave_the_columns_alone(self):
+        # English: the label signal saves the new job again (status, finished_at)
+        job = ProductionJob.objects.create(job_number='L1', product=self.product, job_label='completed',
+                                           allowed_sections=['assembly', 'packaging'])
+        self.assertEqual(ProductionJob.objects.get(pk=job.pk).status, 'completed')
+        self.assertEqual(self.columns(job), progress.compute(job.pk))
+
+        stale = ProductionJob.objects.get(pk=job.pk)
+        self.log('assembly', produced=1, job=job)
+        stale.job_label = 'scrapped'
+        stale.save()
+        self.assertEqual(self.columns(job)['logged_sections'], ['assembly'])
+        self.assertEqual(self.columns(job), progress.compute(job.pk))
+
+    def test_delete_job_completely_keeps_other_jobs_current(self):
+        other = ProductionJob.objects.create(job_number='J2', product=self.product)
+        self.log('cutting', produced=2)
+        self.log('cnc_tools', produced=1)
+        self.log('cutting', produced=4, job=other)
+        expected = self.columns(other)
+
+        self.assertEqual(services.delete_job_completely(self.job), (2, 1))
+        self.assertFalse(ProductionJob.objects.filter(pk=self.job.pk).exists())
+        self.assertFalse(ProductionLog.objects.filter(job_id=self.job.pk).exists())
+        self.assertEqual(self.columns(other), expected)
+        self.assertEqual(list(progress.drift()), [])
+
+    def test_batch_entry_keeps_the_columns_current(self):
+        from production_line import batch_entry
+
+        jobs = [
+            ProductionJob.objects.create(job_number=f'B{i}', product=self.product,
+                                         allowed_sections=['assembly', 'undercoating'])
+            for i in range(1, 4)
+        ]
+        result = batch_entry.submit_batch(self.user, 'assembly', ['B1', 'B2', 'B3'], role='manager')
+        self.assertEqual(sorted(log.job.job_number for log in result.logs), ['B1', 'B2', 'B3'])
+        batch_entry.submit_batch(self.user, 'undercoating', ['B2'], role='manager')
+        for job in jobs:
+            self.assertEqual(self.columns(job), progress.compute(job.pk))
+        self.assertEqual(self.columns(jobs[1])['logged_sections'], ['assembly', 'undercoating'])
+        self.assertEqual(self.columns(jobs[1])['last_logged_section'], 'undercoating')
+        self.assertEqual(list(progress.drift()), [])
+
+
+class ProgressDisplayQueryTests(TestCase):
+    """The progress displays cost the same number of queries for one job or many."""
+
+    def setUp(self):
+        cache.clear()
+        model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=model)
+        self.user = get_user_model().objects.create_user(username='u', password='x', role='manager', full_name='u')
+        self.client.force_login(self.user)
+
+    def add_jobs(self, order, count, start=0):
+        for i in range(start, start + count):
+            job = ProductionJob.objects.create(job_number=f'P{i}', product=self.product, order=order,
+                                               allowed_sections=['assembly', 'undercoating'])
+            for section in ('assembly', 'undercoating'):
+                ProductionLog.objects.create(user=self.user, role='manager', model='M1', product=self.product,
+                                             job=job, section=section, produced_qty=1)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_public_order_summary(self):
+        from orders.models import Order
+
+        order = Order.objects.create(customer_name='Sara', status='در انتظار')
+        url = reverse('orders:public_order_summary', args=[order.qr_code])
+        self.add_jobs(order, 1)
+        one = self.count_queries(url)
+        self.add_jobs(order, 9, start=1)
+        cache.clear()
+        self.assertEqual(self.count_queries(url), one)
+
+    def test_job_details_panel(self):
+        self.add_jobs(None, 1)
+        url = reverse('reports:job_details_panel') + '?job_number=P0'
+        one = self.count_queries(url)
+        self.add_jobs(None, 9, start=1)
+        job = ProductionJob.objects.get(job_number='P0')
+        for section in ('painting', 'packaging'):
+            ProductionLog.objects.create(user=self.user, role='manager', model='M1', product=self.product,
+                                         job=job, section=section, produced_qty=1)
+        cache.clear()
+        self.assertEqual(self.count_queries(url), one)
+
+
+def _per_log_rewind(job, ordered_flow, target_cursor, current_cursor):
+    """The per-log loop that ``services.rewind_job_progress`` replaced."""
+    slice_set = set(ordered_flow[target_cursor:current_cursor])
+    logs = list(job.productionlog_set.select_related('job', 'product', 'part').order_by('logged_at', 'id'))
+    prev = [None] + [str(log.section).lower() for log in logs[:-1]]
+    removed = 0
+    for log, prev_section in reversed(list(zip(logs, prev))):
+        if slice_set and log.section in slice_set:
+            log.rollback_inventory(prev_section)
+            log.delete()
+            removed += 1
+            slice_set.remove(log.section)
+    progress.refresh(job)
+    return removed
+
+
+class RewindParityTests(TestCase):
+    """A batched rewind must leave what rolling the logs back one by one leaves."""
+
+    FLOW = ['assembly', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging']
+
+    def setUp(self):
+        cache.clear()
+        model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=model)
+        self.leg = Part.objects.create(name='Leg', product_model=model, stock_cut=1000, stock_cnc_tools=1000)
+        self.seat = Part.objects.create(name='Seat', product_model=model, stock_cut=1000, stock_cnc_tools=1000)
+        self.wood = Material.objects.create(name='Wood', unit='kg', quantity=Decimal('1000.000'))
+        ProductComponent.objects.create(product=self.product, part=self.leg, qty=4)
+        ProductComponent.objects.create(product=self.product, part=self.seat, qty=1)
+        ProductMaterial.objects.create(product=self.product, material=self.wood, qty=Decimal('0.125'))
+        ProductStock.objects.update_or_create(product=self.product, defaults={f: 1000 for f in STOCK_FIELDS})
+        self.user = get_user_model().objects.create_user(username='u', password='x', role='manager', full_name='u')
+
+    def make_jobs(self, rng, count):
+        """Jobs with random labels and logs; ``bulk_create`` skips the forward stock effects."""
+        plans = []
+        for i in range(count):
+            label = rng.choice(['in_progress', 'in_progress', 'deposit'])
+            job = ProductionJob.objects.create(job_number=f'R{i}', product=self.product, job_label=label,
+                                               deposit_account='Store' if label == 'deposit' else None)
+            flow = ([] if rng.random() < 0.7 else ['cutting']) + sorted(
+                rng.sample(self.FLOW, rng.randint(1, len(self.FLOW))), key=self.FLOW.index)
+            logs = []
+            for section in flow:
+                if section == 'cutting':
+                    logs.append(ProductionLog(user=self.user, role='manager', model='M1', part=self.leg, job=job,
+                                              section=section, produced_qty=rng.randint(1, 5), scrap_qty=rng.randint(0, 2)))
+                else:
+                    logs.append(ProductionLog(user=self.user, role='manager', model='M1', product=self.product, job=job,
+                                              section=section, is_scrap=rng.random() < 0.2,
+                                              is_external=rng.random() < 0.15))
+            ProductionLog.objects.bulk_create(logs)
+            progress.refresh(job)
+            target = rng.randint(0, len(flow))
+            plans.append((job, flow, target, rng.randint(target, len(flow) + 1)))
+        return plans
+
+    def state(self):
+        ledger_rows = sorted(
+            StockMovement.objects.filter(log__isnull=False)
+            .values_list('item_type', 'item_id', 'bucket', 'log_id').annotate(total=Sum('qty'))
+        )
+        return {
+            'parts': list(Part.objects.order_by('pk').values_list('stock_cut', 'stock_cnc_tools', 'is_low_stock')),
+            'materials': list(Material.objects.order_by('pk').values_list('quantity', 'is_low_stock')),
+            'stock': ProductStock.objects.values(*STOCK_FIELDS, 'is_low_stock').get(product=self.product),
+            'logs': sorted(ProductionLog.objects.values_list('pk', flat=True)),
+            'jobs': list(ProductionJob.objects.order_by('pk').values_list('pk', *progress.PROGRESS_FIELDS)),
+            'ledger': ledger_rows,
+        }
+
+    def test_random_rewinds_match_the_per_log_rollback(self):
+        for seed in range(6):
+            with self.subTest(seed=seed), transaction.atomic():
+                rng = random.Random(seed)
+                plans = self.make_jobs(rng, 8)
+                with transaction.atomic():
+                    expected_removed = [_per_log_rewind(*plan) for plan in plans]
+                    expected = self.state()
+                    transaction.set_rollback(True)
+                removed = []
+                for job, flow, target, current in plans:
+                    count, new_current = services.rewind_job_progress(job, flow, target, current)
+                    removed.append(count)
+                    self.assertEqual(new_current, flow[target - 1] if target else None)
+                self.assertEqual(removed, expected_removed)
+                self.assertEqual(self.state(), expected)
+                self.assertGreater(sum(removed), 0)
+                transaction.set_rollback(True)
+
+    def test_query_count_does_not_grow_with_the_rewound_logs(self):
+        counts = []
+        for number, flow in (('S', self.FLOW[:2]), ('L', self.FLOW)):
+            job = ProductionJob.objects.create(job_number=number, product=self.product)
+            ProductionLog.objects.bulk_create([
+                ProductionLog(user=self.user, role='manager', model='M1', product=self.product, job=job, section=section)
+                for section in flow
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(services.rewind_job_progress(job, flow, 0, len(flow))[0], len(flow))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -20,16 +20,17 @@ from django.utils import timezone
 import re
 from typing import Iterable
 import json
-from decimal import Decimal
 import jdatetime
 
 from production_line.views import is_manager_or_accountant
 from .models import ProductionJob
-from jobs.forms import CreateJobForm
+from jobs.forms import BulkJobForm, CreateJobForm
 from jobs.services import delete_job_completely, rewind_job_progress
-from production_line.models import SectionChoices, get_components_for_product, get_materials_for_product
+from jobs import bulk, planner
+from jobs.planner import SECTION_LABEL_MAP
+from production_line.models import SectionChoices
 from production_line.utils import product_contains_mdf_page
-from inventory.models import Product, Part, Material
+from inventory.models import Product
 
 
 def _infer_default_allowed_sections(product: Product | None) -> list[str]:
@@ -72,7 +73,6 @@ PRODUCT_SECTION_FLOW = [
     str(SectionChoices.PACKAGING),
 ]
 
-SECTION_LABEL_MAP = {str(slug): label for slug, label in SectionChoices.choices}
 # Map first allowed section to the stock bucket that should feed it
 PREV_STOCK_FIELD_MAP = {
     str(SectionChoices.WORKPAGE): ('stock_assembly', str(SectionChoices.ASSEMBLY)),
@@ -83,158 +83,21 @@ PREV_STOCK_FIELD_MAP = {
     str(SectionChoices.PACKAGING): ('stock_upholstery', str(SectionChoices.UPHOLSTERY)),
 }
 
-SECTION_STOCK_FIELD_MAP = {
-    str(SectionChoices.ASSEMBLY): 'stock_assembly',
-    str(SectionChoices.WORKPAGE): 'stock_workpage',
-    str(SectionChoices.UNDERCOATING): 'stock_undercoating',
-    str(SectionChoices.PAINTING): 'stock_painting',
-    str(SectionChoices.SEWING): 'stock_sewing',
-    str(SectionChoices.UPHOLSTERY): 'stock_upholstery',
-    str(SectionChoices.PACKAGING): 'stock_packaging',
-}
-
 
 def _base_flow_for_product(product: Product | None) -> list[str]:
     """Return canonical flow for a product respecting MDF/page presence."""
     if not product:
         return []
-    has_mdf = product_contains_mdf_page(product)
-    if has_mdf:
-        return [
-            str(SectionChoices.ASSEMBLY),
-            str(SectionChoices.WORKPAGE),
-            str(SectionChoices.UNDERCOATING),
-            str(SectionChoices.PAINTING),
-            str(SectionChoices.PACKAGING),
-        ]
-    return [
-        str(SectionChoices.ASSEMBLY),
-        str(SectionChoices.UNDERCOATING),
-        str(SectionChoices.PAINTING),
-        str(SectionChoices.SEWING),
-        str(SectionChoices.UPHOLSTERY),
-        str(SectionChoices.PACKAGING),
-    ]
+    return planner.base_flow(product_contains_mdf_page(product))
 
 
 def _calculate_job_shortages(product: Product | None, allowed_sections: Iterable[str] | None) -> list[dict]:
-    """Return a list of missing inventory items for creating an in-progress job."""
-    if not product:
-        return []
-    base_flow = _base_flow_for_product(product)
-    if not base_flow:
-        return []
-    allowed_norm = [str(sec).lower() for sec in (allowed_sections or []) if sec]
-
-    # Pick the first *selected* section that is actually part of the product's base flow.
-    first_selected = None
-    if allowed_norm:
-        for sec in base_flow:
-            if sec in allowed_norm:
-                first_selected = sec
-                break
-    # Fallback: first section of the product flow (even if user unticked everything)
-    first_section = (first_selected or base_flow[0]).lower()
-    shortages: list[dict] = []
-
-    # Assembly needs component parts (CNC stock) and materials
-    if first_section == str(SectionChoices.ASSEMBLY):
-        components = get_components_for_product(product)
-        product_model = getattr(product, 'product_model', None)
-        part_ids = [c.get('part_id') or c.get('part_pk') or c.get('part') for c in components if c.get('part_id') or c.get('part_pk') or c.get('part')]
-        parts_map = {}
-        if part_ids:
-            try:
-                parts_map = {p.id: p for p in Part.objects.filter(pk__in=part_ids)}
-            except Exception:
-                parts_map = {}
-
-        for comp in components:
-            pname = (comp.get('part_name') or '').strip()
-            qty = int(comp.get('qty') or 0)
-            if not pname or qty <= 0:
-                continue
-            part_obj = None
-            part_id = comp.get('part_id') or comp.get('part_pk') or comp.get('part')
-            try:
-                part_id_int = int(part_id) if part_id else None
-            except (TypeError, ValueError):
-                part_id_int = None
-            if part_id_int:
-                part_obj = parts_map.get(part_id_int) or Part.objects.filter(pk=part_id_int).first()
-            elif product_model:
-                part_obj = Part.objects.filter(name=pname, product_model=product_model).first()
-            else:
-                part_obj = Part.objects.filter(name=pname).first()
-            available = int(getattr(part_obj, 'stock_cnc_tools', 0) or 0)
-            missing = qty - available
-            if missing > 0:
-                shortages.append({
-                    'name': pname,
-                    'required': qty,
-                    'available': available,
-                    'missing': missing,
-                    'type': 'part',
-                })
+    """Return a list of missing inventory items for creating an in-progress job.
 
-        materials = get_materials_for_product(product)
-        mat_ids = [m.get('material_id') for m in materials if m.get('material_id')]
-        mats_map = {}
-        if mat_ids:
-            try:
-                mats_map = {m.id: m for m in Material.objects.filter(id__in=mat_ids)}
-            except Exception:
-                mats_map = {}
-        for mat in materials:
-            try:
-                req = Decimal(mat.get('qty') or 0)
-            except Exception:
-                continue
-            mat_obj = mats_map.get(mat.get('material_id'))
-            available_raw = getattr(mat_obj, 'quantity', 0) if mat_obj else 0
-            unit = getattr(mat_obj, 'unit', '') if mat_obj else ''
-            try:
-                available = Decimal(available_raw or 0)
-            except Exception:
-                available = Decimal('0')
-            missing = req - available
-            if missing > 0:
-                shortages.append({
-                    'name': (mat.get('material_name') or getattr(mat_obj, 'name', '') or 'ماده اولیه').strip(),
-                    'required': float(req),
-                    'available': float(available),
-                    'missing': float(missing),
-                    'unit': unit,
-                    'type': 'material',
-                })
-        return shortages
-
-    # For later sections, ensure prior-stage product stock exists using base flow (not user-toggled)
-    try:
-        idx = base_flow.index(first_section)
-        prev_section = base_flow[idx - 1] if idx > 0 else None
-    except ValueError:
-        prev_section = None
-    if prev_section:
-        # Map previous section to its own stock column
-        stock_field = SECTION_STOCK_FIELD_MAP.get(prev_section)
-        if stock_field:
-            try:
-                stock_obj = getattr(product, 'stock', None)
-            except Exception:
-                stock_obj = None
-            available = int(getattr(stock_obj, stock_field, 0) or 0)
-            required = 1
-            missing = required - available
-            if missing > 0:
-                shortages.append({
-                    'name': f"موجودی بخش {SECTION_LABEL_MAP.get(prev_section, prev_section)}",
-                    'required': required,
-                    'available': available,
-                    'missing': missing,
-                    'type': 'product',
-                })
-    return shortages
+    Delegates to :mod:`jobs.planner` so single-job checks and the batch
+    plan share one BOM explosion.
+    """
+    return planner.shortages_for_product(product, allowed_sections)
 
 
 def _ordered_allowed_sections(raw_sections: Iterable[str] | None) -> list[str]:
@@ -252,14 +115,8 @@ def _build_progress_state(job: ProductionJob | None, raw_sections: Iterable[str]
     logged_sections: set[str] = set()
 
     if job and flow:
-        try:
-            qs = job.productionlog_set.filter(section__in=flow)
-            logged_sections = {
-                str(sec).lower()
-                for sec in qs.values_list('section', flat=True)
-            }
-        except Exception:
-            logged_sections = set()
+        # English: denormalized by jobs.progress, so no query per job
+        logged_sections = set(getattr(job, 'logged_sections', None) or [])
         for slug in flow:
             if slug in logged_sections:
                 cursor += 1
@@ -494,7 +351,34 @@ def api_job_shortages(request):
         shortages = _calculate_job_shortages(product, allowed_sections)
     except Exception:
         shortages = []
-    return JsonResponse({"ok": True, "shortages": shortages})
+    payload = {"ok": True, "shortages": shortages}
+    # English: net=1 also reports what is missing once open jobs take their share first
+    if (request.GET.get('net') or '').strip() in ('1', 'true'):
+        try:
+            payload["net_shortages"] = planner.shortages_for_product(product, allowed_sections, net=True)
+        except Exception:
+            payload["net_shortages"] = []
+    return JsonResponse(payload)
+
+
+@login_required
+@user_passes_test(is_manager_or_accountant)
+def api_shortage_plan(request):
+    """Return per-job and aggregate shortages for all open in-progress jobs."""
+    try:
+        plan = planner.plan_shortages()
+    except Exception:
+        return JsonResponse({"ok": False, "error": "plan_failed", "jobs": [], "aggregate": []}, status=500)
+    job_numbers = {}
+    if plan.per_job:
+        job_numbers = dict(
+            ProductionJob.objects.filter(pk__in=list(plan.per_job.keys())).values_list('id', 'job_number')
+        )
+    jobs_payload = [
+        {"job_id": job_id, "job_number": job_numbers.get(job_id, ''), "shortages": items}
+        for job_id, items in plan.per_job.items()
+    ]
+    return JsonResponse({"ok": True, "jobs": jobs_payload, "aggregate": plan.aggregate})
 
 
 @login_required
@@ -548,16 +432,8 @@ def job_add_view(request):
                         'inventory_shortages': inventory_shortages,
                     })
 
-            # Determine the initial status based on the label
-            # English: 'repaired' is a label for repair-type jobs, but they are still in progress
-            # until the last allowed section is logged. So start them as in_progress.
-            if job_label in ('in_progress', 'deposit', 'repaired'):
-                initial_status = 'in_progress'
-            elif job_label == 'warranty':
-                initial_status = 'warranty'
-            else:
-                # completed/scrapped set explicit closure state
-                initial_status = job_label
+            # Determine the initial status based on the label (shared with bulk creation)
+            initial_status = bulk.initial_status_for_label(job_label)
             # Build object with all fields before first save to avoid update_fields on new instance
             job_obj = ProductionJob(
                 job_number=job_number_val,
@@ -604,6 +480,86 @@ def job_add_view(request):
         'section_progress_highlight': progress_payload['highlight_slug'],
         'inventory_shortages': inventory_shortages,
     })
+
+
+@login_required
+@user_passes_test(is_manager_or_accountant)
+def job_bulk_add_view(request):
+    """Create many jobs from a number range or an uploaded CSV/XLSX file.
+
+    The whole batch is validated first (row-level error report) and then
+    created in one transaction, or nothing is created at all.  While the user
+    confirms shortages, uploaded rows travel in a signed hidden field.
+    """
+    row_errors: list = []
+    inventory_shortages: list[dict] = []
+    pending_rows = ''
+    pending_count = 0
+    if request.method == 'POST':
+        form = BulkJobForm(request.POST, request.FILES)
+        if form.is_valid():
+            data = form.cleaned_data
+            product = data.get('product')
+            defaults = {
+                'product': str(product.pk) if product else '',
+                'allowed_sections': ','.join(data.get('allowed_sections') or []),
+                'job_label': data.get('job_label') or 'in_progress',
+                'deposit_account': (data.get('deposit_account') or '').strip(),
+            }
+            raw_rows = None
+            try:
+                if data.get('upload'):
+                    raw_rows = bulk.parse_upload(data['upload'])
+                elif data.get('pending_rows'):
+                    raw_rows = bulk.load_pending(data['pending_rows'])
+                if raw_rows is not None:
+                    rows = bulk.with_defaults(raw_rows, **defaults)
+                else:
+                    rows = bulk.expand_range(
+                        data.get('prefix') or '', data['start'], data['end'],
+                        width=data.get('width') or None, **defaults,
+                    )
+            except bulk.BulkJobError as exc:
+                form.add_error(None, str(exc))
+                rows = None
+
+            if rows is not None:
+                validation = bulk.validate_rows(rows)
+                row_errors = validation.errors
+                if validation.ok:
+                    inventory_ack = (request.POST.get('inventory_ack') or '').strip() == '1'
+                    try:
+                        inventory_shortages = bulk.shortages_for_jobs(validation.jobs)
+                    except Exception:
+                        inventory_shortages = []
+                    if inventory_shortages and not inventory_ack:
+                        messages.warning(request, "موجودی کافی نیست. کمبودها را بررسی و در صورت تایید مجدداً ثبت کنید.")
+                        if raw_rows is not None:
+                            pending_rows = bulk.dump_pending(raw_rows)
+                            pending_count = len(raw_rows)
+                    else:
+                        try:
+                            created = bulk.create_jobs(validation.jobs)
+                        except bulk.BulkJobError as exc:
+                            form.add_error(None, str(exc))
+                            if raw_rows is not None:
+                                pending_rows = bulk.dump_pending(raw_rows)
+                                pending_count = len(raw_rows)
+                        else:
+                            messages.success(request, f"{len(created)} کار جدید با موفقیت ایجاد شد.")
+                            return redirect('jobs:job_list')
+                elif row_errors:
+                    messages.error(request, "هیچ کاری ثبت نشد؛ خطاهای ردیف‌ها را برطرف کنید.")
+    else:
+        form = BulkJobForm()
+    return render(request, 'jobs/job_bulk_form.html', {
+        'form': form,
+        'row_errors': row_errors,
+        'inventory_shortages': inventory_shortages,
+        'pending_rows': pending_rows,
+        'pending_count': pending_count,
+        'bulk_job_limit': bulk.BULK_JOB_LIMIT,
+    })
 
 
 @login_required
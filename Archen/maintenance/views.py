@@ -23,8 +23,10 @@ import os
 import json
 import subprocess
 
+from production_line import ledger
 from production_line.utils import get_user_role
 from production_line.models import ProductionLog, ProductStock
+from inventory import low_stock
 from inventory.models import Part, Material
 
 
@@ -36,6 +38,27 @@ def maintenance_view(request):
     return render(request, "maintenance/maintenance.html", {})
 
 
+# English: ``stock_workpage`` is not touched by the maintenance resets.
+RESET_PART_FIELDS = ('stock_cut', 'stock_cnc_tools')
+RESET_PRODUCT_FIELDS = (
+    'stock_undercoating', 'stock_painting', 'stock_sewing',
+    'stock_upholstery', 'stock_assembly', 'stock_packaging',
+)
+
+
+def _zero_stocks(user, *, materials: bool) -> None:
+    """Zero the stock columns, writing the cleared balances to the stock ledger first."""
+    with ledger.recording(ledger.REASON_RESET, user=user):
+        ledger.record_zeroing(Part.objects.all(), RESET_PART_FIELDS)
+        ledger.record_zeroing(ProductStock.objects.all(), RESET_PRODUCT_FIELDS)
+        if materials:
+            ledger.record_zeroing(Material.objects.all(), ('quantity',))
+    Part.objects.update(**low_stock.with_flag(Part, {f: 0 for f in RESET_PART_FIELDS}))
+    ProductStock.objects.update(**low_stock.with_flag(ProductStock, {f: 0 for f in RESET_PRODUCT_FIELDS}))
+    if materials:
+        Material.objects.update(**low_stock.with_flag(Material, {'quantity': 0}))
+
+
 @require_POST
 @login_required
 @transaction.atomic
@@ -50,23 +73,16 @@ def maintenance_action(request):
         messages.success(request, "تمام گزارش‌ها حذف شدند. موجودی‌ها دست‌نخورده باقی ماندند.")
     elif action == "purge_logs_and_zero":
         ProductionLog.objects.all().delete()
-        Part.objects.update(stock_cut=0, stock_cnc_tools=0)
-        ProductStock.objects.update(
-            stock_undercoating=0, stock_painting=0, stock_sewing=0,
-            stock_upholstery=0, stock_assembly=0, stock_packaging=0
-        )
         # Also zero warehouse raw materials quantities so the inventory list shows zeros
         # English: Ensure Materials list (dashboard › warehouse › raw materials) reflects zero quantities.
-        Material.objects.update(quantity=0)
+        _zero_stocks(request.user, materials=True)
         messages.success(request, "تمام گزارش‌ها حذف و همهٔ موجودی‌ها صفر شدند.")
     elif action == "rebuild_stocks":
-        Part.objects.update(stock_cut=0, stock_cnc_tools=0)
-        ProductStock.objects.update(
-            stock_undercoating=0, stock_painting=0, stock_sewing=0,
-            stock_upholstery=0, stock_assembly=0, stock_packaging=0
-        )
-        for log in ProductionLog.objects.order_by('logged_at').all():
-            log.apply_inventory()
+        _zero_stocks(request.user, materials=False)
+        with ledger.recording(ledger.REASON_REBUILD, user=request.user):
+            for log in ProductionLog.objects.order_by('logged_at').all():
+                with ledger.recording(ledger.REASON_REBUILD, log=log, job=log.job_id):
+                    log.apply_inventory()
         messages.success(request, "موجودی‌ها بر اساس گزارش‌های فعلی مجدداً محاسبه شدند.")
     else:
         messages.error(request, "اقدام نامعتبر.")
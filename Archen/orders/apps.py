@@ -5,3 +5,9 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        # English: deleted orders leave a tombstone for the live-orders feed.
+        from orders import sync
+
+        sync.connect_signals()
@@ -224,8 +224,8 @@ class OrderForm(forms.ModelForm):
 
         # Populate product model choices dynamically
         try:
-            from inventory.models import ProductModel
-            self.fields['product_models'].choices = [(m.name, m.name) for m in ProductModel.objects.all().order_by('name')]
+            from inventory import catalog
+            self.fields['product_models'].choices = catalog.model_choices()
         except Exception:
             self.fields['product_models'].choices = []
 
@@ -0,0 +1,172 @@
+# PATH: /Archen/orders/labels.py
+"""Label building for single and batch order label printing.
+
+``build_label_items`` turns an order (with ``items`` prefetched) into label
+dictionaries; ``render_labels_pdf`` draws 100×100 mm labels on A4 landscape
+pages with ReportLab, reusing the cached QR matrices from ``orders.qr``.
+"""
+
+from __future__ import annotations
+
+import os
+
+from orders.qr import public_summary_url, qr_matrix, qr_svg
+from utils.normalize import serial_ascii, to_fullwidth
+from utils.persian_text import shape as fa
+
+LABELS_PER_PAGE = 4
+LABEL_FOOTER_TEXT = (
+    "مشتری گرامی، این برچسب جهت استفاده از خدمات پس از فروش مبل آرچن است. "
+    "جهت فعال‌سازی، شماره سفارش و کد محصول را به شماره همراه ۰۹۰۰۴۰۴۵۱۰۴ ارسال نمایید."
+)
+
+
+def _inline_svg(markup: str) -> str:
+    """Drop the XML declaration so SVG markup can be embedded in HTML."""
+    if markup.startswith('<?xml'):
+        return markup.split('?>', 1)[-1].lstrip()
+    return markup
+
+
+def build_label_items(order, *, per_unit: bool = False, request=None, with_qr: bool = False) -> list[dict]:
+    """Return ``[{'order', 'item', 'code', 'serial', 'qr_svg', 'qr_data'}, ...]`` for ``order``.
+
+    Codes are ``"<serial12> <index>"``; ``code`` uses FULLWIDTH glyphs (same
+    as the warranty card, HTML only) and ``serial`` the ASCII form for the
+    PDF, whose font has no FULLWIDTH digits.  With ``per_unit`` an item of
+    quantity N yields N labels.
+    ``order.items.all()`` must be prefetched by the caller for batch use.
+    """
+    cleaned = serial_ascii(getattr(order, 'qr_code', ''))
+    serial12 = cleaned[:12]
+    qr_data = ''
+    qr_markup = ''
+    if with_qr and getattr(order, 'qr_code', None):
+        qr_data = public_summary_url(request, order.qr_code)
+        try:
+            qr_markup = _inline_svg(qr_svg(qr_data))
+        except Exception:
+            qr_markup = ''
+
+    labels: list[dict] = []
+    idx = 0
+    for item in order.items.all():
+        units = max(1, int(getattr(item, 'quantity', 1) or 1)) if per_unit else 1
+        for _ in range(units):
+            idx += 1
+            serial = f"{serial12} {idx}" if cleaned else ''
+            labels.append({
+                'order': order,
+                'item': item,
+                'code': to_fullwidth(serial),
+                'serial': serial,
+                'qr_svg': qr_markup,
+                'qr_data': qr_data,
+            })
+    return labels
+
+
+def paginate(labels: list[dict], per_page: int = LABELS_PER_PAGE) -> list[list[dict]]:
+    return [labels[i:i + per_page] for i in range(0, len(labels), per_page)]
+
+
+def _register_fonts() -> tuple[str, str]:
+    """Register Vazirmatn from static files when available."""
+    from django.contrib.staticfiles import finders
+    from reportlab.pdfbase import pdfmetrics  # type: ignore
+    from reportlab.pdfbase.ttfonts import TTFont  # type: ignore
+
+    try:
+        registered = pdfmetrics.getRegisteredFontNames()
+        regular = finders.find('fonts/Vazirmatn/Vazirmatn-Regular.ttf')
+        bold = finders.find('fonts/Vazirmatn/Vazirmatn-Bold.ttf')
+        if regular and os.path.exists(regular):
+            if 'Vazirmatn' not in registered:
+                pdfmetrics.registerFont(TTFont('Vazirmatn', regular))
+            bold_name = 'Vazirmatn'
+            if bold and os.path.exists(bold):
+                if 'Vazirmatn-Bold' not in registered:
+                    pdfmetrics.registerFont(TTFont('Vazirmatn-Bold', bold))
+                bold_name = 'Vazirmatn-Bold'
+            return 'Vazirmatn', bold_name
+    except Exception:
+        pass
+    return 'Helvetica', 'Helvetica-Bold'
+
+
+def render_labels_pdf(labels: list[dict]) -> bytes:
+    """Draw labels (two columns × two rows per A4 landscape page) and return PDF bytes."""
+    from io import BytesIO
+    from reportlab.lib.pagesizes import A4, landscape  # type: ignore
+    from reportlab.lib.units import mm  # type: ignore
+    from reportlab.pdfgen import canvas  # type: ignore
+
+    font, font_bold = _register_fonts()
+    page_w, page_h = landscape(A4)
+    size = 100 * mm
+    gap = 20 * mm
+    left0 = (page_w - 2 * size - gap) / 2
+    bottom0 = (page_h - 2 * size) / 2
+
+    buf = BytesIO()
+    pdf = canvas.Canvas(buf, pagesize=(page_w, page_h))
+    for page in paginate(labels):
+        for pos, label in enumerate(page):
+            col, row = pos % 2, pos // 2
+            # RTL reading order: first label on the right-hand column.
+            x = left0 + (1 - col) * (size + gap)
+            y = bottom0 + (1 - row) * size
+            _draw_label(pdf, label, x, y, size, font, font_bold)
+        pdf.showPage()
+    pdf.save()
+    return buf.getvalue()
+
+
+def _draw_label(pdf, label: dict, x: float, y: float, size: float, font: str, font_bold: str) -> None:
+    from reportlab.lib.units import mm  # type: ignore
+
+    order = label['order']
+    item = label['item']
+    pdf.setLineWidth(1.2)
+    pdf.roundRect(x + 2 * mm, y + 2 * mm, size - 4 * mm, size - 4 * mm, 3 * mm)
+
+    right = x + size - 8 * mm
+    top = y + size - 12 * mm
+    pdf.setFont(font_bold, 12)
+    pdf.drawRightString(right, top, fa("مبل آرچن"))
+
+    if label.get('qr_data'):
+        matrix = qr_matrix(label['qr_data'])
+        qr_size = 22 * mm
+        cell = qr_size / max(1, len(matrix))
+        qx = x + 8 * mm
+        qy = y + size - 8 * mm - qr_size
+        pdf.setFillColorRGB(0, 0, 0)
+        for r, cells in enumerate(matrix):
+            for c, on in enumerate(cells):
+                if on:
+                    pdf.rect(qx + c * cell, qy + (len(matrix) - 1 - r) * cell, cell, cell, stroke=0, fill=1)
+
+    # English: Vazirmatn has no FULLWIDTH digit glyphs, so draw the ASCII serial.
+    code = label.get('serial') or getattr(item, 'job_number', '') or '-'
+    product = getattr(item, 'product', None)
+    rows = [
+        ("کد اشتراک", getattr(order, 'subscription_code', '') or '-'),
+        ("نام مشتری", getattr(order, 'customer_name', '') or '-'),
+        ("شماره سفارش", getattr(order, 'badge_number', '') or str(order.pk)),
+        ("نام محصول", getattr(product, 'name', '') or '-'),
+        ("کد محصول", code),
+    ]
+    line_y = y + size - 40 * mm
+    for title, value in rows:
+        pdf.setFont(font_bold, 9)
+        pdf.drawRightString(right, line_y, fa(title))
+        pdf.setFont(font, 10)
+        pdf.drawCentredString(x + size / 2 - 10 * mm, line_y, fa(str(value)))
+        line_y -= 8 * mm
+
+    pdf.setFont(font, 6.5)
+    words = LABEL_FOOTER_TEXT.split(' ')
+    half = len(words) // 2
+    for offset, chunk in enumerate((' '.join(words[:half]), ' '.join(words[half:]))):
+        pdf.drawRightString(right, y + 12 * mm - offset * 4 * mm, fa(chunk))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:22
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def seed_counter(apps, schema_editor):
+    """Number existing orders by id and start the counter after the highest."""
+    Order = apps.get_model('orders', 'Order')
+    OrderSyncState = apps.get_model('orders', 'OrderSyncState')
+    Order.objects.update(sync_seq=F('id'))
+    top = Order.objects.aggregate(m=Max('id'))['m'] or 0
+    OrderSyncState.objects.update_or_create(pk=1, defaults={'seq': top, 'pruned_seq': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_order_current_stage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(default=0)),
+                ('pruned_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField()),
+                ('seq', models.BigIntegerField(unique=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='sync_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(seed_counter, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,5 @@
 # PATH: /Archen/orders/models.py
-from django.db import models
+from django.db import models, transaction
 import django_jalali.db.models as jmodels
 
 
@@ -82,18 +82,50 @@ class Order(models.Model):
         help_text="شناسه یکتا برای تولید کد QR سفارش."
     )
 
+    # Change counter for the live-orders feed (see ``orders.sync``).
+    sync_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
     def save(self, *args, **kwargs):
-        """Assign a QR code once on initial save.  Uses uuid4 for randomness."""
+        """Assign a QR code once on initial save.  Uses uuid4 for randomness.
+
+        Every save also takes the next ``orders.sync`` counter value.
+        """
         import uuid
+        from orders import sync
         if not getattr(self, "qr_code", None):
             # Generate a 32-character hex string
             self.qr_code = uuid.uuid4().hex
-        return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'sync_seq'}
+        # English: keep the counter row locked until the order row is committed
+        with transaction.atomic():
+            self.sync_seq = sync.next_seq()
+            return super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.customer_name} - {self.order_date}"
 
 
+class OrderTombstone(models.Model):
+    """Deleted order id, kept for ``orders.sync.TOMBSTONE_TTL`` so clients can drop it."""
+    order_id = models.BigIntegerField()
+    seq = models.BigIntegerField(unique=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.order_id} @ {self.seq}"
+
+
+class OrderSyncState(models.Model):
+    """Single row holding the live-orders change counter (see ``orders.sync``)."""
+    seq = models.BigIntegerField(default=0)
+    pruned_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"seq={self.seq}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey('inventory.Product', on_delete=models.PROTECT)
@@ -0,0 +1,62 @@
+# PATH: /Archen/orders/qr.py
+"""Shared QR rendering for order labels, warranty cards and the SVG endpoint.
+
+QR output depends only on the encoded text, so results are cached:
+SVG markup in the shared Django cache (``qr`` namespace, reused across
+workers and requests) and module matrices in a per-process LRU for PDF
+drawing.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django.urls import reverse
+
+from utils.cache import cached
+
+QR_CACHE_NAMESPACE = 'qr'
+# QR markup never changes for the same payload; keep it for 30 days.
+QR_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+def public_summary_url(request, code: str) -> str:
+    """Absolute URL encoded into an order QR (``code`` may already be a URL)."""
+    if not code:
+        return ''
+    if code.startswith('http://') or code.startswith('https://'):
+        return code
+    path = reverse('orders:public_order_summary', args=[code])
+    return request.build_absolute_uri(path) if request is not None else path
+
+
+def _make_qr(data: str):
+    import qrcode  # type: ignore
+
+    qr = qrcode.QRCode(
+        version=None,  # automatically determine the minimal version
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=8,  # cell size; overall SVG will scale without blur
+        border=0,    # outer quiet zone handled by layout CSS
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def _build_svg(data: str) -> str:
+    from qrcode.image.svg import SvgPathImage  # type: ignore
+
+    img = _make_qr(data).make_image(image_factory=SvgPathImage)
+    svg = img.to_string()
+    return svg.decode('utf-8') if isinstance(svg, bytes) else svg
+
+
+def qr_svg(data: str) -> str:
+    """Return SVG markup for ``data``, cached in the shared ``qr`` namespace."""
+    return cached(QR_CACHE_NAMESPACE, ['svg', data], lambda: _build_svg(data), timeout=QR_CACHE_TIMEOUT)
+
+
+@lru_cache(maxsize=2048)
+def qr_matrix(data: str) -> tuple[tuple[bool, ...], ...]:
+    """Return the QR module matrix (without quiet zone) for vector drawing."""
+    return tuple(tuple(bool(cell) for cell in row) for row in _make_qr(data).get_matrix())
@@ -0,0 +1,103 @@
+"""Change cursor for incremental order sync (the dashboard live-orders feed).
+
+Every ``Order`` save takes the next value of a single counter
+(:class:`~orders.models.OrderSyncState`) and stores it in
+``Order.sync_seq``; every delete records an
+:class:`~orders.models.OrderTombstone` with its own counter value.  A client
+that remembers the counter value it last saw (the *cursor*) asks for the rows
+and tombstones above it and gets exactly what changed.
+
+- The counter row is incremented with ``UPDATE`` inside the writer's
+  transaction, so it stays locked until that transaction commits.  Writers
+  therefore commit in counter order and a reader can never see value ``n+1``
+  before ``n`` is visible; the cursor is a server-side number, so client
+  clocks play no part in it.
+- Tombstones older than ``TOMBSTONE_TTL`` are pruned as new ones are written;
+  ``OrderSyncState.pruned_seq`` remembers the highest pruned value, and a
+  cursor below it has expired (the client must reload the full list).
+- ``QuerySet.update()`` skips ``Order.save``; code that updates orders that
+  way must also set ``sync_seq=next_seq()`` or clients will not see it.
+"""
+
+from __future__ import annotations
+
+import datetime
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+TOMBSTONE_TTL = datetime.timedelta(days=30)
+STATE_PK = 1
+
+
+def next_seq() -> int:
+    """Reserve the next counter value; call inside the writing transaction."""
+    from .models import OrderSyncState
+
+    with transaction.atomic():
+        if not OrderSyncState.objects.filter(pk=STATE_PK).update(seq=F('seq') + 1):
+            # English: the row is created by the migration; recreate it after a flush.
+            OrderSyncState.objects.get_or_create(pk=STATE_PK, defaults={'seq': _highest_seq()})
+            OrderSyncState.objects.filter(pk=STATE_PK).update(seq=F('seq') + 1)
+        return OrderSyncState.objects.values_list('seq', flat=True).get(pk=STATE_PK)
+
+
+def _highest_seq() -> int:
+    from .models import Order, OrderTombstone
+
+    return max(
+        Order.objects.aggregate(m=Max('sync_seq'))['m'] or 0,
+        OrderTombstone.objects.aggregate(m=Max('seq'))['m'] or 0,
+    )
+
+
+def state() -> tuple[int, int]:
+    """``(cursor, pruned_seq)``: the newest committed value and the expiry floor."""
+    from .models import OrderSyncState
+
+    row = OrderSyncState.objects.filter(pk=STATE_PK).values_list('seq', 'pruned_seq').first()
+    return row or (0, 0)
+
+
+def changes(since: int, cursor: int):
+    """Orders saved and ids deleted in ``(since, cursor]``."""
+    from .models import Order, OrderTombstone
+
+    orders = Order.objects.filter(sync_seq__gt=since, sync_seq__lte=cursor)
+    deleted = list(
+        OrderTombstone.objects
+        .filter(seq__gt=since, seq__lte=cursor)
+        .order_by('seq')
+        .values_list('order_id', flat=True)
+    )
+    return orders, deleted
+
+
+def prune_tombstones(now=None) -> int:
+    """Drop tombstones older than ``TOMBSTONE_TTL`` and raise the expiry floor."""
+    from .models import OrderSyncState, OrderTombstone
+
+    cutoff = (now or timezone.now()) - TOMBSTONE_TTL
+    old = OrderTombstone.objects.filter(deleted_at__lt=cutoff)
+    floor = old.aggregate(m=Max('seq'))['m']
+    if floor is None:
+        return 0
+    with transaction.atomic():
+        OrderSyncState.objects.filter(pk=STATE_PK, pruned_seq__lt=floor).update(pruned_seq=floor)
+        deleted, _ = OrderTombstone.objects.filter(seq__lte=floor).delete()
+    return deleted
+
+
+def _record_delete(sender, instance, **kwargs):
+    from .models import OrderTombstone
+
+    OrderTombstone.objects.create(order_id=instance.pk, seq=next_seq())
+    prune_tombstones()
+
+
+def connect_signals() -> None:
+    from .models import Order
+
+    post_delete.connect(_record_delete, sender=Order, weak=False, dispatch_uid='orders.sync:delete')
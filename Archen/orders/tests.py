@@ -0,0 +1,190 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Product, ProductModel
+from jobs.models import ProductionJob
+
+from . import labels, qr, sync
+from .models import Order, OrderItem, OrderTombstone
+
+
+def make_user(username, role):
+    return get_user_model().objects.create_user(username=username, password='x', role=role, full_name=username)
+
+
+class OrderFixtureMixin:
+    def setUp(self):
+        cache.clear()
+        self.model = ProductModel.objects.create(name='M1')
+        self.sofa = Product.objects.create(name='Sofa', product_model=self.model)
+        self.table = Product.objects.create(name='Table', product_model=self.model)
+
+    def make_order(self, name, **fields):
+        order = Order.objects.create(customer_name=name, status='در انتظار', **fields)
+        OrderItem.objects.create(order=order, product=self.sofa, quantity=2)
+        OrderItem.objects.create(order=order, product=self.table, quantity=1)
+        return order
+
+
+class LabelItemsTests(OrderFixtureMixin, TestCase):
+    def test_one_label_per_unit_with_ascii_and_fullwidth_serials(self):
+        order = self.make_order('Sara', qr_code='ab12cd34ef56aa99')
+        items = labels.build_label_items(order, per_unit=True)
+        self.assertEqual([i['serial'] for i in items], ['AB12CD34EF56 1', 'AB12CD34EF56 2', 'AB12CD34EF56 3'])
+        self.assertEqual([i['item'].product.name for i in items], ['Sofa', 'Sofa', 'Table'])
+        self.assertEqual(items[0]['code'], 'ＡＢ１２ＣＤ３４ＥＦ５６ １')
+
+    def test_single_order_page_keeps_one_label_per_item(self):
+        order = self.make_order('Sara')
+        self.assertEqual(len(labels.build_label_items(order)), 2)
+
+
+class BatchLabelTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user('manager', 'manager'))
+
+    def batch(self, orders, **params):
+        ids = ','.join(str(o.pk) for o in orders)
+        return self.client.get(reverse('orders:labels_batch'), {'ids': ids, **params})
+
+    def test_query_count_does_not_grow_with_the_order_count(self):
+        orders = [self.make_order(f'Customer {i}') for i in range(6)]
+        counts = []
+        for subset in (orders[:2], orders):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(subset)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(response.context['label_count'], 18)
+        self.assertEqual(len(response.context['label_pages']), 5)
+
+    def test_pdf_draws_the_ascii_serial(self):
+        order = self.make_order('Sara', qr_code='ab12cd34ef56aa99')
+        drawn = []
+        original = labels._draw_label
+
+        def record(pdf, label, *args):
+            with mock.patch.object(pdf, 'drawCentredString', side_effect=lambda x, y, text: drawn.append(text)):
+                original(pdf, label, *args)
+
+        with mock.patch.object(labels, '_draw_label', record):
+            response = self.batch([order], fmt='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertIn('AB12CD34EF56 3', drawn)
+
+    def test_empty_selection_is_rejected(self):
+        response = self.client.get(reverse('orders:labels_batch'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_qr_markup_is_built_once_per_payload(self):
+        orders = [self.make_order(f'Customer {i}') for i in range(2)]
+        with mock.patch.object(qr, '_build_svg', wraps=qr._build_svg) as build:
+            self.batch(orders)
+            self.batch(orders)
+        self.assertEqual(build.call_count, 2)
+
+
+class LiveOrdersSyncTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user('manager', 'manager'))
+        self.first = self.make_order('Sara')
+        self.second = self.make_order('Omid')
+
+    def feed(self, **params):
+        return self.client.get(reverse('orders:live_orders_feed'), params)
+
+    def test_every_save_and_delete_takes_the_next_counter_value(self):
+        seqs = [self.first.sync_seq, self.second.sync_seq]
+        self.first.customer_name = 'Sara K'
+        self.first.save(update_fields=['customer_name'])
+        self.first.refresh_from_db()
+        self.assertGreater(self.first.sync_seq, max(seqs))
+        self.second.delete()
+        tombstone = OrderTombstone.objects.get()
+        self.assertGreater(tombstone.seq, self.first.sync_seq)
+        self.assertEqual(sync.state()[0], tombstone.seq)
+
+    def test_delta_holds_only_the_changes_since_the_cursor(self):
+        full = self.feed().json()
+        self.assertTrue(full['full'])
+        self.assertEqual({o['id'] for o in full['orders']}, {self.first.pk, self.second.pk})
+        self.assertEqual(self.feed(since=full['cursor']).status_code, 204)
+
+        self.first.status = 'در حال ساخت'
+        self.first.save()
+        removed = self.second.pk
+        self.second.delete()
+        third = self.make_order('Nima')
+        delta = self.feed(since=full['cursor']).json()
+        self.assertFalse(delta['full'])
+        self.assertEqual([o['id'] for o in delta['orders']], [self.first.pk, third.pk])
+        self.assertEqual(delta['deleted'], [removed])
+        self.assertEqual(self.feed(since=delta['cursor']).status_code, 204)
+
+    def test_changed_orders_that_stop_matching_the_search_are_dropped(self):
+        cursor = self.feed(q='Sara').json()['cursor']
+        self.first.customer_name = 'Leila'
+        self.first.save()
+        delta = self.feed(q='Sara', since=cursor).json()
+        self.assertEqual((delta['orders'], delta['deleted']), ([], [self.first.pk]))
+
+    def test_pruned_or_future_cursors_reload_the_full_list(self):
+        cursor = self.feed().json()['cursor']
+        self.first.delete()
+        OrderTombstone.objects.update(deleted_at=timezone.now() - sync.TOMBSTONE_TTL - datetime.timedelta(days=1))
+        self.assertEqual(sync.prune_tombstones(), 1)
+        for since in (cursor, sync.state()[0] + 5):
+            response = self.feed(since=since).json()
+            self.assertTrue(response['full'])
+            self.assertTrue(response['reset'])
+            self.assertEqual([o['id'] for o in response['orders']], [self.second.pk])
+
+    def test_more_changes_than_one_page_reload_the_full_list(self):
+        cursor = self.feed().json()['cursor']
+        self.first.save()
+        self.second.save()
+        response = self.feed(since=cursor, limit=1).json()
+        self.assertTrue(response['full'])
+        self.assertEqual(len(response['orders']), 1)
+
+
+class JobsBySelectionTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user('manager', 'manager'))
+
+    def jobs(self, **params):
+        return self.client.get(reverse('orders:jobs_by_selection'), params)
+
+    def test_unassigned_jobs_of_the_selected_products(self):
+        ProductionJob.objects.create(job_number='J1', product=self.sofa)
+        ProductionJob.objects.create(job_number='J2', product=self.table)
+        ProductionJob.objects.create(job_number='J3', product=self.sofa, order=self.make_order('Sara'))
+        jobs = self.jobs(**{'models[]': ['M1'], 'product_ids[]': [self.sofa.pk]}).json()['jobs']
+        self.assertEqual([(j['job_number'], j['product_name'], j['product_model']) for j in jobs], [('J1', 'Sofa', 'M1')])
+
+    def test_nothing_selected_returns_no_jobs(self):
+        ProductionJob.objects.create(job_number='J1', product=self.sofa)
+        self.assertEqual(self.jobs().json(), {'jobs': []})
+
+    def test_query_count_does_not_grow_with_the_jobs(self):
+        counts = []
+        for numbers in (['J1'], ['J2', 'J3', 'J4', 'J5']):
+            for number in numbers:
+                ProductionJob.objects.create(job_number=number, product=self.sofa)
+            with CaptureQueriesContext(connection) as queries:
+                self.jobs(**{'product_ids[]': [self.sofa.pk]})
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -24,5 +24,7 @@ urlpatterns = [
     path("public/<str:serial>/", views.public_order_summary, name="public_order_summary"),
     # Printable label page for an order
     path("label/<int:pk>/", views.order_label, name="label"),
+    # Batch labels: ?ids=1,2,3 or ?df=&dt=&stage=; add fmt=pdf for a PDF sheet
+    path("labels/batch/", views.order_labels_batch, name="labels_batch"),
     path("qr/<str:code>.svg", views.qr_image_svg, name="qr_image"),
 ]
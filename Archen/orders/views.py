@@ -5,19 +5,22 @@
 import json
 import jdatetime
 from django.views.generic import ListView, CreateView, UpdateView  # type: ignore # noqa: E501
-from django.urls import reverse_lazy, reverse  # type: ignore
+from django.urls import reverse_lazy  # type: ignore
 from django.http import JsonResponse  # type: ignore
 from django.http import HttpResponse
 from django.views import View
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib import messages
 from django.db import IntegrityError, transaction
-from django.db.models import F
+from django.db.models import F, Prefetch, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 from .models import Order, OrderItem
 from .forms import OrderForm, _extract_product_ids
+from .labels import build_label_items, paginate, render_labels_pdf
+from .qr import public_summary_url, qr_svg
 from inventory.models import Product
 from inventory.models import Part  # update part inventory on order create/update/delete # noqa: E501
 
@@ -27,6 +30,7 @@ from django.db import models  # for Q in job selection logic
 
 from jobs.models import ProductionJob
 from jobs.views import _build_progress_state
+from utils.normalize import digit_variants, serial_ascii, to_ascii_digits, to_fullwidth
 
 
 def _generate_unique_qr_code(*, exclude_pk=None, max_attempts=6):
@@ -85,42 +89,8 @@ class OrderListView(LoginRequiredMixin, ListView):
             # Normalize whitespace
             qstr = ' '.join(search_raw.split())
 
-            # Helper to create digit-variant strings for broader matching.
-            def _variants(s: str) -> list[str]:
-                # Returns [raw, ascii_digits, persian_digits, arabic_indic_digits]
-                try:
-                    raw = s
-                    # Map Persian/Arabic-Indic → ASCII
-                    def to_ascii_digits(t: str) -> str:
-                        out = []
-                        for ch in t:
-                            code = ord(ch)
-                            if 0x06F0 <= code <= 0x06F9:
-                                out.append(chr(code - 0x06F0 + ord('0')))
-                            elif 0x0660 <= code <= 0x0669:
-                                out.append(chr(code - 0x0660 + ord('0')))
-                            else:
-                                out.append(ch)
-                        return ''.join(out)
-
-                    ascii_s = to_ascii_digits(raw)
-                    # Map ASCII → Persian and ASCII → Arabic-Indic
-                    def map_digits(t: str, base: int) -> str:
-                        out = []
-                        for ch in t:
-                            if '0' <= ch <= '9':
-                                out.append(chr(ord(ch) - 48 + base))
-                            else:
-                                out.append(ch)
-                        return ''.join(out)
-
-                    persian = map_digits(ascii_s, 0x06F0)
-                    arabic = map_digits(ascii_s, 0x0660)
-                    return [raw, ascii_s, persian, arabic]
-                except Exception:
-                    return [s]
-
-            variants = _variants(qstr)
+            # Raw/ASCII/Persian/Arabic-Indic digit spellings for broader matching.
+            variants = digit_variants(qstr)
 
             # Build a broad OR query across key text fields and related data.
             # Limit search to fields exposed on the order form so results never
@@ -387,29 +357,6 @@ def warranty_card(request):
             ctx['pre_qr_code'] = ''
 
     # Compute a display-only serial string (English digits + uppercase) strictly for the card
-    def _to_english_upper(s: str) -> str:
-        """Convert Persian/Arabic-Indic digits to ASCII and uppercase letters.
-
-        This affects only the warranty card serial display (not stored data).
-        """
-        out: list[str] = []
-        for ch in str(s or ""):
-            code = ord(ch)
-            # Persian digits U+06F0..U+06F9
-            if 0x06F0 <= code <= 0x06F9:
-                out.append(chr(code - 0x06F0 + ord('0')))
-                continue
-            # Arabic-Indic digits U+0660..U+0669
-            if 0x0660 <= code <= 0x0669:
-                out.append(chr(code - 0x0660 + ord('0')))
-                continue
-            # Keep only ASCII alnum; uppercase letters; drop others for display
-            ch_u = ch.upper()
-            if ('A' <= ch_u <= 'Z') or ('0' <= ch_u <= '9'):
-                out.append(ch_u)
-            # ignore other symbols/spaces to guarantee ASCII-only output
-        return ''.join(out)
-
     raw_code = ''
     try:
         raw_code = getattr(ctx.get('order'), 'qr_code', '') if ctx.get('order') else ''
@@ -417,29 +364,11 @@ def warranty_card(request):
         raw_code = ''
     if not raw_code:
         raw_code = ctx.get('pre_qr_code', '')
-    cleaned = ''
-    try:
-        cleaned = _to_english_upper(str(raw_code))
-    except Exception:
-        cleaned = str(raw_code or '')
+    cleaned = serial_ascii(raw_code)
     if not cleaned:
-        try:
-            cleaned = _to_english_upper(str(ctx.get('pre_qr_code', '')))
-        except Exception:
-            cleaned = str(ctx.get('pre_qr_code', '') or '')
+        cleaned = serial_ascii(ctx.get('pre_qr_code', ''))
     # Final guard: convert ASCII letters+digits to FULLWIDTH (consistent glyph set)
-    def _to_fullwidth_ascii(s: str) -> str:
-        out: list[str] = []
-        for ch in s:
-            if '0' <= ch <= '9':
-                out.append(chr(ord(ch) - 48 + 0xFF10))
-            elif 'A' <= ch <= 'Z':
-                out.append(chr(ord(ch) - 65 + 0xFF21))
-            else:
-                out.append(ch)
-        return ''.join(out)
-
-    ctx['serial_display'] = _to_fullwidth_ascii((cleaned or '')[:12])
+    ctx['serial_display'] = to_fullwidth(cleaned[:12])
     return render(request, 'orders/warranty.html', ctx)
 
 
@@ -504,32 +433,6 @@ def warranty_card_serial(request, serial: str):
         pass
 
     # Serial text used on the card (ASCII-only, then rendered as FULLWIDTH for consistency)
-    def _to_english_upper(s: str) -> str:
-        out: list[str] = []
-        for ch in str(s or ""):
-            code = ord(ch)
-            if 0x06F0 <= code <= 0x06F9:  # Persian digits
-                out.append(chr(code - 0x06F0 + ord('0')))
-                continue
-            if 0x0660 <= code <= 0x0669:  # Arabic-Indic digits
-                out.append(chr(code - 0x0660 + ord('0')))
-                continue
-            ch_u = ch.upper()
-            if ('A' <= ch_u <= 'Z') or ('0' <= ch_u <= '9'):
-                out.append(ch_u)
-        return ''.join(out)
-
-    def _to_fullwidth_ascii(s: str) -> str:
-        out: list[str] = []
-        for ch in s:
-            if '0' <= ch <= '9':
-                out.append(chr(ord(ch) - 48 + 0xFF10))
-            elif 'A' <= ch <= 'Z':
-                out.append(chr(ord(ch) - 65 + 0xFF21))
-            else:
-                out.append(ch)
-        return ''.join(out)
-
     raw_code = ''
     try:
         raw_code = getattr(ctx.get('order'), 'qr_code', '') if ctx.get('order') else ''
@@ -537,8 +440,7 @@ def warranty_card_serial(request, serial: str):
         raw_code = ''
     if not raw_code:
         raw_code = ctx.get('pre_qr_code', '')
-    cleaned = _to_english_upper(str(raw_code or ''))
-    ctx['serial_display'] = _to_fullwidth_ascii((cleaned or '')[:12])
+    ctx['serial_display'] = to_fullwidth(serial_ascii(raw_code)[:12])
 
     return render(request, 'orders/warranty.html', ctx)
 
@@ -551,59 +453,17 @@ def order_label(request, pk: int):
     the provided Label.xlsx file.
     """
 
-    def _to_english_upper(s: str) -> str:
-        """Normalize QR code to ASCII uppercase letters and digits."""
-        out: list[str] = []
-        for ch in str(s or ""):
-            code = ord(ch)
-            # Persian digits
-            if 0x06F0 <= code <= 0x06F9:
-                out.append(chr(code - 0x06F0 + ord("0")))
-                continue
-            # Arabic-Indic digits
-            if 0x0660 <= code <= 0x0669:
-                out.append(chr(code - 0x0660 + ord("0")))
-                continue
-            ch_u = ch.upper()
-            if ("A" <= ch_u <= "Z") or ("0" <= ch_u <= "9"):
-                out.append(ch_u)
-        return "".join(out)
-
-    def _to_fullwidth_ascii(s: str) -> str:
-        """Convert ASCII letters/digits to FULLWIDTH glyphs for visual consistency."""
-        out: list[str] = []
-        for ch in s:
-            if "0" <= ch <= "9":
-                out.append(chr(ord(ch) - 48 + 0xFF10))
-            elif "A" <= ch <= "Z":
-                out.append(chr(ord(ch) - 65 + 0xFF21))
-            else:
-                out.append(ch)
-        return "".join(out)
-
     order = get_object_or_404(
         Order.objects.prefetch_related("items__product__product_model"),
         pk=pk,
     )
 
     # Build the same base serial string used on the warranty card, limited to 12 chars.
-    raw_code = getattr(order, "qr_code", "") or ""
-    cleaned = _to_english_upper(raw_code)
-    serial_base = _to_fullwidth_ascii((cleaned or "")[:12]) if cleaned else ""
+    serial_base = to_fullwidth(serial_ascii(getattr(order, "qr_code", ""))[:12])
 
-    # Build per-item product codes: "<serial_base> <index>" where the whole
-    # string is rendered using the same FULLWIDTH ASCII mapping so that both
-    # the base and the appended index are visually English (non-localized).
-    label_items = []
-    items = list(order.items.all())
-    if cleaned:
-        for idx, item in enumerate(items, start=1):
-            ascii_code = f"{(cleaned or '')[:12]} {idx}"
-            fullwidth_code = _to_fullwidth_ascii(ascii_code)
-            label_items.append({"item": item, "code": fullwidth_code})
-    else:
-        for item in items:
-            label_items.append({"item": item, "code": ""})
+    # Per-item product codes: "<serial_base> <index>" rendered with FULLWIDTH
+    # ASCII so both the base and the index stay visually English.
+    label_items = build_label_items(order)
 
     context = {
         "order": order,
@@ -613,43 +473,94 @@ def order_label(request, pk: int):
     return render(request, "orders/label.html", context)
 
 
+ORDER_LABELS_BATCH_LIMIT = 500
+
+
+@login_required(login_url="/users/login/")
+def order_labels_batch(request):
+    """Print labels for many orders in one page (or one PDF).
+
+    Orders are selected by ``ids`` (repeated or comma-separated) or by the
+    ``df``/``dt`` Jalali order-date range and ``stage`` (current stage).
+    One label is produced per product unit.  Orders and items are loaded in
+    two queries regardless of the number of orders, and QR markup comes from
+    the shared cache in ``orders.qr``.
+    """
+    raw_ids: list[str] = []
+    for value in request.GET.getlist("ids"):
+        raw_ids.extend(part.strip() for part in value.split(","))
+    ids = [int(v) for v in raw_ids if v.isdigit()]
+
+    qs = Order.objects.all()
+    if ids:
+        qs = qs.filter(pk__in=ids)
+    else:
+        df = _parse_jalali_date(request.GET.get("df"))
+        dt = _parse_jalali_date(request.GET.get("dt"))
+        stage = (request.GET.get("stage") or "").strip()
+        if not (df or dt or stage):
+            return HttpResponse("هیچ سفارشی انتخاب نشده است.", status=400)
+        if df:
+            qs = qs.filter(order_date__gte=df)
+        if dt:
+            qs = qs.filter(order_date__lte=dt)
+        if stage:
+            qs = qs.filter(current_stage=stage)
+
+    orders = list(
+        qs.order_by("id").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product").order_by("id"))
+        )[:ORDER_LABELS_BATCH_LIMIT]
+    )
+
+    labels: list[dict] = []
+    for order in orders:
+        labels.extend(build_label_items(order, per_unit=True, request=request, with_qr=True))
+
+    if (request.GET.get("fmt") or "").lower() == "pdf":
+        pdf_bytes = render_labels_pdf(labels)
+        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = 'inline; filename="order_labels.pdf"'
+        return response
+
+    context = {
+        "orders": orders,
+        "label_pages": paginate(labels),
+        "label_count": len(labels),
+        "truncated": len(orders) >= ORDER_LABELS_BATCH_LIMIT,
+    }
+    return render(request, "orders/label_batch.html", context)
+
+
+def _parse_jalali_date(value: str | None):
+    """Parse 'YYYY/MM/DD' or 'YYYY-MM-DD' (Persian/Arabic digits allowed)."""
+    text = (value or "").strip()
+    if not text:
+        return None
+    text = to_ascii_digits(text).replace("-", "/")
+    try:
+        year, month, day = (int(x) for x in text.split("/"))
+        return jdatetime.date(year, month, day)
+    except Exception:
+        return None
+
+
 def qr_image_svg(request, code: str):
     """Generate and return a real QR code as SVG for the given ``code``.
 
     - Uses the lightweight ``qrcode`` library with the SVG image factory,
-      so no Pillow dependency is required.
+      so no Pillow dependency is required; output is cached (``orders.qr``).
     - Falls back to a simple placeholder SVG only if the library is missing
       or generation fails for any reason.
     """
     try:
-        import qrcode  # type: ignore
-        from qrcode.image.svg import SvgPathImage  # type: ignore
-
-        qr = qrcode.QRCode(
-            version=None,  # automatically determine the minimal version
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=8,  # cell size; overall SVG will scale without blur
-            border=0,    # outer quiet zone handled by layout CSS
-        )
-        qr_data = code or ""
         try:
-            if code:
-                if not (code.startswith("http://") or code.startswith("https://")):
-                    public_url = request.build_absolute_uri(
-                        reverse("orders:public_order_summary", args=[code])
-                    )
-                    qr_data = public_url
-                else:
-                    qr_data = code
+            qr_data = public_summary_url(request, code) or ""
         except Exception:
             qr_data = code or ""
-
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        img = qr.make_image(image_factory=SvgPathImage)
-        # ``to_string()`` returns bytes containing the SVG markup
-        svg_bytes = img.to_string()
-        return HttpResponse(svg_bytes, content_type="image/svg+xml; charset=utf-8")
+        # English: markup is cached per payload in the shared "qr" namespace.
+        svg = qr_svg(qr_data)
+        return HttpResponse(svg, content_type="image/svg+xml; charset=utf-8")
     except Exception:
         # Fallback placeholder to ensure something is visible and printable
         svg = f'''<?xml version="1.0" encoding="UTF-8"?>
@@ -688,9 +599,16 @@ def public_order_summary(request, serial: str):
             status=404,
         )
 
+    # English: progress comes from the job columns and logs are prefetched,
+    # so the page costs the same number of queries for any number of jobs.
     jobs_qs = (
         ProductionJob.objects.filter(order=order)
         .select_related("product", "part")
+        .prefetch_related(Prefetch(
+            "productionlog_set",
+            queryset=ProductionLog.objects.select_related("product", "part", "user").order_by("logged_at"),
+            to_attr="ordered_logs",
+        ))
         .order_by("created_at")
     )
 
@@ -714,18 +632,12 @@ def public_order_summary(request, serial: str):
 
         progress_values.append(percent)
 
-        logs = (
-            ProductionLog.objects.filter(job=job)
-            .select_related("product", "part", "user")
-            .order_by("logged_at")
-        )
-
         jobs_data.append(
             {
                 "instance": job,
                 "progress_percent": percent,
                 "flow_items": flow_items,
-                "logs": logs,
+                "logs": job.ordered_logs,
             }
         )
 
@@ -734,35 +646,8 @@ def public_order_summary(request, serial: str):
         overall_progress = int(round(sum(progress_values) / len(progress_values)))
 
     # Reuse the same QR serial display logic as the warranty card.
-    def _to_english_upper(s: str) -> str:
-        out: list[str] = []
-        for ch in str(s or ""):
-            code = ord(ch)
-            if 0x06F0 <= code <= 0x06F9:
-                out.append(chr(code - 0x06F0 + ord("0")))
-                continue
-            if 0x0660 <= code <= 0x0669:
-                out.append(chr(code - 0x0660 + ord("0")))
-                continue
-            ch_u = ch.upper()
-            if ("A" <= ch_u <= "Z") or ("0" <= ch_u <= "9"):
-                out.append(ch_u)
-        return "".join(out)
-
-    def _to_fullwidth_ascii(s: str) -> str:
-        out: list[str] = []
-        for ch in s:
-            if "0" <= ch <= "9":
-                out.append(chr(ord(ch) - 48 + 0xFF10))
-            elif "A" <= ch <= "Z":
-                out.append(chr(ord(ch) - 65 + 0xFF21))
-            else:
-                out.append(ch)
-        return "".join(out)
-
     raw_code = getattr(order, "qr_code", "") or serial
-    cleaned = _to_english_upper(raw_code)
-    serial_display = _to_fullwidth_ascii((cleaned or "")[:12]) if cleaned else ""
+    serial_display = to_fullwidth(serial_ascii(raw_code)[:12])
 
     context = {
         "order": order,
@@ -1256,21 +1141,13 @@ class ProductsByModelsView(LoginRequiredMixin, View):
     """
 
     def get(self, request, *args, **kwargs):
+        from inventory import catalog
+
         models_sel = request.GET.getlist('models[]') or request.GET.getlist('models')
         if not models_sel:
             return JsonResponse({'products': []})
-        # Filter products by the names of their related product models and
-        # order by model then product name.
-        qs = Product.objects.filter(product_model__name__in=models_sel).select_related('product_model').order_by('product_model__name', 'name')
-        data = [
-            {
-                'id': p.id,
-                'name': p.name,
-                'model': p.product_model.name if p.product_model else ''
-            }
-            for p in qs
-        ]
-        return JsonResponse({'products': data})
+        # Served from the cached catalog snapshot (ordered by model then name).
+        return JsonResponse({'products': catalog.products_for_models(models_sel)})
 
 
 class JobsBySelectionView(LoginRequiredMixin, View):
@@ -1310,7 +1187,7 @@ class JobsBySelectionView(LoginRequiredMixin, View):
             return JsonResponse({"jobs": []})
 
         # Base queryset: unassigned jobs. On edit, include jobs linked to this order as well.
-        base_qs = ProductionJob.objects.select_related('product', 'product__product_model')
+        base_qs = ProductionJob.objects.all()
         if order_id:
             base_qs = base_qs.filter(models.Q(order__isnull=True) | models.Q(order_id=order_id))
         else:
@@ -1328,10 +1205,8 @@ class JobsBySelectionView(LoginRequiredMixin, View):
             if order_id:
                 qs = base_qs.filter(order_id=order_id)
             else:
-                qs = base_qs.none()
+                return JsonResponse({"jobs": []})
 
-        # Prepare response payload
-        jobs_data = []
         # Mapping of job_label to color classes and Persian label used elsewhere in the app
         label_map = {
             'in_progress': ('bg-gray-500 text-white', 'در حال ساخت'),
@@ -1341,28 +1216,24 @@ class JobsBySelectionView(LoginRequiredMixin, View):
             'repaired':    ('bg-blue-600 text-white', 'تعمیرات'),
             'deposit':     ('bg-yellow-600 text-white', 'امانی'),
         }
-        for job in qs:
-            try:
-                pid = getattr(job, 'product_id', None)
-                pname = getattr(job.product, 'name', '') if getattr(job, 'product', None) else ''
-                try:
-                    pmodel = job.product.product_model.name if job.product and job.product.product_model else ''
-                except Exception:
-                    pmodel = ''
-                label_display = job.get_job_label_display() if hasattr(job, 'get_job_label_display') else getattr(job, 'job_label', '')
-                color_cls, fa_label = label_map.get(getattr(job, 'job_label', ''), ('bg-gray-400 text-white', label_display))
-                jobs_data.append({
-                    'id': job.pk,
-                    'job_number': job.job_number,
-                    'product_id': pid,
-                    'product_name': pname,
-                    'product_model': pmodel,
-                    'label': fa_label,
-                    'color_class': color_cls,
-                })
-            except Exception:
-                # Skip malformed jobs safely
-                continue
+        label_display = dict(ProductionJob.LABEL_CHOICES)
+        # English: one query; names come from the joins, no model instances.
+        rows = qs.annotate(
+            product_name=Coalesce('product__name', Value('')),
+            product_model_name=Coalesce('product__product_model__name', Value('')),
+        ).values_list('id', 'job_number', 'product_id', 'product_name', 'product_model_name', 'job_label')
+        jobs_data = []
+        for pk, job_number, pid, pname, pmodel, job_label in rows:
+            color_cls, fa_label = label_map.get(job_label, ('bg-gray-400 text-white', label_display.get(job_label, job_label)))
+            jobs_data.append({
+                'id': pk,
+                'job_number': job_number,
+                'product_id': pid,
+                'product_name': pname,
+                'product_model': pmodel,
+                'label': fa_label,
+                'color_class': color_cls,
+            })
 
         return JsonResponse({"jobs": jobs_data})
 
@@ -1390,36 +1261,85 @@ class OrderStageUpdateView(LoginRequiredMixin, View):
 
 class LiveOrdersFeedView(LoginRequiredMixin, View):
     login_url = "/users/login/"
-    """Return a lightweight JSON feed of the latest orders for dashboard sync."""
+    """Lightweight JSON feed of the latest orders for dashboard sync.
+
+    Without ``since`` (or with an expired one) the response is the newest
+    ``limit`` orders with ``full: true``.  With ``since`` set to the
+    ``cursor`` of an earlier response it holds only the orders saved since
+    then plus the ids to drop (``deleted``: deleted orders, and with ``q``
+    changed orders that no longer match).  Nothing changed -> ``204``.
+    See ``orders.sync`` for how the cursor is kept.
+    """
+
+    @staticmethod
+    def _row(order):
+        return {
+            'id': order.id,
+            'badge_number': order.badge_number or '',
+            'subscription_code': order.subscription_code or '',
+            'customer_name': order.customer_name or '',
+            'model': order.model or '',
+            'status': order.status,
+            'status_display': order.get_status_display(),
+        }
+
+    @staticmethod
+    def _search(search):
+        return (
+            models.Q(badge_number__icontains=search) |
+            models.Q(subscription_code__icontains=search) |
+            models.Q(customer_name__icontains=search) |
+            models.Q(exhibition_name__icontains=search)
+        )
 
     def get(self, request, *args, **kwargs):
+        from orders import sync
+
         try:
             limit = int(request.GET.get('limit', 200))
         except (TypeError, ValueError):
             limit = 200
         limit = max(1, min(limit, 500))
-
         search = (request.GET.get('q') or '').strip()
+        try:
+            since = int(request.GET.get('since', ''))
+        except (TypeError, ValueError):
+            since = None
+
+        # English: read the cursor before the rows; a change racing the read
+        # is sent again next time, which the client merge absorbs.
+        cursor, pruned = sync.state()
+        expired = since is not None and (since < pruned or since > cursor)
+
+        if since is not None and not expired:
+            if since == cursor:
+                return HttpResponse(status=204)
+            changed, deleted = sync.changes(since, cursor)
+            changed = changed.order_by('sync_seq')
+            if changed[limit:limit + 1].exists():
+                # More changes than one page holds: cheaper to start over
+                expired = True
+            else:
+                data = []
+                for order in changed:
+                    if search and not _order_matches(order, search):
+                        deleted.append(order.id)
+                        continue
+                    data.append(self._row(order))
+                return JsonResponse({'full': False, 'cursor': cursor, 'orders': data, 'deleted': deleted})
+
         qs = Order.objects.order_by('-id')
         if search:
-            qs = qs.filter(
-                models.Q(badge_number__icontains=search) |
-                models.Q(subscription_code__icontains=search) |
-                models.Q(customer_name__icontains=search) |
-                models.Q(exhibition_name__icontains=search)
-            )
-
-        data = []
-        for order in qs[:limit]:
-            data.append({
-                'id': order.id,
-                'badge_number': order.badge_number or '',
-                'subscription_code': order.subscription_code or '',
-                'customer_name': order.customer_name or '',
-                'model': order.model or '',
-                'status': order.status,
-                'status_display': order.get_status_display(),
-            })
-
-        return JsonResponse({'orders': data})
+            qs = qs.filter(self._search(search))
+        data = [self._row(order) for order in qs[:limit]]
+        return JsonResponse({'full': True, 'reset': expired, 'cursor': cursor, 'orders': data, 'deleted': []})
+
+
+def _order_matches(order, search: str) -> bool:
+    """Python twin of ``LiveOrdersFeedView._search`` for rows already loaded."""
+    needle = search.casefold()
+    return any(
+        needle in (value or '').casefold()
+        for value in (order.badge_number, order.subscription_code, order.customer_name, order.exhibition_name)
+    )
 
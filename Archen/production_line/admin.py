@@ -1,6 +1,6 @@
 # PATH: /Archen/production_line/admin.py
 from django.contrib import admin
-from .models import ProductionLine, ProductionLog, ProductStock
+from .models import ProductionLine, ProductionLog, ProductStock, StockMovement
 
 
 @admin.register(ProductionLine)
@@ -64,3 +64,21 @@ class ProductStockAdmin(admin.ModelAdmin):
 
 
 # [auto] Removed non-model admin registration: admin.site.register(SectionChoices)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only view of the append-only stock ledger."""
+
+    list_display = ("id", "created_at", "item_type", "item_id", "bucket", "qty", "reason", "log_id", "job_id", "user_id")
+    list_filter = ("item_type", "reason", "bucket")
+    search_fields = ("=item_id", "job__job_number")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
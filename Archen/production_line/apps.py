@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'production_line'
+
+    def ready(self):
+        # English: every save of a stock row also lands in the movement ledger.
+        from production_line import ledger
+
+        ledger.connect_signals()
@@ -0,0 +1,437 @@
+"""Batch work entry: log many product jobs for one section in one submission.
+
+Operators at the end of a shift often finish dozens of identical units.
+Instead of one POST per job, :func:`submit_batch` takes a list of job
+numbers and:
+
+- locks the submitted job rows and checks eligibility against them with
+  set-based queries (logs already present in the section, logs of the
+  previous allowed section);
+- computes each job's stock movement with the same rules as
+  ``ProductionLog.apply_inventory`` and checks product, part and material
+  stock against the locked rows, allocating in the submitted order so the
+  outcome matches sequential single entries;
+- creates every log with ``bulk_create`` in one transaction and applies the
+  stock movement as one aggregated ``F()`` update per product/part/material.
+
+By default the batch is all-or-nothing; with ``allow_partial=True`` the
+valid jobs are logged and the rest are reported per job number.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from inventory import low_stock
+from inventory.models import Material, Part, ProductComponent, ProductMaterial
+from jobs import progress
+from jobs.models import LABEL_STOCK_FIELD_MAP, ProductionJob
+from utils.normalize import to_ascii_digits
+from . import ledger
+from .idempotency import remember
+from .models import ProductionLog, ProductStock, SectionChoices, StockMovement
+
+BATCH_ENTRY_LIMIT = 200
+# Canonical business order of the product sections.
+PRODUCT_FLOW = ['assembly', 'workpage', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging']
+JOB_UPDATE_FIELDS = ['current_section', 'is_external_entry', 'status', 'job_label', 'finished_at']
+
+_SPLIT_RE = re.compile(r'[\s,،;]+')
+
+
+class BatchEntryError(Exception):
+    """Raised for problems with the whole submission (empty, too many jobs)."""
+
+
+@dataclass
+class JobError:
+    job_number: str
+    message: str
+
+
+@dataclass
+class BatchResult:
+    logs: list[ProductionLog] = field(default_factory=list)
+    errors: list[JobError] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.logs) and not self.errors
+
+
+@dataclass
+class _Movement:
+    job: ProductionJob
+    stock_deltas: dict[str, int]
+    consume_bom: bool
+    job_updates: dict
+    parts_used: list[tuple[int, int]] = field(default_factory=list)
+    materials_used: list[tuple[int, Decimal]] = field(default_factory=list)
+
+
+def parse_job_numbers(raw) -> list[str]:
+    """Split scanned/typed input into unique job numbers (ASCII digits, input order)."""
+    if isinstance(raw, str):
+        raw = [raw]
+    seen: dict[str, None] = {}
+    for chunk in raw or []:
+        for token in _SPLIT_RE.split(to_ascii_digits(chunk)):
+            if token:
+                seen.setdefault(token, None)
+    return list(seen)
+
+
+def _allowed_flow(job) -> list[str]:
+    allowed = {str(x).lower() for x in (getattr(job, 'allowed_sections', None) or [])}
+    return [s for s in PRODUCT_FLOW if s in allowed]
+
+
+def _section_allowed(job, section: str) -> bool:
+    """Whether ``job`` may be logged in ``section``; an empty allowed list does not gate."""
+    if not (getattr(job, 'allowed_sections', None) or []):
+        return True
+    return section in _allowed_flow(job)
+
+
+def _previous_allowed(job, section: str) -> str | None:
+    """Previous allowed section that must be logged before ``section`` (None if not gated)."""
+    flow = _allowed_flow(job)
+    if section not in flow:
+        return None
+    idx = flow.index(section)
+    return flow[idx - 1] if idx > 0 else None
+
+
+def eligible_open_jobs(section: str):
+    """Open jobs that may be logged in ``section``, using two queries.
+
+    Same rules as the single-entry dropdown: not finished, no log in this
+    section yet, section allowed, and the previous allowed section logged.
+    Jobs without allowed product sections are left out.
+    """
+    jobs = list(
+        ProductionJob.objects
+        .filter(finished_at__isnull=True)
+        .exclude(productionlog__section=section)
+        .order_by('-created_at')
+    )
+    logged = set(
+        ProductionLog.objects
+        .filter(job_id__in=[j.pk for j in jobs])
+        .values_list('job_id', 'section')
+    )
+    out = []
+    for job in jobs:
+        if not _section_allowed(job, section):
+            continue
+        prev = _previous_allowed(job, section)
+        if prev and (job.pk, prev) not in logged:
+            continue
+        out.append(job)
+    return out
+
+
+def _closes_job(job, section: str) -> bool:
+    flow = _allowed_flow(job)
+    return bool(flow and flow[-1] == section) or section == SectionChoices.PACKAGING
+
+
+def _advance_updates(job, section: str, *, external: bool) -> dict:
+    status = job.status
+    label = job.job_label or ''
+    finished_at = job.finished_at
+    if _closes_job(job, section):
+        status = 'repaired' if job.status == 'warranty' else 'completed'
+        finished_at = timezone.now()
+    if status == 'completed' and label == 'in_progress':
+        label = 'completed'
+    return {
+        'current_section': section,
+        'is_external_entry': external,
+        'status': status,
+        'job_label': label,
+        'finished_at': finished_at,
+    }
+
+
+def _scrapped_updates(section: str) -> dict:
+    return {
+        'current_section': section,
+        'is_external_entry': False,
+        'status': 'scrapped',
+        'job_label': 'scrapped',
+        'finished_at': timezone.now(),
+    }
+
+
+def job_movement(job, section: str, *, is_scrap: bool, is_external: bool) -> _Movement:
+    """Stock movement and job changes for logging ``job`` in ``section``.
+
+    Mirrors ``ProductionLog.apply_inventory`` for product logs without
+    touching the database.
+    """
+    prev = str(job.current_section or '').lower()
+    prev_field = LABEL_STOCK_FIELD_MAP.get(prev) if prev else None
+    cur_field = LABEL_STOCK_FIELD_MAP.get(section)
+    deltas: dict[str, int] = defaultdict(int)
+
+    if is_external:
+        if cur_field:
+            deltas[cur_field] += 1
+        return _Movement(job, deltas, False, _advance_updates(job, section, external=True))
+
+    if (job.job_label or '') == 'deposit':
+        # Deposit jobs never consume BOM inputs; previous bucket moves even into assembly.
+        if prev_field:
+            deltas[prev_field] -= 1
+        if is_scrap:
+            return _Movement(job, deltas, False, _scrapped_updates(section))
+        if cur_field:
+            deltas[cur_field] += 1
+        return _Movement(job, deltas, False, _advance_updates(job, section, external=False))
+
+    is_assembly = section == SectionChoices.ASSEMBLY
+    if prev_field and not is_assembly:
+        deltas[prev_field] -= 1
+    if is_scrap:
+        return _Movement(job, deltas, is_assembly, _scrapped_updates(section))
+    if cur_field:
+        deltas[cur_field] += 1
+    return _Movement(job, deltas, is_assembly, _advance_updates(job, section, external=False))
+
+
+def _load_jobs(numbers: list[str]) -> dict[str, ProductionJob]:
+    """Lock and load the jobs for ``numbers`` (call inside a transaction).
+
+    Eligibility and stock deltas are computed from these locked rows, so a
+    concurrent entry for the same job waits instead of being applied twice.
+    """
+    return {
+        j.job_number: j
+        for j in ProductionJob.objects
+        .filter(job_number__in=numbers)
+        .select_related('product__product_model')
+        # English: lock only the job rows; the product join is nullable.
+        .select_for_update(of=('self',))
+        .order_by('pk')
+    }
+
+
+def lock_job(job, section: str) -> bool:
+    """Lock ``job`` and reload its progress columns for a single entry.
+
+    Returns False when ``section`` was logged meanwhile.  Single entries call
+    this inside their transaction so they serialize with :func:`submit_batch`.
+    """
+    row = ProductionJob.objects.select_for_update().filter(pk=job.pk).values(*JOB_UPDATE_FIELDS).first()
+    if row is None:
+        return False
+    for name, value in row.items():
+        setattr(job, name, value)
+    return not ProductionLog.objects.filter(job_id=job.pk, section=section).exists()
+
+
+def _eligibility_errors(section: str, numbers: list[str], jobs: dict[str, ProductionJob], *, is_external: bool) -> dict[str, str]:
+    logged = set(
+        ProductionLog.objects
+        .filter(job_id__in=[j.pk for j in jobs.values()])
+        .values_list('job_id', 'section')
+    )
+    section_labels = dict(SectionChoices.choices)
+    errors: dict[str, str] = {}
+    for number in numbers:
+        job = jobs.get(number)
+        if job is None:
+            errors[number] = "شماره کار یافت نشد."
+        elif not job.product_id:
+            errors[number] = "محصول این شماره کار مشخص نیست."
+        elif job.finished_at is not None:
+            errors[number] = "این شماره کار بسته شده است."
+        elif not _section_allowed(job, section):
+            errors[number] = "این شماره کار برای این بخش مجاز نیست."
+        elif (job.pk, section) in logged:
+            errors[number] = "این شماره کار پیش‌تر در این بخش ثبت شده است."
+        elif (job.job_label or '') == 'deposit' and is_external:
+            errors[number] = "برای کار امانی امکان انتخاب کلاف بیرون وجود ندارد."
+        else:
+            prev = _previous_allowed(job, section)
+            if prev and (job.pk, prev) not in logged:
+                errors[number] = f"مرحله قبلی ({section_labels.get(prev, prev)}) برای این شماره کار ثبت نشده است."
+    return errors
+
+
+class _StockBook:
+    """Locked stock rows for the batch with in-memory running balances."""
+
+    def __init__(self, product_ids: set[int], consuming_product_ids: set[int]):
+        have = set(ProductStock.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+        # English: apply_inventory creates missing stock rows on demand; do it once up front.
+        ProductStock.objects.bulk_create(
+            [ProductStock(product_id=pid) for pid in sorted(product_ids - have)],
+            ignore_conflicts=True,
+        )
+        self.products = {
+            s.product_id: {f: int(getattr(s, f) or 0) for f in LABEL_STOCK_FIELD_MAP.values()}
+            for s in ProductStock.objects.select_for_update().filter(product_id__in=product_ids)
+        }
+        self.components: dict[int, list[tuple[int, int, str]]] = defaultdict(list)
+        for product_id, part_id, qty, name in (
+            ProductComponent.objects
+            .filter(product_id__in=consuming_product_ids, qty__gt=0)
+            .values_list('product_id', 'part_id', 'qty', 'part__name')
+        ):
+            self.components[product_id].append((part_id, int(qty), (name or '').strip()))
+        self.materials: dict[int, list[tuple[int, Decimal, str]]] = defaultdict(list)
+        for product_id, material_id, qty, name in (
+            ProductMaterial.objects
+            .filter(product_id__in=consuming_product_ids, qty__gt=0)
+            .values_list('product_id', 'material_id', 'qty', 'material__name')
+        ):
+            self.materials[product_id].append((material_id, Decimal(qty), (name or '').strip()))
+        part_ids = {p for rows in self.components.values() for p, _, _ in rows}
+        material_ids = {m for rows in self.materials.values() for m, _, _ in rows}
+        self.parts = {
+            p.pk: int(p.stock_cnc_tools or 0)
+            for p in Part.objects.select_for_update().filter(pk__in=part_ids)
+        }
+        self.material_qty = {
+            m.pk: ledger.to_qty(m.quantity)
+            for m in Material.objects.select_for_update().filter(pk__in=material_ids)
+        }
+        # Aggregated changes to write back.
+        self.product_deltas: dict[int, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.part_used: dict[int, int] = defaultdict(int)
+        self.material_used: dict[int, Decimal] = defaultdict(Decimal)
+
+    def allocate(self, movement: _Movement) -> str | None:
+        """Reserve stock for ``movement``; return an error message instead when short."""
+        product_id = movement.job.product_id
+        balances = self.products.get(product_id, {})
+        for fname, delta in movement.stock_deltas.items():
+            if delta < 0 and balances.get(fname, 0) + delta < 0:
+                return "موجودی محصول کافی نیست"
+        parts = materials = []
+        if movement.consume_bom:
+            parts = [(pid, qty, name) for pid, qty, name in self.components.get(product_id, []) if pid in self.parts]
+            missing = sorted({name for pid, qty, name in parts if self.parts[pid] < qty})
+            if missing:
+                return "موجودی قطعات زیر کافی نیست: " + "، ".join(missing)
+            materials = [(mid, qty, name) for mid, qty, name in self.materials.get(product_id, []) if mid in self.material_qty]
+            missing = sorted({name for mid, qty, name in materials if self.material_qty[mid] < qty})
+            if missing:
+                return "موجودی مواد اولیه زیر کافی نیست: " + "، ".join(missing)
+        for fname, delta in movement.stock_deltas.items():
+            balances[fname] = balances.get(fname, 0) + delta
+            self.product_deltas[product_id][fname] += delta
+        for pid, qty, _name in parts:
+            self.parts[pid] -= qty
+            self.part_used[pid] += qty
+            movement.parts_used.append((pid, qty))
+        for mid, qty, _name in materials:
+            self.material_qty[mid] -= qty
+            self.material_used[mid] += qty
+            movement.materials_used.append((mid, qty))
+        return None
+
+    def write(self) -> None:
+        for product_id, fields in self.product_deltas.items():
+            changes = {fname: F(fname) + delta for fname, delta in fields.items() if delta}
+            if changes:
+                ProductStock.objects.filter(product_id=product_id).update(**low_stock.with_flag(ProductStock, changes))
+        for part_id, qty in self.part_used.items():
+            Part.objects.filter(pk=part_id).update(**low_stock.with_flag(Part, {'stock_cnc_tools': F('stock_cnc_tools') - qty}))
+        for material_id, qty in self.material_used.items():
+            new_quantity = ledger.rounded(F('quantity') - qty)
+            Material.objects.filter(pk=material_id).update(**low_stock.with_flag(Material, {'quantity': new_quantity}))
+
+
+def _record_movements(logs: list[ProductionLog], movements: list[_Movement], user) -> None:
+    """Write the per-log stock ledger rows that ``apply_inventory`` would have made."""
+    with ledger.recording(ledger.REASON_BATCH_ENTRY, user=user):
+        for log, m in zip(logs, movements):
+            for fname, delta in m.stock_deltas.items():
+                ledger.record(StockMovement.ITEM_PRODUCT, m.job.product_id, fname, delta, log=log, job=m.job)
+            for pid, qty in m.parts_used:
+                ledger.record(StockMovement.ITEM_PART, pid, 'stock_cnc_tools', -qty, log=log, job=m.job)
+            for mid, qty in m.materials_used:
+                ledger.record(StockMovement.ITEM_MATERIAL, mid, 'quantity', -qty, log=log, job=m.job)
+
+
+def submit_batch(user, section: str, job_numbers, *, role: str = '', is_scrap: bool = False,
+                 is_external: bool = False, note: str | None = None,
+                 allow_partial: bool = False, idempotency_key: str | None = None) -> BatchResult:
+    """Validate and log ``job_numbers`` in ``section`` in one transaction.
+
+    Without ``allow_partial`` nothing is written when any job fails; the
+    returned ``errors`` then list every problem at once.  ``idempotency_key``
+    is stored with the logs (see ``production_line.idempotency``).
+    """
+    from utils.cache import bump_namespace
+
+    numbers = parse_job_numbers(job_numbers)
+    if not numbers:
+        raise BatchEntryError("هیچ شماره کاری وارد نشده است.")
+    if len(numbers) > BATCH_ENTRY_LIMIT:
+        raise BatchEntryError(f"حداکثر {BATCH_ENTRY_LIMIT} شماره کار در هر ثبت گروهی مجاز است.")
+
+    result = BatchResult()
+    with transaction.atomic():
+        jobs = _load_jobs(numbers)
+        errors = _eligibility_errors(section, numbers, jobs, is_external=is_external)
+        candidates = [jobs[n] for n in numbers if n not in errors]
+
+        movements = [job_movement(j, section, is_scrap=is_scrap, is_external=is_external) for j in candidates]
+        book = _StockBook(
+            {m.job.product_id for m in movements},
+            {m.job.product_id for m in movements if m.consume_bom},
+        )
+        accepted: list[_Movement] = []
+        for movement in movements:
+            message = book.allocate(movement)
+            if message:
+                errors[movement.job.job_number] = message
+            else:
+                accepted.append(movement)
+
+        result.errors = [JobError(n, errors[n]) for n in numbers if n in errors]
+        if not accepted or (result.errors and not allow_partial):
+            return result
+
+        remember(idempotency_key, user, 'work_entry_batch')
+        logs = [
+            ProductionLog(
+                user=user, role=role or '', section=section,
+                model=getattr(getattr(m.job.product, 'product_model', None), 'name', '') or '',
+                product=m.job.product, job=m.job, is_scrap=bool(is_scrap),
+                is_external=bool(is_external) and (m.job.job_label or '') != 'deposit',
+                note=note,
+            )
+            for m in accepted
+        ]
+        # bulk_create skips ProductionLog.save(), so apply_inventory does not run;
+        # the book writes the same movement aggregated.
+        result.logs = ProductionLog.objects.bulk_create(logs)
+        book.write()
+        _record_movements(result.logs, accepted, user)
+
+        updated = []
+        for m in accepted:
+            for fname, value in m.job_updates.items():
+                setattr(m.job, fname, value)
+            updated.append(m.job)
+        ProductionJob.objects.bulk_update(updated, JOB_UPDATE_FIELDS)
+        progress.refresh_many(j.pk for j in updated)
+        # Single entry marks the submitted job as default; the last one wins here.
+        last = updated[-1]
+        ProductionJob.objects.filter(is_default=True).exclude(pk=last.pk).update(is_default=False)
+        ProductionJob.objects.filter(pk=last.pk).update(is_default=True)
+        # bulk_create/bulk_update skip post_save, so invalidate dependent caches explicitly.
+        transaction.on_commit(lambda: bump_namespace('metrics'))
+    return result
@@ -1,8 +1,8 @@
 # production_line/forms.py
 from django import forms
-from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
+from inventory import catalog
 from inventory.models import Part, Product
 from .models import ProductionLog, SectionChoices
 from .utils import (
@@ -21,12 +21,12 @@ class WorkEntryForm(forms.ModelForm):
         widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_model"}),
     )
     # حالت «بخش قطعه‌محور»: انتخاب قطعه
-    part = forms.ModelChoiceField(
+    part = catalog.CatalogChoiceField(
         queryset=Part.objects.none(), required=False, label=_("قطعه"),
         empty_label=" ", widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_part"}),
     )
     # حالت «بخش محصول‌محور»: انتخاب محصول
-    product = forms.ModelChoiceField(
+    product = catalog.CatalogChoiceField(
         queryset=Product.objects.none(), required=False, label=_("محصول"),
         empty_label="انتخاب محصول", widget=forms.Select(attrs={"class": SELECT_CLS, "id": "id_product"}),
     )
@@ -74,12 +74,11 @@ class WorkEntryForm(forms.ModelForm):
         self.user = user
         self.section = section
 
-        # بارگذاری ProductModel ها برای لیست مدل
+        # بارگذاری ProductModel ها برای لیست مدل (از اسنپ‌شات کش‌شده کاتالوگ)
         try:
-            from inventory.models import ProductModel
-            models_qs = ProductModel.objects.all().order_by('name')
-            self.fields['model'].choices = [('', 'انتخاب مدل')] + [(m.name, m.name) for m in models_qs]
-            if not models_qs.exists():
+            model_choices = catalog.model_choices()
+            self.fields['model'].choices = [('', 'انتخاب مدل')] + model_choices
+            if not model_choices:
                 self.fields['model'].widget.attrs['disabled'] = 'disabled'
         except Exception:
             self.fields['model'].choices = [('', 'انتخاب مدل')]
@@ -87,36 +86,16 @@ class WorkEntryForm(forms.ModelForm):
 
         selected_model = (self.data.get('model') if self.is_bound else self.initial.get('model')) or None
 
-        def expand_part_queryset(qs):
-            posted_id = (self.data.get('part') if self.is_bound else self.initial.get('part'))
-            if posted_id:
-                try:
-                    return Part.objects.filter(Q(pk=posted_id) | Q(pk__in=qs.values('pk'))).order_by('name')
-                except Exception:
-                    return qs
-            return qs
-
-        def expand_product_queryset(qs):
-            posted_id = (self.data.get('product') if self.is_bound else self.initial.get('product'))
-            if posted_id:
-                try:
-                    return Product.objects.filter(Q(pk=posted_id) | Q(pk__in=qs.values('pk'))).order_by('name')
-                except Exception:
-                    return qs
-            return qs
+        def posted(name):
+            value = self.data.get(name) if self.is_bound else self.initial.get(name)
+            return getattr(value, 'pk', value)
 
         if is_parts_based(section):
-            qs = Part.objects.none()
-            if selected_model:
-                qs = Part.objects.filter(product_model__name=selected_model).order_by('name')
-            self.fields["part"].queryset = expand_part_queryset(qs)
-            try:
-                if qs.count() == 0:
-                    self.fields["part"].widget.attrs['disabled'] = 'disabled'
-                else:
-                    self.fields["part"].widget.attrs.pop('disabled', None)
-            except Exception:
-                pass
+            count = catalog.limit_field(self.fields["part"], 'parts', selected_model, posted_id=posted('part'))
+            if count == 0:
+                self.fields["part"].widget.attrs['disabled'] = 'disabled'
+            else:
+                self.fields["part"].widget.attrs.pop('disabled', None)
             # Make part selection mandatory in parts-based sections
             self.fields["part"].required = True
             self.fields["part"].error_messages.update({'required': 'لطفاً قطعه را انتخاب کنید.'})
@@ -129,17 +108,11 @@ class WorkEntryForm(forms.ModelForm):
             self.fields["is_external"].widget = forms.HiddenInput()
 
         elif is_products_based(section):
-            qs = Product.objects.none()
-            if selected_model:
-                qs = Product.objects.filter(product_model__name=selected_model).order_by('name')
-            self.fields["product"].queryset = expand_product_queryset(qs)
-            try:
-                if qs.count() == 0:
-                    self.fields["product"].widget.attrs['disabled'] = 'disabled'
-                else:
-                    self.fields["product"].widget.attrs.pop('disabled', None)
-            except Exception:
-                pass
+            count = catalog.limit_field(self.fields["product"], 'products', selected_model, posted_id=posted('product'))
+            if count == 0:
+                self.fields["product"].widget.attrs['disabled'] = 'disabled'
+            else:
+                self.fields["product"].widget.attrs.pop('disabled', None)
             # پنهان‌سازی فیلدهای مخصوص قطعه‌محور
             self.fields["part"].widget = forms.HiddenInput()
             self.fields["produced_qty"].widget = forms.HiddenInput()
@@ -190,3 +163,27 @@ class WorkEntryForm(forms.ModelForm):
         self.fields['model'].error_messages.update({'required': 'لطفاً مدل را انتخاب کنید.'})
         self.fields['model'].widget.attrs.pop('required', None)
         self.fields['model'].widget.attrs['aria-required'] = 'true'
+
+
+class BatchWorkEntryForm(forms.Form):
+    """Log many product jobs of one section at once (see ``batch_entry``)."""
+
+    job_numbers = forms.CharField(
+        required=False, label=_("شماره کارها"),
+        help_text=_("هر شماره کار در یک خط یا با فاصله/کاما جدا شود (اسکن پیاپی مجاز است)."),
+        widget=forms.Textarea(attrs={"class": INPUT_CLS, "rows": 4, "id": "id_job_numbers", "dir": "ltr"}),
+    )
+    is_scrap = forms.BooleanField(required=False, label=_("اسقاط"),
+        widget=forms.CheckboxInput(attrs={"class": "mr-2", "id": "id_is_scrap"}))
+    is_external = forms.BooleanField(required=False, label=_("کلاف بیرون"),
+        widget=forms.CheckboxInput(attrs={"class": "mr-2", "id": "id_is_external"}))
+    allow_partial = forms.BooleanField(required=False, label=_("ثبت موارد معتبر و گزارش خطای بقیه"),
+        widget=forms.CheckboxInput(attrs={"class": "mr-2", "id": "id_allow_partial"}))
+    note = forms.CharField(required=False, max_length=200, label=_("توضیحات"),
+        widget=forms.Textarea(attrs={"class": INPUT_CLS, "rows": 2}))
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("is_scrap") and cleaned.get("is_external"):
+            raise forms.ValidationError(_("نمی‌توانید همزمان اسقاط و کلاف بیرون را انتخاب کنید."))
+        return cleaned
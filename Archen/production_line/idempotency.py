@@ -0,0 +1,60 @@
+"""Idempotency keys for work-entry POSTs.
+
+Work-entry forms render a hidden ``idempotency_key`` (see :func:`new_key`);
+the service-worker outbox also sends it as an ``Idempotency-Key`` header when
+it replays a queued submission.  Views call :func:`already_applied` before
+doing any work and :func:`remember` inside the transaction that creates the
+logs, so the key is stored only when the entry was really applied and a
+concurrent replay fails on the unique constraint instead of logging twice.
+
+Keys are kept for :data:`KEEP_DAYS` and then deleted by the
+``prune_idempotency_keys`` command; a queued submission replayed after that
+would be applied again.
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+import uuid
+
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+FIELD_NAME = 'idempotency_key'
+HEADER_NAME = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_MESSAGE = "این ثبت پیش‌تر انجام شده است."
+# English: well beyond how long a device stays offline with a queued entry
+KEEP_DAYS = 30
+
+_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+def request_key(request) -> str | None:
+    """Key sent with ``request`` (form field first, then header), or None when missing/malformed."""
+    key = (request.POST.get(FIELD_NAME) or request.META.get(HEADER_NAME) or '').strip()
+    return key if _KEY_RE.match(key) else None
+
+
+def already_applied(key: str | None) -> bool:
+    return bool(key) and IdempotencyKey.objects.filter(key=key).exists()
+
+
+def remember(key: str | None, user, scope: str) -> None:
+    """Store ``key``; call inside the transaction that applies the entry.
+
+    Raises ``IntegrityError`` when a concurrent request stored it first.
+    """
+    if key:
+        IdempotencyKey.objects.create(key=key, user=user, scope=scope)
+
+
+def expired(days: int = KEEP_DAYS, now=None):
+    """Keys created more than ``days`` days before ``now``, oldest first."""
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=days)
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by('created_at')
@@ -0,0 +1,334 @@
+"""Append-only stock ledger.
+
+The stock columns (``Part.stock_cut``/``stock_cnc_tools``, the ``ProductStock``
+section columns and ``Material.quantity``) stay the fast read path, but every
+change to them is also written as a :class:`~production_line.models.StockMovement`.
+
+- Saves of ``Part``, ``ProductStock`` and ``Material`` are tracked by signals:
+  the values loaded from the database are remembered and the difference is
+  recorded on ``post_save``.  Code that writes with ``QuerySet.update()``
+  (bulk job creation, batch work entry, maintenance resets) calls
+  :func:`record` itself.  ``refresh_from_db()`` bypasses the tracking, so
+  reload stock rows with a query before changing them.
+- :func:`recording` sets the reason and source (log/job/user) of the
+  movements made inside it and buffers them, so one ``ProductionLog`` costs a
+  single INSERT for all of its movements.  Movements made outside any
+  ``recording`` block are saved immediately with reason ``edit``.
+- :func:`write_snapshot` folds the ledger into a new
+  :class:`~production_line.models.StockSnapshot` run; :func:`balances` returns
+  the stock at any time as one snapshot run plus the movements after it.
+
+``manage.py verify_stock_ledger`` compares the columns with the ledger.
+"""
+
+from __future__ import annotations
+
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import ROUND_HALF_UP, Context, Decimal
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Round
+from django.db.models.signals import post_init, post_save
+from django.utils import timezone
+
+REASON_LOG = 'production_log'
+REASON_ROLLBACK = 'rollback'
+REASON_JOB_LABEL = 'job_label'
+REASON_BULK_JOBS = 'bulk_jobs'
+REASON_BATCH_ENTRY = 'batch_entry'
+REASON_MANUAL = 'manual_edit'
+REASON_RESET = 'reset'
+REASON_REBUILD = 'rebuild'
+REASON_EDIT = 'edit'
+REASON_ADJUST = 'adjust'
+
+PART_BUCKETS = ('stock_cut', 'stock_cnc_tools')
+PRODUCT_BUCKETS = (
+    'stock_workpage', 'stock_undercoating', 'stock_painting', 'stock_sewing',
+    'stock_upholstery', 'stock_assembly', 'stock_packaging',
+)
+MATERIAL_BUCKETS = ('quantity',)
+
+INSERT_BATCH_SIZE = 1000
+_QTY_STEP = Decimal('0.001')
+_QTY_PLACES = 3
+# English: one context for all stock arithmetic, independent of the thread's decimal context
+QTY_CONTEXT = Context(prec=28, rounding=ROUND_HALF_UP)
+_MISSING = object()
+
+
+def to_qty(value) -> Decimal:
+    """Stock value as a Decimal rounded to the ledger precision (None -> 0)."""
+    if value is None:
+        return Decimal('0')
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(_QTY_STEP, context=QTY_CONTEXT)
+
+
+def rounded(expression):
+    """SQL ``expression`` for a new ``Material.quantity`` rounded to the ledger precision.
+
+    SQLite evaluates NUMERIC arithmetic in floating point, so ``0.300 - 0.100``
+    is stored as ``0.19999999999999998`` and a later take of ``0.200`` looks
+    short.  Rounding each written value keeps the column on the ``0.001`` grid.
+    """
+    return Round(expression, _QTY_PLACES)
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+class _Recorder:
+    def __init__(self, reason: str, log=None, job=None, user=None):
+        self.reason = reason
+        self.log_id = _pk(log)
+        self.job_id = _pk(job)
+        self.user_id = _pk(user)
+        self.rows: list = []
+
+
+_current: contextvars.ContextVar[_Recorder | None] = contextvars.ContextVar('stock_ledger_recorder', default=None)
+
+
+@contextmanager
+def recording(reason: str, *, log=None, job=None, user=None):
+    """Attribute movements inside the block to ``reason`` and the given sources.
+
+    Movements are buffered and inserted with one ``bulk_create`` when the
+    outermost block exits.  On an exception inside a transaction they are
+    dropped, since the caller's rollback also undoes the stock writes.
+    """
+    parent = _current.get()
+    recorder = _Recorder(reason, log=log, job=job, user=user)
+    if parent is not None:
+        # English: nested blocks keep their own attribution but share the outer flush.
+        recorder.log_id = recorder.log_id or parent.log_id
+        recorder.job_id = recorder.job_id or parent.job_id
+        recorder.user_id = recorder.user_id or parent.user_id
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    except BaseException:
+        _current.reset(token)
+        if parent is not None:
+            parent.rows.extend(recorder.rows)
+        elif not transaction.get_connection().in_atomic_block:
+            # English: in autocommit mode the stock writes before the error persisted.
+            _flush(recorder.rows)
+        raise
+    _current.reset(token)
+    if parent is not None:
+        parent.rows.extend(recorder.rows)
+    else:
+        _flush(recorder.rows)
+
+
+def recorded_view(reason: str):
+    """View decorator: run the view inside :func:`recording` attributed to ``request.user``."""
+    def decorator(view):
+        @wraps(view)
+        def _wrapped(request, *args, **kwargs):
+            with recording(reason, user=getattr(request, 'user', None)):
+                return view(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+def _flush(rows) -> None:
+    if rows:
+        from .models import StockMovement
+        StockMovement.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+
+
+def record(item_type: str, item_id: int, bucket: str, qty, *, log=None, job=None, user=None) -> None:
+    """Record one stock delta; zero deltas are ignored.
+
+    ``log``/``job``/``user`` override the sources of the enclosing
+    :func:`recording` block for this movement only.
+    """
+    from .models import StockMovement
+
+    qty = to_qty(qty)
+    if not qty:
+        return
+    recorder = _current.get()
+    row = StockMovement(
+        item_type=item_type,
+        item_id=item_id,
+        bucket=bucket,
+        qty=qty,
+        reason=recorder.reason if recorder else REASON_EDIT,
+        log_id=_pk(log) or (recorder.log_id if recorder else None),
+        job_id=_pk(job) or (recorder.job_id if recorder else None),
+        user_id=_pk(user) or (recorder.user_id if recorder else None),
+    )
+    if recorder is None:
+        _flush([row])
+    else:
+        recorder.rows.append(row)
+
+
+def record_zeroing(queryset, fields) -> None:
+    """Record the movements of ``queryset.update(<field>=0, ...)``; call it before the update."""
+    item_type, id_attr, _buckets = _tracked()[queryset.model]
+    for row in queryset.values_list(id_attr, *fields).iterator(chunk_size=5000):
+        for bucket, value in zip(fields, row[1:]):
+            record(item_type, row[0], bucket, -to_qty(value))
+
+
+# ---------------------------------------------------------------------------
+# Save tracking
+# ---------------------------------------------------------------------------
+
+def _tracked():
+    from inventory.models import Material, Part
+    from .models import ProductStock, StockMovement
+
+    return {
+        Part: (StockMovement.ITEM_PART, 'pk', PART_BUCKETS),
+        ProductStock: (StockMovement.ITEM_PRODUCT, 'product_id', PRODUCT_BUCKETS),
+        Material: (StockMovement.ITEM_MATERIAL, 'pk', MATERIAL_BUCKETS),
+    }
+
+
+def connect_signals() -> None:
+    """Track stock column changes on every save of the stock models."""
+    for model, (item_type, id_attr, buckets) in _tracked().items():
+        def _remember(sender, instance, buckets=buckets, **kwargs):
+            # English: deferred columns are absent from __dict__ and stay unknown.
+            instance._ledger_loaded = {b: instance.__dict__[b] for b in buckets if b in instance.__dict__}
+
+        def _record_changes(sender, instance, created, update_fields=None, raw=False,
+                            item_type=item_type, id_attr=id_attr, buckets=buckets, **kwargs):
+            if raw:
+                return
+            loaded = {} if created else getattr(instance, '_ledger_loaded', {})
+            names = buckets if update_fields is None else [b for b in buckets if b in update_fields]
+            item_id = getattr(instance, id_attr)
+            for bucket in names:
+                if bucket not in instance.__dict__:
+                    continue
+                new = instance.__dict__[bucket]
+                old = loaded.get(bucket, 0 if created else _MISSING)
+                if old is not _MISSING:
+                    record(item_type, item_id, bucket, to_qty(new) - to_qty(old))
+                loaded[bucket] = new
+            instance._ledger_loaded = loaded
+
+        uid = f"production_line.ledger:{model._meta.label_lower}"
+        post_init.connect(_remember, sender=model, weak=False, dispatch_uid=uid + ':init')
+        post_save.connect(_record_changes, sender=model, weak=False, dispatch_uid=uid + ':save')
+
+
+# ---------------------------------------------------------------------------
+# Balances and snapshots
+# ---------------------------------------------------------------------------
+
+def latest_snapshot_id(at=None) -> int | None:
+    """``movement_id`` of the newest snapshot run (taken at or before ``at``)."""
+    from .models import StockSnapshot
+
+    qs = StockSnapshot.objects.all()
+    if at is not None:
+        qs = qs.filter(taken_at__lte=at)
+    return qs.aggregate(m=Max('movement_id'))['m']
+
+
+def balances(at=None, *, snapshot_id: int | None = None, upto_movement_id: int | None = None) -> dict[tuple, Decimal]:
+    """Ledger balance per ``(item_type, item_id, bucket)``.
+
+    Starts from the snapshot run ``snapshot_id`` (default: the newest one taken
+    at or before ``at``) and adds the movements after it, up to ``at`` and
+    ``upto_movement_id`` when given.  Two aggregate queries.
+    """
+    from .models import StockMovement, StockSnapshot
+
+    if snapshot_id is None:
+        snapshot_id = latest_snapshot_id(at)
+    totals: dict[tuple, Decimal] = defaultdict(Decimal)
+    if snapshot_id is not None:
+        for item_type, item_id, bucket, qty in (
+            StockSnapshot.objects.filter(movement_id=snapshot_id)
+            .values_list('item_type', 'item_id', 'bucket', 'qty')
+            .iterator(chunk_size=5000)
+        ):
+            totals[(item_type, item_id, bucket)] += qty
+    tail = StockMovement.objects.filter(id__gt=snapshot_id or 0)
+    if at is not None:
+        tail = tail.filter(created_at__lte=at)
+    if upto_movement_id is not None:
+        tail = tail.filter(id__lte=upto_movement_id)
+    for row in tail.values('item_type', 'item_id', 'bucket').annotate(total=Sum('qty')).order_by().iterator():
+        totals[(row['item_type'], row['item_id'], row['bucket'])] += row['total'] or 0
+    # English: SQLite sums NUMERIC columns in floating point; snap back to the ledger scale
+    return {key: to_qty(total) for key, total in totals.items()}
+
+
+def current_columns() -> dict[tuple, Decimal]:
+    """Stock columns keyed like :func:`balances` (three queries)."""
+    from inventory.models import Material, Part
+    from .models import ProductStock, StockMovement
+
+    out: dict[tuple, Decimal] = {}
+    for row in Part.objects.values_list('id', *PART_BUCKETS).iterator(chunk_size=5000):
+        for bucket, value in zip(PART_BUCKETS, row[1:]):
+            out[(StockMovement.ITEM_PART, row[0], bucket)] = to_qty(value)
+    for row in ProductStock.objects.values_list('product_id', *PRODUCT_BUCKETS).iterator(chunk_size=5000):
+        for bucket, value in zip(PRODUCT_BUCKETS, row[1:]):
+            out[(StockMovement.ITEM_PRODUCT, row[0], bucket)] = to_qty(value)
+    for row in Material.objects.values_list('id', *MATERIAL_BUCKETS).iterator(chunk_size=5000):
+        out[(StockMovement.ITEM_MATERIAL, row[0], 'quantity')] = to_qty(row[1])
+    return out
+
+
+def write_snapshot(now=None) -> tuple[int | None, int]:
+    """Store a snapshot run covering every movement so far.
+
+    Returns ``(movement_id, rows_written)``; nothing is written when there are
+    no movements after the newest run.
+    """
+    from .models import StockMovement, StockSnapshot
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        last_movement = StockMovement.objects.aggregate(m=Max('id'))['m']
+        previous = latest_snapshot_id()
+        if last_movement is None or (previous is not None and last_movement <= previous):
+            return previous, 0
+        totals = balances(snapshot_id=previous, upto_movement_id=last_movement)
+        rows = [
+            StockSnapshot(movement_id=last_movement, taken_at=now, item_type=item_type,
+                          item_id=item_id, bucket=bucket, qty=qty)
+            for (item_type, item_id, bucket), qty in totals.items()
+        ]
+        StockSnapshot.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+    return last_movement, len(rows)
+
+
+def reconcile(*, full: bool = False) -> list[tuple[tuple, Decimal, Decimal]]:
+    """Return ``[(key, column_value, ledger_value)]`` for every bucket that differs.
+
+    ``full`` replays from the baseline run instead of the newest snapshot,
+    which also cross-checks the snapshots.
+    """
+    from .models import StockSnapshot
+
+    snapshot_id = None
+    if full:
+        snapshot_id = StockSnapshot.objects.order_by('movement_id').values_list('movement_id', flat=True).first()
+    ledger = balances(snapshot_id=snapshot_id)
+    columns = current_columns()
+    drift = []
+    # English: ledger keys without a column belong to deleted items and are skipped.
+    for key in sorted(columns):
+        expected = ledger.get(key, Decimal('0'))
+        actual = columns[key]
+        if expected != actual:
+            drift.append((key, actual, expected))
+    return drift
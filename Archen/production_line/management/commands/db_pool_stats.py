@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Show database connection settings, in-process pool stats and server-side connection counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to inspect.")
+        parser.add_argument('--json', action='store_true', help="Print machine-readable JSON.")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        conn = connections[alias]
+        settings_dict = conn.settings_dict
+        report = {
+            'alias': alias,
+            'engine': settings_dict.get('ENGINE'),
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'conn_health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+            'pool_config': settings_dict.get('POOL') or None,
+            'pool': None,
+            'server': None,
+        }
+
+        conn.ensure_connection()
+        # English: this process only sees its own pool; the server view below
+        # covers every gunicorn worker connected to the same database.
+        if hasattr(conn, 'pool_stats'):
+            report['pool'] = conn.pool_stats()
+
+        if conn.vendor == 'postgresql':
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COALESCE(state, 'unknown'), COUNT(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() GROUP BY 1 ORDER BY 1"
+                )
+                by_state = {state: count for state, count in cur.fetchall()}
+                cur.execute("SHOW max_connections")
+                max_connections = int(cur.fetchone()[0])
+            report['server'] = {
+                'connections_by_state': by_state,
+                'total': sum(by_state.values()),
+                'max_connections': max_connections,
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"Database '{alias}': {report['engine']}")
+        self.stdout.write(f"  CONN_MAX_AGE={report['conn_max_age']}  CONN_HEALTH_CHECKS={report['conn_health_checks']}")
+        if report['pool'] is not None:
+            self.stdout.write("  Pool (this process):")
+            for key, value in report['pool'].items():
+                self.stdout.write(f"    {key}: {value}")
+        else:
+            self.stdout.write("  Pool: disabled (set DB_POOL=1 with PostgreSQL to enable)")
+        if report['server'] is not None:
+            server = report['server']
+            self.stdout.write(f"  Server connections: {server['total']} / {server['max_connections']}")
+            for state, count in server['connections_by_state'].items():
+                self.stdout.write(f"    {state}: {count}")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from production_line import idempotency
+from production_line.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete work-entry idempotency keys older than --days, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=idempotency.KEEP_DAYS,
+                            help="Keep keys created within this many days.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per batch.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        pause = max(0.0, options['sleep'])
+        expired = idempotency.expired(days=max(0, options['days']))
+
+        total = 0
+        while True:
+            # English: select a bounded set of ids so each DELETE holds locks briefly.
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+            total += deleted
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        if total:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired idempotency keys."))
+        else:
+            self.stdout.write("No expired idempotency keys to delete.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from production_line import ledger
+
+
+class Command(BaseCommand):
+    help = "Fold the stock movements since the last snapshot into a new snapshot run (run from cron)."
+
+    def handle(self, *args, **options):
+        movement_id, rows = ledger.write_snapshot()
+        if not rows:
+            self.stdout.write(f"No new movements since snapshot {movement_id}.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Snapshot up to movement {movement_id}: {rows} row(s)."))
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import low_stock
+from inventory.models import Material, Part
+from production_line import ledger
+from production_line.models import ProductStock, StockMovement
+
+
+class Command(BaseCommand):
+    help = "Compare the stock columns with the stock movement ledger and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Replay from the baseline snapshot instead of the newest one.")
+        parser.add_argument('--limit', type=int, default=50, help="Drifting buckets to print (0 = all).")
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--repair', action='store_true',
+                            help="Overwrite drifting columns with the ledger balance.")
+        action.add_argument('--adopt', action='store_true',
+                            help="Record adjusting movements so the ledger matches the columns.")
+        parser.add_argument('--snapshot', action='store_true',
+                            help="Write a new snapshot run after a clean (or fixed) check.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            drift = ledger.reconcile(full=options['full'])
+            elapsed = time.monotonic() - started
+            movements = StockMovement.objects.count()
+            self.stdout.write(f"Checked the ledger ({movements} movements) in {elapsed:.2f}s: {len(drift)} drifting bucket(s).")
+
+            limit = options['limit']
+            for (item_type, item_id, bucket), column, expected in drift[:limit or None]:
+                self.stdout.write(f"  {item_type}#{item_id}.{bucket}: column={column} ledger={expected}")
+            if limit and len(drift) > limit:
+                self.stdout.write(f"  ... {len(drift) - limit} more")
+
+            if drift and options['repair']:
+                self._repair(drift)
+                self.stdout.write(self.style.WARNING(f"Set {len(drift)} column(s) to the ledger balance."))
+            elif drift and options['adopt']:
+                with ledger.recording(ledger.REASON_ADJUST):
+                    for (item_type, item_id, bucket), column, expected in drift:
+                        ledger.record(item_type, item_id, bucket, column - expected)
+                self.stdout.write(self.style.WARNING(f"Recorded {len(drift)} adjusting movement(s)."))
+            elif drift:
+                raise CommandError("Stock columns and the stock ledger disagree; rerun with --repair or --adopt.")
+
+        if options['snapshot']:
+            movement_id, rows = ledger.write_snapshot()
+            self.stdout.write(f"Snapshot up to movement {movement_id}: {rows} row(s).")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _repair(self, drift):
+        # English: QuerySet.update() skips the ledger signals, so the cache is
+        # reset without recording new movements.
+        models = {
+            StockMovement.ITEM_PART: (Part, 'pk'),
+            StockMovement.ITEM_PRODUCT: (ProductStock, 'product_id'),
+            StockMovement.ITEM_MATERIAL: (Material, 'pk'),
+        }
+        for (item_type, item_id, bucket), _column, expected in drift:
+            model, id_attr = models[item_type]
+            value = model._meta.get_field(bucket).to_python(expected)
+            model.objects.filter(**{id_attr: item_id}).update(**low_stock.with_flag(model, {bucket: value}))
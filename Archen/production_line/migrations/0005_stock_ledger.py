@@ -0,0 +1,100 @@
+# Generated by Django 4.2.23 on 2026-10-18 21:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+
+PART_BUCKETS = ('stock_cut', 'stock_cnc_tools')
+PRODUCT_BUCKETS = (
+    'stock_workpage', 'stock_undercoating', 'stock_painting', 'stock_sewing',
+    'stock_upholstery', 'stock_assembly', 'stock_packaging',
+)
+
+
+def write_baseline_snapshot(apps, schema_editor):
+    """Seed the ledger with the current stock columns as snapshot run 0."""
+    Part = apps.get_model('inventory', 'Part')
+    Material = apps.get_model('inventory', 'Material')
+    ProductStock = apps.get_model('production_line', 'ProductStock')
+    StockSnapshot = apps.get_model('production_line', 'StockSnapshot')
+
+    now = django.utils.timezone.now()
+    step = Decimal('0.001')
+    sources = (
+        ('part', Part.objects.values_list('id', *PART_BUCKETS), PART_BUCKETS),
+        ('product', ProductStock.objects.values_list('product_id', *PRODUCT_BUCKETS), PRODUCT_BUCKETS),
+        ('material', Material.objects.values_list('id', 'quantity'), ('quantity',)),
+    )
+    rows = []
+    for item_type, qs, buckets in sources:
+        for values in qs.iterator(chunk_size=5000):
+            for bucket, value in zip(buckets, values[1:]):
+                rows.append(StockSnapshot(
+                    movement_id=0, taken_at=now, item_type=item_type, item_id=values[0],
+                    bucket=bucket, qty=Decimal(str(value or 0)).quantize(step),
+                ))
+    StockSnapshot.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+        ('jobs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('production_line', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('part', 'قطعه'), ('product', 'محصول'), ('material', 'ماده اولیه')], max_length=10)),
+                ('item_id', models.PositiveIntegerField()),
+                ('bucket', models.CharField(max_length=30)),
+                ('qty', models.DecimalField(decimal_places=3, max_digits=16)),
+                ('reason', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_id', models.BigIntegerField(db_index=True)),
+                ('taken_at', models.DateTimeField(db_index=True)),
+                ('item_type', models.CharField(choices=[('part', 'قطعه'), ('product', 'محصول'), ('material', 'ماده اولیه')], max_length=10)),
+                ('item_id', models.PositiveIntegerField()),
+                ('bucket', models.CharField(max_length=30)),
+                ('qty', models.DecimalField(decimal_places=3, max_digits=16)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('movement_id', 'item_type', 'item_id', 'bucket'), name='stock_snapshot_unique_run_item_bucket'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='job',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='jobs.productionjob'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='log',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='production_line.productionlog'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item_type', 'item_id', 'bucket', 'id'], name='stock_movement_item_idx'),
+        ),
+        migrations.RunPython(write_baseline_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_line', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productionlog',
+            index=models.Index(fields=['-logged_at', '-id'], name='production_log_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productionlog',
+            index=models.Index(fields=['jdate'], name='production_log_jdate_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.23 on 2026-10-18 22:44
+
+from django.db import migrations, models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+STOCK_FIELDS = (
+    'stock_workpage', 'stock_undercoating', 'stock_painting', 'stock_sewing',
+    'stock_upholstery', 'stock_assembly', 'stock_packaging',
+)
+
+
+def backfill_flags(apps, schema_editor):
+    """Rows are added as low (the field default); clear the flag where every bucket is above the threshold."""
+    ProductStock = apps.get_model('production_line', 'ProductStock')
+    above = Q()
+    for name in STOCK_FIELDS:
+        above &= Q(**{f'{name}__gt': F('thr')})
+    ProductStock.objects.annotate(thr=Coalesce('threshold', Value(0))).filter(above).update(is_low_stock=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_line', '0006_productionlog_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstock',
+            name='is_low_stock',
+            field=models.BooleanField(default=True, editable=False, verbose_name='کمبود موجودی'),
+        ),
+        migrations.AddField(
+            model_name='productstock',
+            name='low_stock_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='productstock',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['id'], name='productstock_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstock',
+            index=models.Index(fields=['low_stock_changed_at'], name='productstock_low_changed_idx'),
+        ),
+        migrations.RunPython(backfill_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_line', '0007_low_stock_flag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productionlog',
+            index=models.Index(fields=['job', 'jdate', 'logged_at', 'id'], name='production_log_job_flow_idx'),
+        ),
+    ]
@@ -166,6 +166,21 @@ class ProductStock(models.Model):
     stock_packaging = models.IntegerField(default=0, verbose_name="موجودی بسته‌بندی")
     threshold = models.IntegerField(default=0, blank=True, null=True, verbose_name="حد آستانه")
     description = models.TextField(blank=True, null=True, verbose_name="توضیحات")
+    # English: maintained by inventory.low_stock; see that module
+    is_low_stock = models.BooleanField(default=True, editable=False, verbose_name="کمبود موجودی")
+    low_stock_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_low_stock=True), name='productstock_low_stock_idx'),
+            models.Index(fields=['low_stock_changed_at'], name='productstock_low_changed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from inventory import low_stock
+
+        kwargs['update_fields'] = low_stock.stamp(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Stock | {self.product}"
@@ -225,6 +240,48 @@ class ProductionLog(models.Model):
 
         return qs.filter(name=pname).first()
 
+    def _consume_inputs(self):
+        """Take the BOM parts (CNC/Tools stock) and raw materials of one unit.
+
+        Check and decrement are a single operation per stock table (see
+        ``production_line.reservation``), so concurrent entries cannot drive
+        stock negative.  Raises ``reservation.Shortage`` naming the short
+        parts, or else the short materials; nothing is taken in that case.
+        """
+        from inventory.models import Material
+        from . import reservation
+
+        part_needs: dict[int, int] = {}
+        part_names: dict[int, str] = {}
+        for comp in get_components_for_product(self.product):
+            pname = (comp.get('part_name') or '').strip()
+            qty = int(comp.get('qty') or 0)
+            if not pname or qty <= 0:
+                continue
+            part_id = comp.get('part_id')
+            if not part_id:
+                part = self._resolve_component_part(comp)
+                part_id = part.pk if part else None
+            if not part_id:
+                continue
+            part_needs[part_id] = part_needs.get(part_id, 0) + qty
+            part_names[part_id] = pname
+
+        material_needs: dict[int, Decimal] = {}
+        material_names: dict[int, str] = {}
+        for itm in get_materials_for_product(self.product):
+            mid = itm['material_id']
+            material_needs[mid] = material_needs.get(mid, Decimal('0')) + Decimal(itm['qty'])
+            material_names[mid] = itm.get('material_name') or ''
+
+        with transaction.atomic():
+            short = reservation.take(Part, 'stock_cnc_tools', part_needs)
+            if short:
+                raise reservation.Shortage(reservation.PART_SHORTAGE_MESSAGE, [part_names[pk] for pk in short])
+            short = reservation.take(Material, 'quantity', material_needs)
+            if short:
+                raise reservation.Shortage(reservation.MATERIAL_SHORTAGE_MESSAGE, [material_names[pk] for pk in short])
+
     def increment_current(self):
         """
         Increment inventory for the *current* section (default +1 when quantity
@@ -516,43 +573,8 @@ class ProductionLog(models.Model):
             # Product scrap handling depends on the section
 
             if self.section == SectionChoices.ASSEMBLY:
-                # Consume parts from CNC for each component
-                components = get_components_for_product(self.product)
-                materials = get_materials_for_product(self.product)
-                with transaction.atomic():
-                    # Consume components (parts)
-                    for comp in components:
-                        pname = (comp.get('part_name') or '').strip()
-                        qty = int(comp.get('qty') or 0)
-                        if not pname or qty <= 0:
-                            continue
-                        part = self._resolve_component_part(comp)
-                        if not part:
-                            continue
-                        current_cnc = int(part.stock_cnc_tools or 0)
-                        if current_cnc < qty:
-                            # English: Prevent negative inventory of parts
-                            raise ValidationError(_('موجودی قطعه کافی نیست'))
-                        # Consume parts from CNC/Tools stock when scrapping
-                        part.stock_cnc_tools = current_cnc - qty
-                        part.save(update_fields=['stock_cnc_tools'])
-                    # Consume raw materials
-                    if materials:
-                        from inventory.models import Material  # Local import to avoid circulars
-                        # Lock rows to avoid race on concurrent submissions
-                        mat_ids = [m['material_id'] for m in materials]
-                        mats = {m.id: m for m in Material.objects.select_for_update().filter(id__in=mat_ids)}
-                        for itm in materials:
-                            mat = mats.get(itm['material_id'])
-                            if not mat:
-                                continue
-                            req = float(itm['qty'])
-                            current = float(mat.quantity or 0)
-                            if current < req:
-                                # English: Not enough raw material stock
-                                raise ValidationError(_('موجودی مواد اولیه کافی نیست'))
-                            mat.quantity = current - req
-                            mat.save(update_fields=['quantity'])
+                # Consume parts from CNC/Tools stock and raw materials when scrapping
+                self._consume_inputs()
             else:
 
                 self.decrement_previous()
@@ -579,39 +601,7 @@ class ProductionLog(models.Model):
         if self.product and self.section == SectionChoices.ASSEMBLY:
             # Skip consumption entirely if marked as external; handled earlier
             if not self.is_external:
-                components = get_components_for_product(self.product)
-                materials = get_materials_for_product(self.product)
-                with transaction.atomic():
-                    # Consume components (parts)
-                    for comp in components:
-                        pname = (comp.get('part_name') or '').strip()
-                        qty = int(comp.get('qty') or 0)
-                        if not pname or qty <= 0:
-                            continue
-                        part = self._resolve_component_part(comp)
-                        if not part:
-                            continue
-                        current_cnc = int(part.stock_cnc_tools or 0)
-                        if current_cnc < qty:
-                            # English: Prevent negative inventory of parts
-                            raise ValidationError(_('موجودی قطعه کافی نیست'))
-                        part.stock_cnc_tools = current_cnc - qty
-                        part.save(update_fields=['stock_cnc_tools'])
-                    # Consume raw materials
-                    if materials:
-                        from inventory.models import Material  # Local import to avoid circulars
-                        mat_ids = [m['material_id'] for m in materials]
-                        mats = {m.id: m for m in Material.objects.select_for_update().filter(id__in=mat_ids)}
-                        for itm in materials:
-                            mat = mats.get(itm['material_id'])
-                            if not mat:
-                                continue
-                            req = float(itm['qty'])
-                            current = float(mat.quantity or 0)
-                            if current < req:
-                                raise ValidationError(_('موجودی مواد اولیه کافی نیست'))
-                            mat.quantity = current - req
-                            mat.save(update_fields=['quantity'])
+                self._consume_inputs()
 
         # Increment current section
         # In assembly section, do not increment product stock if marked as scrap
@@ -715,22 +705,14 @@ class ProductionLog(models.Model):
                 part.save(update_fields=['stock_cnc_tools'])
             if materials:
                 from inventory.models import Material
-                mat_ids = [m.get('material_id') for m in materials if m.get('material_id')]
-                mats = {m.id: m for m in Material.objects.select_for_update().filter(id__in=mat_ids)}
+                from . import reservation
+
+                amounts: dict[int, Decimal] = {}
                 for itm in materials:
-                    mat = mats.get(itm.get('material_id'))
-                    if not mat:
-                        continue
-                    try:
-                        qty = Decimal(itm.get('qty') or 0)
-                    except Exception:
-                        continue
-                    try:
-                        current = Decimal(mat.quantity or 0)
-                    except Exception:
-                        current = Decimal('0')
-                    mat.quantity = current + qty
-                    mat.save(update_fields=['quantity'])
+                    mid = itm.get('material_id')
+                    if mid:
+                        amounts[mid] = amounts.get(mid, Decimal('0')) + itm['qty']
+                reservation.restore(Material, 'quantity', amounts)
 
     def _reverse_decrement_previous(self, prev_section: str | None):
         prev_section = self._normalize_section(prev_section)
@@ -773,6 +755,12 @@ class ProductionLog(models.Model):
 
     def rollback_inventory(self, prev_section: str | None = None):
         """Undo the inventory movements triggered by this log."""
+        from . import ledger
+
+        with ledger.recording(ledger.REASON_ROLLBACK, log=self, job=self.job_id, user=self.user_id):
+            self._rollback_inventory(prev_section)
+
+    def _rollback_inventory(self, prev_section: str | None = None):
         # Part-only jobs have isolated stock rules
         if self.part and not self.product:
             self._reverse_part_log()
@@ -826,12 +814,19 @@ class ProductionLog(models.Model):
     def save(self, *args, **kwargs):
         """
         Persist and then apply inventory side-effects on first creation.
+
+        Runs in one transaction with the side-effects and the job progress
+        update (``jobs.progress``, on ``post_save``).
         """
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new:
-            # Any exception should bubble up to surface invalid transitions during development.
-            self.apply_inventory()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                # Any exception should bubble up to surface invalid transitions during development.
+                from . import ledger
+
+                with ledger.recording(ledger.REASON_LOG, log=self, job=self.job_id, user=self.user_id):
+                    self.apply_inventory()
 
     def __str__(self):
         who = getattr(self.user, 'full_name', None) or getattr(self.user, 'username', '—')
@@ -852,3 +847,99 @@ class ProductionLog(models.Model):
                 name='production_log_unique_job_section',
             ),
         ]
+        indexes = [
+            # Reports dashboard: newest-first paging and Jalali date-range filters
+            models.Index(fields=['-logged_at', '-id'], name='production_log_recent_idx'),
+            models.Index(fields=['jdate'], name='production_log_jdate_idx'),
+            # Stock as of a date: each job's logs in order (``inventory.stock_asof``)
+            models.Index(fields=['job', 'jdate', 'logged_at', 'id'], name='production_log_job_flow_idx'),
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Idempotency keys for work-entry submissions
+# ---------------------------------------------------------------------------
+class IdempotencyKey(models.Model):
+    """A work-entry POST that has already been applied.
+
+    Every rendered work-entry form carries a fresh key.  The service-worker
+    outbox replays queued submissions with the same body, so a replay of an
+    applied entry finds its key here and is skipped instead of logging (and
+    moving inventory) twice.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=40)
+    # English: indexed for the expiry cutoff (``prune_idempotency_keys``)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.scope} | {self.key}"
+
+
+# ---------------------------------------------------------------------------
+# Stock ledger (append-only movements + periodic snapshots)
+# ---------------------------------------------------------------------------
+class StockMovement(models.Model):
+    """One stock delta; rows are only ever inserted (see ``production_line.ledger``).
+
+    ``item_type``/``item_id`` name the stock owner (``Part``, ``Product`` for
+    ``ProductStock`` rows, or ``Material``) and ``bucket`` the stock column.
+    Sources are kept without DB constraints so deleting a log or job never
+    touches its history.
+    """
+    ITEM_PART = 'part'
+    ITEM_PRODUCT = 'product'
+    ITEM_MATERIAL = 'material'
+    ITEM_CHOICES = [
+        (ITEM_PART, 'قطعه'),
+        (ITEM_PRODUCT, 'محصول'),
+        (ITEM_MATERIAL, 'ماده اولیه'),
+    ]
+
+    item_type = models.CharField(max_length=10, choices=ITEM_CHOICES)
+    item_id = models.PositiveIntegerField()
+    bucket = models.CharField(max_length=30)
+    qty = models.DecimalField(max_digits=16, decimal_places=3)
+    reason = models.CharField(max_length=20)
+    log = models.ForeignKey('ProductionLog', null=True, blank=True, on_delete=models.DO_NOTHING,
+                            db_constraint=False, related_name='+')
+    job = models.ForeignKey('jobs.ProductionJob', null=True, blank=True, on_delete=models.DO_NOTHING,
+                            db_constraint=False, related_name='+')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.DO_NOTHING,
+                             db_constraint=False, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item_type', 'item_id', 'bucket', 'id'], name='stock_movement_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_type}:{self.item_id}.{self.bucket} {self.qty:+} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    """Balance of one stock bucket after every movement up to ``movement_id``.
+
+    Snapshots are written as complete runs sharing ``movement_id``; the
+    baseline run (``movement_id=0``) holds the stock columns at the time the
+    ledger was introduced.
+    """
+    movement_id = models.BigIntegerField(db_index=True)
+    taken_at = models.DateTimeField(db_index=True)
+    item_type = models.CharField(max_length=10, choices=StockMovement.ITEM_CHOICES)
+    item_id = models.PositiveIntegerField()
+    bucket = models.CharField(max_length=30)
+    qty = models.DecimalField(max_digits=16, decimal_places=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['movement_id', 'item_type', 'item_id', 'bucket'],
+                name='stock_snapshot_unique_run_item_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.movement_id} {self.item_type}:{self.item_id}.{self.bucket} = {self.qty}"
@@ -0,0 +1,145 @@
+"""Atomic check-and-take of stock for BOM consumption.
+
+An assembly entry consumes the product's parts (``Part.stock_cnc_tools``) and
+raw materials (``Material.quantity``).  The work-entry views used to read each
+component's stock first and decrement it later in ``ProductionLog.save()``, so
+two operators assembling the same product at once could both pass the check
+and drive the stock negative.
+
+:func:`take` makes the check and the decrement one operation: every row is
+decremented only ``WHERE stock >= needed``, and when any row is short the
+whole take is rolled back and the short rows are reported.
+
+- PostgreSQL: one ``UPDATE ... FROM unnest(ids, qtys) ... RETURNING`` per
+  stock table.  The rows are locked in primary-key order first, so concurrent
+  takes of overlapping BOMs queue instead of deadlocking, and the ``WHERE`` is
+  re-evaluated against the committed stock after the wait.
+- Other backends: one conditional ``UPDATE`` per row.  SQLite serializes
+  writers, so the first ``UPDATE`` holds the write lock until commit.
+
+Both forms set the low-stock flag in the same statement (``inventory.low_stock``).
+
+:func:`restore` is the reverse (rollback of an assembly log).  Quantities are
+converted with the field's own ``to_python`` so ``Material.quantity`` stays
+an exact ``Decimal`` end to end.  The ledger movements are recorded here,
+since ``QuerySet.update()`` skips the ledger signals.
+"""
+
+from __future__ import annotations
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from inventory import low_stock
+
+from . import ledger
+
+PART_SHORTAGE_MESSAGE = "موجودی قطعات زیر کافی نیست: "
+MATERIAL_SHORTAGE_MESSAGE = "موجودی مواد اولیه زیر کافی نیست: "
+
+_ARRAY_TYPES = {
+    models.DecimalField: 'numeric',
+    models.FloatField: 'double precision',
+    models.IntegerField: 'bigint',
+}
+
+
+class Shortage(ValidationError):
+    """Not enough stock; ``names`` lists the short items, ``message`` is user-facing."""
+
+    def __init__(self, prefix: str, names):
+        self.names = sorted({str(n) for n in names if n})
+        super().__init__(prefix + "، ".join(self.names))
+
+
+def _array_type(field) -> str:
+    for field_class, sql_type in _ARRAY_TYPES.items():
+        if isinstance(field, field_class):
+            return sql_type
+    raise TypeError(f"unsupported stock field {field!r}")
+
+
+def _take_postgresql(model, field, needs: dict) -> set:
+    meta = model._meta
+    qn = connection.ops.quote_name
+    table, pk, col = qn(meta.db_table), qn(meta.pk.column), qn(field.column)
+    ids = sorted(needs)
+    sql = (
+        f"WITH req(id, qty) AS (SELECT * FROM unnest(%s::bigint[], %s::{_array_type(field)}[])), "
+        f"locked AS (SELECT t.{pk} FROM {table} t JOIN req ON req.id = t.{pk} ORDER BY t.{pk} FOR UPDATE OF t) "
+        f"UPDATE {table} AS t SET {col} = t.{col} - req.qty, "
+        f"{low_stock.set_clause_sql(model, 't', {field.name: f't.{col} - req.qty'}, qn)} FROM req "
+        f"WHERE t.{pk} = req.id AND t.{pk} IN (SELECT {pk} FROM locked) AND t.{col} >= req.qty "
+        f"RETURNING t.{pk}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [ids, [needs[i] for i in ids]])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _stock_expression(field, expression):
+    return ledger.rounded(expression) if isinstance(field, models.DecimalField) else expression
+
+
+def _take_rowwise(model, field, needs: dict) -> set:
+    taken = set()
+    for pk in sorted(needs):
+        qty = needs[pk]
+        changes = low_stock.with_flag(model, {field.name: _stock_expression(field, F(field.name) - qty)})
+        if model.objects.filter(pk=pk, **{f'{field.name}__gte': qty}).update(**changes):
+            taken.add(pk)
+    return taken
+
+
+def _clean(field, amounts: dict) -> dict:
+    amounts = {pk: field.to_python(qty) for pk, qty in amounts.items() if pk and qty}
+    return {pk: qty for pk, qty in amounts.items() if qty > 0}
+
+
+def take(model, field_name: str, needs: dict) -> list:
+    """Subtract ``needs[pk]`` from ``model.<field_name>`` for every row, or for none.
+
+    Returns the primary keys whose stock is short (rows that do not exist are
+    skipped, as the per-component loop did).  On success the movements are
+    recorded in the stock ledger under the enclosing ``ledger.recording``.
+    """
+    field = model._meta.get_field(field_name)
+    needs = _clean(field, needs)
+    if not needs:
+        return []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            taken = _take_postgresql(model, field, needs)
+        else:
+            taken = _take_rowwise(model, field, needs)
+        missed = set(needs) - taken
+        short = sorted(model.objects.filter(pk__in=missed).values_list('pk', flat=True)) if missed else []
+        if short:
+            # English: undo the rows already taken (savepoint when nested)
+            transaction.set_rollback(True)
+            return short
+    item_type, _id_attr, _buckets = ledger._tracked()[model]
+    for pk in sorted(taken):
+        ledger.record(item_type, pk, field_name, -ledger.to_qty(needs[pk]))
+    return []
+
+
+def restore(model, field_name: str, amounts: dict) -> None:
+    """Add ``amounts[pk]`` back to ``model.<field_name>`` (NULL counts as zero)."""
+    field = model._meta.get_field(field_name)
+    amounts = _clean(field, amounts)
+    if not amounts:
+        return
+    zero = Value(field.to_python(0), output_field=field)
+    restored = []
+    with transaction.atomic():
+        for pk in sorted(amounts):
+            new_value = _stock_expression(field, Coalesce(F(field.name), zero) + amounts[pk])
+            changes = low_stock.with_flag(model, {field.name: new_value})
+            if model.objects.filter(pk=pk).update(**changes):
+                restored.append(pk)
+    item_type, _id_attr, _buckets = ledger._tracked()[model]
+    for pk in restored:
+        ledger.record(item_type, pk, field_name, ledger.to_qty(amounts[pk]))
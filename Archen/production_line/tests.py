@@ -0,0 +1,424 @@
+import datetime
+import random
+import shutil
+import subprocess
+import threading
+import unittest
+from decimal import Decimal
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Material, Part, Product, ProductComponent, ProductMaterial, ProductModel
+from jobs.models import ProductionJob
+
+from . import batch_entry, idempotency, ledger, reservation
+from .models import IdempotencyKey, ProductionLog, ProductStock, StockMovement
+
+
+def make_user(username, role):
+    return get_user_model().objects.create_user(username=username, password='x', role=role, full_name=username)
+
+
+class StockFixtureMixin:
+    """One product model with a two-part BOM and a raw material."""
+
+    def setUp(self):
+        cache.clear()
+        self.model = ProductModel.objects.create(name='M1')
+        self.product = Product.objects.create(name='Chair', product_model=self.model)
+        self.leg = Part.objects.create(name='Leg', product_model=self.model, stock_cut=10, stock_cnc_tools=20)
+        self.seat = Part.objects.create(name='Seat', product_model=self.model, stock_cnc_tools=20)
+        self.wood = Material.objects.create(name='Wood', quantity=Decimal('10.000'), unit='kg')
+        ProductComponent.objects.create(product=self.product, part=self.leg, qty=4)
+        ProductComponent.objects.create(product=self.product, part=self.seat, qty=1)
+        ProductMaterial.objects.create(product=self.product, material=self.wood, qty=Decimal('0.250'))
+
+
+class WorkEntryIdempotencyTests(StockFixtureMixin, TestCase):
+    def post(self, user, key, **data):
+        self.client.force_login(user)
+        return self.client.post(reverse('production_line:work_entry'), {**data, idempotency.FIELD_NAME: key})
+
+    def test_duplicate_replay_of_a_part_entry_is_applied_once(self):
+        cutter = make_user('cutter', 'cutter_master')
+        data = {'model': self.model.name, 'part': self.leg.pk, 'produced_qty': 3, 'scrap_qty': 0}
+        for _ in range(3):
+            response = self.post(cutter, 'replay-key-1', **data)
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(ProductionLog.objects.filter(part=self.leg).count(), 1)
+        self.leg.refresh_from_db()
+        self.assertEqual(self.leg.stock_cut, 13)
+        self.assertEqual(IdempotencyKey.objects.get().scope, 'work_entry')
+
+    def test_replay_with_the_header_key(self):
+        cutter = make_user('cutter', 'cutter_master')
+        self.client.force_login(cutter)
+        data = {'model': self.model.name, 'part': self.leg.pk, 'produced_qty': 2, 'scrap_qty': 0}
+        for _ in range(2):
+            self.client.post(reverse('production_line:work_entry'), data, HTTP_IDEMPOTENCY_KEY='header-key-1')
+        self.assertEqual(ProductionLog.objects.filter(part=self.leg).count(), 1)
+
+    def test_queued_entries_replayed_in_order_then_again(self):
+        assembler = make_user('assembler', 'assembly_master')
+        worker = make_user('worker', 'workpage_master')
+        ProductionJob.objects.create(job_number='J1', product=self.product, allowed_sections=['assembly', 'workpage'])
+        outbox = [
+            (assembler, 'entry-assembly', {'model': self.model.name, 'product': self.product.pk, 'job_number': 'J1'}),
+            (worker, 'entry-workpage', {'model': self.model.name, 'product': self.product.pk, 'job_number': 'J1'}),
+        ]
+        for _ in range(2):
+            for user, key, data in outbox:
+                self.post(user, key, **data)
+
+        logs = list(ProductionLog.objects.filter(job__job_number='J1').order_by('id').values_list('section', flat=True))
+        self.assertEqual(logs, ['assembly', 'workpage'])
+        stock = ProductStock.objects.get(product=self.product)
+        self.assertEqual((stock.stock_assembly, stock.stock_workpage), (0, 1))
+        self.leg.refresh_from_db()
+        self.wood.refresh_from_db()
+        self.assertEqual(self.leg.stock_cnc_tools, 16)
+        self.assertEqual(self.wood.quantity, Decimal('9.750'))
+
+    def test_concurrent_replay_fails_on_the_unique_key(self):
+        user = make_user('cutter', 'cutter_master')
+        idempotency.remember('same-key-1', user, 'work_entry')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            idempotency.remember('same-key-1', user, 'work_entry')
+
+    def test_malformed_keys_are_ignored(self):
+        request = type('R', (), {'POST': {idempotency.FIELD_NAME: 'bad key!'}, 'META': {}})()
+        self.assertIsNone(idempotency.request_key(request))
+        self.assertFalse(idempotency.already_applied(None))
+
+
+class BatchEntryParityTests(StockFixtureMixin, TestCase):
+    """A batch must leave the same state as the same jobs entered one by one."""
+
+    def setUp(self):
+        super().setUp()
+        # English: Leg stock 10 covers two assemblies (Leg x4); the third job is short
+        self.leg.stock_cnc_tools = 10
+        self.leg.save()
+        for number in ('A1', 'A2', 'A3'):
+            ProductionJob.objects.create(job_number=number, product=self.product, allowed_sections=['assembly', 'undercoating'])
+        ProductionJob.objects.create(job_number='D1', product=self.product, job_label='deposit',
+                                     deposit_account='Store', allowed_sections=['assembly', 'undercoating'])
+        self.assembler = make_user('assembler', 'assembly_master')
+        self.undercoater = make_user('undercoater', 'undercoating_master')
+
+    def state(self):
+        stock = ProductStock.objects.filter(product=self.product).values(
+            'stock_assembly', 'stock_undercoating', 'is_low_stock').get()
+        jobs = [
+            (j.job_number, j.current_section, j.status, j.job_label, j.finished_at is None)
+            for j in ProductionJob.objects.order_by('job_number')
+        ]
+        logs = sorted(ProductionLog.objects.values_list('job__job_number', 'section', 'is_scrap', 'is_external'))
+        parts = list(Part.objects.order_by('pk').values_list('stock_cut', 'stock_cnc_tools', 'is_low_stock'))
+        materials = list(Material.objects.order_by('pk').values_list('quantity', 'is_low_stock'))
+        ledger_rows = sorted(
+            StockMovement.objects.filter(job__isnull=False)
+            .values_list('item_type', 'item_id', 'bucket', 'job__job_number')
+            .annotate(total=Sum('qty'))
+        )
+        return {'stock': stock, 'jobs': jobs, 'logs': logs, 'parts': parts,
+                'materials': materials, 'ledger': ledger_rows}
+
+    def sequential_state(self, user, numbers, **data):
+        self.client.force_login(user)
+        with transaction.atomic():
+            for number in numbers:
+                self.client.post(reverse('production_line:work_entry'), {
+                    'model': self.model.name, 'product': self.product.pk, 'job_number': number, **data,
+                })
+            state = self.state()
+            transaction.set_rollback(True)
+        return state
+
+    def assert_batch_matches_sequential(self, user, section, numbers, **options):
+        data = {name: 'on' for name, value in options.items() if value}
+        expected = self.sequential_state(user, numbers, **data)
+        result = batch_entry.submit_batch(user, section, numbers, role=user.role, allow_partial=True, **options)
+        self.assertEqual(self.state(), expected)
+        return result
+
+    def test_assembly_batch_with_a_short_job(self):
+        result = self.assert_batch_matches_sequential(self.assembler, 'assembly', ['A1', 'D1', 'A2', 'A3'])
+        self.assertEqual([e.job_number for e in result.errors], ['A3'])
+        self.leg.refresh_from_db()
+        self.assertEqual(self.leg.stock_cnc_tools, 2)
+
+    def test_next_section_batch(self):
+        batch_entry.submit_batch(self.assembler, 'assembly', ['A1', 'A2', 'D1'], role='assembly_master')
+        self.assert_batch_matches_sequential(self.undercoater, 'undercoating', ['D1', 'A2', 'A1'])
+
+    def test_scrap_and_external_batches(self):
+        self.assert_batch_matches_sequential(self.assembler, 'assembly', ['A1'], is_scrap=True)
+        batch_entry.submit_batch(self.assembler, 'assembly', ['A2'], role='assembly_master')
+        self.assert_batch_matches_sequential(self.undercoater, 'undercoating', ['A2'], is_external=True)
+
+    def test_all_or_nothing_by_default(self):
+        before = self.state()
+        result = batch_entry.submit_batch(self.assembler, 'assembly', ['A1', 'A2', 'A3', 'NOPE'], role='assembly_master')
+        self.assertEqual([e.job_number for e in result.errors], ['A3', 'NOPE'])
+        self.assertEqual(result.logs, [])
+        self.assertEqual(self.state(), before)
+
+    def test_eligible_jobs_follow_the_allowed_flow(self):
+        batch_entry.submit_batch(self.assembler, 'assembly', ['A1', 'D1'], role='assembly_master')
+        self.assertEqual(sorted(j.job_number for j in batch_entry.eligible_open_jobs('assembly')), ['A2', 'A3'])
+        self.assertEqual(sorted(j.job_number for j in batch_entry.eligible_open_jobs('undercoating')), ['A1', 'D1'])
+
+    def test_jobs_without_allowed_sections_are_not_gated(self):
+        ProductionJob.objects.create(job_number='U1', product=self.product, allowed_sections=[])
+        ProductionJob.objects.create(job_number='U2', product=self.product, allowed_sections=['Cutting'])
+        self.client.force_login(self.undercoater)
+        dropdown = self.client.get(reverse('production_line:work_entry')).context['open_jobs_data']
+        eligible = batch_entry.eligible_open_jobs('undercoating')
+        self.assertEqual(sorted(j.job_number for j in eligible), sorted(j['job_number'] for j in dropdown))
+        self.assertEqual([j.job_number for j in eligible], ['U1'])
+        result = self.assert_batch_matches_sequential(self.undercoater, 'undercoating', ['U1', 'U2'])
+        self.assertEqual([e.job_number for e in result.errors], ['U2'])
+
+    def test_last_job_becomes_the_default(self):
+        batch_entry.submit_batch(self.assembler, 'assembly', ['A2', 'A1'], role='assembly_master')
+        self.assertEqual(list(ProductionJob.objects.filter(is_default=True).values_list('job_number', flat=True)), ['A1'])
+
+
+class PruneIdempotencyKeysTests(TestCase):
+    def test_deletes_only_keys_older_than_the_window(self):
+        user = make_user('cutter', 'cutter_master')
+        for i in range(5):
+            idempotency.remember(f'old-key-{i}', user, 'work_entry')
+        idempotency.remember('fresh-key-1', user, 'work_entry')
+        old = timezone.now() - datetime.timedelta(days=idempotency.KEEP_DAYS + 1)
+        IdempotencyKey.objects.filter(key__startswith='old-').update(created_at=old)
+
+        out = StringIO()
+        call_command('prune_idempotency_keys', '--batch-size', '2', stdout=out)
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh-key-1'])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'exercises the PostgreSQL UPDATE ... FROM unnest() path')
+class ConcurrentTakePostgreSQLTests(TransactionTestCase):
+    """Concurrent ``reservation.take`` calls from separate connections (``_take_postgresql``)."""
+
+    THREADS = 16
+
+    def setUp(self):
+        cache.clear()
+        model = ProductModel.objects.create(name='M1')
+        self.parts = [Part.objects.create(name=f'P{i}', product_model=model, stock_cnc_tools=10) for i in range(3)]
+
+    def test_overlapping_takes_never_oversell_or_deadlock(self):
+        taken, short, errors = [], [], []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(i):
+            # English: half the threads list the BOM backwards; the PK-ordered lock keeps them from deadlocking
+            ids = [part.pk for part in self.parts]
+            if i % 2:
+                ids.reverse()
+            try:
+                barrier.wait()
+                with transaction.atomic(), ledger.recording('test'):
+                    missing = reservation.take(Part, 'stock_cnc_tools', {pk: 2 for pk in ids})
+                (short if missing else taken).append(i)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual((len(taken), len(short)), (5, self.THREADS - 5))
+        for part in self.parts:
+            part.refresh_from_db()
+            self.assertEqual(part.stock_cnc_tools, 0)
+            self.assertTrue(part.is_low_stock)
+
+    def test_one_short_row_takes_nothing(self):
+        needs = {self.parts[0].pk: 4, self.parts[1].pk: 11}
+        with transaction.atomic(), ledger.recording('test'):
+            self.assertEqual(reservation.take(Part, 'stock_cnc_tools', needs), [self.parts[1].pk])
+        self.assertEqual(list(Part.objects.order_by('pk').values_list('stock_cnc_tools', flat=True)), [10, 10, 10])
+
+
+class DecimalQuantityTests(SimpleTestCase):
+    def test_100k_consumptions_leave_no_drift(self):
+        # English: 50k random takes and the 50k restores that undo them, shuffled
+        field = Material._meta.get_field('quantity')
+        rng = random.Random(47)
+        amounts = [Decimal(rng.randint(1, 5000)).scaleb(-3) for _ in range(50000)]
+        steps = [-qty for qty in amounts] + amounts
+        rng.shuffle(steps)
+
+        start = field.to_python('250000.000')
+        balance = start
+        for step in steps:
+            need = reservation._clean(field, {1: abs(step)})[1]
+            balance = ledger.to_qty(balance + need if step > 0 else balance - need)
+        self.assertEqual(len(steps), 100000)
+        self.assertEqual(balance, start)
+        self.assertEqual(balance.as_tuple().exponent, -3)
+
+
+class MaterialAccountingTests(TestCase):
+    def setUp(self):
+        self.materials = [
+            Material.objects.create(name=name, unit='kg', quantity=Decimal(start))
+            for name, start in (('Glue', '0.300'), ('Foam', '50.000'), ('Fabric', '75.125'))
+        ]
+
+    def test_tenths_add_up_exactly(self):
+        glue = self.materials[0]
+        for qty in ('0.1', '0.2'):
+            self.assertEqual(reservation.take(Material, 'quantity', {glue.pk: Decimal(qty)}), [])
+        glue.refresh_from_db()
+        self.assertEqual(glue.quantity, Decimal('0.000'))
+        self.assertEqual(reservation.take(Material, 'quantity', {glue.pk: Decimal('0.001')}), [glue.pk])
+
+    def test_take_and_restore_cycles_end_where_they_started(self):
+        rng = random.Random(7)
+        start = {m.pk: m.quantity for m in self.materials}
+        for _ in range(200):
+            needs = {m.pk: Decimal(rng.randint(1, 300)).scaleb(-3) for m in self.materials[1:]}
+            self.assertEqual(reservation.take(Material, 'quantity', needs), [])
+            reservation.restore(Material, 'quantity', needs)
+        self.assertEqual(dict(Material.objects.values_list('pk', 'quantity')), start)
+        self.assertEqual(ledger.reconcile(), [])
+        balances = ledger.balances()
+        for material in self.materials:
+            self.assertEqual(balances[(StockMovement.ITEM_MATERIAL, material.pk, 'quantity')], start[material.pk])
+
+
+class StockLedgerTests(StockFixtureMixin, TestCase):
+    def nonzero(self, totals):
+        return {key: value for key, value in totals.items() if value}
+
+    def movements(self, **filters):
+        return list(StockMovement.objects.filter(**filters).order_by('id').values_list('item_id', 'bucket', 'qty'))
+
+    def test_recording_buffers_one_insert(self):
+        user = make_user('boss', 'manager')
+        before = StockMovement.objects.count()
+        table = StockMovement._meta.db_table
+        with CaptureQueriesContext(connection) as captured:
+            with ledger.recording(ledger.REASON_MANUAL, user=user):
+                for part, cut in ((self.leg, 12), (self.seat, 3)):
+                    part = Part.objects.get(pk=part.pk)
+                    part.stock_cut = cut
+                    part.save(update_fields=['stock_cut'])
+                wood = Material.objects.get(pk=self.wood.pk)
+                wood.quantity = Decimal('7.500')
+                wood.save()
+                self.assertEqual(StockMovement.objects.count(), before)
+        inserts = [q['sql'] for q in captured if q['sql'].startswith(f'INSERT INTO "{table}"')]
+        self.assertEqual(len(inserts), 1)
+        rows = StockMovement.objects.filter(reason=ledger.REASON_MANUAL)
+        self.assertEqual(sorted(rows.values_list('item_type', 'qty')), [
+            (StockMovement.ITEM_MATERIAL, Decimal('-2.500')),
+            (StockMovement.ITEM_PART, Decimal('2.000')),
+            (StockMovement.ITEM_PART, Decimal('3.000')),
+        ])
+        self.assertEqual(set(rows.values_list('user_id', flat=True)), {user.pk})
+
+    def test_saves_record_the_difference_from_the_loaded_row(self):
+        self.assertEqual(ledger.reconcile(), [])
+        leg = Part.objects.get(pk=self.leg.pk)
+        leg.stock_cut = 15
+        leg.save()
+        leg.stock_cut = 14
+        leg.threshold = 2
+        leg.save(update_fields=['threshold'])
+        self.assertEqual(self.movements(item_id=self.leg.pk, reason=ledger.REASON_EDIT, bucket='stock_cut'),
+                         [(self.leg.pk, 'stock_cut', Decimal('10.000')), (self.leg.pk, 'stock_cut', Decimal('5.000'))])
+        Part.objects.filter(pk=self.leg.pk).update(stock_cut=15)
+        ProductStock.objects.create(product=self.product, stock_assembly=2)
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_record_zeroing_matches_the_update(self):
+        ProductStock.objects.create(product=self.product, stock_assembly=2, stock_painting=1)
+        with ledger.recording(ledger.REASON_RESET):
+            ledger.record_zeroing(Part.objects.all(), ('stock_cut', 'stock_cnc_tools'))
+            ledger.record_zeroing(ProductStock.objects.all(), ('stock_assembly',))
+            Part.objects.update(stock_cut=0, stock_cnc_tools=0)
+            ProductStock.objects.update(stock_assembly=0)
+        self.assertEqual(ledger.reconcile(), [])
+        self.assertEqual(len(self.movements(reason=ledger.REASON_RESET)), 4)
+
+    def test_snapshot_and_balances(self):
+        out = StringIO()
+        call_command('snapshot_stock_ledger', stdout=out)
+        self.assertIn('row(s)', out.getvalue())
+        first = ledger.latest_snapshot_id()
+        at_snapshot = self.nonzero(ledger.current_columns())
+        self.assertEqual(self.nonzero(ledger.balances()), at_snapshot)
+        moment = timezone.now()
+
+        with ledger.recording(ledger.REASON_MANUAL):
+            leg = Part.objects.get(pk=self.leg.pk)
+            leg.stock_cnc_tools = 3
+            leg.save()
+        self.assertEqual(self.nonzero(ledger.balances()), self.nonzero(ledger.current_columns()))
+        self.assertEqual(self.nonzero(ledger.balances(at=moment)), at_snapshot)
+        with self.assertNumQueries(2):
+            ledger.balances(snapshot_id=first)
+
+        call_command('snapshot_stock_ledger', stdout=StringIO())
+        self.assertGreater(ledger.latest_snapshot_id(), first)
+        self.assertEqual(self.nonzero(ledger.balances()), self.nonzero(ledger.current_columns()))
+        self.assertEqual(self.nonzero(ledger.balances(at=moment)), at_snapshot)
+        out = StringIO()
+        call_command('snapshot_stock_ledger', stdout=out)
+        self.assertIn('No new movements', out.getvalue())
+        self.assertEqual(ledger.reconcile(full=True), [])
+
+    def test_verify_repairs_or_adopts_seeded_drift(self):
+        Part.objects.filter(pk=self.leg.pk).update(stock_cut=99)
+        Material.objects.filter(pk=self.wood.pk).update(quantity=Decimal('4.000'))
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verify_stock_ledger', stdout=out)
+        self.assertIn(f'part#{self.leg.pk}.stock_cut: column=99.000 ledger=10.000', out.getvalue())
+        self.assertIn('2 drifting bucket(s)', out.getvalue())
+
+        call_command('verify_stock_ledger', '--repair', stdout=StringIO())
+        self.assertEqual(Part.objects.get(pk=self.leg.pk).stock_cut, 10)
+        self.assertEqual(Material.objects.get(pk=self.wood.pk).quantity, Decimal('10.000'))
+        self.assertEqual(ledger.reconcile(), [])
+
+        Part.objects.filter(pk=self.leg.pk).update(stock_cut=7)
+        call_command('verify_stock_ledger', '--adopt', '--snapshot', stdout=StringIO())
+        self.assertEqual(Part.objects.get(pk=self.leg.pk).stock_cut, 7)
+        self.assertEqual(self.movements(reason=ledger.REASON_ADJUST), [(self.leg.pk, 'stock_cut', Decimal('-3.000'))])
+        self.assertEqual(ledger.reconcile(full=True), [])
+        call_command('verify_stock_ledger', stdout=StringIO())
+
+
+class ServiceWorkerOutboxTests(SimpleTestCase):
+    """Runs the Node harness for the service-worker outbox (tests/js)."""
+
+    def test_node_harness(self):
+        node = shutil.which('node')
+        if not node:
+            self.skipTest('node is not installed')
+        result = subprocess.run([node, '--test', 'tests/js/'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
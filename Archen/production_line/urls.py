@@ -21,6 +21,8 @@ urlpatterns = [
 
     # Unified work entry form
     path('work/', views.work_entry_view, name='work_entry'),
+    # Batch work entry: many job numbers in one submission
+    path('work/batch/', views.work_entry_batch_view, name='work_entry_batch'),
 
     # Manager: select a section for work entry
     path('work/manager/', views.work_entry_select_view, name='work_entry_select'),
@@ -2,6 +2,7 @@
 from typing import Optional
 from django.contrib.auth.models import Group
 from .models import ROLE_TO_SECTION, SectionChoices
+from utils.normalize import normalize_name, normalize_names
 PERSIAN_ROLE_TO_SLUG = {
     # Managers and accounting
     "مدیر": "manager",
@@ -45,18 +46,40 @@ def canonical_role(value: Optional[str]) -> Optional[str]:
     return PERSIAN_ROLE_TO_SLUG.get(s, None)
 
 
+_ROLE_UNSET = object()
+
+
 def get_user_role(user) -> Optional[str]:
     """
     Resolve user's role robustly:
     1) Use user.role (may be Persian or slug).
     2) Fall back to Django Groups with Persian names (e.g., 'مدیر', 'خط تولید' -> None).
+
+    The result is memoized on the user instance; ``request.user`` lives for a
+    single request, so the Groups fallback runs at most once per request.
     """
+    if user is None:
+        return None
+    cached = getattr(user, '_resolved_role', _ROLE_UNSET)
+    if cached is not _ROLE_UNSET:
+        return cached
+    role = _resolve_user_role(user)
+    try:
+        user._resolved_role = role
+    except Exception:
+        pass
+    return role
+
+
+def _resolve_user_role(user) -> Optional[str]:
     # 1) direct role field
     role = canonical_role(getattr(user, "role", None))
     if role is not None:
         return role
 
-    # 2) try groups
+    # 2) try groups (anonymous users have no pk and no groups)
+    if not getattr(user, 'pk', None):
+        return None
     try:
         for g in Group.objects.filter(user=user):
             cand = canonical_role(g.name)
@@ -91,28 +114,14 @@ def is_products_based(section: Optional[str]) -> bool:
     )
 
 
-def _normalize_material_name(value: str) -> str:
-    """Normalize a material/part name for fuzzy Persian comparisons."""
-    if not value:
-        return ""
-    text = str(value).strip().lower()
-    translation_table = str.maketrans({
-        'ي': 'ی',
-        'ك': 'ک',
-    })
-    text = text.translate(translation_table)
-    for ch in ('‌', '-', '_', '.', '/', '\\'):
-        text = text.replace(ch, ' ')
-    return ' '.join(text.split())
+def is_mdf_page_name(normalized: str) -> bool:
+    """Like :func:`contains_mdf_page_material` for a name already passed through ``normalize_name``."""
+    return 'صفحهامدیاف' in normalized.replace(' ', '')
 
 
 def contains_mdf_page_material(value: str) -> bool:
     """Return True if the value contains the phrase 'صفحه ام‌دی‌اف' (with variations)."""
-    normalized = _normalize_material_name(value)
-    if not normalized:
-        return False
-    collapsed = normalized.replace(' ', '')
-    return 'صفحهامدیاف' in collapsed
+    return is_mdf_page_name(normalize_name(value))
 
 
 def product_contains_mdf_page(product) -> bool:
@@ -146,10 +155,8 @@ def product_contains_mdf_page(product) -> bool:
         except Exception:
             return
 
+    candidates = []
     for row in _yield_material_rows():
         material = getattr(row, 'material', None)
-        candidate = getattr(material, 'name', '') if material else getattr(row, 'material_name', '')
-        if contains_mdf_page_material(candidate):
-            return True
-
-    return False
+        candidates.append(getattr(material, 'name', '') if material else getattr(row, 'material_name', ''))
+    return any(is_mdf_page_name(name) for name in normalize_names(candidates))
@@ -14,10 +14,11 @@ from django.utils import timezone
 from zoneinfo import ZoneInfo
 from django.db import transaction, IntegrityError
 
-from inventory.models import Product, Part
+from inventory.models import Product
 from .models import ProductionLog, SectionChoices, today_jdate
 from jobs.models import ProductionJob
-from .forms import WorkEntryForm
+from .forms import BatchWorkEntryForm, WorkEntryForm
+from . import batch_entry, idempotency, reservation
 from .utils import (
     get_user_role,
     role_to_section,
@@ -76,7 +77,7 @@ def _count_open_jobs_for_section(section: str) -> int:
             idx = allowed_norm.index(section)
             if idx > 0:
                 prev = allowed_norm[idx - 1]
-                if not ProductionLog.objects.filter(job=job, section=prev).exists():
+                if prev not in (job.logged_sections or []):
                     continue
         total += 1
     return total
@@ -158,6 +159,12 @@ def work_entry_view(request):
         return redirect('accounting:dashboard')
 
     if request.method == 'POST':
+        # English: a replayed submission (offline outbox, double submit) that
+        # was already applied must not log or move inventory again.
+        idem_key = idempotency.request_key(request)
+        if idempotency.already_applied(idem_key):
+            messages.info(request, idempotency.REPLAY_MESSAGE)
+            return redirect('production_line:work_entry')
         # Track whether an inventory-related failure occurred so we
         # can avoid showing the success message in that case.  We
         # intentionally do not attach the inventory message to the
@@ -209,6 +216,7 @@ def work_entry_view(request):
                 if is_parts_based(section):
                     try:
                         with transaction.atomic():
+                            idempotency.remember(idem_key, request.user, 'work_entry')
                             ProductionLog.objects.create(
                                 user=request.user,
                                 role=role or "",
@@ -219,6 +227,10 @@ def work_entry_view(request):
                                 scrap_qty=form.cleaned_data.get('scrap_qty') or 0,
                                 note=form.cleaned_data.get('note'),
                             )
+                    except IntegrityError:
+                        # English: a concurrent replay stored the same key first.
+                        messages.info(request, idempotency.REPLAY_MESSAGE)
+                        return redirect('production_line:work_entry')
                     except Exception as e:
                         # Surface inventory/constraint errors as a non-field form error (inline),
                         # matching the Users form UX. Avoid redirects and browser popups.
@@ -248,79 +260,10 @@ def work_entry_view(request):
                     if not form.errors and job_obj and ProductionLog.objects.filter(job=job_obj, section=section).exists():
                         form.add_error('job_number', "این شماره کار پیش‌تر در این بخش ثبت شده است.")
 
-                    # If working in the assembly section with a product, ensure sufficient component stock exists.
-                    if not form.errors and section == SectionChoices.ASSEMBLY and selected_product and not bool(is_external):
-                        try:
-                            from production_line.models import get_components_for_product
-                            components = get_components_for_product(selected_product)
-                        except Exception:
-                            components = []
-                        missing_parts = []
-                        product_model = getattr(selected_product, 'product_model', None)
-                        for comp in components:
-                            pname = (comp.get('part_name') or '').strip()
-                            qty = int(comp.get('qty') or 0)
-                            if not pname or qty <= 0:
-                                continue
-                            part_id = (
-                                comp.get('part_id')
-                                or comp.get('part_pk')
-                                or comp.get('part')
-                            )
-                            try:
-                                part_id = int(part_id)
-                            except (TypeError, ValueError):
-                                part_id = None
-                            qs = Part.objects.all()
-                            if part_id:
-                                part_obj = qs.filter(pk=part_id).first()
-                            elif product_model:
-                                part_obj = qs.filter(name=pname, product_model=product_model).first()
-                            else:
-                                part_obj = qs.filter(name=pname).first()
-                            if part_obj:
-                                available = part_obj.stock_cnc_tools or 0
-                                if available < qty:
-                                    missing_parts.append(pname)
-                        if missing_parts:
-                            unique_parts = sorted(set(missing_parts))
-                            msg = "موجودی قطعات زیر کافی نیست: " + "، ".join(unique_parts)
-                            form.add_error(None, msg)
-                            inventory_failed = True
-                            messages.error(request, msg)
-                    # For assembly: also ensure sufficient raw materials stock exists (skip for external)
-                    if not form.errors and section == SectionChoices.ASSEMBLY and selected_product and not bool(is_external):
-                        try:
-                            from inventory.models import ProductMaterial
-                            mats = ProductMaterial.objects.filter(product=selected_product).select_related('material')
-                        except Exception:
-                            mats = []
-                        missing_materials = []
-                        for m in mats:
-                            try:
-                                req = float(m.qty)
-                            except Exception:
-                                continue
-                            available = float(getattr(m.material, 'quantity', 0) or 0)
-                            if available < req:
-                                name = (getattr(m.material, 'name', '') or '').strip()
-                                if name:
-                                    missing_materials.append(name)
-                        if missing_materials:
-                            unique_mats = sorted(set(missing_materials))
-                            msg = "موجودی مواد اولیه زیر کافی نیست: " + "، ".join(unique_mats)
-                            form.add_error(None, msg)
-                            inventory_failed = True
-                            messages.error(request, msg)
+                    # English: the assembly stock check for parts and raw materials happens
+                    # in ProductionLog.save() as one check-and-take (production_line.reservation).
 
                     if not form.errors:
-                        if job_number:
-                            # Only one job can be default at a time; clear others and mark this job as default.
-                            ProductionJob.objects.filter(is_default=True).exclude(job_number=job_number).update(is_default=False)
-                            if hasattr(job_obj, 'is_default'):
-                                job_obj.is_default = True
-                                job_obj.save(update_fields=['is_default'])
-
                         # Create the production log entry (atomically with inventory checks)
                         try:
                             with transaction.atomic():
@@ -328,14 +271,30 @@ def work_entry_view(request):
                                 if getattr(job_obj, 'job_label', '') == 'deposit' and bool(is_external):
                                     form.add_error(None, "برای کار امانی امکان انتخاب کلاف بیرون وجود ندارد.")
                                     raise Exception('deposit_external_not_allowed')
+                                # English: serialize with batch entry on the job row; the
+                                # IntegrityError branch reports the duplicate.
+                                if not batch_entry.lock_job(job_obj, section):
+                                    raise IntegrityError('section already logged')
+                                idempotency.remember(idem_key, request.user, 'work_entry')
                                 ProductionLog.objects.create(
                                     user=request.user, role=role or "", section=section,
                                     model=form.cleaned_data['model'], part=selected_part, product=selected_product,
                                     job=job_obj, is_scrap=bool(is_scrap), is_external=(False if getattr(job_obj, 'job_label', '') == 'deposit' else bool(is_external)),
                                     note=form.cleaned_data.get('note'),
                                 )
+                                if job_number:
+                                    # Only one job can be default at a time; clear others and mark this job as default.
+                                    ProductionJob.objects.filter(is_default=True).exclude(job_number=job_number).update(is_default=False)
+                                    if hasattr(job_obj, 'is_default'):
+                                        job_obj.is_default = True
+                                        job_obj.save(update_fields=['is_default'])
                         except IntegrityError:
                             form.add_error('job_number', "این شماره کار پیش‌تر در این بخش ثبت شده است.")
+                        except reservation.Shortage as exc:
+                            # Per-component message for short parts / raw materials
+                            form.add_error(None, exc.message)
+                            inventory_failed = True
+                            messages.error(request, exc.message)
                         except Exception:
                             # Surface inventory/constraint errors as inline non-field error.
                             form.add_error(None, "موجودی محصول کافی نیست")
@@ -394,7 +353,7 @@ def work_entry_view(request):
                 if idx > 0:
                     prev = allowed[idx - 1]
                     # Only show when previous section has a log for this job
-                    if not ProductionLog.objects.filter(job=job, section=prev).exists():
+                    if prev not in (job.logged_sections or []):
                         continue
             jl = job.job_label or 'in_progress'
             open_jobs_data.append({
@@ -529,9 +488,92 @@ def work_entry_view(request):
         "name_column_label": name_column_label,
         "scrap_column_label": scrap_column_label,
         "today_jdate": today_val_str,
+        "idempotency_key": idempotency.new_key(),
     }
     return render(request, "production_line/work_entry.html", context)
 
+@login_required
+def work_entry_batch_view(request):
+    """Log many jobs of the worker's product section in one submission.
+
+    Jobs are picked from the open-jobs list or scanned/typed into the text
+    box.  Without "allow partial" nothing is saved while any job fails.
+    """
+    role = get_user_role(request.user)
+    section = role_to_section(role)
+    if role == "manager":
+        return redirect('production_line:index')
+    if role == "accountant":
+        return redirect('accounting:dashboard')
+    if not is_products_based(section):
+        messages.info(request, "ثبت گروهی فقط برای بخش‌های محصول‌محور فعال است.")
+        return redirect('production_line:work_entry')
+
+    job_errors = []
+    if request.method == 'POST':
+        idem_key = idempotency.request_key(request)
+        if idempotency.already_applied(idem_key):
+            messages.info(request, idempotency.REPLAY_MESSAGE)
+            return redirect('production_line:work_entry_batch')
+        form = BatchWorkEntryForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            numbers = request.POST.getlist('selected_jobs') + [data.get('job_numbers') or '']
+            try:
+                result = batch_entry.submit_batch(
+                    request.user, section, numbers,
+                    role=role or "",
+                    is_scrap=bool(data.get('is_scrap')),
+                    is_external=bool(data.get('is_external')),
+                    note=data.get('note') or None,
+                    allow_partial=bool(data.get('allow_partial')),
+                    idempotency_key=idem_key,
+                )
+            except batch_entry.BatchEntryError as exc:
+                form.add_error(None, str(exc))
+            except IntegrityError:
+                form.add_error(None, "برخی شماره کارها هم‌زمان در این بخش ثبت شدند؛ دوباره تلاش کنید.")
+            else:
+                job_errors = result.errors
+                if result.logs:
+                    messages.success(request, f"{len(result.logs)} شماره کار با موفقیت ثبت شد.")
+                    if not job_errors:
+                        return redirect('production_line:work_entry_batch')
+                    messages.warning(request, f"{len(job_errors)} شماره کار ثبت نشد.")
+                elif job_errors:
+                    messages.error(request, "هیچ شماره کاری ثبت نشد؛ خطاها را برطرف کنید.")
+    else:
+        form = BatchWorkEntryForm()
+
+    label_display = dict(ProductionJob.LABEL_CHOICES)
+    open_jobs = [
+        {'job_number': job.job_number, 'label_display': label_display.get(job.job_label or 'in_progress', 'نامشخص')}
+        for job in batch_entry.eligible_open_jobs(section)
+    ]
+    selected = set(request.POST.getlist('selected_jobs')) if request.method == 'POST' else set()
+
+    def _job_sort_key(item):
+        jn = str(item.get('job_number') or '').strip()
+        try:
+            return (0, int(jn))
+        except (TypeError, ValueError):
+            return (1, jn)
+    open_jobs.sort(key=_job_sort_key)
+
+    section_label = dict(SectionChoices.choices).get(section, "بخش تولید")
+    return render(request, "production_line/work_entry_batch.html", {
+        "form": form,
+        "section": section,
+        "page_title": f"ثبت گروهی کار - {section_label}",
+        "title": f"ثبت گروهی کار - {section_label}",
+        "back_url": reverse('production_line:work_entry'),
+        "open_jobs": open_jobs,
+        "selected_jobs": selected,
+        "job_errors": job_errors,
+        "batch_limit": batch_entry.BATCH_ENTRY_LIMIT,
+        "idempotency_key": idempotency.new_key(),
+    })
+
 # ------------------------------
 # Work entry (manager chooses section)
 # ------------------------------
@@ -626,6 +668,10 @@ def work_entry_manager_view(request, section: str):
         # Track inventory failures for manager flow as well so we don't show
         # a success message when inventory checks have failed.
         inventory_failed = False
+        idem_key = idempotency.request_key(request)
+        if idempotency.already_applied(idem_key):
+            messages.info(request, idempotency.REPLAY_MESSAGE)
+            return redirect('production_line:work_entry_manager', section=section)
         form = WorkEntryForm(request.POST, user=request.user, section_override=canonical_section)
         if form.is_valid():
             selected_part = form.cleaned_data.get('part')
@@ -644,13 +690,19 @@ def work_entry_manager_view(request, section: str):
 
             if not form.errors:
                 if is_parts_based(canonical_section):
-                    ProductionLog.objects.create(
-                        user=request.user, role="manager", section=canonical_section,
-                        model=form.cleaned_data['model'], part=selected_part,
-                        produced_qty=form.cleaned_data.get('produced_qty') or 0,
-                        scrap_qty=form.cleaned_data.get('scrap_qty') or 0,
-                        note=form.cleaned_data.get('note'),
-                    )
+                    try:
+                        with transaction.atomic():
+                            idempotency.remember(idem_key, request.user, 'work_entry_manager')
+                            ProductionLog.objects.create(
+                                user=request.user, role="manager", section=canonical_section,
+                                model=form.cleaned_data['model'], part=selected_part,
+                                produced_qty=form.cleaned_data.get('produced_qty') or 0,
+                                scrap_qty=form.cleaned_data.get('scrap_qty') or 0,
+                                note=form.cleaned_data.get('note'),
+                            )
+                    except IntegrityError:
+                        messages.info(request, idempotency.REPLAY_MESSAGE)
+                        return redirect('production_line:work_entry_manager', section=section)
                 else:
                     job_obj, created = ProductionJob.objects.get_or_create(
                         job_number=job_number,
@@ -684,94 +736,45 @@ def work_entry_manager_view(request, section: str):
                         if prev and not ProductionLog.objects.filter(job=job_obj, section=prev).exists():
                             form.add_error('job_number', "تا ثبت بخش قبلی، این کار برای این بخش قابل مشاهده نیست.")
 
-                    # For assembly section ensure sufficient parts stock exists for the product (skip for external)
-                    if not form.errors and canonical_section == SectionChoices.ASSEMBLY and selected_product and not bool(is_external):
-                        try:
-                            from production_line.models import get_components_for_product
-                            components = get_components_for_product(selected_product)
-                        except Exception:
-                            components = []
-                        missing_parts = []
-                        product_model = getattr(selected_product, 'product_model', None)
-                        for comp in components:
-                            pname = (comp.get('part_name') or '').strip()
-                            qty = int(comp.get('qty') or 0)
-                            if not pname or qty <= 0:
-                                continue
-                            part_id = (
-                                comp.get('part_id')
-                                or comp.get('part_pk')
-                                or comp.get('part')
-                            )
-                            try:
-                                part_id = int(part_id)
-                            except (TypeError, ValueError):
-                                part_id = None
-                            qs = Part.objects.all()
-                            if part_id:
-                                part_obj = qs.filter(pk=part_id).first()
-                            elif product_model:
-                                part_obj = qs.filter(name=pname, product_model=product_model).first()
-                            else:
-                                part_obj = qs.filter(name=pname).first()
-                            if part_obj:
-                                available = part_obj.stock_cnc_tools or 0
-                                if available < qty:
-                                    missing_parts.append(pname)
-                        if missing_parts:
-                            unique_parts = sorted(set(missing_parts))
-                            msg = "موجودی قطعات زیر کافی نیست: " + "، ".join(unique_parts)
-                            messages.error(request, msg)
-                            return redirect('production_line:work_entry_manager', section=section)
-                    # For assembly section also ensure sufficient raw materials (skip for external)
-                    if not form.errors and canonical_section == SectionChoices.ASSEMBLY and selected_product and not bool(is_external):
-                        try:
-                            from inventory.models import ProductMaterial
-                            mats = ProductMaterial.objects.filter(product=selected_product).select_related('material')
-                        except Exception:
-                            mats = []
-                        missing_materials = []
-                        for m in mats:
-                            try:
-                                req = float(m.qty)
-                            except Exception:
-                                continue
-                            available = float(getattr(m.material, 'quantity', 0) or 0)
-                            if available < req:
-                                name = (getattr(m.material, 'name', '') or '').strip()
-                                if name:
-                                    missing_materials.append(name)
-                        if missing_materials:
-                            unique_mats = sorted(set(missing_materials))
-                            msg = "موجودی مواد اولیه زیر کافی نیست: " + "، ".join(unique_mats)
-                            messages.error(request, msg)
-                            return redirect('production_line:work_entry_manager', section=section)
+                    # English: the assembly stock check for parts and raw materials happens
+                    # in ProductionLog.save() as one check-and-take (production_line.reservation).
 
                     if not form.errors:
-                        # Update default job flags
-                        ProductionJob.objects.filter(is_default=True).exclude(job_number=job_number).update(is_default=False)
-                        if hasattr(job_obj, 'is_default'):
-                            job_obj.is_default = True
-                            job_obj.save(update_fields=['is_default'])
-
                         # Create the production log entry (handle inventory errors)
                         try:
                             # For deposit (امانی) jobs, force is_external off
                             if getattr(job_obj, 'job_label', '') == 'deposit' and bool(is_external):
                                 messages.error(request, "برای کار امانی امکان انتخاب کلاف بیرون وجود ندارد.")
                                 return redirect('production_line:work_entry_manager', section=section)
-                            ProductionLog.objects.create(
-                                user=request.user,
-                                role="manager",
-                                section=canonical_section,
-                                model=form.cleaned_data['model'],
-                                part=selected_part,
-                                product=selected_product,
-                                job=job_obj,
-                                is_scrap=bool(is_scrap),
-                                is_external=(False if getattr(job_obj, 'job_label', '') == 'deposit' else bool(is_external)),
-                                note=form.cleaned_data.get('note'),
-                            )
+                            with transaction.atomic():
+                                if not batch_entry.lock_job(job_obj, canonical_section):
+                                    messages.error(request, "این شماره کار پیش‌تر در این بخش ثبت شده است.")
+                                    return redirect('production_line:work_entry_manager', section=section)
+                                idempotency.remember(idem_key, request.user, 'work_entry_manager')
+                                ProductionLog.objects.create(
+                                    user=request.user,
+                                    role="manager",
+                                    section=canonical_section,
+                                    model=form.cleaned_data['model'],
+                                    part=selected_part,
+                                    product=selected_product,
+                                    job=job_obj,
+                                    is_scrap=bool(is_scrap),
+                                    is_external=(False if getattr(job_obj, 'job_label', '') == 'deposit' else bool(is_external)),
+                                    note=form.cleaned_data.get('note'),
+                                )
+                                # Update default job flags
+                                ProductionJob.objects.filter(is_default=True).exclude(job_number=job_number).update(is_default=False)
+                                if hasattr(job_obj, 'is_default'):
+                                    job_obj.is_default = True
+                                    job_obj.save(update_fields=['is_default'])
+                        except IntegrityError:
+                            messages.info(request, idempotency.REPLAY_MESSAGE)
+                            return redirect('production_line:work_entry_manager', section=section)
+                        except reservation.Shortage as exc:
+                            # Per-component message for short parts / raw materials
+                            messages.error(request, exc.message)
+                            return redirect('production_line:work_entry_manager', section=section)
                         except Exception:
                             messages.error(request, "موجودی قطعه کافی نیست")
                             return redirect('production_line:work_entry_manager', section=section)
@@ -838,7 +841,7 @@ def work_entry_manager_view(request, section: str):
                 idx = allowed.index(canonical_section)
                 if idx > 0:
                     prev = allowed[idx - 1]
-                    if not ProductionLog.objects.filter(job=job, section=prev).exists():
+                    if prev not in (job.logged_sections or []):
                         continue
             jl = job.job_label or 'in_progress'
             open_jobs_data.append({
@@ -876,6 +879,7 @@ def work_entry_manager_view(request, section: str):
         "label_colors": label_colors,
         "label_text_colors": label_text_colors,
         "selected_job_number": selected_job_number,
+        "idempotency_key": idempotency.new_key(),
     }
     return render(request, "production_line/work_entry.html", context)
 
@@ -933,18 +937,19 @@ def api_job_info(request):
 @require_GET
 @login_required
 def api_parts_by_model(request):
+    from inventory import catalog
+
     model = request.GET.get('model')
-    parts = Part.objects.filter(product_model__name=model).order_by('name') if model else Part.objects.none()
-    data = [{"id": p.id, "name": p.name} for p in parts]
-    return JsonResponse({"results": data})
+    return JsonResponse({"results": catalog.parts_for_model(model) if model else []})
 
 @require_GET
 @login_required
 def api_products_by_model(request):
+    from inventory import catalog
+
     model = request.GET.get('model')
-    products = Product.objects.filter(product_model__name=model).order_by('name') if model else Product.objects.none()
-    data = [{"id": pr.id, "name": pr.name} for pr in products]
-    return JsonResponse({"results": data})
+    products = catalog.products_for_models([model]) if model else []
+    return JsonResponse({"results": [{"id": p['id'], "name": p['name']} for p in products]})
 
 
 @require_GET
@@ -1431,7 +1436,7 @@ def api_job_search(request):
                 except ValueError:
                     continue
                 prev = allowed_norm[idx-1] if idx > 0 else None
-                if prev and not ProductionLog.objects.filter(job=job, section=prev).exists():
+                if prev and prev not in (job.logged_sections or []):
                     # Previous section not done yet
                     continue
             jl = job.job_label or 'in_progress'
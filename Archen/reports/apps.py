@@ -5,3 +5,28 @@ from django.apps import AppConfig
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        # English: any write to a model counted on the dashboard invalidates
+        # the cached metrics payload for every worker.  Stock-only saves (one
+        # per BOM line on every log) are left to METRICS_CACHE_TIMEOUT; the
+        # log itself already bumps.
+        from django.contrib.auth import get_user_model
+        from inventory import low_stock
+        from inventory.models import Material, Part, Product, ProductModel
+        from jobs.models import ProductionJob
+        from orders.models import Order
+        from production_line.models import ProductionLog
+        from utils.cache import invalidate_on_change
+
+        invalidate_on_change(
+            'metrics',
+            Product, Part, ProductModel, Material, Order,
+            ProductionLog, ProductionJob, get_user_model(),
+            ignore_fields={
+                *low_stock.STOCK_FIELDS['inventory.part'],
+                *low_stock.STOCK_FIELDS['inventory.material'],
+                *low_stock.FLAG_FIELDS,
+                'updated_at',
+            },
+        )
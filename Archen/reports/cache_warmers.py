@@ -0,0 +1,15 @@
+"""Cache warmers for the reports app (run by ``manage.py warm_caches``)."""
+
+from utils.cache import cached, register_warmer
+
+
+@register_warmer('reports.metrics')
+def warm_dashboard_metrics():
+    from reports.views import METRICS_CACHE_NAMESPACE, METRICS_CACHE_TIMEOUT, _build_metrics_payload
+    return cached(METRICS_CACHE_NAMESPACE, ['dashboard'], _build_metrics_payload, timeout=METRICS_CACHE_TIMEOUT)
+
+
+@register_warmer('reports.metrics_cards')
+def warm_dashboard_cards():
+    from reports.views import METRICS_CACHE_NAMESPACE, METRICS_CACHE_TIMEOUT, _build_cards_payload
+    return cached(METRICS_CACHE_NAMESPACE, ['cards'], _build_cards_payload, timeout=METRICS_CACHE_TIMEOUT)
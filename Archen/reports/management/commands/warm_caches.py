@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from utils.cache import registered_warmers
+
+
+class Command(BaseCommand):
+    help = "Precompute shared cache entries (run after deploy or cache flush)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only run the warmers with these names.")
+        parser.add_argument('--list', action='store_true', help="List available warmers and exit.")
+
+    def handle(self, *args, **options):
+        # English: each app registers its warmers in a ``cache_warmers`` module.
+        autodiscover_modules('cache_warmers')
+        warmers = registered_warmers()
+
+        if options['list']:
+            for name in sorted(warmers):
+                self.stdout.write(name)
+            return
+
+        selected = options['names'] or sorted(warmers)
+        unknown = [n for n in selected if n not in warmers]
+        if unknown:
+            raise CommandError(f"Unknown warmer(s): {', '.join(unknown)}")
+
+        failed = 0
+        for name in selected:
+            started = time.monotonic()
+            try:
+                warmers[name]()
+            except Exception as exc:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{name}: failed ({exc})"))
+                continue
+            elapsed = (time.monotonic() - started) * 1000
+            self.stdout.write(f"{name}: ok ({elapsed:.0f} ms)")
+
+        if failed:
+            raise CommandError(f"{failed} warmer(s) failed.")
+        self.stdout.write(self.style.SUCCESS(f"Warmed {len(selected)} cache entries."))
@@ -0,0 +1,343 @@
+"""Filtered, paginated list sources for the reports dashboard.
+
+The dashboard shell (``reports.views.index``) renders no rows itself; every
+list panel fetches one page at a time from a fragment endpoint that builds its
+rows here.  Filtering and ordering happen in SQL so the cost of a page does
+not depend on how many logs or jobs exist.
+"""
+
+from __future__ import annotations
+
+import datetime
+
+import jdatetime
+from django.core.paginator import Paginator
+from django.db.models import Case, CharField, Count, Exists, F, IntegerField, OuterRef, Q, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce, Length, NullIf
+from django.utils import timezone
+
+from jobs.models import ProductionJob
+from production_line.models import ProductionLog, SectionChoices
+from utils.normalize import normalize_search_text, normalize_search_texts, to_ascii_digits
+
+PAGE_SIZE = 50
+
+# English: product sections in pipeline order; used by the logs chart and the
+# open-jobs list (mirrors ``production_line.views.work_entry``).
+PRODUCT_SECTIONS = [
+    SectionChoices.ASSEMBLY,
+    SectionChoices.WORKPAGE,
+    SectionChoices.UNDERCOATING,
+    SectionChoices.PAINTING,
+    SectionChoices.SEWING,
+    SectionChoices.UPHOLSTERY,
+    SectionChoices.PACKAGING,
+]
+
+# English: sections sort by their displayed label, as the tables always did
+_SECTION_LABEL_RANK = {
+    code: rank for rank, (code, _label) in enumerate(sorted(SectionChoices.choices, key=lambda c: str(c[1])))
+}
+
+
+def _section_rank(field: str = 'section'):
+    return Case(*(When(**{field: code}, then=Value(rank)) for code, rank in _SECTION_LABEL_RANK.items()),
+                default=Value(len(_SECTION_LABEL_RANK)), output_field=IntegerField())
+
+
+# English: a product log is one unit, shown as produced or scrapped; part
+# logs show their quantities.  Sort on the displayed numbers.
+_PRODUCT_UNIT = Q(product_id__isnull=False, part_id__isnull=True)
+_SHOWN_PRODUCED = Case(When(_PRODUCT_UNIT & Q(is_scrap=True), then=Value(0)), When(_PRODUCT_UNIT, then=Value(1)),
+                       default=F('produced_qty'), output_field=IntegerField())
+_SHOWN_SCRAP = Case(When(_PRODUCT_UNIT & Q(is_scrap=True), then=Value(1)), When(_PRODUCT_UNIT, then=Value(0)),
+                    default=F('scrap_qty'), output_field=IntegerField())
+
+# Column index (as sent by the table headers) -> ORDER BY expression.
+LOG_SORT_FIELDS = {
+    0: (Length(Coalesce('job__job_number', Value(''))), 'job__job_number'),
+    1: (_section_rank(),),
+    2: ('user__full_name', 'user__username'),
+    3: ('model',),
+    4: (Coalesce('part__name', 'product__name'),),
+    5: (_SHOWN_PRODUCED,),
+    6: (_SHOWN_SCRAP,),
+    7: ('logged_at',),
+}
+JOB_SORT_FIELDS = {
+    0: (Length('job_number'), 'job_number'),
+    2: ('job_label',),
+    3: ('product__product_model__name',),
+    4: ('product__name',),
+}
+
+
+def parse_jdate(value: str | None) -> jdatetime.date | None:
+    """Parse a Jalali date from 'YYYY/MM/DD' or 'YYYY-MM-DD' (Persian/Arabic digits allowed)."""
+    text = to_ascii_digits((value or '').strip()).replace('-', '/')
+    if not text:
+        return None
+    try:
+        year, month, day = (int(x) for x in text.split('/'))
+        return jdatetime.date(year, month, day)
+    except Exception:
+        return None
+
+
+def _search_q(fields, text: str) -> Q:
+    """OR of ``icontains`` over ``fields`` for the raw and digit-normalized text."""
+    cond = Q()
+    for variant in {text.strip(), normalize_search_text(text)}:
+        if not variant:
+            continue
+        for name in fields:
+            cond |= Q(**{f'{name}__icontains': variant})
+    return cond
+
+
+def _codes_matching(choices, needle: str) -> list:
+    """Codes of ``choices`` whose search-normalized label contains ``needle``."""
+    labels = normalize_search_texts(label for _code, label in choices)
+    return [code for (code, _label), text in zip(choices, labels) if needle in text]
+
+
+def _ordering(sort_map, params, default, tiebreak=('-id',)):
+    try:
+        col = int(params.get('sort_col', ''))
+    except (TypeError, ValueError):
+        return default
+    fields = sort_map.get(col)
+    if not fields:
+        return default
+    desc = (params.get('sort_dir') or 'asc').lower() == 'desc'
+    out = []
+    for f in fields:
+        if isinstance(f, str):
+            out.append(f'-{f}' if desc else f)
+        else:
+            out.append(f.desc() if desc else f.asc())
+    return out + list(tiebreak)
+
+
+def filter_logs(params):
+    """Registered production logs matching the dashboard filters.
+
+    Accepted keys (same names as the export links): ``section``, ``user``,
+    ``model``, ``df``/``dt`` (Jalali dates), ``q`` (free text over job
+    number, section, user, model and part/product name), ``sort_col`` and
+    ``sort_dir``.
+    """
+    qs = ProductionLog.objects.select_related('job', 'user', 'product', 'part')
+
+    sec = (params.get('section') or '').strip()
+    uid = (params.get('user') or '').strip()
+    mdl = (params.get('model') or '').strip()
+    df = parse_jdate(params.get('df'))
+    dt = parse_jdate(params.get('dt'))
+    q = (params.get('q') or '').strip()
+
+    if sec:
+        qs = qs.filter(section=sec)
+    if uid.isdigit():
+        qs = qs.filter(user_id=int(uid))
+    if mdl:
+        qs = qs.filter(model__iexact=mdl)
+    if df:
+        qs = qs.filter(jdate__gte=df)
+    if dt:
+        qs = qs.filter(jdate__lte=dt)
+    if q:
+        cond = _search_q(
+            ['job__job_number', 'user__full_name', 'user__username', 'model', 'part__name', 'product__name'], q,
+        )
+        sections = _codes_matching(SectionChoices.choices, normalize_search_text(q))
+        if sections:
+            cond |= Q(section__in=sections)
+        qs = qs.filter(cond)
+
+    return qs.order_by(*_ordering(LOG_SORT_FIELDS, params, ['-logged_at', '-id']))
+
+
+def filter_jobs(params):
+    """Production jobs for the dashboard job list (``label``, ``q``, sort keys)."""
+    qs = ProductionJob.objects.select_related('product__product_model', 'part')
+    label = (params.get('label') or '').strip()
+    q = (params.get('q') or '').strip()
+    if label:
+        qs = qs.filter(job_label=label)
+    if q:
+        qs = qs.filter(_search_q(['job_number'], q))
+    return qs.order_by(*_ordering(JOB_SORT_FIELDS, params, ['-created_at', '-id']))
+
+
+def _jalali_day_start(jdate: jdatetime.date) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(jdate.togregorian(), datetime.time.min))
+
+
+def _has_log(section) -> Q:
+    return Q(**{f'log_{section}': True})
+
+
+def _allowed(section) -> Q:
+    # English: ``allowed_sections`` is a JSON list; its text form contains the
+    # quoted slug on every backend, and ``icontains`` mirrors the
+    # case-insensitive comparison done by the work-entry views.
+    return Q(allowed_text__icontains=f'"{section}"')
+
+
+def _any_allowed(sections) -> Q | None:
+    cond = None
+    for section in sections:
+        cond = _allowed(section) if cond is None else cond | _allowed(section)
+    return cond
+
+
+def _open_in_section(index: int) -> Q:
+    """SQL form of the work-entry gating for ``PRODUCT_SECTIONS[index]``.
+
+    A job is open in a section when it has no log there yet and either its
+    allowed list names no product section, or the section is allowed and the
+    nearest allowed section before it (if any) already has a log.
+    """
+    section = PRODUCT_SECTIONS[index]
+    earlier = PRODUCT_SECTIONS[:index]
+    gate = _allowed(section)
+    if earlier:
+        # No earlier section allowed -> first step of this job's flow
+        prev_ok = ~_any_allowed(earlier)
+        for k, prev in enumerate(earlier):
+            step = _allowed(prev) & _has_log(prev)
+            skipped = _any_allowed(earlier[k + 1:])
+            if skipped is not None:
+                step &= ~skipped
+            prev_ok |= step
+        gate &= prev_ok
+    # Jobs whose allowed list names no product section are open everywhere
+    no_allowed = Q(allowed_sections__isnull=True) | ~_any_allowed(PRODUCT_SECTIONS)
+    return Q(**{f'log_{section}': False}) & (no_allowed | gate)
+
+
+def _open_jobs_base():
+    """Unfinished jobs annotated with one ``log_<section>`` flag per product section."""
+    flags = {
+        f'log_{section}': Exists(ProductionLog.objects.filter(job_id=OuterRef('pk'), section=section))
+        for section in PRODUCT_SECTIONS
+    }
+    return (
+        ProductionJob.objects
+        .filter(finished_at__isnull=True)
+        .annotate(allowed_text=Cast('allowed_sections', TextField()), **flags)
+    )
+
+
+def open_section_counts() -> dict:
+    """Number of open jobs per product section, in one aggregate query."""
+    totals = _open_jobs_base().aggregate(**{
+        str(section): Count('id', filter=_open_in_section(i)) for i, section in enumerate(PRODUCT_SECTIONS)
+    })
+    return {section: totals[str(section)] or 0 for section in PRODUCT_SECTIONS}
+
+
+OPEN_COLUMNS = ('id', 'job_number', 'number_len', 'job_label', 'created_at', 'model_name', 'item_name',
+                'section', 'section_pos', 'section_rank')
+OPEN_SORT_FIELDS = {
+    0: ('number_len', 'job_number'),
+    1: ('section_rank',),
+    2: ('model_name',),
+    3: ('item_name',),
+    4: ('job_label',),
+    5: ('created_at',),
+}
+
+
+def filter_open_jobs(params):
+    """(job, section) pairs open for daily work entry, with the logs-panel filters.
+
+    Returns a ``values()`` queryset (a UNION of one SELECT per section) with
+    the columns in ``OPEN_COLUMNS``; pass rows through :func:`open_row` for
+    display.  Accepted keys: ``section``, ``model``, ``df``/``dt`` (Jalali,
+    on the job creation date), ``q``, ``sort_col`` and ``sort_dir``.
+    """
+    sec = (params.get('section') or '').strip()
+    mdl = (params.get('model') or '').strip()
+    df = parse_jdate(params.get('df'))
+    dt = parse_jdate(params.get('dt'))
+    q = (params.get('q') or '').strip()
+
+    base = _open_jobs_base().annotate(
+        number_len=Length('job_number'),
+        model_name=Coalesce(
+            NullIf('product__product_model__name', Value('')),
+            'product__name',
+            'part__product_model__name',
+            Value(''),
+        ),
+        item_name=Coalesce('part__name', 'product__name', Value('')),
+    )
+    if mdl:
+        base = base.filter(model_name__iexact=mdl)
+    if df:
+        base = base.filter(created_at__gte=_jalali_day_start(df))
+    if dt:
+        base = base.filter(created_at__lt=_jalali_day_start(dt + datetime.timedelta(days=1)))
+
+    text_q = None
+    needle = normalize_search_text(q)
+    if q:
+        text_q = _search_q(['job_number', 'model_name', 'item_name'], q)
+        labels = _codes_matching(ProductionJob.LABEL_CHOICES, needle)
+        if labels:
+            text_q |= Q(job_label__in=labels)
+
+    section_matches = set(_codes_matching(SectionChoices.choices, needle))
+    selects = []
+    for i, section in enumerate(PRODUCT_SECTIONS):
+        if sec and sec != section:
+            continue
+        qs = base.filter(_open_in_section(i))
+        # A search for the section name lists every open job of that section
+        if text_q is not None and section not in section_matches:
+            qs = qs.filter(text_q)
+        selects.append(
+            qs.annotate(section=Value(str(section), CharField()), section_pos=Value(i, IntegerField()),
+                        section_rank=Value(_SECTION_LABEL_RANK.get(section, i), IntegerField()))
+            .values(*OPEN_COLUMNS)
+        )
+    if not selects:
+        return ProductionJob.objects.none().values('id')
+    combined = selects[0].union(*selects[1:], all=True) if len(selects) > 1 else selects[0]
+    return combined.order_by(*_ordering(OPEN_SORT_FIELDS, params, ['id', 'section_pos'], tiebreak=('id', 'section_pos')))
+
+
+def open_row(row: dict) -> dict:
+    """Display fields for one row of :func:`filter_open_jobs`."""
+    created_date = created_time = ''
+    created_at = row.get('created_at')
+    if created_at:
+        try:
+            j_created = jdatetime.datetime.fromgregorian(datetime=timezone.localtime(created_at))
+            created_date = j_created.strftime('%Y-%m-%d')
+            created_time = j_created.strftime('%H:%M')
+        except Exception:
+            created_date = created_at.strftime('%Y-%m-%d')
+            created_time = created_at.strftime('%H:%M')
+    section = row['section']
+    return {
+        'job_number': row['job_number'],
+        'section': section,
+        'section_label': _SECTION_LABELS.get(section, section),
+        'model': row['model_name'] or '',
+        'item_name': row['item_name'] or '',
+        'label_display': _LABEL_DISPLAY.get(row['job_label'], ''),
+        'created_date': created_date,
+        'created_time': created_time,
+    }
+
+
+_SECTION_LABELS = dict(SectionChoices.choices)
+_LABEL_DISPLAY = dict(ProductionJob.LABEL_CHOICES)
+
+
+def page_of(source, params, per_page: int = PAGE_SIZE):
+    """One page of ``source`` (queryset or list) for the ``page`` parameter."""
+    return Paginator(source, per_page).get_page(params.get('page'))
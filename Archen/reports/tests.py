@@ -0,0 +1,377 @@
+import csv
+import random
+import re
+from collections import Counter
+from io import BytesIO, StringIO
+
+import jdatetime
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Part, Product, ProductModel
+from jobs.models import ProductionJob
+from production_line.models import ProductionLog, SectionChoices
+from utils.cache import make_key, namespace_version
+from utils.normalize import normalize_search_text, to_ascii_digits
+
+from . import queries
+from .views import METRICS_CACHE_NAMESPACE
+
+
+class WarmCachesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lists_the_registered_warmers(self):
+        out = StringIO()
+        call_command('warm_caches', '--list', stdout=out)
+        self.assertIn('reports.metrics', out.getvalue().split())
+
+    def test_warming_fills_the_metrics_cache(self):
+        call_command('warm_caches', 'reports.metrics', 'reports.metrics_cards', stdout=StringIO())
+        for part in ('dashboard', 'cards'):
+            self.assertIsNotNone(cache.get(make_key(METRICS_CACHE_NAMESPACE, [part])))
+
+    def test_metrics_are_invalidated_on_commit_but_not_by_stock_saves(self):
+        part = Part.objects.create(name='Leg', product_model=ProductModel.objects.create(name='M1'))
+        version = namespace_version(METRICS_CACHE_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            part.stock_cut = 3
+            part.save(update_fields=['stock_cut'])
+        self.assertEqual(namespace_version(METRICS_CACHE_NAMESPACE), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            part.name = 'Long leg'
+            part.save()
+        self.assertEqual(namespace_version(METRICS_CACHE_NAMESPACE), version + 1)
+
+
+class LogsFixtureMixin:
+    def setUp(self):
+        cache.clear()
+        users = get_user_model().objects
+        self.ali = users.create_user(username='ali', password='x', role='manager', full_name='Ali')
+        self.reza = users.create_user(username='reza', password='x', role='painting_master', full_name='Reza')
+        m1 = ProductModel.objects.create(name='M1')
+        self.chair = Product.objects.create(name='Chair', product_model=m1)
+        self.leg = Part.objects.create(name='Leg', product_model=m1)
+        self.logs = self.add_logs(1)
+
+    def add_logs(self, copies):
+        """``copies`` x (assembly, painting, cutting) logs; bulk_create skips the stock side effects."""
+        logs = []
+        start = 101 + ProductionJob.objects.count()
+        for i in range(start, start + 2 * copies, 2):
+            j1 = ProductionJob.objects.create(job_number=f'J{i}', product=self.chair)
+            j2 = ProductionJob.objects.create(job_number=f'J{i + 1}', product=self.chair)
+            logs += [
+                ProductionLog(user=self.ali, role='assembly_master', model='M1', product=self.chair, job=j1,
+                              section='assembly', jdate=jdatetime.date(1403, 1, 10)),
+                ProductionLog(user=self.reza, role='painting_master', model='M2', product=self.chair, job=j2,
+                              section='painting', is_scrap=True, jdate=jdatetime.date(1403, 2, 5)),
+                ProductionLog(user=self.ali, role='cutter_master', model='M1', part=self.leg, section='cutting',
+                              produced_qty=5, scrap_qty=1, jdate=jdatetime.date(1403, 1, 20)),
+            ]
+        return ProductionLog.objects.bulk_create(logs)
+
+
+class LogFilterTests(LogsFixtureMixin, TestCase):
+    def sections(self, **params):
+        return sorted(queries.filter_logs(params).values_list('section', flat=True))
+
+    def test_filters(self):
+        self.assertEqual(self.sections(section='assembly'), ['assembly'])
+        self.assertEqual(self.sections(user=str(self.ali.pk)), ['assembly', 'cutting'])
+        self.assertEqual(self.sections(model='m1'), ['assembly', 'cutting'])
+        self.assertEqual(self.sections(df='1403/01/15', dt='۱۴۰۳/۰۲/۰۱'), ['cutting'])
+        self.assertEqual(self.sections(q='۱۰۲'), ['painting'])
+        self.assertEqual(self.sections(q='مونتاژ'), ['assembly'])
+        self.assertEqual(self.sections(q='leg'), ['cutting'])
+
+    def test_sorting(self):
+        logs = queries.filter_logs({'sort_col': '5', 'sort_dir': 'desc'})
+        self.assertEqual(logs[0].section, 'cutting')
+
+
+_FLOW = ['assembly', 'workpage', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging']
+
+
+def _per_job_open_jobs():
+    """The per-job loop of ``_gather_reports_metrics`` that the SQL open-jobs gating replaced."""
+    label_display_map = dict(ProductionJob.LABEL_CHOICES)
+    section_labels = dict(SectionChoices.choices)
+    jobs = ProductionJob.objects.filter(finished_at__isnull=True).select_related('product__product_model')
+    job_logs = {}
+    for row in ProductionLog.objects.filter(job__in=jobs, section__in=_FLOW).values('job_id', 'section'):
+        job_logs.setdefault(row['job_id'], set()).add(row['section'])
+    out = []
+    for job in jobs:
+        logs_for_job = job_logs.get(job.id, set())
+        allowed_lower = {str(x).lower() for x in (job.allowed_sections or [])}
+        allowed_norm = [s for s in _FLOW if s in allowed_lower]
+        for section in _FLOW:
+            if section in logs_for_job:
+                continue
+            if allowed_norm:
+                if section not in allowed_norm:
+                    continue
+                idx = allowed_norm.index(section)
+                if idx > 0 and allowed_norm[idx - 1] not in logs_for_job:
+                    continue
+            created = jdatetime.datetime.fromgregorian(datetime=timezone.localtime(job.created_at))
+            out.append({
+                'job_number': job.job_number,
+                'section': section,
+                'section_label': section_labels.get(section, section),
+                'model': job.product.product_model.name,
+                'item_name': job.product.name,
+                'label_display': label_display_map.get(job.job_label, ''),
+                'created_date': created.strftime('%Y-%m-%d'),
+                'created_time': created.strftime('%H:%M'),
+            })
+    return out
+
+
+def _jdate(text):
+    try:
+        year, month, day = (int(x) for x in to_ascii_digits(text or '').replace('-', '/').split('/'))
+        return jdatetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _per_row_open_export(params):
+    """The Python filtering and sorting of ``logs_list_export(mode=open)`` that the SQL export replaced."""
+    sec, mdl = params.get('section', ''), params.get('model', '')
+    q = normalize_search_text(params.get('q', ''))
+    df, dt = _jdate(params.get('df')), _jdate(params.get('dt'))
+    rows = []
+    for item in _per_job_open_jobs():
+        if sec and item['section'] != sec:
+            continue
+        if mdl and item['model'].strip().lower() != mdl.lower():
+            continue
+        created = _jdate(item['created_date'])
+        if (df and created < df) or (dt and created > dt):
+            continue
+        fields = ('job_number', 'section_label', 'model', 'item_name', 'label_display')
+        if q and q not in normalize_search_text(' '.join(str(item[f]) for f in fields)):
+            continue
+        rows.append([*(item[f] for f in fields), f"{item['created_date']} {item['created_time']}"])
+    if 'sort_col' in params:
+        col = int(params['sort_col'])
+
+        def key(row):
+            if col == 0:
+                return int(re.sub(r'[^0-9.-]', '', to_ascii_digits(row[0])) or 0)
+            return str(row[col])
+        rows.sort(key=key, reverse=params.get('sort_dir') == 'desc')
+    return rows
+
+
+def _per_row_log_export(params):
+    """The Python filtering and sorting of ``logs_list_export`` that the SQL export replaced."""
+    labels = dict(SectionChoices.choices)
+    qs = ProductionLog.objects.select_related('job', 'user', 'product', 'part').order_by('-logged_at', '-id')
+    if params.get('section'):
+        qs = qs.filter(section=params['section'])
+    if params.get('user'):
+        qs = qs.filter(user_id=int(params['user']))
+    if params.get('model'):
+        qs = qs.filter(model__iexact=params['model'])
+    if _jdate(params.get('df')):
+        qs = qs.filter(jdate__gte=_jdate(params['df']))
+    if _jdate(params.get('dt')):
+        qs = qs.filter(jdate__lte=_jdate(params['dt']))
+    q = normalize_search_text(params.get('q', ''))
+    rows = []
+    for log in qs:
+        if log.product_id and not log.part_id:
+            produced, scrap = ('', '1') if log.is_scrap else ('1', '')
+        else:
+            produced, scrap = str(log.produced_qty or ''), str(log.scrap_qty or '')
+        row = [
+            log.job.job_number if log.job else '',
+            labels.get(log.section, log.section),
+            log.user.full_name or log.user.username,
+            log.model or '',
+            getattr(log.part, 'name', None) or getattr(log.product, 'name', '') or '',
+            produced,
+            scrap,
+            f"{log.jdate.strftime('%Y/%m/%d')} {log.logged_at.strftime('%H:%M')}",
+        ]
+        if q and q not in normalize_search_text(' '.join(row)):
+            continue
+        rows.append(row)
+    if 'sort_col' in params:
+        col = int(params['sort_col'])
+        rows.sort(key=lambda row: int(row[col] or 0) if col in (5, 6) else row[col],
+                  reverse=params.get('sort_dir') == 'desc')
+    return rows
+
+
+
+
+class LogsExportTests(LogsFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.ali)
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('reports:logs_list_export', args=[fmt]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_rows_follow_the_filters(self):
+        body = self.export('csv', user=str(self.ali.pk)).decode('utf-8-sig')
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[0][0], 'شماره کار')
+        self.assertEqual(sorted((r[0], r[5], r[6]) for r in rows[1:]), [('', '5', '1'), ('J101', '1', '')])
+
+    def test_xlsx_is_streamed(self):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(BytesIO(self.export('xlsx', section='painting'))).active
+        values = [row for row in sheet.iter_rows(values_only=True) if any(row)]
+        self.assertIn('J102', [cell for row in values for cell in row])
+
+    def rows(self, fmt, **params):
+        body = self.export(fmt, **params)
+        if fmt == 'csv':
+            return list(csv.reader(StringIO(body.decode('utf-8-sig'))))[1:]
+        from openpyxl import load_workbook
+
+        # English: the title row and the header row come first
+        sheet = load_workbook(BytesIO(body)).active
+        return [['' if v is None else str(v) for v in row] for row in sheet.iter_rows(min_row=3, values_only=True)]
+
+    def add_open_jobs(self):
+        ProductionJob.objects.create(job_number='J7', product=self.chair, allowed_sections=['assembly', 'painting'])
+        gated = ProductionJob.objects.create(job_number='J8', product=self.chair, allowed_sections=['Assembly', 'Sewing'])
+        ProductionLog.objects.bulk_create([ProductionLog(user=self.ali, role='manager', model='M1', product=self.chair,
+                                                         job=gated, section='assembly')])
+        ProductionJob.objects.create(job_number='J9', product=self.chair, allowed_sections=['cutting'])
+        self.add_logs(3)
+
+    def assert_matches_golden(self, fmt, golden, params):
+        rows = self.rows(fmt, **params)
+        if 'sort_col' in params:
+            col = int(params['sort_col'])
+            self.assertEqual([r[col] for r in rows], [r[col] for r in golden], params)
+        self.assertEqual(sorted(rows), sorted(golden), params)
+
+    def test_open_mode_matches_the_old_rows(self):
+        self.add_open_jobs()
+        today = jdatetime.date.today().strftime('%Y/%m/%d')
+        for params in ({}, {'section': 'painting'}, {'model': 'm1'}, {'q': 'J10'}, {'q': 'نقاشی'},
+                       {'df': today, 'dt': today}, {'df': '1400/01/01', 'dt': '1400/01/02'},
+                       {'sort_col': '0', 'sort_dir': 'desc'}, {'sort_col': '1'}):
+            golden = _per_row_open_export(params)
+            for fmt in ('csv', 'xlsx'):
+                self.assert_matches_golden(fmt, golden, {'mode': 'open', **params})
+        self.assertIn(['J8', 'خیاطی'], [r[:2] for r in self.rows('csv', mode='open')])
+        # English: a list naming no product section does not gate
+        self.assertIn('J9', [r[0] for r in self.rows('csv', mode='open', section='painting')])
+
+    def test_registered_mode_matches_the_old_rows(self):
+        self.add_open_jobs()
+        for params in ({}, {'section': 'painting'}, {'user': str(self.reza.pk)}, {'model': 'M2'}, {'q': 'leg'},
+                       {'q': 'J10'}, {'df': '1403/01/15', 'dt': '1403/02/01'}, {'sort_col': '5', 'sort_dir': 'desc'},
+                       {'sort_col': '0'}):
+            golden = _per_row_log_export(params)
+            if params.get('sort_col') == '0':
+                # English: job numbers sort numerically, as in the open-jobs
+                # export; the old logs export compared them as text
+                golden.sort(key=lambda row: (len(row[0]), row[0]))
+            for fmt in ('csv', 'xlsx'):
+                self.assert_matches_golden(fmt, golden, params)
+
+    def test_query_count_does_not_grow_with_the_rows(self):
+        counts = []
+        for extra in (0, 20):
+            self.add_logs(extra)
+            with CaptureQueriesContext(connection) as captured:
+                body = self.export('csv')
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(len(body.decode('utf-8-sig').splitlines()), 1 + 3 * 21)
+
+
+class FragmentQueryTests(LogsFixtureMixin, TestCase):
+    """Each polled fragment runs a fixed number of queries whatever the data size."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.ali)
+
+    def assert_fixed_queries(self, name, budget, **params):
+        url = reverse(f'reports:{name}')
+        for extra in (0, 30):
+            self.add_logs(extra)
+            cache.clear()
+            with self.assertNumQueries(budget):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_logs_fragment(self):
+        data = self.assert_fixed_queries('logs_fragment', 4)
+        self.assertEqual(data['count'], 3 * 31)
+        self.assert_fixed_queries('logs_fragment', 5, choices='1', page='2')
+
+    def test_jobs_fragment(self):
+        self.assertEqual(self.assert_fixed_queries('jobs_fragment', 4, q='J1')['count'], 2 * 31)
+
+    def test_open_jobs_fragment(self):
+        data = self.assert_fixed_queries('open_jobs_fragment', 5)
+        self.assertEqual(data['count'], data['total'])
+        self.assertGreater(data['count'], 2 * 30)
+
+    def test_metrics_cards_api(self):
+        data = self.assert_fixed_queries('metrics_cards_api', 10)
+        self.assertEqual(data['totals']['logs'], 3 * 31)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('reports:metrics_cards_api'))
+
+
+class OpenJobsParityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        rng = random.Random(39)
+        user = get_user_model().objects.create_user(username='ali', password='x', role='manager', full_name='Ali')
+        model = ProductModel.objects.create(name='M1')
+        products = [Product.objects.create(name=name, product_model=model) for name in ('Chair', 'Sofa')]
+        choices = [[], ['Cutting'], ['cutting', 'cnc_tools'], ['ASSEMBLY', 'Painting'], ['workpage', 'packaging']]
+        logs = []
+        for i in range(60):
+            if rng.random() < 0.6:
+                allowed = rng.sample(_FLOW, rng.randint(1, 5))
+            else:
+                allowed = rng.choice(choices)
+            job = ProductionJob.objects.create(job_number=f'J{i:03d}', product=rng.choice(products),
+                                               allowed_sections=allowed)
+            for section in rng.sample(_FLOW, rng.randint(0, 4)):
+                logs.append(ProductionLog(user=user, role='manager', model='M1', product=job.product,
+                                          job=job, section=section))
+        ProductionLog.objects.bulk_create(logs)
+        ProductionJob.objects.filter(job_number__endswith='7').update(finished_at=timezone.now())
+
+    def test_counts_match_the_per_job_loop(self):
+        expected = Counter(row['section'] for row in _per_job_open_jobs())
+        self.assertEqual(queries.open_section_counts(), {s: expected.get(str(s), 0) for s in queries.PRODUCT_SECTIONS})
+
+    def test_rows_match_the_per_job_loop(self):
+        def key(row):
+            return row['job_number'], row['section']
+
+        expected = sorted(_per_job_open_jobs(), key=key)
+        self.assertGreater(len({row['job_number'] for row in expected}), 30)
+        rows = [queries.open_row(row) for row in queries.filter_open_jobs({})]
+        self.assertEqual(sorted(rows, key=key), expected)
+        painting = [queries.open_row(row) for row in queries.filter_open_jobs({'section': 'painting'})]
+        self.assertEqual(sorted(map(key, painting)), [key(r) for r in expected if r['section'] == 'painting'])
@@ -11,6 +11,11 @@ urlpatterns = [
     path('', views.index, name='list'),
     # Live metrics API for auto-refreshing reports dashboard
     path('api/metrics/', views.metrics_api, name='metrics_api'),
+    path('api/metrics/cards/', views.metrics_cards_api, name='metrics_cards_api'),
+    # Paginated list fragments loaded on demand by the dashboard panels
+    path('fragments/logs/', views.logs_fragment, name='logs_fragment'),
+    path('fragments/open-jobs/', views.open_jobs_fragment, name='open_jobs_fragment'),
+    path('fragments/jobs/', views.jobs_fragment, name='jobs_fragment'),
     path('scrap/', views.scrap_report, name='scrap'),
     # Job details panel (AJAX) and export endpoints for dashboard
     path('job-details/', views.job_details_panel, name='job_details_panel'),
@@ -4,6 +4,7 @@ from django.shortcuts import render
 from django.db.models import Count, Sum
 from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
+from django.template.loader import render_to_string
 import os
 
 from inventory.models import Product, Part, ProductModel, Material
@@ -12,7 +13,15 @@ from orders.status_styles import get_status_badge_classes
 from production_line.models import ProductionLog
 from users.models import CustomUser
 from jobs.models import ProductionJob
-from utils.xlsx import base_styles, build_table_response, sanitize_value, write_table
+from utils.cache import cached
+from utils.xlsx import (
+    base_styles,
+    build_streaming_workbook_response,
+    sanitize_value,
+    write_table,
+)
+
+from . import queries
 
 
 def _xlsx_response_from_workbook(wb, filename: str) -> HttpResponse:
@@ -64,8 +73,9 @@ def _pdf_response_from_html(html: str, filename: str, request=None) -> HttpRespo
     """Render a PDF using ReportLab only (Persian-safe).
 
     Notes:
-    - Shapes Persian text using arabic_reshaper + python-bidi so the
-      final PDF shows correct glyph order.
+    - Shapes Persian text via ``utils.persian_text.shape`` (arabic_reshaper
+      + python-bidi behind an LRU/vocabulary cache) so the final PDF shows
+      correct glyph order.
     - Registers Vazirmatn TTF from static if available.
     - Performs a very light HTML-to-text conversion, preserving line
       breaks and adding simple separators for table cells/rows.
@@ -119,30 +129,8 @@ def _pdf_response_from_html(html: str, filename: str, request=None) -> HttpRespo
     except Exception:
         font_name = 'Helvetica'
 
-    # Persian shaping (visual order for ReportLab)
-    try:
-        from arabic_reshaper import reshape  # type: ignore
-        from bidi.algorithm import get_display  # type: ignore
-        import re as _re
-
-        def fa(s: str) -> str:
-            """Apply Arabic reshaper + bidi with explicit RTL base direction.
-
-            - If the string has Persian/Arabic letters, return shaped visual order
-              so ReportLab shows connected glyphs in right-to-left.
-            - If it is purely numbers/date/latin, return as-is to preserve order.
-            """
-            try:
-                if not s:
-                    return s
-                if _re.search(r"[\u0600-\u06FF]", s):
-                    return get_display(reshape(s), base_dir='R')
-                return s
-            except Exception:
-                return s
-    except Exception:
-        def fa(s: str) -> str:
-            return s
+    # Persian shaping (visual order for ReportLab); cached, see utils.persian_text
+    from utils.persian_text import shape as fa
 
     # Minimal HTML renderer: remove style/script, render paragraphs and tables
     import re, html as ihtml
@@ -256,23 +244,53 @@ def _pdf_response_from_html(html: str, filename: str, request=None) -> HttpRespo
     resp = HttpResponse(pdf, content_type='application/pdf')
     resp['Content-Disposition'] = f"attachment; filename={filename}.pdf"
     return resp
+
+
+# Badge styling per job label (matches the jobs app list and work entry)
+JOB_BADGE_CLASSES = {
+    'in_progress': 'bg-gray-500 text-white',
+    'completed': 'bg-green-400 text-white',
+    'scrapped': 'bg-red-600 text-white',
+    'warranty': 'bg-yellow-300 text-black',
+    'repaired': 'bg-blue-600 text-white',
+    'deposit': 'text-white',
+}
+JOB_BADGE_STYLES = {
+    'deposit': 'background-color:#8B4513',
+}
+
+
+def _gather_totals() -> dict:
+    """Row counts shown on the summary cards (one COUNT per card)."""
+    return {
+        'products': Product.objects.count(),
+        'parts': Part.objects.count(),
+        'orders': Order.objects.count(),
+        'logs': ProductionLog.objects.count(),
+        'models': ProductModel.objects.count(),
+        'materials': Material.objects.count(),
+        'users': CustomUser.objects.count(),
+        'jobs': ProductionJob.objects.count(),
+    }
+
+
 def _gather_reports_metrics():
     """
-    Compute and return all datasets used by the reports dashboard.
+    Compute and return all chart datasets used by the reports dashboard.
 
-    This central helper is used by both the HTML view and the JSON API to keep
-    logic consistent. It helps the frontend refresh data without a full page
-    reload and stay in sync with inventory changes.
+    Only the JSON API (``metrics_api``, cached) calls this; the dashboard page
+    itself is a shell that fetches the payload when a chart is opened.
     """
-    total_products = Product.objects.count()
-    total_parts = Part.objects.count()
-    total_orders = Order.objects.count()
-    total_production_logs = ProductionLog.objects.count()
+    totals = _gather_totals()
+    total_products = totals['products']
+    total_parts = totals['parts']
+    total_orders = totals['orders']
+    total_production_logs = totals['logs']
     # Additional totals for extra cards
-    total_models = ProductModel.objects.count()
-    total_materials = Material.objects.count()
-    total_users = CustomUser.objects.count()
-    total_jobs = ProductionJob.objects.count()
+    total_models = totals['models']
+    total_materials = totals['materials']
+    total_users = totals['users']
+    total_jobs = totals['jobs']
 
     # Count orders by status for the status chart (used both in static and dynamic views)
     all_statuses = [choice[0] for choice in Order.STATUS_CHOICES]
@@ -343,15 +361,7 @@ def _gather_reports_metrics():
     # through packaging) and expose both series so the frontend can
     # render grouped columns.
     from production_line.models import SectionChoices
-    product_sections_order = [
-        SectionChoices.ASSEMBLY,
-        SectionChoices.WORKPAGE,
-        SectionChoices.UNDERCOATING,
-        SectionChoices.PAINTING,
-        SectionChoices.SEWING,
-        SectionChoices.UPHOLSTERY,
-        SectionChoices.PACKAGING,
-    ]
+    product_sections_order = queries.PRODUCT_SECTIONS
     section_label_map = dict(SectionChoices.choices)
 
     # Human‑readable labels (Persian) for the x‑axis
@@ -373,95 +383,9 @@ def _gather_reports_metrics():
     logs_chart_registered_data = [registered_map[code] for code in product_sections_order]
 
     # Open work: count jobs that appear in the daily work-entry dropdown
-    # for each section.  Mirror the logic from ``production_line.views.work_entry``
-    # so that the chart matches the "شماره کار" list shown to operators.
-    open_map = {code: 0 for code in product_sections_order}
-    logs_open_jobs_list = []
-    # Consider only unfinished jobs
-    jobs_qs = (
-        ProductionJob.objects
-        .filter(finished_at__isnull=True)
-        .select_related('product__product_model', 'part')
-    )
-    job_ids = list(jobs_qs.values_list('id', flat=True))
-    job_logs = {}
-    if job_ids:
-        for row in (
-            ProductionLog.objects
-            .filter(job_id__in=job_ids, section__in=product_sections_order)
-            .values('job_id', 'section')
-        ):
-            job_logs.setdefault(row['job_id'], set()).add(row['section'])
-    # Normalise allowed sections order as in work_entry view
-    ORDER = ['assembly', 'workpage', 'undercoating', 'painting', 'sewing', 'upholstery', 'packaging']
-    label_display_map = dict(ProductionJob.LABEL_CHOICES)
-    for job in jobs_qs:
-        logs_for_job = job_logs.get(job.id, set())
-        allowed = list(getattr(job, 'allowed_sections', []) or [])
-        allowed_norm = []
-        if allowed:
-            allowed_lower = {str(x).lower() for x in allowed}
-            allowed_norm = [s for s in ORDER if s in allowed_lower]
-        for section_code in product_sections_order:
-            # Ensure we compare using the plain slug string
-            section_slug = str(section_code)
-            # Equivalent to ``exclude(productionlog__section=section_slug)``
-            if section_slug in logs_for_job:
-                continue
-            if allowed_norm:
-                if section_slug not in allowed_norm:
-                    continue
-                idx = allowed_norm.index(section_slug)
-                if idx > 0:
-                    prev = allowed_norm[idx - 1]
-                    # Only open when previous section has at least one log
-                    if prev not in logs_for_job:
-                        continue
-            open_map[section_code] += 1
-            # Build an entry for the open jobs list (used in logs panel)
-            product = getattr(job, 'product', None)
-            part = getattr(job, 'part', None)
-            model_name = ''
-            if product is not None:
-                model_name = getattr(getattr(product, 'product_model', None), 'name', '') or getattr(product, 'name', '')
-            elif part is not None:
-                model_name = getattr(part, 'product_model', None) or ''
-            item_name = ''
-            if part is not None:
-                item_name = getattr(part, 'name', '')
-            elif product is not None:
-                item_name = getattr(product, 'name', '')
-            # English: For the open jobs list, compute Jalali creation date/time
-            # strings similar to the logs table jdate + time columns.
-            try:
-                g_created = timezone.localtime(job.created_at) if job.created_at else None
-                if g_created is not None:
-                    j_created = jdatetime.datetime.fromgregorian(datetime=g_created)
-                    created_date = j_created.strftime('%Y-%m-%d')
-                    created_time = j_created.strftime('%H:%M')
-                else:
-                    created_date = ''
-                    created_time = ''
-            except Exception:
-                if job.created_at:
-                    created_date = job.created_at.strftime('%Y-%m-%d')
-                    created_time = job.created_at.strftime('%H:%M')
-                else:
-                    created_date = ''
-                    created_time = ''
-
-            logs_open_jobs_list.append(
-                {
-                    'job_number': job.job_number,
-                    'section': section_slug,
-                    'section_label': section_label_map.get(section_code, section_slug),
-                    'model': model_name,
-                    'item_name': item_name,
-                    'label_display': label_display_map.get(job.job_label, ''),
-                    'created_date': created_date,
-                    'created_time': created_time,
-                }
-            )
+    # for each section so that the chart matches the "شماره کار" list
+    # shown to operators.
+    open_map = queries.open_section_counts()
 
     logs_chart_open_data = [open_map[code] for code in product_sections_order]
 
@@ -483,21 +407,15 @@ def _gather_reports_metrics():
     models_summary = list(parts_summary)
 
     # Materials dataset: shortage (<= threshold) vs normal counts + list of low-stock materials
-    below = 0
-    normal = 0
-    low_stock_list = []
-    for m in Material.objects.all():
-        qty = m.quantity or 0
-        thr = m.threshold or 0
-        diff = qty - thr
-        # English: Treat materials with quantity less than OR equal to threshold as shortage
-        if qty <= thr:
-            below += 1
-            low_stock_list.append({'label': m.name, 'count': qty})
-        else:
-            normal += 1
+    # English: the shortage rule is kept in the indexed is_low_stock flag (inventory.low_stock)
+    below = Material.objects.filter(is_low_stock=True).count()
+    normal = Material.objects.count() - below
+    low_stock_list = [
+        {'label': name, 'count': qty or 0}
+        for name, qty in Material.objects.filter(is_low_stock=True).values_list('name', 'quantity')
+    ]
     # Sort low stock ascending by quantity and take top 10
-    low_stock_list.sort(key=lambda x: (x['count'] if x['count'] is not None else 0))
+    low_stock_list.sort(key=lambda x: x['count'])
     # Persian labels for the materials inventory chart
     # English: Replace the below-threshold label with a clearer shortage warning
     materials_chart_labels = ['کمبود موجودی', 'نرمال']
@@ -507,22 +425,14 @@ def _gather_reports_metrics():
     # Parts inventory dataset: count parts by shortage status.
     # English comment: A part is in shortage if ANY unit bucket (cut or cnc/tools)
     # is at or below threshold (<=). Normal only when BOTH buckets are above.
-    below_p = 0
-    normal_p = 0
-    low_parts = []
-    for p in Part.objects.all():
-        cut = getattr(p, 'stock_cut', 0) or 0
-        cnc = getattr(p, 'stock_cnc_tools', 0) or 0
-        thr = getattr(p, 'threshold', 0) or 0
-        is_low = (cut <= thr) or (cnc <= thr)
-        # For summary sorting, use the lower unit bucket as the key
-        min_unit_stock = cut if cut <= cnc else cnc
-        if is_low:
-            below_p += 1
-            low_parts.append({'label': p.name, 'count': min_unit_stock})
-        else:
-            normal_p += 1
-    low_parts.sort(key=lambda x: (x['count'] if x['count'] is not None else 0))
+    below_p = Part.objects.filter(is_low_stock=True).count()
+    normal_p = Part.objects.count() - below_p
+    # For summary sorting, use the lower unit bucket as the key
+    low_parts = [
+        {'label': name, 'count': min(cut or 0, cnc or 0)}
+        for name, cut, cnc in Part.objects.filter(is_low_stock=True).values_list('name', 'stock_cut', 'stock_cnc_tools')
+    ]
+    low_parts.sort(key=lambda x: x['count'])
     # Use simplified labels without parenthetical threshold hints for display
     parts_inventory_chart_labels = ['کمبود موجودی', 'نرمال']
     parts_inventory_chart_data = [below_p, normal_p]
@@ -578,17 +488,6 @@ def _gather_reports_metrics():
         'repaired':    '#2563eb',  # blue-600
         'deposit':     '#8B4513',  # brown
     }
-    job_badge_classes = {
-        'in_progress': 'bg-gray-500 text-white',
-        'completed': 'bg-green-400 text-white',
-        'scrapped': 'bg-red-600 text-white',
-        'warranty': 'bg-yellow-300 text-black',
-        'repaired': 'bg-blue-600 text-white',
-        'deposit': 'text-white',
-    }
-    job_badge_styles = {
-        'deposit': 'background-color:#8B4513',
-    }
     for item in jobs_by_label:
         code = item.get('job_label') or ''
         if code in label_counts:
@@ -608,56 +507,11 @@ def _gather_reports_metrics():
             'code': code,
             'label': label,
             'count': cnt,
-            'classes': job_badge_classes.get(code, 'bg-gray-400 text-white'),
-            'style': job_badge_styles.get(code, ''),
+            'classes': JOB_BADGE_CLASSES.get(code, 'bg-gray-400 text-white'),
+            'style': JOB_BADGE_STYLES.get(code, ''),
             'color': color,
         })
 
-    # Jobs list for Job Details panel (same dataset as main jobs list)
-    # English: Use the full queryset ordered by creation time so that the
-    # dashboard list stays in sync with the Jobs module list view.
-    jobs_list_qs = (
-        ProductionJob.objects
-        .select_related('product__product_model', 'part')
-        .order_by('-created_at')
-    )
-
-    # Lightweight orders list for Order Details panel (recent 200)
-    orders_list_qs = (
-        Order.objects
-        .order_by('-id')[:200]
-    )
-
-    # Logs list for Log Details panel (show all records without limit)
-    logs_list_qs = (
-        ProductionLog.objects
-        .select_related('job', 'user', 'product', 'part')
-        .order_by('-logged_at', '-id')
-    )
-
-    # English: Provide section choices in a specific UI order for the logs filter dropdown
-    from production_line.models import SectionChoices
-    preferred_order = [
-        SectionChoices.CUTTING,
-        SectionChoices.CNC_TOOLS,
-        SectionChoices.ASSEMBLY,
-        SectionChoices.WORKPAGE,
-        SectionChoices.UNDERCOATING,
-        SectionChoices.PAINTING,
-        SectionChoices.SEWING,
-        SectionChoices.UPHOLSTERY,
-        SectionChoices.PACKAGING,
-    ]
-    section_label_map = dict(SectionChoices.choices)
-    section_choices_ordered = [(code, section_label_map.get(code, code)) for code in preferred_order]
-
-    # English: Provide additional choices for filters: users and product models
-    user_choices = []
-    for u in CustomUser.objects.all().order_by('full_name', 'username'):
-        label = getattr(u, 'full_name', None) or getattr(u, 'username', '')
-        user_choices.append((str(u.id), label))
-    model_choices = list(ProductModel.objects.values_list('name', flat=True).order_by('name'))
-
     context = {
         'total_products': total_products,
         'total_parts': total_parts,
@@ -699,42 +553,123 @@ def _gather_reports_metrics():
         'products_summary': products_summary,
         'parts_summary': parts_summary,
 	        'logs_summary': logs_summary,
-	        'logs_open_jobs_list': logs_open_jobs_list,
         'models_summary': models_summary,
         'materials_summary': materials_summary,
         'parts_inventory_summary': parts_inventory_summary,
         'users_summary': users_summary,
         'jobs_summary': jobs_summary,
         'jobs_status_summary': jobs_status_summary,
-        'jobs_list': jobs_list_qs,
-        'orders_list': orders_list_qs,
-        'logs_list': logs_list_qs,
-        # Section choices for UI filters (logs panel) in preferred order
-        'section_choices': section_choices_ordered,
-        # Extra filters: users and models
-        'user_choices': user_choices,
-        'model_choices': model_choices,
     }
     return context
 
 
+def _log_section_choices() -> list[tuple[str, str]]:
+    """Section choices for the logs filter dropdown in pipeline order."""
+    from production_line.models import SectionChoices
+    preferred_order = [
+        SectionChoices.CUTTING,
+        SectionChoices.CNC_TOOLS,
+        SectionChoices.ASSEMBLY,
+        SectionChoices.WORKPAGE,
+        SectionChoices.UNDERCOATING,
+        SectionChoices.PAINTING,
+        SectionChoices.SEWING,
+        SectionChoices.UPHOLSTERY,
+        SectionChoices.PACKAGING,
+    ]
+    section_label_map = dict(SectionChoices.choices)
+    return [(code, section_label_map.get(code, code)) for code in preferred_order]
+
+
 @login_required(login_url="/users/login/")
 def index(request):
-    """Render the reports dashboard page using the computed metrics."""
-    context = _gather_reports_metrics()
+    """Render the reports dashboard shell.
+
+    English: the page carries no rows and no metrics.  Counters come from
+    ``metrics_cards_api`` on load, charts from ``metrics_api`` when a card is
+    opened, and each list panel pages through its own fragment endpoint, so
+    the size and latency of this response do not grow with the data.
+    """
+    order_statuses = [label for label, _ in Order.STATUS_CHOICES]
+    orders_status_class_map = {label: get_status_badge_classes(label) for label in order_statuses}
+    context = {
+        'orders_status_class_map': orders_status_class_map,
+        'orders_status_filters': [
+            {'label': label, 'classes': orders_status_class_map[label]} for label in order_statuses
+        ],
+        'jobs_status_filters': [
+            {
+                'code': code,
+                'label': label,
+                'classes': JOB_BADGE_CLASSES.get(code, 'bg-gray-400 text-white'),
+                'style': JOB_BADGE_STYLES.get(code, ''),
+            }
+            for code, label in ProductionJob.LABEL_CHOICES
+        ],
+        'section_choices': _log_section_choices(),
+        'model_choices': list(ProductModel.objects.values_list('name', flat=True).order_by('name')),
+        'page_size': queries.PAGE_SIZE,
+    }
     return render(request, 'reports/index.html', context)
 
 
+def _fragment_response(template: str, page, extra: dict | None = None, **context) -> JsonResponse:
+    """JSON envelope for a page of table rows rendered by ``template``."""
+    html = render_to_string(template, {'rows': page.object_list, 'page': page, **context})
+    payload = {
+        'ok': True,
+        'html': html,
+        'page': page.number,
+        'has_next': page.has_next(),
+        'count': page.paginator.count,
+    }
+    payload.update(extra or {})
+    return JsonResponse(payload)
+
+
 @login_required(login_url="/users/login/")
-def metrics_api(request):
-    """
-    Lightweight JSON endpoint for live dashboard refresh.
+def logs_fragment(request):
+    """One page of registered production logs, filtered and ordered in SQL.
 
-    Frontend polls this endpoint to update counters and charts after DB changes,
-    fixing out-of-sync issues such as the parts inventory status card.
+    Query budget: COUNT + one page SELECT (+ the user list when
+    ``choices=1``, requested once when the panel is first opened).
     """
+    page = queries.page_of(queries.filter_logs(request.GET), request.GET)
+    extra = {}
+    if request.GET.get('choices'):
+        extra['users'] = [
+            [str(uid), full_name or username]
+            for uid, full_name, username in
+            CustomUser.objects.order_by('full_name', 'username').values_list('id', 'full_name', 'username')
+        ]
+    return _fragment_response('reports/_logs_rows.html', page, extra)
+
+
+@login_required(login_url="/users/login/")
+def open_jobs_fragment(request):
+    """One page of the per-section open jobs list with the logs-panel filters."""
+    page = queries.page_of(queries.filter_open_jobs(request.GET), request.GET)
+    page.object_list = [queries.open_row(row) for row in page.object_list]
+    return _fragment_response(
+        'reports/_open_jobs_rows.html', page, {'total': sum(queries.open_section_counts().values())},
+    )
+
+
+@login_required(login_url="/users/login/")
+def jobs_fragment(request):
+    """One page of the job list (status label + job number search) for the job panel."""
+    page = queries.page_of(queries.filter_jobs(request.GET), request.GET)
+    return _fragment_response('reports/_jobs_rows.html', page)
+
+
+METRICS_CACHE_NAMESPACE = 'metrics'
+METRICS_CACHE_TIMEOUT = 120
+
+
+def _build_metrics_payload() -> dict:
+    """Return the JSON-serialisable dashboard payload used by ``metrics_api``."""
     ctx = _gather_reports_metrics()
-    data = {
+    return {
         'totals': {
             'products': ctx['total_products'],
             'parts': ctx['total_parts'],
@@ -745,6 +680,11 @@ def metrics_api(request):
             'users': ctx['total_users'],
             'jobs': ctx['total_jobs'],
         },
+        # English: counts for the status filter buttons of the orders/jobs panels
+        'status_counts': {
+            'orders': {item['label']: item['count'] for item in ctx['orders_status_summary']},
+            'jobs': {item['code']: item['count'] for item in ctx['jobs_status_summary']},
+        },
         'datasets': {
             'products': {
                 'labels': ctx['products_chart_labels'],
@@ -797,6 +737,31 @@ def metrics_api(request):
             },
         },
     }
+
+
+def _build_cards_payload() -> dict:
+    """Return the summary-card counters served by ``metrics_cards_api``."""
+    return {'totals': _gather_totals()}
+
+
+@login_required(login_url="/users/login/")
+def metrics_cards_api(request):
+    """Counters for the summary cards only (eight COUNT queries, cached)."""
+    data = cached(METRICS_CACHE_NAMESPACE, ['cards'], _build_cards_payload, timeout=METRICS_CACHE_TIMEOUT)
+    return JsonResponse(data)
+
+
+@login_required(login_url="/users/login/")
+def metrics_api(request):
+    """
+    Lightweight JSON endpoint for live dashboard refresh.
+
+    Frontend polls this endpoint to update counters and charts after DB changes,
+    fixing out-of-sync issues such as the parts inventory status card.
+    The payload is shared through the cache and invalidated on writes
+    (see ``ReportsConfig.ready``).
+    """
+    data = cached(METRICS_CACHE_NAMESPACE, ['dashboard'], _build_metrics_payload, timeout=METRICS_CACHE_TIMEOUT)
     return JsonResponse(data)
 
 @login_required(login_url="/users/login/")
@@ -846,10 +811,7 @@ def scrap_report(request):
 
 
 from django.core.paginator import Paginator
-# Import the relocated ProductionJob model from the jobs app.  SectionChoices
-# and ProductionLog remain in the production_line app.
-from jobs.models import ProductionJob
-from production_line.models import ProductionLog, SectionChoices
+from production_line.models import SectionChoices
 
 @login_required(login_url="/users/login/")
 def jobs(request):
@@ -981,35 +943,18 @@ def job_detail(request, job_number: str):
 
 
 # ------------------------------------------------------------------
-# Jobs report: list and detail
+# Jobs report: list
 # ------------------------------------------------------------------
-from django.shortcuts import get_object_or_404
-from django.utils.timezone import now
-from jobs.models import ProductionJob
-
 @login_required(login_url="/users/login/")
 def jobs_list(request):
     jobs = ProductionJob.objects.all().order_by('-created_at')
     context = {'jobs': jobs}
     return render(request, 'reports/jobs_list.html', context)
 
-@login_required(login_url="/users/login/")
-def job_detail(request, job_id: int):
-    job = get_object_or_404(ProductionJob, pk=job_id)
-    logs = ProductionLog.objects.filter(job=job).order_by('logged_at')
-    # Compute elapsed production time (first to last log)
-    elapsed = None
-    if logs:
-        elapsed = (logs.last().logged_at - logs.first().logged_at)
-    context = {'job': job, 'logs': logs, 'elapsed': elapsed}
-    return render(request, 'reports/job_detail.html', context)
-
 # -------------------------------------------------------------
 # Job Details panel (dashboard) + Export endpoints
 # -------------------------------------------------------------
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
-from django.template.loader import render_to_string
-from django.utils.encoding import smart_str
+from django.http import HttpResponseBadRequest
 from inventory.models import ProductMaterial, ProductComponent
 from django.utils import timezone
 import jdatetime
@@ -1075,12 +1020,8 @@ def job_details_panel(request):
     ORDER = ['assembly','workpage','undercoating','painting','sewing','upholstery','packaging']
     flow = [s for s in ORDER if (not allowed) or (s in allowed)]
     flow_items = [{'slug': s, 'label': dict(SectionChoices.choices).get(s, s)} for s in flow]
-    # Build a list of visited sections (unique, order preserved)
-    visited_list = []
-    for x in logs:
-        s = str(x.section).lower()
-        if s not in visited_list:
-            visited_list.append(s)
+    # Visited sections (unique, logging order), denormalized by jobs.progress
+    visited_list = list(getattr(job, 'logged_sections', None) or [])
 
     # Flags
     is_scrapped = (getattr(job, 'job_label', '') == 'scrapped') or any(l.is_scrap for l in logs)
@@ -1615,294 +1556,167 @@ def log_details_export(request, log_id: int, fmt: str):
     return _pdf_response_from_html(html, f"log_{log.id}", request)
 
 
-@login_required(login_url="/users/login/")
-def logs_list_export(request, fmt: str):
-    """Export the visible logs list (after client filters) to XLSX or PDF.
-
-    Reads filter parameters from query string to mirror the on-page filters:
-    - section: exact SectionChoices key
-    - user: user id
-    - model: exact model name (case-insensitive)
-    - df: from jdate (YYYY/MM/DD or YYYY-MM-DD)
-    - dt: to jdate (YYYY/MM/DD or YYYY-MM-DD)
-    - q: free text search
-    - sort_col, sort_dir: optional sort settings from client (0-based column index)
-    """
-    from production_line.models import SectionChoices
+LOGS_EXPORT_CHUNK = 2000
+LOGS_EXPORT_HEADERS = [
+    'شماره کار', 'واحد', 'کاربر', 'مدل', 'قطعه/محصول', 'تعداد تولید شده', 'تعداد ضایعات/اسقاط', 'زمان ثبت'
+]
+OPEN_EXPORT_HEADERS = ['شماره کار', 'واحد', 'مدل', 'قطعه/محصول', 'وضعیت', 'تاریخ ایجاد']
 
-    def _normalize_digits(value: str | None) -> str:
-        """Normalize Persian/Arabic digits to ASCII for consistent comparisons."""
-        s = (value or '')
-        fa = '۰۱۲۳۴۵۶۷۸۹'
-        ar = '٠١٢٣٤٥٦٧٨٩'
-        mapping = {fa[i]: str(i) for i in range(10)}
-        mapping.update({ar[i]: str(i) for i in range(10)})
-        return ''.join(mapping.get(ch, ch) for ch in s)
-
-    def _normalize_search_text(value: str | None) -> str:
-        """Lowercase + digit-normalized search text (mirrors frontend normalizeSearchText)."""
-        return _normalize_digits((value or '').strip().lower())
-
-    def _to_jdate(s: str | None):
-        """Parse Jalali date from 'YYYY/MM/DD' or 'YYYY-MM-DD' with Persian/Arabic digits."""
-        s = (s or '').strip()
-        if not s:
-            return None
-        s = _normalize_digits(s).replace('-', '/')
+
+def _log_export_row(l, label_map) -> list:
+    """One registered-log row as shown in the logs table."""
+    produced = ''
+    scrap = ''
+    if l.product_id and not l.part_id:
+        if l.is_scrap:
+            scrap = '1'
+        else:
+            produced = '1'
+    else:
+        pq = int(l.produced_qty or 0)
+        sq = int(l.scrap_qty or 0)
+        produced = (str(pq) if pq else '')
+        scrap = (str(sq) if sq else '')
+    jdate = ''
+    if l.jdate:
         try:
-            parts = [int(x) for x in s.split('/')]
-            if len(parts) == 3:
-                return jdatetime.date(parts[0], parts[1], parts[2])
+            jdate = l.jdate.strftime('%Y/%m/%d')
         except Exception:
-            return None
-        return None
+            jdate = str(l.jdate)
+    time_str = l.logged_at.strftime('%H:%M') if l.logged_at else ''
+    user = l.user
+    return [
+        (l.job.job_number if l.job_id else '') or '',
+        label_map.get(l.section, l.section),
+        ((user.full_name or user.username) if user else ''),
+        l.model or '',
+        (getattr(l.part, 'name', None) or getattr(l.product, 'name', '') or ''),
+        produced,
+        scrap,
+        f"{jdate} {time_str}".strip(),
+    ]
 
-    mode = (request.GET.get('mode') or '').strip().lower()
 
-    # ------------------------------
-    # Open jobs export (mode=open)
-    # ------------------------------
-    if mode == 'open':
-        ctx = _gather_reports_metrics()
-        source = list(ctx.get('logs_open_jobs_list', []))
+def _open_export_row(row: dict) -> list:
+    item = queries.open_row(row)
+    return [
+        item['job_number'] or '',
+        item['section_label'] or '',
+        item['model'],
+        item['item_name'],
+        item['label_display'],
+        f"{item['created_date']} {item['created_time']}".strip(),
+    ]
 
-        sec = (request.GET.get('section') or '').strip()
-        mdl = (request.GET.get('model') or '').strip()
-        raw_q = (request.GET.get('q') or '').strip()
-        q = _normalize_search_text(raw_q)
-        df = _to_jdate(request.GET.get('df'))
-        dt = _to_jdate(request.GET.get('dt'))
 
-        rows = []
-        for item in source:
-            if sec and item.get('section') != sec:
-                continue
-            if mdl:
-                model_name = (item.get('model') or '').strip()
-                if model_name.lower() != mdl.lower():
-                    continue
-            created_date = item.get('created_date') or ''
-            created_time = item.get('created_time') or ''
-            created_dt = None
-            if created_date:
-                try:
-                    created_dt = _to_jdate(created_date)
-                except Exception:
-                    created_dt = None
-            if df and (created_dt is None or created_dt < df):
-                continue
-            if dt and (created_dt is None or created_dt > dt):
-                continue
-            if q:
-                hay = ' '.join(
-                    [
-                        str(item.get('job_number') or ''),
-                        str(item.get('section_label') or ''),
-                        str(item.get('model') or ''),
-                        str(item.get('item_name') or ''),
-                        str(item.get('label_display') or ''),
-                    ]
-                )
-                if q not in _normalize_search_text(hay):
-                    continue
-            rows.append([
-                item.get('job_number') or '',
-                item.get('section_label') or '',
-                item.get('model') or '',
-                item.get('item_name') or '',
-                item.get('label_display') or '',
-                f"{created_date} {created_time}".strip(),
-            ])
+class _Echo:
+    """File-like sink for ``csv.writer`` that hands each line back to the caller."""
 
-        # Reflect client sort state
-        try:
-            import re
-
-            def _normalize_digits(s: str) -> str:
-                if not s:
-                    return ''
-                s = str(s)
-                s = ''.join(
-                    chr(ord('0') + (ord(ch) - ord('۰'))) if '۰' <= ch <= '۹'
-                    else chr(ord('0') + (ord(ch) - ord('٠'))) if '٠' <= ch <= '٩'
-                    else ch
-                    for ch in s
-                )
-                return s
-
-            scol = int(request.GET.get('sort_col', ''))
-            sdir = (request.GET.get('sort_dir') or 'asc').lower()
-
-            def _key_open(row):
-                val = row[scol]
-                if scol == 0:
-                    # Numeric sort on job number (ignore non-digits)
-                    txt = _normalize_digits(val)
-                    txt = re.sub(r'[^0-9.-]', '', txt)
-                    try:
-                        return int(txt or 0)
-                    except Exception:
-                        return 0
-                return str(val)
-
-            rows.sort(key=_key_open, reverse=(sdir == 'desc'))
-        except Exception:
-            pass
+    def write(self, value):
+        return value
 
-        headers = ['شماره کار', 'واحد', 'مدل', 'قطعه/محصول', 'وضعیت', 'تاریخ ایجاد']
-
-        if fmt == 'pdf' or fmt == 'print':
-            try:
-                gnow = timezone.localtime(timezone.now())
-                print_dt = jdatetime.datetime.fromgregorian(datetime=gnow).strftime('%Y/%m/%d %H:%M')
-            except Exception:
-                print_dt = ''
-            html = render_to_string('reports/logs_list_export.html', {
-                'title': 'گزارش لیست کارهای باز',
-                'headers': headers,
-                'rows': rows,
-                'print_dt': print_dt,
-            })
-            if (request.GET.get('dl') or request.GET.get('download')):
-                return _pdf_response_from_html(html, 'open_jobs_list', request)
-            return HttpResponse(html)
-
-        if fmt == 'xlsx':
-            return build_table_response(
-                sheet_title="لیست کارهای باز",
-                report_title="گزارش لیست کارهای باز",
-                headers=headers,
-                rows=rows,
-                filename="open_jobs_list.xlsx",
-                column_widths=[20] * len(headers),
-                table_name="OpenJobsTable",
-            )
-
-        # Unsupported format for open-mode; fall back to registered mode handling
-
-    # ------------------------------
-    # Registered logs export (default)
-    # ------------------------------
-    qs = (ProductionLog.objects
-          .select_related('job', 'user', 'product', 'part')
-          .order_by('-logged_at', '-id'))
-
-    sec = (request.GET.get('section') or '').strip()
-    uid = (request.GET.get('user') or '').strip()
-    mdl = (request.GET.get('model') or '').strip()
-    raw_q = (request.GET.get('q') or '').strip()
-    q_norm = _normalize_search_text(raw_q)
-    df = _to_jdate(request.GET.get('df'))
-    dt = _to_jdate(request.GET.get('dt'))
-
-    if sec:
-        qs = qs.filter(section=sec)
-    if uid.isdigit():
-        qs = qs.filter(user_id=int(uid))
-    if mdl:
-        qs = qs.filter(model__iexact=mdl)
-    if df:
-        qs = qs.filter(jdate__gte=df)
-    if dt:
-        qs = qs.filter(jdate__lte=dt)
-
-    # Materialize rows with computed fields exactly like template
-    rows = []
-    label_map = dict(SectionChoices.choices)
-    def _fmt_jdate(d):
-        if not d:
-            return ''
-        try:
-            return d.strftime('%Y/%m/%d')
-        except Exception:
-            try:
-                # If it's a datetime/date-like
-                import jdatetime as _jd
-                if isinstance(d, _jd.date) or hasattr(d, 'year'):
-                    return f"{getattr(d,'year', ''):04d}/{getattr(d,'month',''):02d}/{getattr(d,'day',''):02d}"
-            except Exception:
-                pass
-        return str(d)
-    for l in qs:
-        produced = ''
-        scrap = ''
-        if getattr(l, 'product_id', None) and not getattr(l, 'part_id', None):
-            if getattr(l, 'is_scrap', False):
-                scrap = '1'
-            else:
-                produced = '1'
-        else:
-            pq = int(getattr(l, 'produced_qty', 0) or 0)
-            sq = int(getattr(l, 'scrap_qty', 0) or 0)
-            produced = (str(pq) if pq else '')
-            scrap = (str(sq) if sq else '')
-        jdate = _fmt_jdate(getattr(l, 'jdate', None))
-        time_str = getattr(l, 'logged_at', None).strftime('%H:%M') if getattr(l, 'logged_at', None) else ''
-        row = [
-            (getattr(getattr(l, 'job', None), 'job_number', '') or ''),
-            label_map.get(getattr(l, 'section', ''), getattr(l, 'section', '')),
-            (getattr(getattr(l, 'user', None), 'full_name', None) or getattr(getattr(l, 'user', None), 'username', '')),
-            (getattr(l, 'model', '') or ''),
-            (getattr(getattr(l, 'part', None), 'name', None) or getattr(getattr(l, 'product', None), 'name', '') or ''),
-            produced,
-            scrap,
-            f"{jdate} {time_str}".strip(),
-        ]
-        if q_norm:
-            hay = ' '.join(str(v) for v in row)
-            if q_norm not in _normalize_search_text(hay):
-                continue
-        rows.append(row)
 
-    # Optional client-side sort reflection: by column index
-    try:
-        scol = int(request.GET.get('sort_col', ''))
-        sdir = (request.GET.get('sort_dir') or 'asc').lower()
-        def _key(row):
-            val = row[scol]
-            # numeric sort for produced/scrap columns
-            if scol in (5, 6):
-                try:
-                    return int(val or 0)
-                except Exception:
-                    return 0
-            return str(val)
-        rows.sort(key=_key, reverse=(sdir == 'desc'))
-    except Exception:
-        pass
+def _csv_streaming_response(headers, rows, filename: str):
+    """Stream ``rows`` as CSV with a UTF-8 BOM so Excel opens Persian text correctly."""
+    import csv
 
-    headers = [
-        'شماره کار', 'واحد', 'کاربر', 'مدل', 'قطعه/محصول', 'تعداد تولید شده', 'تعداد ضایعات/اسقاط', 'زمان ثبت'
-    ]
+    from django.http import StreamingHttpResponse
 
-    if fmt == 'pdf' or fmt == 'print':
-        # Use print-friendly HTML (browser handles Persian perfectly). Auto-print on load.
-        # Compose current Jalali timestamp for the print footer/header
-        try:
-            gnow = timezone.localtime(timezone.now())
-            print_dt = jdatetime.datetime.fromgregorian(datetime=gnow).strftime('%Y/%m/%d %H:%M')
-        except Exception:
-            print_dt = ''
-        html = render_to_string('reports/logs_list_export.html', {
-            'title': 'گزارش لیست کارهای ثبت‌شده',
-            'headers': headers,
-            'rows': rows,
-            'print_dt': print_dt,
-        })
-        # If user requested direct download (dl=1), render to PDF server-side
-        if (request.GET.get('dl') or request.GET.get('download')):
-            return _pdf_response_from_html(html, 'logs_list', request)
-        return HttpResponse(html)
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield '\ufeff' + writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _print_streaming_response(template: str, context: dict, rows, num_cols=()):
+    """Stream a print page: the template shell with ``rows`` rendered in chunks.
+
+    ``template`` marks the table body with ``<!--rows-->`` when rendered with
+    ``stream=True``; rows are rendered ``LOGS_EXPORT_CHUNK`` at a time with
+    ``reports/_export_rows.html`` so the page never sits in memory whole.
+    """
+    from itertools import islice
+
+    from django.http import StreamingHttpResponse
+
+    head, _marker, foot = render_to_string(template, {**context, 'stream': True}).partition('<!--rows-->')
+    rows = iter(rows)
+
+    def chunks():
+        yield head
+        while True:
+            batch = list(islice(rows, LOGS_EXPORT_CHUNK))
+            if not batch:
+                break
+            yield render_to_string('reports/_export_rows.html', {'rows': batch, 'num_cols': num_cols})
+        yield foot
+
+    return StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+
+
+@login_required(login_url="/users/login/")
+def logs_list_export(request, fmt: str):
+    """Export the logs list (registered logs or ``mode=open`` jobs) to XLSX, CSV or PDF.
+
+    Reads the same filter parameters as the on-page panel (see
+    ``reports.queries.filter_logs`` / ``filter_open_jobs``): ``section``,
+    ``user``, ``model``, ``df``/``dt`` (Jalali), ``q``, ``sort_col`` and
+    ``sort_dir``.  Filters run in SQL and rows are read with ``iterator()``
+    and streamed out, so memory stays flat however many logs match; only the
+    server-rendered PDF (``dl=1``) needs the whole page at once.
+    """
+    from production_line.models import SectionChoices
+
+    if fmt not in ('xlsx', 'csv', 'pdf', 'print'):
+        return HttpResponseBadRequest('invalid format')
+
+    mode = (request.GET.get('mode') or '').strip().lower()
+    if mode == 'open':
+        title = 'لیست کارهای باز'
+        headers = OPEN_EXPORT_HEADERS
+        basename = 'open_jobs_list'
+        num_cols = (0,)
+        rows = (
+            _open_export_row(row)
+            for row in queries.filter_open_jobs(request.GET).iterator(chunk_size=LOGS_EXPORT_CHUNK)
+        )
+    else:
+        title = 'لیست کارهای ثبت‌شده'
+        headers = LOGS_EXPORT_HEADERS
+        basename = 'logs_list'
+        num_cols = (0, 5, 6)
+        label_map = dict(SectionChoices.choices)
+        rows = (
+            _log_export_row(l, label_map)
+            for l in queries.filter_logs(request.GET).iterator(chunk_size=LOGS_EXPORT_CHUNK)
+        )
 
     if fmt == 'xlsx':
-        return build_table_response(
-            sheet_title="لیست کارهای ثبت‌شده",
-            report_title="گزارش لیست کارهای ثبت‌شده",
-            headers=headers,
-            rows=rows,
-            filename="logs_list.xlsx",
+        return build_streaming_workbook_response(
+            sheets=[(title, headers, rows)],
+            filename=f"{basename}.xlsx",
+            report_title=f"گزارش {title}",
             column_widths=[20] * len(headers),
-            table_name="LogsListTable",
         )
 
-    return HttpResponseBadRequest('invalid format')
+    if fmt == 'csv':
+        return _csv_streaming_response(headers, rows, f"{basename}.csv")
+
+    # pdf / print: print-friendly HTML (browser handles Persian perfectly), auto-print on load
+    try:
+        gnow = timezone.localtime(timezone.now())
+        print_dt = jdatetime.datetime.fromgregorian(datetime=gnow).strftime('%Y/%m/%d %H:%M')
+    except Exception:
+        print_dt = ''
+    context = {'title': f"گزارش {title}", 'headers': headers, 'print_dt': print_dt}
+    # If user requested direct download (dl=1), render to PDF server-side
+    if (request.GET.get('dl') or request.GET.get('download')):
+        html = render_to_string('reports/logs_list_export.html', {**context, 'rows': list(rows), 'num_cols': num_cols})
+        return _pdf_response_from_html(html, basename, request)
+    return _print_streaming_response('reports/logs_list_export.html', context, rows, num_cols)
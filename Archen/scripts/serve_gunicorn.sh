@@ -14,6 +14,9 @@ export PYTHONUNBUFFERED=1
 # Apply migrations and collect static before serving (idempotent for CI/CD)
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
+python manage.py createcachetable
+# Precompute shared cache entries; a failure here must not block serving
+python manage.py warm_caches || true
 
 exec gunicorn Archen.wsgi:application \
   --bind "${HOST}:${PORT}" \
@@ -0,0 +1,75 @@
+// Catalog snapshot for cascading selectors (model -> products / parts).
+// Loads /inventory/api/catalog/ once, keeps it in localStorage and revalidates
+// it with If-None-Match (the server answers 304 while the catalog is unchanged),
+// so changing a model selector filters locally instead of calling the server.
+
+(function () {
+  'use strict';
+
+  var URL = '/inventory/api/catalog/';
+  var STORE_KEY = 'archen.catalog.v1';
+  var REVALIDATE_MS = 60000;
+  var pending = null;
+  var loadedAt = 0;
+
+  function readStore() {
+    try { return JSON.parse(window.localStorage.getItem(STORE_KEY) || 'null'); } catch (e) { return null; }
+  }
+
+  function writeStore(value) {
+    try { window.localStorage.setItem(STORE_KEY, JSON.stringify(value)); } catch (e) {}
+  }
+
+  /**
+   * Resolve to {models: [name], products: [[id, name, model]], parts: [[id, name, model]]}.
+   * Concurrent callers share one request; the copy is revalidated after REVALIDATE_MS.
+   */
+  function load() {
+    if (pending && Date.now() - loadedAt < REVALIDATE_MS) return pending;
+    var stored = readStore();
+    var headers = { 'Accept': 'application/json' };
+    if (stored && stored.etag) headers['If-None-Match'] = stored.etag;
+    loadedAt = Date.now();
+    pending = fetch(URL, { headers: headers, cache: 'no-store', credentials: 'same-origin' })
+      .then(function (resp) {
+        if (resp.status === 304 && stored && stored.data) return stored.data;
+        if (!resp.ok) throw new Error('catalog ' + resp.status);
+        var etag = resp.headers.get('ETag');
+        return resp.json().then(function (data) {
+          writeStore({ etag: etag, data: data });
+          return data;
+        });
+      })
+      .catch(function (err) {
+        pending = null;
+        // Offline or server error: fall back to the last copy we have
+        if (stored && stored.data) return stored.data;
+        throw err;
+      });
+    return pending;
+  }
+
+  function productsByModels(names) {
+    var wanted = new Set((names || []).map(String));
+    return load().then(function (data) {
+      return (data.products || [])
+        .filter(function (row) { return wanted.has(row[2]); })
+        .map(function (row) { return { id: row[0], name: row[1], model: row[2] }; });
+    });
+  }
+
+  function partsByModel(name) {
+    return load().then(function (data) {
+      return (data.parts || [])
+        .filter(function (row) { return row[2] === name; })
+        .map(function (row) { return { id: row[0], name: row[1] }; });
+    });
+  }
+
+  window.ArchenCatalog = {
+    load: load,
+    productsByModels: productsByModels,
+    productsByModel: function (name) { return productsByModels([name]); },
+    partsByModel: partsByModel,
+  };
+})();
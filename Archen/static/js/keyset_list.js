@@ -0,0 +1,93 @@
+// PATH: /Archen/static/js/keyset_list.js
+
+// English: Infinite scroll for the keyset-paged inventory lists (parts,
+// products, materials).  The page renders the first rows into
+// <tbody data-keyset-next="<cursor>">; the following pages are requested from
+// the same URL with ?fragment=1&after=<cursor> and come back as rendered rows
+// (see inventory/queries.py).  Filters and sorting run on the server: a click
+// on a header sort button (indicator set by sort.js) reloads the first page.
+(function () {
+  "use strict";
+
+  function applySort(table, params) {
+    params.delete("sort_col");
+    params.delete("sort_dir");
+    table.querySelectorAll("thead .sort-btn").forEach(function (btn) {
+      const ic = btn.querySelector(".sort-indicator");
+      if (ic && ic.classList.contains("opacity-100")) {
+        params.set("sort_col", btn.getAttribute("data-col") || "");
+        params.set("sort_dir", ic.classList.contains("rotate-180") ? "asc" : "desc");
+      }
+    });
+  }
+
+  function init(tbody) {
+    const table = tbody.closest("table");
+    if (!table) return;
+    let next = tbody.getAttribute("data-keyset-next") || "";
+    let loading = false;
+    let seq = 0;
+
+    const moreBtn = document.createElement("button");
+    moreBtn.type = "button";
+    moreBtn.className = "block mx-auto my-2 px-3 py-1 text-sm font-bold rounded border border-blue-600 text-blue-700 hover:bg-blue-200";
+    moreBtn.textContent = "موارد بیشتر";
+    moreBtn.classList.toggle("hidden", !next);
+    table.insertAdjacentElement("afterend", moreBtn);
+
+    function nearEnd() {
+      return moreBtn.getBoundingClientRect().top < window.innerHeight + 300;
+    }
+
+    async function load(reset) {
+      if (!reset && (loading || !next)) return;
+      const params = new URLSearchParams(window.location.search);
+      params.delete("after");
+      applySort(table, params);
+      if (!reset) params.set("after", next);
+      params.set("fragment", "1");
+      const mine = ++seq;
+      loading = true;
+      try {
+        const resp = await fetch(window.location.pathname + "?" + params.toString(), {
+          headers: { "Accept": "application/json" },
+          credentials: "same-origin",
+        });
+        const data = await resp.json();
+        // A newer request (e.g. another sort click) supersedes this one
+        if (mine !== seq) return;
+        if (!data || !data.ok) throw new Error("bad response");
+        if (reset) tbody.innerHTML = "";
+        tbody.insertAdjacentHTML("beforeend", data.html || "");
+        next = data.next || "";
+        tbody.dispatchEvent(new CustomEvent("keyset:loaded", { bubbles: true, detail: { reset: !!reset } }));
+      } catch (e) {
+        // Keep the rows already shown; the button retries
+      } finally {
+        if (mine === seq) {
+          loading = false;
+          moreBtn.classList.toggle("hidden", !next);
+        }
+      }
+      // The observer only fires on changes; keep going while the end is still in view
+      if (mine === seq && next && nearEnd()) load(false);
+    }
+
+    moreBtn.addEventListener("click", function () { load(false); });
+    if ("IntersectionObserver" in window) {
+      new IntersectionObserver(function (entries) {
+        if (entries.some(function (en) { return en.isIntersecting; })) load(false);
+      }, { rootMargin: "300px" }).observe(moreBtn);
+    }
+    document.addEventListener("click", function (e) {
+      const btn = e.target.closest(".sort-btn");
+      if (btn && table.contains(btn)) setTimeout(function () { load(true); }, 0);
+    });
+  }
+
+  function start() {
+    document.querySelectorAll("tbody[data-keyset-next]").forEach(init);
+  }
+  if (document.readyState === "loading") document.addEventListener("DOMContentLoaded", start);
+  else start();
+})();
@@ -1,14 +1,15 @@
 // PATH: /Archen/static/serviceworker.js
 /* Safe, minimal service worker for django-pwa
- * - Never intercept POST/PUT/DELETE
+ * - POST/PUT/DELETE go to the network; only failed writes are queued in an
+ *   idempotent outbox and replayed in order (see "Offline outbox" below)
  * - Don't handle HTML navigations aggressively
  * - Make install robust even if some assets 404
  */
 
-// Bump version to invalidate old caches after policy and feature changes
-// Bump when static pipeline/CSP changes to force clients to refetch assets
-// v15: invalidate static cache after sort.js numeric sorting update
-const CACHE_NAME = 'archen-static-v15';
+// Development cache version. In production `collectstatic` writes
+// static/sw/serviceworker.js with CACHE_NAME derived from the static manifest
+// and hashed PRECACHE_URLS (see Archen/storage.py), so no manual bump is needed.
+const CACHE_NAME = 'archen-static-v16';
 const PAGE_CACHE_NAME = 'archen-pages-v5';
 
 // App routes allowed for page caching and request queueing (same-origin)
@@ -157,11 +158,21 @@ self.addEventListener('fetch', (event) => {
 });
 
 // -------------------------------
-// Offline POST queue (Background Sync)
+// Offline outbox (Background Sync)
 // -------------------------------
-// Minimal IndexedDB helpers
+// Writes on allowlisted routes that fail on the network are stored in
+// IndexedDB and replayed oldest-first.  Every entry carries an idempotency
+// key: work-entry forms post a hidden `idempotency_key` field, and for other
+// requests the worker generates one and sends it as the `Idempotency-Key`
+// header, so the server can skip replays it already applied.  Replay stops
+// at the first network/5xx failure to keep the order.  Without Background
+// Sync, pages ask for a flush on load and when the connection returns
+// (see layout.html).
 const DB_NAME = 'archen-sync-db';
 const DB_STORE = 'queue';
+const SYNC_TAG = 'archen-sync';
+const IDEMPOTENCY_FIELD = 'idempotency_key';
+const IDEMPOTENCY_HEADER = 'Idempotency-Key';
 
 function idbOpen() {
   return new Promise((resolve, reject) => {
@@ -205,6 +216,119 @@ async function queueDelete(id) {
   });
 }
 
+const idbOutbox = { all: queueAll, add: queuePut, remove: queueDelete };
+
+function newIdempotencyKey() {
+  if (self.crypto && typeof self.crypto.randomUUID === 'function') return self.crypto.randomUUID().replace(/-/g, '');
+  let key = '';
+  for (let i = 0; i < 32; i++) key += Math.floor(Math.random() * 16).toString(16);
+  return key;
+}
+
+// Read the form's idempotency key from a urlencoded or multipart body.
+function idempotencyKeyFromBody(contentType, bytes) {
+  if (!bytes || !bytes.length) return null;
+  const text = new TextDecoder().decode(bytes);
+  if ((contentType || '').includes('application/x-www-form-urlencoded')) {
+    const value = new URLSearchParams(text).get(IDEMPOTENCY_FIELD);
+    return value || null;
+  }
+  const match = text.match(/name="idempotency_key"\r?\n\r?\n([A-Za-z0-9_-]+)/);
+  return match ? match[1] : null;
+}
+
+function outboxEntry(url, method, headers, bytes) {
+  const contentType = headers['content-type'] || '';
+  const key = idempotencyKeyFromBody(contentType, bytes) || headers[IDEMPOTENCY_HEADER.toLowerCase()] || newIdempotencyKey();
+  return {
+    url,
+    method,
+    headers: Object.assign({}, headers, { [IDEMPOTENCY_HEADER.toLowerCase()]: key }),
+    body: bytes && bytes.length ? Array.from(bytes) : null,
+    key,
+    ts: Date.now(),
+  };
+}
+
+async function outboxEntryFromRequest(req) {
+  const headers = {};
+  req.headers.forEach((v, k) => { headers[k] = v; });
+  const body = await req.clone().arrayBuffer();
+  return outboxEntry(req.url, req.method, headers, body ? new Uint8Array(body) : null);
+}
+
+function isRetryableStatus(status) {
+  return status === 408 || status === 429 || status >= 500;
+}
+
+// Replay queued entries oldest-first through `send(entry) -> Response`.
+// Sent and rejected (non-retryable 4xx) entries leave the outbox; the first
+// network error or retryable status stops the run so later entries never
+// overtake an earlier one.
+async function replayOutbox(store, send) {
+  const entries = (await store.all()).slice().sort((a, b) => a.id - b.id);
+  const result = { sent: [], rejected: [], pending: 0 };
+  for (let i = 0; i < entries.length; i++) {
+    const entry = entries[i];
+    let res;
+    try {
+      res = await send(entry);
+    } catch (_) {
+      res = null;
+    }
+    if (!res || isRetryableStatus(res.status)) {
+      result.pending = entries.length - i;
+      break;
+    }
+    await store.remove(entry.id);
+    if (res.ok || res.redirected || (res.status >= 300 && res.status < 400)) result.sent.push(entry.key);
+    else result.rejected.push({ key: entry.key, url: entry.url, status: res.status });
+  }
+  return result;
+}
+
+function sendOutboxEntry(entry) {
+  return fetch(entry.url, {
+    method: entry.method,
+    headers: entry.headers || {},
+    body: entry.body ? new Uint8Array(entry.body) : undefined,
+    credentials: 'include',
+  });
+}
+
+// One replay at a time: sync events, page messages and new POSTs share it.
+let outboxFlush = null;
+
+function flushQueue() {
+  if (!outboxFlush) {
+    outboxFlush = (async () => {
+      const result = await replayOutbox(idbOutbox, sendOutboxEntry);
+      // Notify clients (best-effort)
+      try {
+        const allClients = await self.clients.matchAll({ includeUncontrolled: true });
+        allClients.forEach(c => c.postMessage({ type: 'sync-complete', ...result }));
+      } catch (_) {}
+      return result;
+    })().finally(() => { outboxFlush = null; });
+  }
+  return outboxFlush;
+}
+
+function queuedResponse() {
+  return new Response('<html lang="fa" dir="rtl"><body style="font-family:sans-serif;padding:1rem"><h1>درخواست شما در صف همگام‌سازی قرار گرفت</h1><p>به محض اتصال اینترنت، عملیات ارسال می‌شود.</p></body></html>', {
+    status: 202,
+    headers: { 'Content-Type': 'text/html; charset=utf-8' }
+  });
+}
+
+async function enqueue(entry) {
+  await idbOutbox.add(entry);
+  // Register a background sync if supported
+  if ('sync' in self.registration) {
+    try { await self.registration.sync.register(SYNC_TAG); } catch (_) {}
+  }
+}
+
 // Intercept POST/PUT/DELETE for allowed routes to queue when offline
 self.addEventListener('fetch', (event) => {
   const req = event.request;
@@ -214,59 +338,35 @@ self.addEventListener('fetch', (event) => {
   if (!isAllowedPath(url.pathname)) return;
 
   event.respondWith((async () => {
+    let entry;
+    try {
+      entry = await outboxEntryFromRequest(req);
+    } catch (_) {
+      return fetch(req);
+    }
+    // Older queued entries go first; if they cannot be sent yet, queue behind them.
+    try {
+      const pending = (await idbOutbox.all()).length;
+      if (pending) {
+        const result = await flushQueue();
+        if (result.pending) {
+          await enqueue(entry);
+          return queuedResponse();
+        }
+      }
+    } catch (_) {}
     try {
-      // Try online first
+      // English: send the original request so navigations keep redirect mode 'manual'.
       return await fetch(req);
     } catch (e) {
-      // On failure, queue the request body and metadata for later sync
-      try {
-        const headers = {};
-        req.headers.forEach((v, k) => { headers[k] = v; });
-        const body = await req.clone().arrayBuffer();
-        await queuePut({
-          url: req.url,
-          method: req.method,
-          headers,
-          body: body ? Array.from(new Uint8Array(body)) : null,
-          ts: Date.now(),
-        });
-        // Register a background sync if supported
-        if ('sync' in self.registration) {
-          try { await self.registration.sync.register('archen-sync'); } catch (_) {}
-        }
-      } catch (_) {}
-      // Inform the client that the request is queued
-      return new Response('<html lang="fa" dir="rtl"><body style="font-family:sans-serif;padding:1rem"><h1>درخواست شما در صف همگام‌سازی قرار گرفت</h1><p>به محض اتصال اینترنت، عملیات ارسال می‌شود.</p></body></html>', {
-        status: 202,
-        headers: { 'Content-Type': 'text/html; charset=utf-8' }
-      });
+      try { await enqueue(entry); } catch (_) {}
+      return queuedResponse();
     }
   })());
 });
 
-async function flushQueue() {
-  const entries = await queueAll();
-  for (const entry of entries) {
-    try {
-      const body = entry.body ? new Uint8Array(entry.body) : undefined;
-      const res = await fetch(entry.url, {
-        method: entry.method,
-        headers: entry.headers || {},
-        body,
-        credentials: 'include',
-      });
-      if (res && res.ok) await queueDelete(entry.id);
-    } catch (_) { /* keep in queue */ }
-  }
-  // Notify clients (best-effort)
-  try {
-    const allClients = await self.clients.matchAll({ includeUncontrolled: true });
-    allClients.forEach(c => c.postMessage({ type: 'sync-complete' }));
-  } catch (_) {}
-}
-
 self.addEventListener('sync', (event) => {
-  if (event.tag === 'archen-sync') {
+  if (event.tag === SYNC_TAG) {
     event.waitUntil(flushQueue());
   }
 });
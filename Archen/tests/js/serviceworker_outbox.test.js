@@ -0,0 +1,118 @@
+// PATH: /Archen/tests/js/serviceworker_outbox.test.js
+/* Unit tests for the offline outbox in static/serviceworker.js.
+ * No browser needed: the worker script runs in a Node `vm` context with a
+ * stub `self`, and the outbox store and network are in-memory fakes.
+ * Run with `npm run test:js` (or `node --test tests/js/`).
+ */
+'use strict';
+
+const assert = require('node:assert/strict');
+const fs = require('node:fs');
+const path = require('node:path');
+const test = require('node:test');
+const vm = require('node:vm');
+
+const SOURCE = fs.readFileSync(path.join(__dirname, '..', '..', 'static', 'serviceworker.js'), 'utf8');
+
+function loadWorker() {
+  const self = {
+    addEventListener() {},
+    location: { origin: 'https://archen.test' },
+    registration: {},
+    clients: { matchAll: async () => [] },
+    crypto: globalThis.crypto,
+  };
+  const context = vm.createContext({ self, URL, URLSearchParams, TextDecoder, TextEncoder, console });
+  vm.runInContext(SOURCE, context, { filename: 'serviceworker.js' });
+  return context;
+}
+
+function memoryStore(entries) {
+  const rows = new Map(entries.map(e => [e.id, e]));
+  return {
+    rows,
+    all: async () => Array.from(rows.values()),
+    add: async (entry) => { rows.set(entry.id, entry); },
+    remove: async (id) => { rows.delete(id); },
+  };
+}
+
+const encode = text => new TextEncoder().encode(text);
+const response = status => ({ status, ok: status >= 200 && status < 300, redirected: false });
+
+test('reads the form key from urlencoded and multipart bodies', () => {
+  const sw = loadWorker();
+  const form = sw.outboxEntry('/production/work-entry/', 'POST',
+    { 'content-type': 'application/x-www-form-urlencoded' }, encode('job_number=12&idempotency_key=abcdef123456'));
+  assert.equal(form.key, 'abcdef123456');
+  assert.equal(form.headers['idempotency-key'], 'abcdef123456');
+
+  const multipart = '--b\r\nContent-Disposition: form-data; name="idempotency_key"\r\n\r\nkey_from_multipart\r\n--b--\r\n';
+  assert.equal(sw.idempotencyKeyFromBody('multipart/form-data; boundary=b', encode(multipart)), 'key_from_multipart');
+});
+
+test('falls back to the header key, then to a generated key', () => {
+  const sw = loadWorker();
+  const fromHeader = sw.outboxEntry('/x/', 'POST', { 'idempotency-key': 'headerkey1' }, null);
+  assert.equal(fromHeader.key, 'headerkey1');
+  assert.equal(fromHeader.body, null);
+
+  const generated = sw.outboxEntry('/x/', 'POST', {}, encode('a=1'));
+  assert.match(generated.key, /^[0-9a-f]{32}$/);
+  assert.notEqual(sw.outboxEntry('/x/', 'POST', {}, encode('a=1')).key, generated.key);
+});
+
+test('replays oldest first and empties the outbox', async () => {
+  const sw = loadWorker();
+  const store = memoryStore([{ id: 3, key: 'c' }, { id: 1, key: 'a' }, { id: 2, key: 'b' }]);
+  const sent = [];
+  const result = await sw.replayOutbox(store, async (entry) => { sent.push(entry.key); return response(200); });
+  assert.deepEqual(sent, ['a', 'b', 'c']);
+  assert.deepEqual(Array.from(result.sent), ['a', 'b', 'c']);
+  assert.equal(result.pending, 0);
+  assert.equal(store.rows.size, 0);
+});
+
+test('stops at the first network error so later entries keep their place', async () => {
+  const sw = loadWorker();
+  const store = memoryStore([{ id: 1, key: 'a' }, { id: 2, key: 'b' }, { id: 3, key: 'c' }]);
+  const sent = [];
+  const result = await sw.replayOutbox(store, async (entry) => {
+    if (entry.key === 'b') throw new TypeError('offline');
+    sent.push(entry.key);
+    return response(200);
+  });
+  assert.deepEqual(sent, ['a']);
+  assert.equal(result.pending, 2);
+  assert.deepEqual(Array.from(store.rows.keys()), [2, 3]);
+});
+
+test('keeps retryable statuses and drops rejected ones', async () => {
+  const sw = loadWorker();
+  const store = memoryStore([{ id: 1, key: 'a', url: '/a/' }, { id: 2, key: 'b', url: '/b/' }, { id: 3, key: 'c', url: '/c/' }]);
+  const statuses = { a: 400, b: 503, c: 200 };
+  const result = await sw.replayOutbox(store, async entry => response(statuses[entry.key]));
+  assert.deepEqual(JSON.parse(JSON.stringify(result.rejected)), [{ key: 'a', url: '/a/', status: 400 }]);
+  assert.equal(result.pending, 2);
+  assert.deepEqual(Array.from(store.rows.keys()), [2, 3]);
+  assert.equal(sw.isRetryableStatus(429), true);
+  assert.equal(sw.isRetryableStatus(404), false);
+});
+
+test('a replay after a lost response is applied once by a key-checking server', async () => {
+  const sw = loadWorker();
+  const applied = [];
+  const seen = new Set();
+  let dropResponse = true;
+  const server = async (entry) => {
+    if (!seen.has(entry.key)) { seen.add(entry.key); applied.push(entry.key); }
+    if (dropResponse) { dropResponse = false; throw new TypeError('connection reset'); }
+    return response(200);
+  };
+  const store = memoryStore([{ id: 1, key: 'a' }, { id: 2, key: 'b' }]);
+  let result = await sw.replayOutbox(store, server);
+  assert.equal(result.pending, 2);
+  result = await sw.replayOutbox(store, server);
+  assert.equal(result.pending, 0);
+  assert.deepEqual(applied, ['a', 'b']);
+});
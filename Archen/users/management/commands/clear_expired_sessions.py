@@ -0,0 +1,37 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in small batches instead of one large DELETE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per batch.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        pause = max(0.0, options['sleep'])
+        cutoff = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=cutoff).order_by('expire_date')
+
+        total = 0
+        while True:
+            # English: select a bounded set of keys so each DELETE holds locks briefly.
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+            total += deleted
+            if len(keys) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        if total:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired sessions."))
+        else:
+            self.stdout.write("No expired sessions to delete.")
@@ -0,0 +1,117 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from Archen.context_processors import full_name_context
+from orders.models import Order
+from production_line.utils import get_user_role
+
+
+class RoleMemoTests(TestCase):
+    def test_group_fallback_runs_once_per_user_instance(self):
+        user = get_user_model().objects.create_user(username='boss', password='x', role='')
+        user.groups.add(Group.objects.create(name='مدیر'))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_role(user), 'manager')
+            self.assertEqual(get_user_role(user), 'manager')
+
+    def test_anonymous_users_have_no_role(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_user_role(AnonymousUser()))
+
+
+class HeaderContextTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='worker', password='x', role='cnc_master', full_name='Ali Rezaei',
+        )
+
+    def request_for(self, loader):
+        request = RequestFactory().get('/')
+        request.user = SimpleLazyObject(loader)
+        return request
+
+    def test_user_is_loaded_only_when_rendered(self):
+        request = self.request_for(lambda: get_user_model().objects.get(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            context = full_name_context(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(context['full_name']), 'Ali Rezaei')
+            self.assertEqual(str(context['role']), 'cnc_master')
+            self.assertFalse(context['is_superuser'])
+
+    def test_anonymous_header_is_empty(self):
+        context = full_name_context(self.request_for(AnonymousUser))
+        self.assertEqual((str(context['full_name']), str(context['role'])), ('', ''))
+
+
+class ClearExpiredSessionsTests(TestCase):
+    def test_deletes_only_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i:02d}', session_data='', expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + datetime.timedelta(days=1))
+
+        out = StringIO()
+        call_command('clear_expired_sessions', '--batch-size', '2', stdout=out)
+        self.assertIn('Deleted 5 expired sessions.', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class PageQueryTests(TestCase):
+    """Queries per page for a logged-in manager, with db and with cached_db sessions."""
+
+    DB = 'django.contrib.sessions.backends.db'
+    CACHED_DB = 'django.contrib.sessions.backends.cached_db'
+    # English: (url name, params, queries with cached_db sessions): the dashboard
+    # and the fragments reports/index.html polls.  One query loads the user.
+    PAGES = [
+        ('dashboard', {}, 1),
+        ('reports:metrics_cards_api', {}, 1),
+        ('orders:live_orders_feed', {'limit': '50'}, 3),
+        ('reports:logs_fragment', {}, 2),
+        ('reports:jobs_fragment', {}, 2),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='boss', password='x', role='manager', full_name='Boss')
+        Order.objects.create(customer_name='Sara', status='در انتظار')
+
+    def queries(self, engine, name, params):
+        with override_settings(SESSION_ENGINE=engine):
+            client = Client()
+            client.force_login(self.user)
+            # English: the first request fills the fragment caches
+            client.get(reverse(name), params)
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in ctx.captured_queries]
+
+    def test_cached_sessions_skip_the_session_query(self):
+        for name, params, budget in self.PAGES:
+            with self.subTest(name):
+                after = self.queries(self.CACHED_DB, name, params)
+                self.assertEqual(len(after), budget, after)
+                self.assertFalse(any('django_session' in sql for sql in after))
+                before = self.queries(self.DB, name, params)
+                self.assertEqual(len(before), budget + 1)
+
+    def test_dashboard_header_is_rendered_from_the_loaded_user(self):
+        with override_settings(SESSION_ENGINE=self.CACHED_DB):
+            self.client.force_login(self.user)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Boss')
@@ -0,0 +1,139 @@
+"""Namespaced cache helpers with versioned invalidation.
+
+Keys look like ``<namespace>:v<version>:<parts...>``.  Each namespace has a
+version counter stored in the cache itself; bumping it makes every key of
+the namespace unreachable at once (old entries simply expire), which works
+across gunicorn workers as long as the cache backend is shared.
+
+The file and database backends cull entries once ``MAX_ENTRIES`` is reached,
+counters included.  A missing counter is therefore seeded from the clock
+(microseconds) rather than restarting at 1, so a culled namespace never
+comes back at a version whose payloads are still stored.
+
+Usage::
+
+    from utils.cache import cached, invalidate_on_change
+
+    data = cached('metrics', ['dashboard'], build_metrics, timeout=60)
+    invalidate_on_change('metrics', ProductionLog, Order, ignore_fields={'stock_cut'})
+
+Warmers registered with :func:`register_warmer` in an app's
+``cache_warmers`` module are run by ``manage.py warm_caches``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Callable, Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+# Keys longer than this are hashed so every backend accepts them.
+_MAX_PART_LENGTH = 64
+_VERSION_TIMEOUT = None  # namespace versions never expire on their own
+
+_warmers: dict[str, Callable[[], object]] = {}
+
+
+def _version_key(namespace: str) -> str:
+    return f"ns:{namespace}:version"
+
+
+def _seed_version() -> int:
+    # Later than every version a culled counter can have reached, unless it
+    # was bumped more than once per microsecond since it was seeded.
+    return time.time_ns() // 1000
+
+
+def _init_version(key: str) -> int:
+    seed = _seed_version()
+    cache.add(key, seed, timeout=_VERSION_TIMEOUT)
+    return int(cache.get(key) or seed)
+
+
+def namespace_version(namespace: str) -> int:
+    """Return the current version of ``namespace`` (seeded from the clock)."""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        return _init_version(key)
+    return int(version)
+
+
+def bump_namespace(namespace: str) -> int:
+    """Invalidate every key of ``namespace`` and return the new version."""
+    key = _version_key(namespace)
+    try:
+        return int(cache.incr(key))
+    except ValueError:
+        # Missing (never set or culled) counter: a fresh seed is already
+        # newer than any version the namespace was stored under.
+        return _init_version(key)
+
+
+def _format_part(part) -> str:
+    text = str(part)
+    if len(text) > _MAX_PART_LENGTH or any(ch.isspace() for ch in text):
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+    return text
+
+
+def make_key(namespace: str, parts: Iterable | None = None) -> str:
+    """Build a versioned key for ``namespace`` and ``parts``."""
+    version = namespace_version(namespace)
+    suffix = ':'.join(_format_part(p) for p in (parts or []))
+    return f"{namespace}:v{version}:{suffix}" if suffix else f"{namespace}:v{version}"
+
+
+def cached(namespace: str, parts: Iterable | None, builder: Callable[[], object], timeout: int | None = None):
+    """Return the cached value for the key or build, store and return it.
+
+    ``timeout`` of ``None`` uses the backend default (``CACHES['default']['TIMEOUT']``).
+    """
+    key = make_key(namespace, parts)
+    sentinel = object()
+    value = cache.get(key, sentinel)
+    if value is not sentinel:
+        return value
+    value = builder()
+    if timeout is None:
+        cache.set(key, value)
+    else:
+        cache.set(key, value, timeout=timeout)
+    return value
+
+
+def invalidate_on_change(namespace: str, *models, ignore_fields: Iterable[str] = ()) -> None:
+    """Bump ``namespace`` when a save or delete of one of ``models`` commits.
+
+    The bump waits for ``transaction.on_commit``: bumping earlier would let
+    another worker cache pre-commit rows under the new version.  Saves whose
+    ``update_fields`` all fall in ``ignore_fields`` (stock counters, flags)
+    do not bump; the entries' timeout bounds how stale those columns get.
+    """
+    ignored = frozenset(ignore_fields)
+
+    def _bump(sender, update_fields=None, **kwargs):
+        if update_fields and ignored.issuperset(update_fields):
+            return
+        transaction.on_commit(lambda: bump_namespace(namespace))
+
+    for model in models:
+        uid = f"utils.cache:{namespace}:{model._meta.label_lower}"
+        post_save.connect(_bump, sender=model, weak=False, dispatch_uid=uid + ':save')
+        post_delete.connect(_bump, sender=model, weak=False, dispatch_uid=uid + ':delete')
+
+
+def register_warmer(name: str):
+    """Decorator registering a zero-argument function for ``warm_caches``."""
+    def _decorator(func):
+        _warmers[name] = func
+        return func
+    return _decorator
+
+
+def registered_warmers() -> dict[str, Callable[[], object]]:
+    return dict(_warmers)
@@ -0,0 +1,110 @@
+"""Digit and Persian text normalization shared by views, exports and templates.
+
+All helpers are built on precompiled ``str.translate`` tables, so each call
+is a single pass in C instead of a per-character Python loop.  The list
+variants (``to_ascii_digits_many``, ``normalize_search_texts``,
+``normalize_names``) translate a whole column with one call over the joined
+values; import and search loops use them instead of a call per row.
+
+- ``to_ascii_digits``: Persian (U+06F0..) and Arabic-Indic (U+0660..) digits -> 0-9
+- ``digit_variants``: raw/ASCII/Persian/Arabic spellings for DB search
+- ``serial_ascii`` / ``to_fullwidth``: QR serial display on cards and labels
+- ``normalize_search_text``: trimmed, lower-cased, ASCII digits
+- ``normalize_name``: fuzzy catalog names (Arabic ي/ك -> Persian ی/ک,
+  ZWNJ and separators -> space, whitespace collapsed)
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable
+
+PERSIAN_DIGITS = '۰۱۲۳۴۵۶۷۸۹'
+ARABIC_DIGITS = '٠١٢٣٤٥٦٧٨٩'
+ASCII_DIGITS = '0123456789'
+ZWNJ = '\u200c'
+
+_TO_ASCII_DIGITS = str.maketrans(PERSIAN_DIGITS + ARABIC_DIGITS, ASCII_DIGITS * 2)
+_TO_PERSIAN_DIGITS = str.maketrans(ASCII_DIGITS, PERSIAN_DIGITS)
+_TO_ARABIC_DIGITS = str.maketrans(ASCII_DIGITS, ARABIC_DIGITS)
+_TO_FULLWIDTH = str.maketrans({
+    **{ord('0') + i: 0xFF10 + i for i in range(10)},
+    **{ord('A') + i: 0xFF21 + i for i in range(26)},
+})
+# Arabic letter variants -> Persian, and name separators -> space.
+_NAME_TABLE = str.maketrans({
+    'ي': 'ی',
+    'ك': 'ک',
+    ZWNJ: ' ',
+    '-': ' ',
+    '_': ' ',
+    '.': ' ',
+    '/': ' ',
+    '\\': ' ',
+})
+_NON_SERIAL_RE = re.compile(r'[^A-Z0-9]+')
+# Joins list items for single-pass translation; never produced by the tables.
+_JOIN = '\x00'
+
+
+def to_ascii_digits(value) -> str:
+    return str(value or '').translate(_TO_ASCII_DIGITS)
+
+
+def digit_variants(value: str) -> list[str]:
+    """Return ``[raw, ascii_digits, persian_digits, arabic_indic_digits]``."""
+    ascii_s = value.translate(_TO_ASCII_DIGITS)
+    return [value, ascii_s, ascii_s.translate(_TO_PERSIAN_DIGITS), ascii_s.translate(_TO_ARABIC_DIGITS)]
+
+
+def serial_ascii(value) -> str:
+    """QR serial as ASCII uppercase letters/digits only (other characters dropped)."""
+    return _NON_SERIAL_RE.sub('', str(value or '').translate(_TO_ASCII_DIGITS).upper())
+
+
+def to_fullwidth(value: str) -> str:
+    """Map ASCII letters/digits to FULLWIDTH glyphs so serials stay visually English in RTL text."""
+    return value.translate(_TO_FULLWIDTH)
+
+
+def collapse_whitespace(value: str) -> str:
+    return ' '.join(value.split())
+
+
+def normalize_search_text(value) -> str:
+    """Lowercase + digit-normalized search text (mirrors frontend normalizeSearchText)."""
+    return str(value or '').strip().lower().translate(_TO_ASCII_DIGITS)
+
+
+def normalize_name(value) -> str:
+    """Normalize a material/part/product name for fuzzy Persian comparisons."""
+    if not value:
+        return ''
+    return ' '.join(str(value).strip().lower().translate(_NAME_TABLE).split())
+
+
+def _translate_many(values: Iterable, table, *, strip: bool = False, lower: bool = False) -> list[str]:
+    items = [str(v or '') for v in values]
+    if not items:
+        return []
+    if strip:
+        items = [v.strip() for v in items]
+    joined = _JOIN.join(items)
+    if lower:
+        joined = joined.lower()
+    return joined.translate(table).split(_JOIN)
+
+
+def to_ascii_digits_many(values: Iterable) -> list[str]:
+    """:func:`to_ascii_digits` of each value."""
+    return _translate_many(values, _TO_ASCII_DIGITS)
+
+
+def normalize_search_texts(values: Iterable) -> list[str]:
+    """:func:`normalize_search_text` of each value."""
+    return _translate_many(values, _TO_ASCII_DIGITS, strip=True, lower=True)
+
+
+def normalize_names(values: Iterable) -> list[str]:
+    """:func:`normalize_name` of each value."""
+    return [' '.join(v.split()) for v in _translate_many(values, _NAME_TABLE, strip=True, lower=True)]
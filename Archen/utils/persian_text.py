@@ -0,0 +1,202 @@
+"""Persian text shaping for ReportLab output.
+
+ReportLab draws glyphs in logical order without joining, so Persian strings
+are passed through ``arabic_reshaper`` + ``python-bidi`` before drawing.
+Exports repeat the same product, section and customer names thousands of
+times, so :func:`shape` layers three shortcuts in front of the shaper:
+
+1. strings without Arabic-script letters (ASCII, digits, dates) are
+   returned unchanged, exactly as the old per-view helpers did;
+2. a persistent vocabulary of catalog names (products, models, parts,
+   materials) shaped when those rows are saved and stored on disk, so
+   every worker starts warm;
+3. a bounded in-process LRU for everything else.
+
+Usage::
+
+    from utils.persian_text import shape as fa
+    canvas.drawRightString(x, y, fa(product.name))
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import Iterable
+
+SHAPE_CACHE_SIZE = 16384
+# How often (seconds) a process checks whether another process rewrote the
+# vocabulary file; keeps ``shape`` free of a stat() call per string.
+VOCABULARY_RECHECK_SECONDS = 30
+_ARABIC_RE = re.compile(r"[\u0600-\u06FF]")
+
+_vocabulary: dict[str, str] | None = None
+_vocabulary_mtime: float | None = None
+_vocabulary_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _shaper():
+    try:
+        from arabic_reshaper import reshape  # type: ignore
+        from bidi.algorithm import get_display  # type: ignore
+    except Exception:
+        return None
+
+    def _apply(text: str) -> str:
+        return get_display(reshape(text), base_dir='R')
+
+    return _apply
+
+
+_apply_shaping = _shaper()
+
+
+def needs_shaping(text: str | None) -> bool:
+    """True when ``text`` contains Persian/Arabic letters."""
+    if not text or text.isascii():
+        return False
+    return _ARABIC_RE.search(text) is not None
+
+
+def shape_uncached(text: str) -> str:
+    """Shape ``text`` directly (no caches); returns input on any failure."""
+    if _apply_shaping is None or not needs_shaping(text):
+        return text
+    try:
+        return _apply_shaping(text)
+    except Exception:
+        return text
+
+
+@lru_cache(maxsize=SHAPE_CACHE_SIZE)
+def _shape_lru(text: str) -> str:
+    return shape_uncached(text)
+
+
+def shape(text):
+    """Return ``text`` in visual order for ReportLab (cached)."""
+    if not text or not isinstance(text, str) or not needs_shaping(text):
+        return text
+    shaped = _load_vocabulary().get(text)
+    if shaped is not None:
+        return shaped
+    return _shape_lru(text)
+
+
+# ---------------------------------------------------------------------------
+# Persistent vocabulary
+# ---------------------------------------------------------------------------
+
+def vocabulary_path() -> str:
+    from django.conf import settings
+
+    path = getattr(settings, 'PERSIAN_TEXT_CACHE_PATH', None)
+    if path:
+        return str(path)
+    return os.path.join(str(settings.BASE_DIR), 'tmp', 'persian_text_vocabulary.json')
+
+
+def _read_file(path: str) -> dict[str, str]:
+    try:
+        with open(path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        return {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_vocabulary() -> dict[str, str]:
+    """Return the on-disk vocabulary, re-reading it when another process rewrote it."""
+    global _vocabulary, _vocabulary_mtime, _vocabulary_checked_at
+    now = time.monotonic()
+    if _vocabulary is not None and now - _vocabulary_checked_at < VOCABULARY_RECHECK_SECONDS:
+        return _vocabulary
+    _vocabulary_checked_at = now
+    try:
+        path = vocabulary_path()
+        mtime = os.path.getmtime(path)
+    except Exception:
+        if _vocabulary is None:
+            _vocabulary = {}
+        return _vocabulary
+    if _vocabulary is None or mtime != _vocabulary_mtime:
+        with _lock:
+            _vocabulary = _read_file(path)
+            _vocabulary_mtime = mtime
+    return _vocabulary
+
+
+def precompute(texts: Iterable[str | None]) -> int:
+    """Shape ``texts`` and merge them into the on-disk vocabulary.
+
+    Returns the number of new entries written.  Texts already in the
+    in-memory vocabulary are skipped without touching the file.
+    """
+    global _vocabulary, _vocabulary_mtime
+    known = _load_vocabulary()
+    fresh = {t: shape_uncached(t) for t in texts if t and needs_shaping(t) and t not in known}
+    if not fresh:
+        return 0
+    path = vocabulary_path()
+    with _lock:
+        current = _read_file(path)
+        added = {k: v for k, v in fresh.items() if current.get(k) != v}
+        if not added:
+            return 0
+        current.update(added)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # English: write to a temp file and rename so readers never see a
+        # half-written JSON document.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(current, fh, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        _vocabulary = current
+        _vocabulary_mtime = os.path.getmtime(path)
+    return len(added)
+
+
+def precompute_on_save(*models, field: str = 'name') -> None:
+    """Add ``field`` of every saved instance of ``models`` to the vocabulary.
+
+    Saves whose ``update_fields`` leave out ``field`` (stock counters) are skipped.
+    """
+    from django.db.models.signals import post_save
+
+    def _handler(sender, instance, update_fields=None, **kwargs):
+        if update_fields is not None and field not in update_fields:
+            return
+        try:
+            precompute([getattr(instance, field, None)])
+        except Exception:
+            # English: a read-only filesystem must never block a save.
+            pass
+
+    for model in models:
+        post_save.connect(
+            _handler, sender=model, weak=False,
+            dispatch_uid=f"utils.persian_text:{model._meta.label_lower}:{field}",
+        )
+
+
+def clear_caches() -> None:
+    """Drop in-process caches (the on-disk vocabulary is kept)."""
+    global _vocabulary, _vocabulary_mtime, _vocabulary_checked_at
+    _shape_lru.cache_clear()
+    with _lock:
+        _vocabulary = None
+        _vocabulary_mtime = None
+        _vocabulary_checked_at = 0.0
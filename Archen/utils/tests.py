@@ -0,0 +1,319 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from inventory import low_stock
+from inventory.models import Part, Product, ProductModel
+
+from . import cache as ns_cache
+from . import normalize, persian_text
+
+
+class NamespacedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_builds_once_per_namespace_version(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(ns_cache.cached('test', ['a'], build), 1)
+        self.assertEqual(ns_cache.cached('test', ['a'], build), 1)
+        version = ns_cache.namespace_version('test')
+        self.assertEqual(ns_cache.bump_namespace('test'), version + 1)
+        self.assertEqual(ns_cache.cached('test', ['a'], build), 2)
+        self.assertEqual(len(calls), 2)
+
+    def test_cached_none_is_not_rebuilt(self):
+        calls = []
+        for _ in range(2):
+            ns_cache.cached('test', ['none'], lambda: calls.append(1))
+        self.assertEqual(len(calls), 1)
+
+    def test_long_or_spaced_key_parts_are_hashed(self):
+        key = ns_cache.make_key('test', ['x' * 200, 'a b', 'plain'])
+        prefix, version, long_part, spaced, plain = key.split(':')
+        expected = f"v{ns_cache.namespace_version('test')}"
+        self.assertEqual((prefix, version, plain), ('test', expected, 'plain'))
+        self.assertEqual((len(long_part), len(spaced)), (32, 32))
+
+    def test_culled_counter_does_not_revive_old_versions(self):
+        # English: the file/db backends cull the counter like any entry;
+        # payloads stored under earlier versions must stay unreachable.
+        ns_cache.cached('test', ['a'], lambda: 'first')
+        ns_cache.bump_namespace('test')
+        before = ns_cache.namespace_version('test')
+        ns_cache.cached('test', ['a'], lambda: 'second')
+        for _ in range(2):
+            cache.delete(ns_cache._version_key('test'))
+            self.assertGreater(ns_cache.namespace_version('test'), before)
+            self.assertEqual(ns_cache.cached('test', ['a'], lambda: 'fresh'), 'fresh')
+            before = ns_cache.namespace_version('test')
+
+    def test_bump_of_culled_counter_skips_old_versions(self):
+        before = ns_cache.bump_namespace('test')
+        ns_cache.cached('test', ['a'], lambda: 'stale')
+        cache.delete(ns_cache._version_key('test'))
+        self.assertGreater(ns_cache.bump_namespace('test'), before + 1)
+        self.assertEqual(ns_cache.cached('test', ['a'], lambda: 'fresh'), 'fresh')
+
+
+class InvalidateOnChangeTests(TestCase):
+    namespace = 'test_invalidate'
+
+    def setUp(self):
+        cache.clear()
+        ns_cache.invalidate_on_change(self.namespace, Part, ignore_fields={'stock_cut', *low_stock.FLAG_FIELDS})
+        uid = f'utils.cache:{self.namespace}:inventory.part'
+        self.addCleanup(post_save.disconnect, sender=Part, dispatch_uid=uid + ':save')
+        self.addCleanup(post_delete.disconnect, sender=Part, dispatch_uid=uid + ':delete')
+        self.part = Part.objects.create(name='Leg', product_model=ProductModel.objects.create(name='M1'))
+        self.version = ns_cache.namespace_version(self.namespace)
+
+    def test_bump_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.part.name = 'Long leg'
+            self.part.save()
+            self.assertEqual(ns_cache.namespace_version(self.namespace), self.version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(ns_cache.namespace_version(self.namespace), self.version + 1)
+
+    def test_deletes_bump(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.part.delete()
+        self.assertEqual(ns_cache.namespace_version(self.namespace), self.version + 1)
+
+    def test_saves_of_ignored_fields_do_not_bump(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.part.stock_cut = 5
+            self.part.save(update_fields=['stock_cut'])
+        self.assertEqual(ns_cache.namespace_version(self.namespace), self.version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.part.save(update_fields=['stock_cut', 'name'])
+        self.assertEqual(ns_cache.namespace_version(self.namespace), self.version + 1)
+
+
+
+_CHILD_SCRIPT = """
+import json, sys
+import django
+django.setup()
+from django.core.cache import cache
+from utils import cache as ns_cache
+action, namespace = sys.argv[1:3]
+if action == 'bump':
+    result = ns_cache.bump_namespace(namespace)
+elif action == 'read':
+    result = ns_cache.cached(namespace, ['a'], lambda: 'child')
+else:
+    result = cache.delete(ns_cache._version_key(namespace))
+print(json.dumps(result))
+"""
+
+
+class CrossProcessCacheMixin:
+    """Run the namespace protocol against a second interpreter sharing the backend."""
+
+    namespace = 'coherent'
+
+    def cache_settings(self):
+        raise NotImplementedError
+
+    def child_env(self):
+        return {}
+
+    def prepare_cache(self):
+        pass
+
+    def setUp(self):
+        super().setUp()
+        override = override_settings(CACHES={'default': {
+            **self.cache_settings(), 'TIMEOUT': 300, 'KEY_PREFIX': 'archen-test',
+        }})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.prepare_cache()
+        cache.clear()
+
+    def child(self, action):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'Archen.settings',
+            'CACHE_KEY_PREFIX': 'archen-test',
+            **self.child_env(),
+        }
+        out = subprocess.run(
+            [sys.executable, '-c', _CHILD_SCRIPT, action, self.namespace],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    def test_bumps_and_payloads_are_shared(self):
+        self.assertEqual(ns_cache.cached(self.namespace, ['a'], lambda: 'old'), 'old')
+        self.assertEqual(self.child('read'), 'old')
+        version = self.child('bump')
+        self.assertEqual(ns_cache.namespace_version(self.namespace), version)
+        self.assertEqual(ns_cache.cached(self.namespace, ['a'], lambda: 'new'), 'new')
+        self.assertEqual(self.child('read'), 'new')
+        ns_cache.bump_namespace(self.namespace)
+        self.assertEqual(self.child('read'), 'child')
+
+    def test_counter_culled_by_another_process(self):
+        ns_cache.cached(self.namespace, ['a'], lambda: 'old')
+        before = self.child('bump')
+        ns_cache.cached(self.namespace, ['a'], lambda: 'stale')
+        self.child('cull')
+        self.assertEqual(ns_cache.cached(self.namespace, ['a'], lambda: 'fresh'), 'fresh')
+        self.assertGreater(ns_cache.namespace_version(self.namespace), before)
+        self.assertEqual(self.child('read'), 'fresh')
+
+
+class FileCacheCrossProcessTests(CrossProcessCacheMixin, SimpleTestCase):
+    def cache_settings(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.location}
+
+    def child_env(self):
+        return {'CACHE_BACKEND': 'file', 'CACHE_LOCATION': self.location}
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'the SQLite test database is in-memory, a child process cannot share it')
+class DatabaseCacheCrossProcessTests(CrossProcessCacheMixin, TransactionTestCase):
+    def cache_settings(self):
+        return {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'archen_test_cache'}
+
+    def prepare_cache(self):
+        call_command('createcachetable', verbosity=0)
+
+    def child_env(self):
+        return {
+            'CACHE_BACKEND': 'db',
+            'CACHE_LOCATION': 'archen_test_cache',
+            'DB_NAME': connection.settings_dict['NAME'],
+        }
+
+
+class PersianTextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'vocabulary.json')
+        override = override_settings(PERSIAN_TEXT_CACHE_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        persian_text.clear_caches()
+        self.addCleanup(persian_text.clear_caches)
+
+    def test_text_without_persian_letters_is_returned_unchanged(self):
+        for text in ('ABC-123', '1403/05/12', '', None, 12):
+            self.assertEqual(persian_text.shape(text), text)
+
+    def test_shape_matches_the_uncached_shaper(self):
+        self.assertEqual(persian_text.shape('مبل آرچن'), persian_text.shape_uncached('مبل آرچن'))
+
+    def test_precomputed_names_are_served_from_the_vocabulary(self):
+        self.assertEqual(persian_text.precompute(['میز', 'صندلی', 'ABC', None]), 2)
+        self.assertEqual(persian_text.precompute(['میز']), 0)
+        with open(self.path, encoding='utf-8') as fh:
+            self.assertEqual(set(json.load(fh)), {'میز', 'صندلی'})
+
+        # English: a fresh worker reads the file instead of reshaping
+        persian_text.clear_caches()
+        with mock.patch.object(persian_text, '_apply_shaping', side_effect=AssertionError('reshaped')):
+            self.assertEqual(persian_text.shape('میز'), persian_text._read_file(self.path)['میز'])
+
+    def test_catalog_saves_extend_the_vocabulary(self):
+        model = ProductModel.objects.create(name='مدل یک')
+        Product.objects.create(name='مبل راحتی', product_model=model)
+        self.assertEqual(set(persian_text._read_file(self.path)), {'مدل یک', 'مبل راحتی'})
+
+    def test_stock_only_saves_skip_the_vocabulary(self):
+        part = Part.objects.create(name='پایه', product_model=ProductModel.objects.create(name='M1'))
+        with mock.patch.object(persian_text, 'precompute') as precompute:
+            part.stock_cut = 4
+            part.save(update_fields=['stock_cut'])
+        precompute.assert_not_called()
+
+
+def _per_char_ascii_digits(text):
+    """The per-character loop that ``normalize.to_ascii_digits`` replaced."""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if 0x06F0 <= code <= 0x06F9:
+            out.append(chr(code - 0x06F0 + ord('0')))
+        elif 0x0660 <= code <= 0x0669:
+            out.append(chr(code - 0x0660 + ord('0')))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def _per_char_serial(text):
+    """The per-character loop that ``normalize.serial_ascii`` replaced."""
+    out = []
+    for ch in _per_char_ascii_digits(text):
+        upper = ch.upper()
+        if ('A' <= upper <= 'Z') or ('0' <= upper <= '9'):
+            out.append(upper)
+    return ''.join(out)
+
+
+def _replace_loop_name(text):
+    """The replace() chain that ``normalize.normalize_name`` replaced."""
+    text = text.strip().lower().translate(str.maketrans({'ي': 'ی', 'ك': 'ک'}))
+    for ch in ('\u200c', '-', '_', '.', '/', '\\'):
+        text = text.replace(ch, ' ')
+    return ' '.join(text.split())
+
+
+class NormalizeTests(SimpleTestCase):
+    ALPHABET = 'abcXYZ09 -_./\\' + normalize.PERSIAN_DIGITS + normalize.ARABIC_DIGITS + 'يكیکمبل\u200cßﬁ²'
+
+    def random_strings(self, count=2000):
+        rng = random.Random(33)
+        return [''.join(rng.choice(self.ALPHABET) for _ in range(rng.randint(0, 24))) for _ in range(count)]
+
+    def test_same_results_as_the_per_character_helpers(self):
+        for text in self.random_strings():
+            self.assertEqual(normalize.to_ascii_digits(text), _per_char_ascii_digits(text))
+            self.assertEqual(normalize.serial_ascii(text), _per_char_serial(text))
+            self.assertEqual(normalize.normalize_name(text), _replace_loop_name(text))
+
+    def test_list_helpers_match_the_single_value_helpers(self):
+        texts = self.random_strings() + [None, '', '  ']
+        self.assertEqual(normalize.to_ascii_digits_many(texts), [normalize.to_ascii_digits(t) for t in texts])
+        self.assertEqual(normalize.normalize_search_texts(texts), [normalize.normalize_search_text(t) for t in texts])
+        self.assertEqual(normalize.normalize_names(texts), [normalize.normalize_name(t) for t in texts])
+        self.assertEqual(normalize.normalize_names(iter([])), [])
+
+    def test_digit_variants(self):
+        self.assertEqual(normalize.digit_variants('A-۱2'), ['A-۱2', 'A-12', 'A-۱۲', 'A-١٢'])
+
+    def test_serial_display(self):
+        self.assertEqual(normalize.serial_ascii('ab-۱۲ ٣c'), 'AB123C')
+        self.assertEqual(normalize.to_fullwidth('AB12 3'), 'ＡＢ１２ ３')
+
+    def test_search_and_name_normalization(self):
+        self.assertEqual(normalize.normalize_search_text('  Job-۱۲۳ '), 'job-123')
+        self.assertEqual(normalize.normalize_name(' صفحه_ام\u200cدي-اف '), 'صفحه ام دی اف')
+        self.assertEqual(normalize.normalize_name(None), '')
@@ -239,3 +239,64 @@ def build_table_response(
     )
     resp["Content-Disposition"] = f"attachment; filename={filename}"
     return resp
+
+
+def build_streaming_workbook_response(
+    *,
+    sheets: Sequence[tuple[str, Sequence[str], Iterable[Sequence[object]]]],
+    filename: str,
+    report_title: str | None = None,
+    column_widths: Sequence[int] | None = None,
+    right_to_left: bool = True,
+):
+    """
+    Build a multi-sheet XLSX with openpyxl's write-only mode and stream it.
+
+    ``sheets`` holds ``(title, headers, rows)``; rows may be a generator.
+    Write-only sheets keep memory flat for large exports; the file is
+    spooled to disk and sent in chunks by ``FileResponse``.
+    """
+    import tempfile
+
+    from django.http import FileResponse
+    from openpyxl.cell import WriteOnlyCell
+
+    styles = base_styles()
+    wb = Workbook(write_only=True)
+    for title, headers, rows in sheets:
+        ws = wb.create_sheet(title=(title or "گزارش")[:31])
+        if right_to_left:
+            try:
+                ws.sheet_view.rightToLeft = True
+            except Exception:
+                pass
+        widths = column_widths or []
+        for col_idx in range(1, len(headers) + 1):
+            width = widths[col_idx - 1] if col_idx - 1 < len(widths) else 24
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+        if report_title:
+            c = WriteOnlyCell(ws, value=report_title)
+            c.font = styles["title_font"]
+            ws.append([c])
+        header_cells = []
+        for label in headers:
+            c = WriteOnlyCell(ws, value=label)
+            c.font = styles["header_font"]
+            c.alignment = styles["center_header"]
+            c.fill = styles["header_fill"]
+            c.border = styles["border"]
+            header_cells.append(c)
+        ws.append(header_cells)
+        for data_row in rows:
+            ws.append([sanitize_value(v) for v in data_row])
+
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    wb.save(spool)
+    spool.seek(0)
+    return FileResponse(
+        spool,
+        as_attachment=True,
+        filename=filename,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )